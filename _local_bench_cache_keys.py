@@ -0,0 +1,96 @@
+# _local_bench_cache_keys.py
+# Replays the user queries in train.txt (plus deterministic rephrasings of each: case/whitespace,
+# punctuation, articles, country aliases, hyphenation) against three web-search cache key schemes
+# and reports hit rates: exact sha256 of the raw query, the normalized key, and normalized + the
+# local similarity index. A "cross-query merge" is a hit served by an entry written for a different
+# original query; those are listed so the merges can be eyeballed for false positives.
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+# --- Configure Logging ---
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("LocalBenchCacheKeys")
+
+from search_cache_keys import SemanticQueryIndex, build_search_cache_key, normalize_search_query
+from _local_bench_fast_path import load_conversations, find_country
+
+DATASET_PATH = project_root / "train.txt"
+COUNTRY_SWAPS = {"United States": ["US", "the USA", "america"], "United Kingdom": ["UK", "Britain", "the U.K."]}
+
+
+def build_variants(user_query: str, country: str):
+    """The search query the external lambda would send, plus rephrasings a user could plausibly type."""
+    base = f"{user_query} {country}"
+    variants = [base,
+                "  " + base.lower().replace(" ", "  ") + " ?",
+                f"{user_query.rstrip('?.!')}, in the {country}!",
+                f"Please tell me: {user_query} ({country})"]
+    for alias in COUNTRY_SWAPS.get(country, []):
+        variants.append(f"{user_query} in {alias}")
+    if "-" in user_query: variants.append(f"{user_query.replace('-', '')} {country}")
+    return variants
+
+
+def replay(requests, scheme: str, threshold: float):
+    """Simulates one shared cache. Returns (hits, semantic_hits, cross_query_merges)."""
+    cache = {}; index = SemanticQueryIndex(max_entries=100000, threshold=threshold)
+    hits = semantic_hits = 0; merges = []
+    for origin, search_query in requests:
+        normalized = normalize_search_query(search_query) if scheme != "exact" else search_query
+        cache_key = build_search_cache_key(search_query, normalize=scheme != "exact")
+        served_by = cache.get(cache_key)
+        if served_by is None and scheme == "semantic":
+            similar = index.find_similar(normalized)
+            if similar: served_by = cache.get(similar[0]); semantic_hits += served_by is not None
+        if served_by is not None:
+            hits += 1
+            if served_by[0] != origin: merges.append((search_query, served_by[1]))
+            continue
+        cache[cache_key] = (origin, search_query)
+        if scheme == "semantic": index.add(normalized, cache_key)
+    return hits, semantic_hits, merges
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.9)))
+    parser.add_argument("--show-merges", type=int, default=15, help="How many cross-query merges to print per scheme.")
+    args = parser.parse_args()
+
+    requests = []; originals = set()
+    for conversation in load_conversations(DATASET_PATH):
+        user_turns = [m["content"] for m in conversation.get("messages", []) if m.get("role") == "user"]
+        if not user_turns: continue
+        user_query = user_turns[0].strip(); originals.add(user_query.lower())
+        for variant in build_variants(user_query, find_country(user_query)):
+            requests.append((user_query.lower(), variant))
+    random.Random(7).shuffle(requests) # Deterministic interleaving of originals and rephrasings
+
+    print("\n----- Search Cache Key Benchmark -----")
+    print(f"Requests: {len(requests)} ({len(originals)} distinct original queries), semantic threshold: {args.threshold}")
+    for scheme in ("exact", "normalized", "semantic"):
+        start = time.perf_counter()
+        hits, semantic_hits, merges = replay(requests, scheme, args.threshold)
+        elapsed_ms = 1000.0 * (time.perf_counter() - start) / max(len(requests), 1)
+        print(f"{scheme:<11} hit rate: {hits}/{len(requests)} ({100.0 * hits / len(requests):.1f}%)"
+              f"{f', via similarity: {semantic_hits}' if scheme == 'semantic' else ''}"
+              f", cross-query merges: {len(merges)}, {elapsed_ms:.3f} ms/request")
+        for search_query, cached_query in merges[:args.show_merges]:
+            print(f"    '{' '.join(search_query.split())}'  <-  '{cached_query}'")
+    print("--------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# _local_bench_comparisons.py
+# N-way category comparisons: the interpreter accepts up to MAX_COMPARISON_CATEGORIES categories, and the
+# router sends them as one invoke of TREND_MAIN_BATCH_LAMBDA_NAME when configured (bounded parallel single
+# invokes otherwise). Reports latency and downstream invocation count for 2- and 10-category comparisons on
+# both paths and both engines, and checks the merged trends_data_comparison is the same either way.
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalBenchComparisons")
+
+# --- Set Environment Variables for the Lambdas ---
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['TREND_MAIN_LAMBDA_NAME'] = 'TrendMain'
+os.environ['ROUTER_CACHE_ENABLED'] = 'false' # Counts invokes; covered by _local_test_router_cache.py
+
+# --- Import Handlers AFTER setting environment variables ---
+try:
+    import fetch_internal_router_v2 as router
+    import interpret_query_v2
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # Handler modules set the root logger to INFO on import
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", "10"))
+INVOKE_OVERHEAD, PER_CATEGORY_QUERY = 0.060, 0.015 # Invoke/cold path vs the per-category query inside TREND_MAIN
+CATEGORIES = ["Jeans", "Shorts", "Skirts", "Dresses", "Pants", "Blouses", "Jackets", "Coats", "Sweaters", "Sneakers", "Hoodies"]
+
+
+# --- Stand-in for TREND_MAIN and its batch entry point ---
+def trend_body(params):
+    return {"country_category": {"category_name": params["category"], "average_volume": 1000 + len(params["category"]), "growth_recent": 4.2},
+            "country_category_style": [{"style_name": f"{params['category']} Wide", "average_volume": 50}], "country_color_category": []}
+
+
+class FakeLambdaClient:
+    def __init__(self): self.calls = []; self.batch_sizes = []; self.lock = threading.Lock()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        payload = json.loads(Payload)
+        with self.lock: self.calls.append(FunctionName)
+        if FunctionName == "TrendMainBatch": # One invoke; the per-category queries run concurrently inside it
+            requests = payload["requests"]; self.batch_sizes.append(len(requests))
+            time.sleep(INVOKE_OVERHEAD + PER_CATEGORY_QUERY)
+            results = [{"statusCode": 200, "body": json.dumps(trend_body(r["queryStringParameters"]))} for r in requests]
+            outer = {"statusCode": 200, "body": json.dumps({"results": results})}
+        else:
+            time.sleep(INVOKE_OVERHEAD + PER_CATEGORY_QUERY)
+            outer = {"statusCode": 200, "body": json.dumps(trend_body(payload["queryStringParameters"]))}
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(outer).encode())}
+
+
+def interpret(query):
+    response = interpret_query_v2.lambda_handler({"query": query, "category": "COMPARE_CATEGORIES", "country": "United States"}, None)
+    return json.loads(response["body"])
+
+
+def sorted_comparison(output):
+    return sorted(output["trends_data_comparison"], key=lambda c: c["category_name"])
+
+
+# --- Run Scenarios ---
+failures = []
+
+# 1. Interpreter: N-way requests are accepted up to the cap
+four_way = interpret("compare jeans, shorts, skirts and dresses")
+eleven_way = interpret("compare " + ", ".join(c.lower() for c in CATEGORIES))
+print(f"Interpreter: 4-way -> {four_way['status']} {[s['subject'] for s in four_way['query_subjects']['comparison_subjects']]}; "
+      f"11-way -> {eleven_way['status']}: {eleven_way['clarification_needed']}")
+if four_way["status"] != "success" or len(four_way["query_subjects"]["comparison_subjects"]) != 4: failures.append("4-way interpretation")
+if eleven_way["status"] != "needs_clarification": failures.append("cap not enforced by interpreter")
+
+# 2. Router: single invokes vs batch entry point
+fake_lambda = FakeLambdaClient()
+with patch('fetch_internal_router_v2.lambda_client', fake_lambda), patch('fetch_internal_router_v2.BOTO3_CLIENT_ERROR', None):
+    print(f"\n{'categories':>10} {'engine':>8} {'path':>7} {'p50 ms':>8} {'invokes':>8}")
+    for count in (2, 10):
+        interpretation = interpret("compare " + " and ".join(c.lower() for c in CATEGORIES[:count]))
+        outputs = {}
+        for engine in ("thread", "asyncio"):
+            for path, batch_name in (("single", None), ("batch", "TrendMainBatch")):
+                with patch('fetch_internal_router_v2.ROUTER_ENGINE', engine), patch('fetch_internal_router_v2.TREND_MAIN_BATCH_LAMBDA_NAME', batch_name):
+                    samples = []
+                    for _ in range(ITERATIONS):
+                        fake_lambda.calls.clear()
+                        start = time.perf_counter(); output = router.lambda_handler(json.loads(json.dumps(interpretation)), None)
+                        samples.append((time.perf_counter() - start) * 1000)
+                outputs[(engine, path)] = output
+                print(f"{count:>10} {engine:>8} {path:>7} {statistics.median(samples):>8.1f} {len(fake_lambda.calls):>8}")
+                if output["status"] != "success" or len(output["trends_data_comparison"]) != count: failures.append(f"{engine}/{path}/{count}")
+                if path == "batch" and fake_lambda.calls != ["TrendMainBatch"]: failures.append(f"{engine}/{count}: batch not used")
+        if len({json.dumps(sorted_comparison(o), sort_keys=True) for o in outputs.values()}) != 1: failures.append(f"{count}: paths disagree")
+
+    # 3. Over the cap: the first MAX_COMPARISON_CATEGORIES are fetched, the rest reported
+    over_cap = {**interpretation, "query_subjects": {"comparison_subjects": [{"subject": c, "type": "category"} for c in CATEGORIES],
+                                                     "specific_known": []}}
+    with patch('fetch_internal_router_v2.TREND_MAIN_BATCH_LAMBDA_NAME', "TrendMainBatch"):
+        capped = router.lambda_handler(over_cap, None)
+    print(f"\nOver the cap: fetched={len(capped['trends_data_comparison'])}, errors={[e['details'] for e in capped['errors']]}")
+    if len(capped["trends_data_comparison"]) != router.MAX_COMPARISON_CATEGORIES or len(capped["errors"]) != 1: failures.append("router cap")
+
+    # 4. A failing batch entry point reports every category it was asked for
+    def broken_batch(FunctionName, InvocationType, Payload):
+        return {"StatusCode": 200, "FunctionError": "Unhandled", "Payload": io.BytesIO(b'{"errorMessage": "boom"}')}
+    with patch('fetch_internal_router_v2.TREND_MAIN_BATCH_LAMBDA_NAME', "TrendMainBatch"), patch.object(fake_lambda, 'invoke', broken_batch):
+        broken = router.lambda_handler(json.loads(json.dumps(four_way)), None)
+    print(f"Broken batch: status={broken['status']}, error subjects={sorted(e.get('subject') for e in broken['errors'])}")
+    if broken["status"] != "partial" or len(broken["errors"]) != 4: failures.append("broken batch")
+
+    # 5. With the result cache on, categories already cached are left out of the batch
+    router.ROUTER_L1_CACHE.clear(); fake_lambda.batch_sizes.clear()
+    with patch('fetch_internal_router_v2.TREND_MAIN_BATCH_LAMBDA_NAME', "TrendMainBatch"), patch('fetch_internal_router_v2.ROUTER_CACHE_ENABLED', True):
+        router.lambda_handler(json.loads(json.dumps(four_way)), None)
+        ten_way = router.lambda_handler(json.loads(json.dumps(interpretation)), None)
+    print(f"Cached batch: batch sizes={fake_lambda.batch_sizes}, compared={len(ten_way['trends_data_comparison'])}")
+    if fake_lambda.batch_sizes != [4, 6] or len(ten_way["trends_data_comparison"]) != 10: failures.append("cached batch")
+
+print("\n----- Comparison Benchmark -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("--------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,133 @@
+# _local_bench_fast_path.py
+# Replays the first user turn of every conversation in test_tune.jsonl through the rule-based
+# fast path and reports how often the LLM call would be skipped and how often the fast-path
+# task agrees with the reference. References come from the assistant replies in the dataset
+# ("demand forecast" -> get_forecast, "mega demands" -> summarize_mega_trends, ...).
+# With --llm (and GOOGLE_API_KEY set) the standard LLM interpretation is used as the reference instead.
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+# --- Configure Logging ---
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("LocalBenchFastPath")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+import interpret_query_v2
+from interpret_query_v2 import classify_query_rule_based, post_process_interpretation, FAST_PATH_CONFIDENCE_THRESHOLD
+
+DATASET_PATH = project_root / "test_tune.jsonl"
+COUNTRY_ALIASES = {"united states": "United States", "us": "United States", "usa": "United States", "america": "United States",
+                   "uk": "United Kingdom", "united kingdom": "United Kingdom", "britain": "United Kingdom",
+                   "australia": "Australia", "canada": "Canada", "germany": "Germany", "france": "France", "japan": "Japan", "india": "India"}
+# Tasks the generator renders with the same indicator family count as agreeing
+TASK_FAMILIES = {"get_trend": "trend", "summarize_category": "trend", "get_forecast": "forecast",
+                 "summarize_mega_trends": "mega", "qa_combined": "qa", "qa_web_only": "qa", "qa_internal_only": "qa",
+                 "get_recommendation": "recommend", "compare_items": "compare", "compare_categories_task": "compare"}
+
+
+def load_conversations(path: Path):
+    """test_tune.jsonl holds one or more JSON objects per line."""
+    text = path.read_text(encoding="utf-8"); decoder = json.JSONDecoder(); index = 0; conversations = []
+    while index < len(text):
+        while index < len(text) and text[index].isspace(): index += 1
+        if index >= len(text): break
+        conversation, index = decoder.raw_decode(text, index); conversations.append(conversation)
+    return conversations
+
+
+def find_category(text: str):
+    text_lower = text.lower()
+    for category_lower in sorted(interpret_query_v2.KNOWN_CATEGORIES, key=len, reverse=True):
+        if re.search(r'\b' + re.escape(category_lower) + r'\b', text_lower): return category_lower.title()
+    return None
+
+
+def find_country(text: str) -> str:
+    text_lower = text.lower()
+    for alias in sorted(COUNTRY_ALIASES, key=len, reverse=True):
+        if re.search(r'\b' + re.escape(alias) + r'\b', text_lower): return COUNTRY_ALIASES[alias]
+    return "United States"
+
+
+def reference_family(final_reply: str) -> str:
+    reply_lower = final_reply.lower()
+    if "demand forecast" in reply_lower: return "forecast"
+    if "mega demand" in reply_lower: return "mega"
+    if "comparison" in reply_lower or "versus" in reply_lower: return "compare"
+    if "amazon radar" in reply_lower or "brand analysis" in reply_lower: return "placeholder"
+    if "demand intelligence" in reply_lower: return "trend"
+    return "clarify"
+
+
+def llm_reference_family(user_query: str, category: str, country: str) -> str:
+    with patch('interpret_query_v2.FAST_PATH_ENABLED', False), \
+         patch('interpret_query_v2.get_secret_value', lambda *_: os.environ.get("GOOGLE_API_KEY")):
+        result = interpret_query_v2.lambda_handler({"query": user_query, "category": category, "country": country}, None)
+    body = json.loads(result["body"])
+    if body.get("status") == "needs_clarification": return "clarify"
+    return TASK_FAMILIES.get(body.get("primary_task"), "unknown")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="Use the live LLM interpretation as the reference (needs GOOGLE_API_KEY).")
+    parser.add_argument("--verbose", action="store_true", help="Print every fast-path decision.")
+    args = parser.parse_args()
+    if args.llm and not os.environ.get("GOOGLE_API_KEY"): sys.exit("--llm needs GOOGLE_API_KEY in the environment.")
+
+    conversations = load_conversations(DATASET_PATH)
+    evaluated = skipped_llm = agreed = no_category = 0; fast_path_time = 0.0; disagreements = []
+    for conversation in conversations:
+        messages = conversation.get("messages", [])
+        user_turns = [m["content"] for m in messages if m.get("role") == "user"]
+        assistant_turns = [m["content"] for m in messages if m.get("role") == "assistant"]
+        if not user_turns or not assistant_turns: continue
+        user_query = user_turns[0]
+        category = find_category(assistant_turns[-1]) or find_category(user_query)
+        if not category: no_category += 1; continue
+        country = find_country(user_query)
+        evaluated += 1
+
+        start = time.perf_counter()
+        output, confidence = classify_query_rule_based(user_query, category, country)
+        fast_path_time += time.perf_counter() - start
+        accepted = output is not None and confidence >= FAST_PATH_CONFIDENCE_THRESHOLD
+        if args.verbose: print(f"[{confidence:.2f}] {'FAST' if accepted else 'LLM '} {category:<16} {user_query}")
+        if not accepted: continue
+        skipped_llm += 1
+
+        output = post_process_interpretation(output)
+        fast_family = "clarify" if output["status"] == "needs_clarification" else TASK_FAMILIES.get(output["primary_task"], "unknown")
+        reference = llm_reference_family(user_query, category, country) if args.llm else reference_family(assistant_turns[-1])
+        if fast_family == reference: agreed += 1
+        else: disagreements.append((user_query, category, fast_family, reference))
+
+    print("\n----- Fast Path Benchmark -----")
+    print(f"Conversations: {len(conversations)}, evaluated: {evaluated}, skipped (no category context): {no_category}")
+    print(f"Confidence threshold: {FAST_PATH_CONFIDENCE_THRESHOLD}")
+    print(f"LLM-skip rate: {skipped_llm}/{evaluated} ({100.0 * skipped_llm / max(evaluated, 1):.1f}%)")
+    print(f"Agreement on fast-path answers ({'LLM' if args.llm else 'dataset replies'} as reference): "
+          f"{agreed}/{skipped_llm} ({100.0 * agreed / max(skipped_llm, 1):.1f}%)")
+    print(f"Mean fast-path classification time: {1000.0 * fast_path_time / max(evaluated, 1):.3f} ms")
+    for user_query, category, fast_family, reference in disagreements:
+        print(f"  disagree: fast={fast_family:<9} ref={reference:<9} [{category}] {user_query}")
+    print("-------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# _local_bench_payload_size.py
+# Router payload projection: downstream bodies shaped like production (full style/color lists with
+# per-row charts, full Amazon product records) are cut to what the generator reads. Reports the router
+# output size (the Step Functions state passed to synthesis) with projection off/on, and checks
+# format_data_for_prompt and build_final_payload_for_bubble produce exactly the same output either way,
+# including when the spec is pushed down to the downstream Lambda as fields/limit.
+import io
+import json
+import logging
+import os
+import random
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalBenchPayloadSize")
+
+# --- Set Environment Variables for the Lambdas ---
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+for name in ("TREND_MAIN", "MEGA_TRENDS", "CHART_DETAILS", "AMAZON_RADAR"): os.environ[f"{name}_LAMBDA_NAME"] = name.title().replace("_", "")
+os.environ['ROUTER_CACHE_ENABLED'] = 'false'
+
+# --- Import Handlers AFTER setting environment variables ---
+try:
+    import fetch_internal_router_v2 as router
+    import generate_final_response_v2 as generate
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # Handler modules set the root logger to INFO on import
+
+STATE_LIMIT_BYTES = 256 * 1024 # Step Functions state limit
+
+
+# --- Production-shaped downstream bodies ---
+def chart(rng, points=48):
+    return [{"date": f"2022-{i % 12 + 1:02d}-01", "value": rng.randint(100, 9000), "forecast": None} for i in range(points)]
+
+
+def trend_main_body(rng, category):
+    row = lambda kind, i: {f"{kind}_name": f"{category} {kind} {i}", "average_volume": rng.randint(10, 5000), "growth_recent": rng.uniform(-20, 40),
+                           "growth_yoy": rng.uniform(-20, 40), "rank": i, "image_url": f"https://img.example/{kind}/{i}.jpg", "chart_data": chart(rng)}
+    return {"country_category": {"category_name": category, "average_volume": 12000, "growth_recent": 3.4, "chart_data": chart(rng)},
+            "country_category_style": [row("style", i) for i in range(120)], "country_color_category": [row("color", i) for i in range(40)],
+            "meta": {"generated_at": "2026-10-17", "rows": 160}}
+
+
+def mega_body(rng):
+    return {"query_category": [{"query_name": f"query {i}", "category_name": "Jeans", "growth_recent": rng.uniform(-10, 80), "average_volume": rng.randint(1, 900),
+                                "chart_data": chart(rng), "related_queries": [f"related {j}" for j in range(10)]} for i in range(150)]}
+
+
+def chart_details_body(rng):
+    return {"category_subject": "Baggy Jeans", "average_volume": 800, "growth_recent": 12.5, "chart_data": chart(rng),
+            "f2": 3.1, "f3": 4.2, "f6": 7.9, "avg2": 810, "avg3": 820, "avg6": 850, "debug": {"model": "prophet", "residuals": chart(rng)}}
+
+
+def amazon_body(rng):
+    product = lambda i: {"asin": f"B0{i:08d}", "product_url": f"https://amazon.example/dp/{i}", "product_photo": f"https://img.example/{i}.jpg",
+                         "product_price": rng.uniform(10, 90), "currency": "USD", "estimated_revenue": 100000 - i * 500, "estimated_orders": 2000 - i,
+                         "number_of_reviews": rng.randint(5, 9000), "product_star_rating": 4.3, "saturation": "medium",
+                         "product_title": "Women's High Rise Straight Leg Jeans " * 3, "description": "Stretch denim. " * 40,
+                         "price_history": chart(rng, 24)}
+    return {"country_department_category": [product(i) for i in range(100)], "category_dep_market_size": {"department_in_country_share": 7.5},
+            "raw_sample": [product(i) for i in range(20)]}
+
+
+class FakeLambdaClient:
+    """Builds the full bodies; when asked for fields/limit (pushdown), trims each list the way the spec says."""
+    def __init__(self): self.requests = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        payload = json.loads(Payload); params = payload.get("queryStringParameters", {}); self.requests.append((FunctionName, params))
+        rng = random.Random(f"{FunctionName}:{params.get('category')}")
+        body = {"TrendMain": lambda: trend_main_body(rng, params.get("category")), "MegaTrends": lambda: mega_body(rng),
+                "ChartDetails": lambda: chart_details_body(rng), "AmazonRadar": lambda: amazon_body(rng)}[FunctionName]()
+        if "fields" in params: body = router.project_body(FunctionName, body) # A downstream that honors the spec
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps({"statusCode": 200, "body": json.dumps(body)}).encode())}
+
+
+SCENARIOS = {
+    "forecast (trend+mega+charts)": {"primary_task": "get_forecast", "required_sources": ["internal_trends_item", "internal_mega"],
+                                     "query_subjects": {"specific_known": [{"subject": "Baggy", "type": "style"}]},
+                                     "original_context": {"query": "will baggy jeans grow", "category": "Jeans", "country": "United States"}},
+    "compare 10 categories": {"primary_task": "compare_categories_task", "required_sources": ["internal_trends_category"],
+                              "query_subjects": {"comparison_subjects": [{"subject": c, "type": "category"} for c in
+                                                                         ["Jeans", "Shorts", "Skirts", "Dresses", "Pants", "Blouses", "Jackets", "Coats", "Sweaters", "Hoodies"]],
+                                                 "specific_known": []},
+                              "original_context": {"query": "compare", "category": "COMPARE_CATEGORIES", "country": "United States"}},
+    "amazon radar": {"primary_task": "summarize_amazon_radar", "required_sources": ["internal_amazon_radar"], "query_subjects": {"specific_known": []},
+                     "original_context": {"query": "top amazon jeans", "category": "AMAZON_RADAR", "country": "United States",
+                                          "target_department": "Women", "target_category": "Jeans"}},
+}
+
+
+def generator_view(router_output):
+    """Everything the synthesis step derives from the router output (comparison entries land in completion order)."""
+    router_output = {**router_output, "trends_data_comparison": sorted(router_output["trends_data_comparison"], key=lambda c: c["category_name"])}
+    indicator, _ = generate.get_task_details(router_output["interpretation"]["primary_task"])
+    prompt = generate.format_data_for_prompt(router_output, {})
+    payload = generate.build_final_payload_for_bubble({}, router_output, {}, indicator, "success", None)
+    return prompt, json.dumps(payload, sort_keys=True)
+
+
+# --- Run Benchmark ---
+failures = []
+fake_lambda = FakeLambdaClient()
+print(f"{'scenario':<30}{'off KB':>9}{'on KB':>9}{'pushdown KB':>13}{'reduction':>11}")
+with patch('fetch_internal_router_v2.lambda_client', fake_lambda), patch('fetch_internal_router_v2.BOTO3_CLIENT_ERROR', None):
+    for name, interpretation in SCENARIOS.items():
+        event = {"status": "success", "timeframe_reference": None, **interpretation}
+        with patch('fetch_internal_router_v2.PAYLOAD_PROJECTION_ENABLED', False):
+            full = router.lambda_handler(json.loads(json.dumps(event)), None)
+        projected = router.lambda_handler(json.loads(json.dumps(event)), None)
+        fake_lambda.requests.clear()
+        with patch('fetch_internal_router_v2.PROJECTION_PUSHDOWN_LAMBDAS', {"TrendMain", "MegaTrends", "ChartDetails", "AmazonRadar"}):
+            pushed = router.lambda_handler(json.loads(json.dumps(event)), None)
+        sizes = [len(json.dumps(output)) / 1024 for output in (full, projected, pushed)]
+        print(f"{name:<30}{sizes[0]:>9.1f}{sizes[1]:>9.1f}{sizes[2]:>13.1f}{1 - sizes[1] / sizes[0]:>10.0%}")
+        if full["status"] != "success" or projected["status"] != "success": failures.append(f"{name}: status")
+        if generator_view(full) != generator_view(projected): failures.append(f"{name}: generator output changed by projection")
+        if generator_view(projected) != generator_view(pushed): failures.append(f"{name}: generator output changed by pushdown")
+        if not all("fields" in params and "limit" in params for _, params in fake_lambda.requests if _ != "ChartDetails"): failures.append(f"{name}: spec not pushed down")
+        if sizes[1] * 1024 > STATE_LIMIT_BYTES: failures.append(f"{name}: projected output over the Step Functions state limit")
+
+print("\n----- Payload Projection Benchmark -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("----------------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,98 @@
+# _local_bench_prompt_size.py
+# Replays the first user turn of every conversation in test_tune.jsonl and compares the standard
+# interpretation prompt built with the full style/color lists against the candidate-filtered prompt.
+# Reports prompt size (characters and ~tokens). With --llm N (and GOOGLE_API_KEY set) it also measures
+# exact token counts and LLM latency for the first N queries with both prompt variants.
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+# --- Configure Logging ---
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("LocalBenchPromptSize")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+import interpret_query_v2
+from interpret_query_v2 import build_interpretation_prompt, retrieve_vocabulary_candidates
+from _local_bench_fast_path import DATASET_PATH, load_conversations, find_category, find_country
+
+CHARS_PER_TOKEN = 4 # Rough estimate used when no API key is available
+
+
+def build_replay_set():
+    replay = []
+    for conversation in load_conversations(DATASET_PATH):
+        messages = conversation.get("messages", [])
+        user_turns = [m["content"] for m in messages if m.get("role") == "user"]
+        if not user_turns: continue
+        replay.append((user_turns[0], find_category(user_turns[0]) or "Fashion", find_country(user_turns[0])))
+    return replay
+
+
+def build_prompts(user_query: str, category: str, country: str):
+    full_prompt = build_interpretation_prompt(user_query, category, country, interpret_query_v2.ALL_STYLES_TITLE_CASE,
+                                              interpret_query_v2.ALL_COLORS_TITLE_CASE)
+    candidate_styles, candidate_colors = retrieve_vocabulary_candidates(user_query)
+    candidate_prompt = build_interpretation_prompt(user_query, category, country, candidate_styles, candidate_colors,
+                                                   candidates_only=True)
+    return full_prompt, candidate_prompt
+
+
+def measure_llm(replay, sample_size: int):
+    import google.generativeai as genai
+    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+    model = genai.GenerativeModel(interpret_query_v2.LLM_MODEL_NAME)
+    generation_config = genai.types.GenerationConfig(response_mime_type="application/json")
+    results = {"full": {"tokens": [], "latency": []}, "candidates": {"tokens": [], "latency": []}}
+    for user_query, category, country in replay[:sample_size]:
+        for variant, prompt in zip(("full", "candidates"), build_prompts(user_query, category, country)):
+            results[variant]["tokens"].append(model.count_tokens(prompt).total_tokens)
+            start = time.perf_counter()
+            model.generate_content(prompt, generation_config=generation_config)
+            results[variant]["latency"].append(time.perf_counter() - start)
+    for variant, stats in results.items():
+        print(f"  {variant:<10} mean input tokens: {statistics.mean(stats['tokens']):.0f}, "
+              f"p50 latency: {statistics.median(stats['latency']):.2f}s, max latency: {max(stats['latency']):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", type=int, default=0, metavar="N", help="Measure token counts and latency on N queries (needs GOOGLE_API_KEY).")
+    args = parser.parse_args()
+    if args.llm and not os.environ.get("GOOGLE_API_KEY"): sys.exit("--llm needs GOOGLE_API_KEY in the environment.")
+
+    replay = build_replay_set()
+    full_sizes, candidate_sizes, retrieval_times = [], [], []
+    for user_query, category, country in replay:
+        start = time.perf_counter()
+        retrieve_vocabulary_candidates(user_query)
+        retrieval_times.append(time.perf_counter() - start)
+        full_prompt, candidate_prompt = build_prompts(user_query, category, country)
+        full_sizes.append(len(full_prompt)); candidate_sizes.append(len(candidate_prompt))
+
+    print("\n----- Interpretation Prompt Size Benchmark -----")
+    print(f"Replayed queries: {len(replay)} (styles: {len(interpret_query_v2.KNOWN_STYLES)}, colors: {len(interpret_query_v2.KNOWN_COLORS)})")
+    print(f"Full lists:      mean {statistics.mean(full_sizes):.0f} chars (~{statistics.mean(full_sizes) / CHARS_PER_TOKEN:.0f} tokens)")
+    print(f"Candidate lists: mean {statistics.mean(candidate_sizes):.0f} chars (~{statistics.mean(candidate_sizes) / CHARS_PER_TOKEN:.0f} tokens)")
+    print(f"Reduction: {100.0 * (1 - sum(candidate_sizes) / sum(full_sizes)):.1f}%")
+    print(f"Candidate retrieval time: mean {1000.0 * statistics.mean(retrieval_times):.3f} ms, max {1000.0 * max(retrieval_times):.3f} ms")
+    if args.llm:
+        print(f"LLM measurements on {min(args.llm, len(replay))} queries:")
+        measure_llm(replay, args.llm)
+    print("------------------------------------------------")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# _local_bench_router_engines.py
+# Benchmarks the router's fan-out engines (ROUTER_ENGINE=thread vs asyncio) against a local stub of
+# the Lambda Invoke API, served over HTTP so real boto3 clients, signing and connection pooling are
+# exercised. Reports p50/p99 handler latency for comparisons of 1, 5 and 10 categories, checks both
+# engines return the same aggregated result, and checks the asyncio engine's per-task timeout.
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalBenchRouterEngines")
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", "50"))
+STUB_BASE_LATENCY, STUB_JITTER_MEAN, SLOW_CATEGORY_LATENCY = 0.040, 0.010, 1.0
+
+
+# --- Local Lambda Invoke API Stub ---
+class StubLambdaHandler(BaseHTTPRequestHandler):
+    """POST /2015-03-31/functions/<name>/invocations -> a TREND_MAIN-shaped response after a simulated latency."""
+    protocol_version = "HTTP/1.1" # Keep-alive, like the real endpoint
+    disable_nagle_algorithm = True # Headers and body go out in separate writes
+    rng = random.Random(5); rng_lock = threading.Lock()
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        params = payload.get("queryStringParameters", {})
+        with self.rng_lock: delay = STUB_BASE_LATENCY + self.rng.expovariate(1 / STUB_JITTER_MEAN)
+        time.sleep(SLOW_CATEGORY_LATENCY if params.get("category") == "Slow" else delay)
+        body = {"country_category": {"category": params.get("category"), "avg_volume_growth": 0.12},
+                "country_category_style": [{"style": "Wide Leg", "growth": 0.3}], "country_color_category": []}
+        response = json.dumps({"statusCode": 200, "body": json.dumps(body)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(response)))
+        self.end_headers(); self.wfile.write(response)
+
+    def log_message(self, *args): pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubLambdaHandler); server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# --- Set Environment Variables for the Lambda ---
+os.environ['LAMBDA_ENDPOINT_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ['AWS_REGION'] = 'us-west-2'
+os.environ['AWS_ACCESS_KEY_ID'] = 'stub'; os.environ['AWS_SECRET_ACCESS_KEY'] = 'stub'
+os.environ['TREND_MAIN_LAMBDA_NAME'] = 'TrendMain'
+os.environ['ROUTER_CACHE_ENABLED'] = 'false' # Measures invokes; covered by _local_test_router_cache.py
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_internal_router_v2 as router
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The router sets the root logger to INFO on import
+
+
+def compare_event(categories):
+    return {"status": "success", "primary_task": router.COMPARE_CATEGORIES_TASK_NAME, "required_sources": ["internal_trends_category"],
+            "query_subjects": {"comparison_subjects": [{"subject": c, "type": "category"} for c in categories], "specific_known": []},
+            "timeframe_reference": None,
+            "original_context": {"query": "compare", "category": "COMPARE_CATEGORIES", "country": "United States"}}
+
+
+def comparable(result):
+    return {**result, "trends_data_comparison": sorted(result["trends_data_comparison"], key=lambda c: c["category_name"])}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+# --- Run Benchmark ---
+failures = []
+print(f"Stub endpoint {os.environ['LAMBDA_ENDPOINT_URL']}, latency {STUB_BASE_LATENCY * 1000:.0f} ms + exp(mean {STUB_JITTER_MEAN * 1000:.0f} ms), "
+      f"{ITERATIONS} runs per cell, aiobotocore available: {router.AIOBOTOCORE_AVAILABLE}")
+print(f"{'categories':>10} {'engine':>8} {'p50 ms':>8} {'p99 ms':>8}")
+for count in (1, 5, 10): # MAX_COMPARISON_CATEGORIES caps comparisons at 10
+    event = compare_event([f"Category {i}" for i in range(count)])
+    outputs = {}
+    for engine in ("thread", "asyncio"):
+        with patch('fetch_internal_router_v2.ROUTER_ENGINE', engine):
+            router.lambda_handler(event, None) # Warm connections
+            samples = []
+            for _ in range(ITERATIONS):
+                start = time.perf_counter(); outputs[engine] = router.lambda_handler(event, None)
+                samples.append((time.perf_counter() - start) * 1000)
+        print(f"{count:>10} {engine:>8} {statistics.median(samples):>8.1f} {percentile(samples, 0.99):>8.1f}")
+        if outputs[engine]["status"] != "success" or len(outputs[engine]["trends_data_comparison"]) != count: failures.append(f"{engine}/{count}")
+    if comparable(outputs["thread"]) != comparable(outputs["asyncio"]): failures.append(f"engines disagree at {count} categories")
+
+# Per-task timeout: the slow category times out, the rest still land
+with patch('fetch_internal_router_v2.ROUTER_ENGINE', "asyncio"), patch('fetch_internal_router_v2.ROUTER_TASK_TIMEOUT_SECONDS', 0.3):
+    start = time.perf_counter(); result = router.lambda_handler(compare_event(["Jeans", "Slow", "Dresses"]), None)
+    elapsed = time.perf_counter() - start
+timed_out = [e for e in result["errors"] if e.get("timeout")]
+print(f"\nTimeout: status={result['status']}, landed={sorted(c['category_name'] for c in result['trends_data_comparison'])}, "
+      f"timed out={len(timed_out)}, elapsed={elapsed:.2f}s")
+if len(timed_out) != 1 or len(result["trends_data_comparison"]) != 2 or elapsed > SLOW_CATEGORY_LATENCY / 2: failures.append("per-task timeout")
+
+server.shutdown()
+print("\n----- Router Engine Benchmark -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------")
+sys.exit(1 if failures else 0)
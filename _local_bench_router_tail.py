@@ -0,0 +1,150 @@
+# _local_bench_router_tail.py
+# Tail-latency benchmark for the router's deadline budgets and hedged requests, against a local HTTP
+# stub of the Lambda Invoke API where a small share of calls straggle. Which calls straggle is fixed up front
+# (seeded, exactly STRAGGLER_SHARE of them) and a repeat of a call - the hedge - never does, so the hedging
+# check is a stable regression check rather than a sample of a random tail. Reports p50/p95/p99 for a
+# 5-category comparison with hedging off/on on both engines, and checks that a request deadline
+# (proxy-stamped deadline_ms) or a per-Lambda cap abandons late tasks and records them in errors.
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalBenchRouterTail")
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", "150"))
+FAST_LATENCY, STRAGGLER_LATENCY, STRAGGLER_SHARE, SLOW_CATEGORY_LATENCY = 0.040, 0.8, 0.03, 2.0
+
+
+# --- Local Lambda Invoke API Stub ---
+class StubLambdaHandler(BaseHTTPRequestHandler):
+    """POST /2015-03-31/functions/<name>/invocations; the first call for a category in `stragglers` takes STRAGGLER_LATENCY."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    rng = random.Random(17); rng_lock = threading.Lock()
+    stragglers, seen = set(), set() # Category names (unique per run) that straggle; categories already called
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        params = payload.get("queryStringParameters", {})
+        with self.rng_lock:
+            straggler = params.get("category") in self.stragglers and params.get("category") not in self.seen
+            self.seen.add(params.get("category")); jitter = self.rng.uniform(0, 0.01)
+        delay = SLOW_CATEGORY_LATENCY if params.get("category") == "Slow" else (STRAGGLER_LATENCY if straggler else FAST_LATENCY + jitter)
+        time.sleep(delay)
+        body = {"country_category": {"category": params.get("category")}, "country_category_style": [], "country_color_category": []}
+        response = json.dumps({"statusCode": 200, "body": json.dumps(body)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(response)))
+        self.end_headers(); self.wfile.write(response)
+
+    def log_message(self, *args): pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubLambdaHandler); server.daemon_threads = True
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# --- Set Environment Variables for the Lambda ---
+os.environ['LAMBDA_ENDPOINT_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ['AWS_REGION'] = 'us-west-2'
+os.environ['AWS_ACCESS_KEY_ID'] = 'stub'; os.environ['AWS_SECRET_ACCESS_KEY'] = 'stub'
+os.environ['TREND_MAIN_LAMBDA_NAME'] = 'TrendMain'
+os.environ['ROUTER_CACHE_ENABLED'] = 'false' # Measures invokes; covered by _local_test_router_cache.py
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_internal_router_v2 as router
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The router sets the root logger to INFO on import
+
+
+def compare_event(categories, deadline_ms=None):
+    context = {"query": "compare", "category": "COMPARE_CATEGORIES", "country": "United States"}
+    if deadline_ms: context["deadline_ms"] = deadline_ms
+    return {"status": "success", "primary_task": router.COMPARE_CATEGORIES_TASK_NAME, "required_sources": ["internal_trends_category"],
+            "query_subjects": {"comparison_subjects": [{"subject": c, "type": "category"} for c in categories], "specific_known": []},
+            "timeframe_reference": None, "original_context": context}
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_events(row):
+    """One 5-category comparison per run, with category names unique to the row and run; schedules the stragglers."""
+    names = [[f"Category {i} {row} #{run}" for i in range(5)] for run in range(ITERATIONS)]
+    calls = [name for run_names in names for name in run_names]
+    StubLambdaHandler.stragglers = set(random.Random(f"stragglers-{row}").sample(calls, round(STRAGGLER_SHARE * len(calls))))
+    return [compare_event(run_names) for run_names in names]
+
+
+# --- Run Benchmark ---
+failures = []
+warm_up_event = compare_event([f"Category {i}" for i in range(5)])
+print(f"Stub: {FAST_LATENCY * 1000:.0f}-{FAST_LATENCY * 1000 + 10:.0f} ms, {STRAGGLER_SHARE:.0%} of calls {STRAGGLER_LATENCY * 1000:.0f} ms "
+      f"(hedges never straggle); 5-category comparison, {ITERATIONS} runs per row")
+print(f"{'engine':>8} {'hedged':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hedges':>7} {'won':>5}")
+results = {}
+for engine in ("thread", "asyncio"):
+    for hedged in (False, True):
+        with patch('fetch_internal_router_v2.ROUTER_ENGINE', engine), patch('fetch_internal_router_v2.HEDGED_REQUESTS_ENABLED', hedged):
+            for _ in range(10): router.lambda_handler(warm_up_event, None) # Warm connections and the latency window
+            router.HEDGE_STATS.update(hedged=0, hedge_won=0); samples = []
+            for event in run_events(f"{engine}-{hedged}"):
+                start = time.perf_counter(); output = router.lambda_handler(event, None)
+                samples.append((time.perf_counter() - start) * 1000)
+                if output["status"] != "success": failures.append(f"{engine}/hedged={hedged}: {output['errors']}"); break
+        results[(engine, hedged)] = samples
+        print(f"{engine:>8} {str(hedged):>7} {statistics.median(samples):>8.1f} {percentile(samples, 0.95):>8.1f} "
+              f"{percentile(samples, 0.99):>8.1f} {router.HEDGE_STATS['hedged']:>7} {router.HEDGE_STATS['hedge_won']:>5}")
+    hedged_samples, unhedged_samples = results[(engine, True)], results[(engine, False)]
+    if percentile(hedged_samples, 0.99) > 0.5 * percentile(unhedged_samples, 0.99): failures.append(f"{engine}: hedging did not cut p99")
+    if statistics.mean(hedged_samples) >= statistics.mean(unhedged_samples): failures.append(f"{engine}: hedging did not cut the mean")
+
+# Deadline: the proxy-stamped deadline leaves 0.4s for fetches; the slow task is abandoned, the rest land
+print()
+for engine in ("thread", "asyncio"):
+    with patch('fetch_internal_router_v2.ROUTER_ENGINE', engine):
+        deadline_ms = int((time.time() + router.ROUTER_SYNTHESIS_RESERVE_SECONDS + 0.4) * 1000)
+        start = time.perf_counter(); output = router.lambda_handler(compare_event(["Jeans", "Slow", "Dresses"], deadline_ms), None)
+        elapsed = time.perf_counter() - start
+        with patch('fetch_internal_router_v2.ROUTER_TASK_TIMEOUTS', {"TrendMain": 0.3}):
+            start = time.perf_counter(); capped = router.lambda_handler(compare_event(["Jeans", "Slow"]), None); capped_elapsed = time.perf_counter() - start
+        expired = router.lambda_handler(compare_event(["Jeans"], int(time.time() * 1000)), None)
+    landed = sorted(c["category_name"] for c in output["trends_data_comparison"])
+    timeouts = [e for e in output["errors"] if e.get("timeout")]
+    print(f"{engine}: deadline -> status={output['status']}, landed={landed}, abandoned={len(timeouts)}, elapsed={elapsed:.2f}s; "
+          f"per-Lambda cap -> abandoned={sum(1 for e in capped['errors'] if e.get('timeout'))}, elapsed={capped_elapsed:.2f}s; "
+          f"expired deadline -> {expired['errors'][0]['error'] if expired['errors'] else 'no error'}")
+    if output["status"] != "partial" or landed != ["Dresses", "Jeans"] or len(timeouts) != 1 or elapsed > 0.6: failures.append(f"{engine}: deadline")
+    if capped_elapsed > 0.5 or len(capped["trends_data_comparison"]) != 1: failures.append(f"{engine}: per-Lambda cap")
+    if not expired["errors"] or not expired["errors"][0].get("timeout") or expired["trends_data_comparison"]: failures.append(f"{engine}: expired deadline")
+
+server.shutdown()
+print("\n----- Router Tail Latency Benchmark -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,176 @@
+# _local_bench_synthesis_tokens.py
+# Synthesis prompt caching: replays trend, comparison, Amazon and web-summary requests through the synthesis
+# handler against a fake Gemini model that bills input tokens the way the API does (system instruction +
+# contents; context-cached tokens at the cached rate; repeated prefixes cached implicitly above a minimum).
+# Reports tokens sent and billed per request for SYNTHESIS_PROMPT_CACHE=off / system_instruction /
+# cached_content, checks that personas below SYNTHESIS_PROMPT_CACHE_MIN_TOKENS keep the inline prompt (the
+# default threshold covers every current persona), and, with the threshold lowered, that a reusable persona is
+# registered once per indicator and the request carries the data.
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalBenchSynthesisTokens")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import generate_final_response_v2 as generate
+    import llm_client
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The generator sets the root logger to INFO on import
+
+REQUESTS_PER_SCENARIO = int(os.environ.get("BENCH_ITERATIONS", "20"))
+CHARS_PER_TOKEN = 4 # Rough estimate, as in _local_bench_prompt_size.py
+CACHED_TOKEN_RATE = 0.25 # Cached input tokens are billed at a quarter of the input rate
+IMPLICIT_CACHE_MIN_TOKENS = 1024 # Shortest repeated prefix the API discounts implicitly
+CONTEXT_CACHE_MIN_TOKENS = 1024 # Shortest content CachedContent.create accepts (Flash)
+
+
+def tokens(text):
+    return len(text or "") // CHARS_PER_TOKEN
+
+
+# --- Fake Gemini: models, context caches and billing ---
+class Ledger:
+    def __init__(self, context_cache_min=CONTEXT_CACHE_MIN_TOKENS):
+        self.context_cache_min = context_cache_min
+        self.requests = 0; self.sent = 0; self.billed = 0.0; self.prompts = []; self.seen_prefixes = set()
+
+
+ledger = Ledger()
+
+
+class FakeContextCache:
+    def __init__(self, model_name, system_instruction, ttl_seconds):
+        if tokens(system_instruction) < ledger.context_cache_min:
+            raise ValueError(f"Cached content is too small. total_token_count={tokens(system_instruction)}, min_total_token_count={ledger.context_cache_min}")
+        self.name = f"cachedContents/{abs(hash(system_instruction))}"; self.system_instruction = system_instruction
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name, generation_config, system_instruction=None, cached_content=None):
+        self.system_instruction = cached_content.system_instruction if cached_content else system_instruction
+        self.cached_content = cached_content
+
+    def generate_content(self, prompt, **kwargs):
+        instruction_tokens, prompt_tokens = tokens(self.system_instruction), tokens(prompt)
+        cached = 0
+        if self.cached_content is not None: cached = instruction_tokens
+        elif self.system_instruction and instruction_tokens >= IMPLICIT_CACHE_MIN_TOKENS: # Repeated prefix
+            if self.system_instruction in ledger.seen_prefixes: cached = instruction_tokens
+            ledger.seen_prefixes.add(self.system_instruction)
+        ledger.requests += 1; ledger.prompts.append(prompt)
+        ledger.sent += prompt_tokens + (0 if self.cached_content else instruction_tokens)
+        ledger.billed += instruction_tokens + prompt_tokens - cached * (1 - CACHED_TOKEN_RATE)
+        return type("FakeResponse", (), {"text": json.dumps(generate.get_default_summary_structure())})()
+
+    def count_tokens(self, contents):
+        return type("FakeTokenCount", (), {"total_tokens": tokens(str(contents))})()
+
+
+# --- Requests ---
+def trend_block(category):
+    return {"category_summary": {"category_name": category, "growth_recent": 6.4, "average_volume": 157000},
+            "style_details": [{"style_name": f"{category} Style {i}", "average_volume": 1800 - i * 90, "growth_recent": 22.0 - i} for i in range(10)],
+            "color_details": [{"color_name": f"Color {i}", "average_volume": 900 - i * 40, "growth_recent": 8.0 - i} for i in range(5)]}
+
+
+def interpretation(primary_task, sources, context, subjects=None):
+    return {"status": "success", "primary_task": primary_task, "required_sources": sources,
+            "query_subjects": {"specific_known": [], **(subjects or {})},
+            "original_context": {"query": "q", "country": "United States", **context}}
+
+
+SCENARIOS = {
+    "trend detail": {"internal_data": {"status": "success", "trends_data": trend_block("Jeans"), "interpretation": interpretation(
+        "get_trend", ["internal_trends_item"], {"category": "Jeans"}, {"specific_known": [{"subject": "Baggy", "type": "style"}]})}},
+    "compare 4 categories": {"internal_data": {"status": "success", "interpretation": interpretation(
+        "compare_categories_task", ["internal_trends_category"], {"category": "COMPARE_CATEGORIES"},
+        {"comparison_subjects": [{"subject": c, "type": "category"} for c in ("Jeans", "Shorts", "Skirts", "Dresses")]}),
+        "trends_data_comparison": [{"category_name": c, "data": trend_block(c)} for c in ("Jeans", "Shorts", "Skirts", "Dresses")]}},
+    "amazon radar": {"internal_data": {"status": "success", "interpretation": interpretation(
+        "summarize_amazon_radar", ["internal_amazon_radar"], {"category": "AMAZON_RADAR", "target_department": "Women", "target_category": "Jeans"}),
+        "amazon_radar_data": {"country_department_category": [{"asin": f"B0{i:08d}", "product_price": 39.9, "currency": "USD", "product_star_rating": 4.3,
+                                                               "estimated_revenue": 90000 - i * 5000, "estimated_orders": 2000 - i * 90, "number_of_reviews": 800}
+                                                              for i in range(10)], "category_dep_market_size": {"department_in_country_share": 7.5}}}},
+    "web summary": {"internal_data": {"status": "success", "interpretation": interpretation(
+        "summarize_web_trends", ["web_search"], {"category": "Jeans", "query": "what is trending in denim"})},
+        "external_data": {"status": "success", "answer": "Wide-leg and barrel fits lead denim this season.",
+                          "results": [{"title": f"Denim report {i}", "content": "Barrel jeans and dark washes are up across retailers. " * 4} for i in range(5)]}},
+}
+
+
+def run(mode, context_cache_min, prompt_cache_min):
+    ledger.__init__(context_cache_min); llm_client.set_model_factory(FakeGenerativeModel, FakeContextCache); outputs = []
+    with patch('generate_final_response_v2.SYNTHESIS_PROMPT_CACHE', mode), patch('generate_final_response_v2.get_secret_value', lambda *_: "test-key"), \
+         patch('generate_final_response_v2.SYNTHESIS_PROMPT_CACHE_MIN_TOKENS', prompt_cache_min), patch('generate_final_response_v2.BOTO3_CLIENT_ERROR', None):
+        for _ in range(REQUESTS_PER_SCENARIO):
+            for event in SCENARIOS.values(): outputs.append(generate.lambda_handler(json.loads(json.dumps(event)), None))
+    return outputs, llm_client.health_check()
+
+
+# --- Run Benchmark ---
+failures = []
+instructions = {name: generate.get_task_details(event["internal_data"]["interpretation"]["primary_task"])[1].instruction
+                for name, event in SCENARIOS.items()}
+print(f"Persona instructions: {', '.join(f'{name} ~{tokens(text)}' for name, text in instructions.items())} tokens; "
+      f"{REQUESTS_PER_SCENARIO} requests per scenario")
+print(f"Default SYNTHESIS_PROMPT_CACHE: {generate.SYNTHESIS_PROMPT_CACHE} (reusable above ~{generate.SYNTHESIS_PROMPT_CACHE_MIN_TOKENS} tokens)")
+if generate.SYNTHESIS_PROMPT_CACHE != "off" and "SYNTHESIS_PROMPT_CACHE" not in os.environ: failures.append("default mode")
+print(f"{'mode':<44}{'sent/req':>10}{'billed/req':>12}{'models':>8}{'caches':>8}{'fallbacks':>11}")
+results = {}
+default_min = generate.SYNTHESIS_PROMPT_CACHE_MIN_TOKENS
+for label, mode, cache_min, prompt_min in (("off", "off", CONTEXT_CACHE_MIN_TOKENS, default_min),
+                                           ("system_instruction", "system_instruction", CONTEXT_CACHE_MIN_TOKENS, default_min),
+                                           ("cached_content", "cached_content", CONTEXT_CACHE_MIN_TOKENS, default_min),
+                                           ("system_instruction (threshold 0)", "system_instruction", CONTEXT_CACHE_MIN_TOKENS, 0),
+                                           (f"cached_content (threshold 0, API min {CONTEXT_CACHE_MIN_TOKENS})", "cached_content", CONTEXT_CACHE_MIN_TOKENS, 0),
+                                           ("cached_content (threshold 0, no API min)", "cached_content", 0, 0)):
+    outputs, stats = run(mode, cache_min, prompt_min)
+    results[label] = (ledger.sent / ledger.requests, ledger.billed / ledger.requests, stats, list(ledger.prompts))
+    print(f"{label:<44}{results[label][0]:>10.0f}{results[label][1]:>12.0f}{stats['models_created']:>8}"
+          f"{stats['context_caches_created']:>8}{stats['context_cache_failures']:>11}")
+    if any(o["statusCode"] != 200 for o in outputs) or ledger.requests != REQUESTS_PER_SCENARIO * len(SCENARIOS): failures.append(f"{label}: requests")
+
+off, default_system_instruction, default_cached, system_instruction, small_cache, cached = (results[label] for label in results)
+# Below the threshold (every current persona) the modes send exactly the inline prompt and never try a cache
+for label, result in (("system_instruction", default_system_instruction), ("cached_content", default_cached)):
+    if result[3] != off[3] or result[1] != off[1] or result[2]["context_cache_failures"] or result[2]["models_created"] != off[2]["models_created"]:
+        failures.append(f"{label}: persona below the threshold not sent inline")
+# The persona leaves the per-request prompt; the data block stays exactly as it was
+if any(text.splitlines()[0] in prompt for text in instructions.values() for prompt in system_instruction[3]): failures.append("persona still sent per request")
+data_blocks = [prompt.split("\n\n", 1)[1] if prompt.startswith("REQUEST DETAILS") else prompt for prompt in system_instruction[3]]
+if not all(inline.endswith("\n\n" + data) for inline, data in zip(off[3], data_blocks)): failures.append("data block changed")
+if "<specific_item_name>: Baggy" not in system_instruction[3][0]: failures.append("request details missing")
+# One model per persona, registered once; a cache that cannot be created falls back once, not per request
+if system_instruction[2]["models_created"] != len(SCENARIOS): failures.append("system instruction models not reused")
+if small_cache[2]["context_cache_failures"] != len(SCENARIOS) or small_cache[1] != system_instruction[1]: failures.append("cache fallback")
+if cached[2]["context_caches_created"] != len(SCENARIOS) or cached[1] >= 0.8 * off[1]: failures.append("context cache savings")
+print(f"\nBelow the threshold every mode bills like off. With a context cache: sent -{1 - cached[0] / off[0]:.0%}, billed -{1 - cached[1] / off[1]:.0%} per request. It needs instructions "
+      f"of at least the model's minimum ({CONTEXT_CACHE_MIN_TOKENS} here); below it requests are served by the system-instruction model.")
+llm_client.set_model_factory(None)
+
+print("\n----- Synthesis Prompt Caching Benchmark -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("----------------------------------------------")
+sys.exit(1 if failures else 0)
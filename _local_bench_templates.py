@@ -0,0 +1,68 @@
+# _local_bench_templates.py
+# Microbenchmark of persona prompt rendering: str.format on the raw PERSONA_PROMPTS template (the old
+# per-request path) vs the CompiledTemplate parsed at import (one join). Reports µs per render for every
+# indicator, checks both produce identical text, and checks a template with an unknown placeholder is
+# rejected when the registry is built rather than at request time.
+import logging
+import os
+import sys
+import timeit
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalBenchTemplates")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import generate_final_response_v2 as generate
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The generator sets the root logger to INFO on import
+
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", "20000"))
+ARGS = {"specific_item_name": "Baggy Jeans", "category_name": "Jeans", "country_name": "United States",
+        "user_query": "what is trending in denim", "brand_domain": "brand.example", "target_category": "Jeans",
+        "target_department": "Women", "category_list_str": "Jeans, Shorts, Skirts, Dresses"}
+
+# --- Run Benchmark ---
+failures = []
+if generate.TEMPLATE_LOAD_ERROR: failures.append(f"registry: {generate.TEMPLATE_LOAD_ERROR}")
+print(f"{ITERATIONS} renders per indicator")
+print(f"{'indicator':<22}{'chars':>7}{'fields':>8}{'format µs':>11}{'compiled µs':>13}{'speedup':>9}")
+for indicator, source in generate.PERSONA_PROMPTS.items():
+    compiled = generate.PERSONA_TEMPLATES[indicator]
+    if compiled.render(ARGS) != source.format(**ARGS): failures.append(f"{indicator}: output differs")
+    format_us = min(timeit.repeat(lambda: source.format(**ARGS), number=ITERATIONS, repeat=3)) / ITERATIONS * 1e6
+    compiled_us = min(timeit.repeat(lambda: compiled.render(ARGS), number=ITERATIONS, repeat=3)) / ITERATIONS * 1e6
+    print(f"{indicator:<22}{len(source):>7}{len(compiled.fields):>8}{format_us:>11.2f}{compiled_us:>13.2f}{format_us / compiled_us:>8.1f}x")
+
+# Cold-start validation: unknown names, positional fields and format specs are rejected at compile time
+for bad in ("Analyze {category_nmae} in {country_name}.", "Top {0} styles", "Growth {growth_recent:.1f}%", "{country_name!r}"):
+    try:
+        generate.CompiledTemplate("TEST", bad); failures.append(f"accepted: {bad}")
+    except ValueError as e:
+        print(f"Rejected at compile: {e}")
+# The system-instruction form keeps every literal brace and labels every field
+for indicator, compiled in generate.PERSONA_TEMPLATES.items():
+    if compiled.instruction != generate.PERSONA_PROMPTS[indicator].format(**{name: f"<{name}>" for name in generate.PROMPT_FIELDS}):
+        failures.append(f"{indicator}: instruction form differs")
+
+print("\n----- Persona Template Benchmark -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("--------------------------------------")
+sys.exit(1 if failures else 0)
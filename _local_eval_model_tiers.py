@@ -0,0 +1,211 @@
+# _local_eval_model_tiers.py
+# Offline evaluation of synthesis model tiering: replays recorded synthesis events ({"internal_data",
+# "external_data"}, one JSON object per line, e.g. the "Received combined event" log lines) through the heavy
+# tier (SYNTHESIS_LLM_MODEL), the light tier (SYNTHESIS_LIGHT_LLM_MODEL) and the routing policy with fallback.
+# Reports latency, token cost and schema-validity rate per tier and indicator.
+# Without --live the tiers are simulated (deterministic latency/validity profiles) so the harness and the
+# fallback paths run anywhere; with --live and GOOGLE_API_KEY set, the real models are called.
+import argparse
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalEvalModelTiers")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['IS_LOCAL'] = 'true' # --live reads GOOGLE_API_KEY from the environment
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import generate_final_response_v2 as generate
+    import llm_client
+    from google.api_core import exceptions as google_api_exceptions
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The generator sets the root logger to INFO on import
+
+HEAVY, LIGHT = generate.SYNTHESIS_LLM_MODEL, generate.SYNTHESIS_LIGHT_LLM_MODEL or "gemini-2.0-flash-lite"
+CHARS_PER_TOKEN = 4
+# USD per 1M (input, output) tokens; override with MODEL_PRICES='{"model": [in, out]}'
+MODEL_PRICES = {"gemini-2.0-flash": (0.10, 0.40), "gemini-2.0-flash-lite": (0.075, 0.30), "gemini-2.5-flash": (0.30, 2.50)}
+try:
+    MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.environ.get("MODEL_PRICES", "{}")).items()})
+except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+    logging.warning("Ignoring invalid MODEL_PRICES value.")
+
+
+# --- Simulated tiers (offline) ---
+# (base latency s, latency per 1k prompt tokens s, invalid-output rate on simple / reasoning-heavy indicators)
+SIMULATED_PROFILES = {"heavy": (1.2, 0.35, 0.01, 0.03), "light": (0.5, 0.15, 0.02, 0.25)}
+SIMPLE_INDICATORS = {generate.INDICATOR_WEB_SUMMARY, generate.INDICATOR_QA_WEB, generate.INDICATOR_AMAZON_RADAR}
+TIMEOUT_MARKER = "[simulate-timeout]" # A query containing this times out on the light tier
+
+
+class SimulatedModel:
+    def __init__(self, model_name, generation_config, system_instruction=None, cached_content=None):
+        self.model_name = model_name; self.system_instruction = system_instruction or ""
+        self.profile = SIMULATED_PROFILES["heavy" if model_name == HEAVY else "light"]
+
+    def generate_content(self, prompt, **kwargs):
+        prompt_tokens = (len(prompt) + len(self.system_instruction)) // CHARS_PER_TOKEN
+        if TIMEOUT_MARKER in prompt and self.model_name == LIGHT: raise google_api_exceptions.DeadlineExceeded("simulated timeout")
+        indicator = next((name for name, template in generate.PERSONA_TEMPLATES.items()
+                          if template.instruction == self.system_instruction), generate.INDICATOR_UNKNOWN)
+        base, per_1k, simple_invalid, heavy_invalid = self.profile
+        roll = int(hashlib.sha256(f"{self.model_name}:{prompt}".encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        invalid = roll < (simple_invalid if indicator in SIMPLE_INDICATORS else heavy_invalid)
+        summary = generate.get_default_summary_structure(); summary["overall_summary"] = f"Summary from {self.model_name}."
+        text = json.dumps({"overall_summary": summary["overall_summary"]} if invalid else summary) # Invalid: sections missing
+        usage = type("Usage", (), {"prompt_token_count": prompt_tokens, "candidates_token_count": len(text) // CHARS_PER_TOKEN})()
+        return type("Response", (), {"text": text, "usage_metadata": usage, "simulated_latency": base + per_1k * prompt_tokens / 1000})()
+
+    def count_tokens(self, contents):
+        return type("TokenCount", (), {"total_tokens": len(str(contents)) // CHARS_PER_TOKEN})()
+
+
+# --- Recording ---
+attempt_log = [] # One entry per LLM attempt of the current event
+
+
+def recording_call(model, synthesis_prompt, stream_id, timeout):
+    """Stands in for generate.call_synthesis_model: same call, plus latency and token usage per attempt."""
+    start = time.perf_counter()
+    entry = {"model": getattr(model, "model_name", None), "ok": False}
+    attempt_log.append(entry)
+    response = model.generate_content(synthesis_prompt, **({"request_options": {"timeout": timeout}} if timeout else {}))
+    usage = getattr(response, "usage_metadata", None)
+    entry.update(ok=True, latency=getattr(response, "simulated_latency", time.perf_counter() - start),
+                 input_tokens=getattr(usage, "prompt_token_count", 0), output_tokens=getattr(usage, "candidates_token_count", 0))
+    return response.text
+
+
+def cost(model_name, input_tokens, output_tokens):
+    price_in, price_out = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+def replay(event, models):
+    """Runs one event through synthesis with the given model order; returns (indicator, valid, attempts)."""
+    attempt_log.clear()
+    with patch('generate_final_response_v2.choose_synthesis_models', lambda *_: list(models)) if models else nullcontext(), \
+         patch('generate_final_response_v2.call_synthesis_model', recording_call):
+        response = generate.lambda_handler(json.loads(json.dumps(event)), None)
+    body = json.loads(response["body"])
+    primary_task = (event.get("internal_data", {}).get("interpretation") or {}).get("primary_task")
+    indicator, _ = generate.get_task_details(primary_task)
+    return indicator, body.get("status") != generate.INDICATOR_ERROR, list(attempt_log)
+
+
+# --- Events ---
+def sample_events():
+    """Built-in events shaped like recorded ones, for when no --events file is given."""
+    trend_block = lambda c: {"category_summary": {"category_name": c, "growth_recent": 6.4, "average_volume": 157000},
+                             "style_details": [{"style_name": f"{c} Style {i}", "average_volume": 1800 - i * 90, "growth_recent": 22.0 - i} for i in range(10)],
+                             "color_details": [{"color_name": f"Color {i}", "average_volume": 900 - i * 40, "growth_recent": 8.0 - i} for i in range(5)]}
+    context = lambda **extra: {"query": "q", "country": "United States", **extra}
+    interpretation = lambda task, sources, ctx, subjects=None: {"status": "success", "primary_task": task, "required_sources": sources,
+                                                                "query_subjects": {"specific_known": [], **(subjects or {})}, "original_context": ctx}
+    events = []
+    for i, category in enumerate(["Jeans", "Dresses", "Sneakers", "Blouses", "Jackets"]):
+        events.append({"internal_data": {"status": "success", "trends_data": trend_block(category), "interpretation": interpretation(
+            "get_trend", ["internal_trends_item"], context(category=category), {"specific_known": [{"subject": f"Style {i}", "type": "style"}]})}})
+        compared = [category, "Shorts", "Skirts", "Pants"][: 2 + i % 3]
+        events.append({"internal_data": {"status": "success", "interpretation": interpretation(
+            "compare_categories_task", ["internal_trends_category"], context(category="COMPARE_CATEGORIES"),
+            {"comparison_subjects": [{"subject": c, "type": "category"} for c in compared]}),
+            "trends_data_comparison": [{"category_name": c, "data": trend_block(c)} for c in compared]}})
+        events.append({"internal_data": {"status": "success", "interpretation": interpretation(
+            "summarize_amazon_radar", ["internal_amazon_radar"], context(category="AMAZON_RADAR", target_department="Women", target_category=category)),
+            "amazon_radar_data": {"country_department_category": [{"asin": f"B0{i}{j:07d}", "product_price": 19.9 + j, "currency": "USD", "product_star_rating": 4.3,
+                                                                   "estimated_revenue": 90000 - j * 5000, "estimated_orders": 2000 - j * 90, "number_of_reviews": 800}
+                                                                  for j in range(10)], "category_dep_market_size": {"department_in_country_share": 7.5}}}})
+        query = f"what is trending in {category.lower()}" + (f" {TIMEOUT_MARKER}" if i == 0 else "")
+        events.append({"internal_data": {"status": "success", "interpretation": interpretation(
+            "summarize_web_trends", ["web_search"], context(category=category, query=query))},
+            "external_data": {"status": "success", "answer": f"{category}: relaxed fits and earthy tones lead this season.",
+                              "results": [{"title": f"{category} report {j}", "content": "Retailers report strong sell-through. " * 4} for j in range(5)]}})
+    return events
+
+
+def load_events(path):
+    with open(path, encoding="utf-8") as f:
+        return [event for event in (json.loads(line) for line in f if line.strip()) if "internal_data" in event]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] if ordered else 0.0
+
+
+# --- Main ---
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument("--events", help="JSONL file of recorded synthesis events (default: built-in samples)")
+parser.add_argument("--live", action="store_true", help="Call the real models (needs GOOGLE_API_KEY)")
+args = parser.parse_args()
+
+events = load_events(args.events) if args.events else sample_events()
+if args.live:
+    if not os.environ.get("GOOGLE_API_KEY"): print("--live needs GOOGLE_API_KEY"); sys.exit(1)
+    TIMEOUT_MARKER = "\0" # Never present in real queries
+else:
+    os.environ.setdefault("GOOGLE_API_KEY", "offline"); llm_client.set_model_factory(SimulatedModel)
+print(f"{len(events)} events, heavy={HEAVY}, light={LIGHT}, {'live' if args.live else 'simulated'} models")
+
+failures = []
+rows = {}
+with patch('generate_final_response_v2.SYNTHESIS_LIGHT_LLM_MODEL', LIGHT), patch('generate_final_response_v2.BOTO3_CLIENT_ERROR', None):
+    for label, models in (("heavy", [HEAVY]), ("light", [LIGHT]), ("routed", None)):
+        for event in events:
+            indicator, valid, attempts = replay(event, models)
+            for key in ((label, indicator), (label, "ALL")):
+                row = rows.setdefault(key, {"n": 0, "valid": 0, "latency": [], "input": 0, "output": 0, "cost": 0.0, "routed_light": 0, "light": 0, "fallbacks": 0})
+                row["n"] += 1; row["valid"] += valid
+                row["latency"].append(sum(a.get("latency", generate.SYNTHESIS_LLM_TIMEOUT_SECONDS) for a in attempts))
+                row["input"] += sum(a.get("input_tokens", 0) for a in attempts); row["output"] += sum(a.get("output_tokens", 0) for a in attempts)
+                row["cost"] += sum(cost(a["model"], a.get("input_tokens", 0), a.get("output_tokens", 0)) for a in attempts)
+                row["routed_light"] += bool(attempts) and attempts[0]["model"] == LIGHT
+                row["light"] += bool(attempts) and attempts[-1]["ok"] and attempts[-1]["model"] == LIGHT; row["fallbacks"] += max(0, len(attempts) - 1)
+
+print(f"\n{'tier':<8}{'indicator':<22}{'n':>4}{'valid':>8}{'p50 s':>8}{'p95 s':>8}{'in tok':>8}{'out tok':>8}{'$/1k req':>10}{'→light':>7}{'light':>7}{'fallbk':>7}")
+for (label, indicator), row in sorted(rows.items(), key=lambda item: (item[0][0] != "heavy", item[0][0] != "light", item[0][1] == "ALL", item[0][1])):
+    n = row["n"]
+    print(f"{label:<8}{indicator:<22}{n:>4}{row['valid'] / n:>8.0%}{statistics.median(row['latency']):>8.2f}{percentile(row['latency'], 0.95):>8.2f}"
+          f"{row['input'] / n:>8.0f}{row['output'] / n:>8.0f}{row['cost'] / n * 1000:>10.4f}{row['routed_light'] / n:>7.0%}{row['light'] / n:>7.0%}{row['fallbacks']:>7}")
+
+if not args.live: # The simulated profiles make the policy's expected behavior checkable
+    heavy, light, routed = (rows[(label, "ALL")] for label in ("heavy", "light", "routed"))
+    if routed["valid"] < heavy["valid"]: failures.append("routing lost validity vs the heavy tier")
+    if routed["cost"] >= heavy["cost"] or statistics.median(routed["latency"]) >= statistics.median(heavy["latency"]): failures.append("routing saved nothing")
+    if not routed["fallbacks"]: failures.append("no fallback exercised")
+    if not any(a["model"] == LIGHT and not a["ok"] for a in replay(events[3], None)[2]): failures.append("no timeout fallback")
+    for indicator in (generate.INDICATOR_CATEGORY_COMPARISON, generate.INDICATOR_TREND_DETAIL):
+        if rows[("routed", indicator)]["routed_light"]: failures.append(f"{indicator} routed to the light tier")
+    for indicator in (generate.INDICATOR_WEB_SUMMARY, generate.INDICATOR_AMAZON_RADAR):
+        if rows[("routed", indicator)]["routed_light"] != rows[("routed", indicator)]["n"]: failures.append(f"{indicator} not routed to the light tier")
+    llm_client.set_model_factory(None)
+
+print("\n----- Model Tier Evaluation -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("---------------------------------")
+sys.exit(1 if failures else 0)
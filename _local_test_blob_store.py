@@ -0,0 +1,201 @@
+# _local_test_blob_store.py
+# Offline test of the claim-check hand-off between the router and synthesis steps: a large router output
+# (10-category comparison, projection off) is written to the blob store (filesystem stand-in in a temp dir,
+# then an in-memory S3 stand-in) and the state carries a handle; the synthesis step resolves it and builds
+# exactly the same prompt and response as with the inline output. Reports state size inline vs by reference.
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from botocore.exceptions import EndpointConnectionError, NoCredentialsError
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestBlobStore")
+
+# --- Set Environment Variables for the Lambdas ---
+blob_dir = tempfile.TemporaryDirectory()
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['TREND_MAIN_LAMBDA_NAME'] = 'TrendMain'
+os.environ['ROUTER_CACHE_ENABLED'] = 'false'
+os.environ['PAYLOAD_PROJECTION_ENABLED'] = 'false' # Full bodies, as before projection, to go over the state limit
+os.environ['BLOB_STORE_LOCAL_DIR'] = blob_dir.name
+
+# --- Import Handlers AFTER setting environment variables ---
+try:
+    import blob_store
+    import fetch_internal_router_v2 as router
+    import generate_final_response_v2 as generate
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # Handler modules set the root logger to INFO on import
+
+STATE_LIMIT_BYTES = 256 * 1024 # Step Functions state limit
+CATEGORIES = ["Jeans", "Shorts", "Skirts", "Dresses", "Pants", "Blouses", "Jackets", "Coats", "Sweaters", "Hoodies"]
+
+
+# --- Stand-ins: downstream Lambda, S3 and the synthesis model ---
+class FakeLambdaClient:
+    """TREND_MAIN bodies with full style/color lists and per-row charts."""
+    def invoke(self, FunctionName, InvocationType, Payload):
+        category = json.loads(Payload)["queryStringParameters"]["category"]; rng = random.Random(category)
+        chart = [{"date": f"2022-{i % 12 + 1:02d}-01", "value": rng.randint(100, 9000)} for i in range(48)]
+        row = lambda kind, i: {f"{kind}_name": f"{category} {kind} {i}", "average_volume": rng.randint(10, 5000),
+                               "growth_recent": round(rng.uniform(-20, 40), 2), "chart_data": chart}
+        body = {"country_category": {"category_name": category, "average_volume": 12000, "growth_recent": 3.4, "chart_data": chart},
+                "country_category_style": [row("style", i) for i in range(40)], "country_color_category": [row("color", i) for i in range(10)]}
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps({"statusCode": 200, "body": json.dumps(body)}).encode())}
+
+
+class FakeS3Client:
+    def __init__(self, error=None): self.objects = {}; self.error = error # error: raised by every call (S3 unreachable)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        if self.error: raise self.error
+        self.objects[(Bucket, Key)] = Body
+
+    def get_object(self, Bucket, Key):
+        if self.error: raise self.error
+        if (Bucket, Key) not in self.objects: raise OSError(f"NoSuchKey: {Key}")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)])}
+
+
+class FakeModel:
+    """Records the synthesis prompt and answers with a valid (empty) summary."""
+    def __init__(self): self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return type("Response", (), {"text": json.dumps(generate.get_default_summary_structure())})()
+
+
+def compare_event():
+    return {"status": "success", "primary_task": router.COMPARE_CATEGORIES_TASK_NAME, "required_sources": ["internal_trends_category"],
+            "query_subjects": {"comparison_subjects": [{"subject": c, "type": "category"} for c in CATEGORIES], "specific_known": []},
+            "timeframe_reference": None, "original_context": {"query": "compare", "category": "COMPARE_CATEGORIES", "country": "United States"}}
+
+
+def state_hand_off(output):
+    """What the next state receives: the JSON the workflow passes on."""
+    return json.loads(json.dumps(output))
+
+
+def synthesize(internal_data):
+    model = FakeModel()
+    with patch('generate_final_response_v2.get_secret_value', return_value="test-key"), \
+         patch('generate_final_response_v2.llm_client.get_model', return_value=model):
+        response = generate.lambda_handler({"internal_data": internal_data, "external_data": {"status": "success", "results": []}}, None)
+    return response, model.prompts
+
+
+# --- Run Scenarios ---
+failures = []
+with patch('fetch_internal_router_v2.lambda_client', FakeLambdaClient()), patch('fetch_internal_router_v2.BOTO3_CLIENT_ERROR', None), \
+     patch('generate_final_response_v2.BOTO3_CLIENT_ERROR', None):
+    # 1. Small outputs stay inline; a large router output becomes a handle backed by one blob
+    small = {"status": "success", "trends_data": {"category_name": "Jeans"}}
+    handle = state_hand_off(router.lambda_handler(compare_event(), None))
+    blobs = list(Path(blob_dir.name).rglob("*.json.gz"))
+    inline = blob_store.resolve(handle)
+    inline_bytes, handle_bytes = len(json.dumps(inline)), len(json.dumps(handle))
+    print(f"Router output: inline {inline_bytes / 1024:.1f} KB, handle {handle_bytes} bytes, blob {blobs[0].stat().st_size / 1024:.1f} KB gzip" if blobs else "No blob written")
+    if blob_store.offload(small, "internal_data") is not small: failures.append("small payload offloaded")
+    if not blob_store.is_blob_ref(handle) or handle.get("status") != "success" or len(blobs) != 1: failures.append("large payload not offloaded")
+    if inline_bytes <= STATE_LIMIT_BYTES: failures.append("scenario output not over the state limit")
+    if handle_bytes > 1024: failures.append("handle not compact")
+    if len(inline.get("trends_data_comparison", [])) != len(CATEGORIES): failures.append("resolved output incomplete")
+
+    # 2. In-process callers (orchestrator) get the output inline
+    direct = router.lambda_handler(compare_event(), None, pass_by_reference=False)
+    if blob_store.is_blob_ref(direct) or len(list(Path(blob_dir.name).rglob("*.json.gz"))) != 1: failures.append("pass_by_reference=False offloaded")
+
+    # 3. Synthesis builds the same prompt and response from the handle as from the inline output
+    by_reference, reference_prompts = synthesize(handle)
+    by_value, value_prompts = synthesize(inline)
+    print(f"Synthesis: by reference {by_reference['statusCode']}, inline {by_value['statusCode']}, same prompt {reference_prompts == value_prompts}")
+    if by_reference["statusCode"] != 200 or by_reference != by_value or not reference_prompts or reference_prompts != value_prompts:
+        failures.append("synthesis differs by reference")
+
+    # 4. A handle whose blob is gone fails the synthesis step cleanly
+    for blob in Path(blob_dir.name).rglob("*.json.gz"): blob.unlink()
+    missing, _ = synthesize(handle)
+    missing_body = json.loads(missing["body"])
+    print(f"Missing blob: {missing['statusCode']} {missing_body.get('error_message')}")
+    if missing["statusCode"] != 500 or "Could not read blob" not in (missing_body.get("error_message") or ""): failures.append("missing blob")
+
+    # 5. S3: the same round trip through put_object/get_object, gzip'd under the prefix
+    fake_s3 = FakeS3Client()
+    with patch('blob_store.s3_client', fake_s3), patch('blob_store.BLOB_STORE_BUCKET', "state-bucket"), patch('blob_store.BLOB_STORE_LOCAL_DIR', None):
+        s3_handle = state_hand_off(router.lambda_handler(compare_event(), None))
+        (bucket, key), body = next(iter(fake_s3.objects.items()))
+        s3_resolved = blob_store.resolve(s3_handle)
+    print(f"S3: {s3_handle[blob_store.BLOB_REF_KEY]['uri']}")
+    if bucket != "state-bucket" or not key.startswith(blob_store.BLOB_STORE_PREFIX) or json.loads(gzip.decompress(body)) != s3_resolved: failures.append("S3 write")
+    if len(s3_resolved.get("trends_data_comparison", [])) != len(CATEGORIES): failures.append("S3 round trip")
+
+    # 6. A failed write passes the output inline; the store disabled passes everything inline
+    with patch('blob_store.put_blob', side_effect=OSError("disk full")):
+        failed_write = router.lambda_handler(compare_event(), None)
+    with patch('blob_store.BLOB_STORE_LOCAL_DIR', None):
+        disabled = router.lambda_handler(compare_event(), None)
+    if blob_store.is_blob_ref(failed_write) or blob_store.is_blob_ref(disabled): failures.append("inline fallback")
+
+    # 7. S3 unreachable or without credentials (botocore errors, not OSError): the router passes its output
+    #    inline instead of crashing, and synthesis fails a handle it cannot read with the clean 500 payload
+    for error in (EndpointConnectionError(endpoint_url="https://s3.us-west-2.amazonaws.com"), NoCredentialsError()):
+        with patch('blob_store.s3_client', FakeS3Client(error)), patch('blob_store.BLOB_STORE_BUCKET', "state-bucket"), \
+             patch('blob_store.BLOB_STORE_LOCAL_DIR', None):
+            try:
+                unreachable = router.lambda_handler(compare_event(), None)
+            except Exception as e:
+                unreachable = None; failures.append(f"router raised {type(e).__name__}")
+            unreadable, _ = synthesize(s3_handle)
+        print(f"S3 {type(error).__name__}: router inline={unreachable is not None and not blob_store.is_blob_ref(unreachable)}, "
+              f"synthesis {unreadable['statusCode']}")
+        if unreachable is None or blob_store.is_blob_ref(unreachable) or len(unreachable.get("trends_data_comparison", [])) != len(CATEGORIES):
+            failures.append(f"{type(error).__name__}: inline fallback")
+        if unreadable["statusCode"] != 500 or "Could not read blob" not in (json.loads(unreadable["body"]).get("error_message") or ""):
+            failures.append(f"{type(error).__name__}: resolve")
+
+    # 8. Handles outside the configured store (another bucket or prefix, any other local path) are never read
+    outside = Path(blob_dir.name) / "outside.json.gz"; outside.write_bytes(gzip.compress(b'{"secret": true}'))
+    local_root = Path(blob_dir.name) / blob_store.BLOB_STORE_PREFIX
+    forged_local = [f"file://{outside}", f"file://{local_root}/../outside.json.gz", "file:///etc/passwd"]
+    forged_s3 = ["s3://other-bucket/pipeline-state/x.json.gz", "s3://state-bucket/other/x.json.gz", "s3://state-bucket/pipeline-state/../x.json.gz"]
+    fake_s3 = FakeS3Client()
+    for uri in forged_s3: fake_s3.objects[tuple(uri[len("s3://"):].split("/", 1))] = gzip.compress(b'{"secret": true}') # Readable if asked
+    rejected = []
+    for uri, s3 in [(uri, None) for uri in forged_local] + [(uri, fake_s3) for uri in forged_s3]:
+        with patch('blob_store.s3_client', s3), patch('blob_store.BLOB_STORE_BUCKET', "state-bucket" if s3 else None):
+            try:
+                blob_store.resolve({blob_store.BLOB_REF_KEY: {"uri": uri}}); failures.append(f"forged handle read: {uri}")
+            except blob_store.BlobStoreError:
+                rejected.append(uri)
+    forged, _ = synthesize({blob_store.BLOB_REF_KEY: {"uri": f"file://{outside}"}, "status": "success"})
+    print(f"Forged handles rejected: {len(rejected)}/{len(forged_local) + len(forged_s3)}, synthesis {forged['statusCode']}")
+    if forged["statusCode"] != 500: failures.append("forged handle in synthesis")
+
+blob_dir.cleanup()
+print("\n----- Blob Store (claim-check) Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,101 @@
+# _local_test_cache_format.py
+# Offline test of the compact web-search cache record: round trip through the Binary attribute,
+# transparent reads of legacy tavily_response_json rows, and item size / decode time against the
+# legacy raw-JSON record for a Tavily-sized response (5 results with content and raw_content).
+import json
+import logging
+import os
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestCacheFormat")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_external_context
+    from boto3.dynamodb.types import Binary
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+
+def fake_tavily_response(seed: int = 7) -> dict:
+    """Shaped like an advanced-depth Tavily response: long content and much longer raw_content per result."""
+    rng = random.Random(seed)
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10))) for _ in range(3000)] # Article-like entropy
+    text = lambda n: " ".join(rng.choice(words) for _ in range(n))
+    return {"query": "bootcut jeans trends United States", "answer": text(60), "response_time": 1.73, "images": [],
+            "follow_up_questions": None,
+            "results": [{"title": f"Result {i}: {text(6)}", "url": f"https://example.com/article-{i}", "content": text(400),
+                         "raw_content": text(4000), "score": round(0.9 - i * 0.07, 4), "published_date": "2025-05-01"}
+                        for i in range(5)]}
+
+
+def prompt_view(data: dict):
+    """What generate_final_response_v2 reads: the answer, 3 titles with 150-char snippets, 5 title/url links."""
+    results = data.get("results", [])
+    return (data.get("answer"), [(r.get("title"), r.get("content", "")[:150]) for r in results[:3]],
+            [(r.get("title"), r.get("url")) for r in results[:5]])
+
+
+def item_size(attributes: dict) -> int:
+    return sum(len(name) + (len(value) if isinstance(value, (bytes, str)) else 8) for name, value in attributes.items())
+
+
+# --- Run Scenarios ---
+failures = []
+raw = fake_tavily_response()
+legacy_item = {'tavily_response_json': json.dumps(raw)}
+projected = fetch_external_context.project_search_response(raw)
+compact_item = fetch_external_context.encode_cache_record(projected)
+
+# 1. Round trip (plain bytes and boto3's Binary wrapper) keeps everything the prompt uses
+decoded = fetch_external_context.decode_cache_record(compact_item)
+decoded_wrapped = fetch_external_context.decode_cache_record({**compact_item, 'tavily_response_bin': Binary(compact_item['tavily_response_bin'])})
+if decoded != projected or decoded_wrapped != projected: failures.append("round trip")
+if prompt_view(decoded) != prompt_view(raw): failures.append("prompt view changed")
+if any("raw_content" in r for r in decoded["results"]): failures.append("raw_content not dropped")
+
+# 2. Legacy rows still read, projected to the same shape
+if fetch_external_context.decode_cache_record(legacy_item) != projected: failures.append("legacy read")
+
+# 3. Records from a newer writer are rejected (treated as a cache miss by the caller)
+try:
+    fetch_external_context.decode_cache_record({**compact_item, 'format_version': 99}); failures.append("future version accepted")
+except ValueError:
+    pass
+
+# 4. Size and decode time
+legacy_size, compact_size = item_size(legacy_item), item_size(compact_item)
+def time_decode(item, n=500):
+    start = time.perf_counter()
+    for _ in range(n): fetch_external_context.decode_cache_record(item)
+    return 1000.0 * (time.perf_counter() - start) / n
+legacy_ms, compact_ms = time_decode(legacy_item), time_decode(compact_item)
+print(f"Item payload: legacy={legacy_size} B, compact={compact_size} B ({100.0 * (1 - compact_size / legacy_size):.1f}% smaller); "
+      f"strongly consistent read units: {-(-legacy_size // 4096)} -> {-(-compact_size // 4096)}")
+print(f"Decode: legacy={legacy_ms:.3f} ms, compact={compact_ms:.3f} ms")
+if compact_size >= legacy_size / 4: failures.append("compact record not substantially smaller")
+
+print("\n----- Cache Format Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,57 @@
+# _local_test_cache_keys.py
+# Offline test of web-search cache key normalization: country aliases share a key, and the pronoun "us"
+# ("what do stylists tell us about jeans") never shares a key with a query about the US, and words like "news" are not singularized.
+import logging
+import os
+import sys
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestCacheKeys")
+
+try:
+    from search_cache_keys import build_search_cache_key, normalize_search_query
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+failures = []
+SAME_KEY = [
+    ["Jeans trends in US", "jeans trends in the United States ", "jeans trends US?", "jeans trends in the us", "JEANS TRENDS IN THE US", "Jeans trends, USA"],
+    ["what do stylists tell us about jeans", "What do stylists tell us about jeans?", "WHAT DO STYLISTS TELL US ABOUT JEANS"],
+    ["dress trends news", "dresses trend news", "Dress Trends News"],
+]
+DIFFERENT_KEY = [
+    ("what do stylists tell us about jeans", "what do stylists tell about jeans in the US"),
+    ("jeans for us", "jeans for US"),
+    ("jeans trends US", "jeans trends UK"),
+    ("new dresses trends", "dresses trends news"),
+    ("camera lens trends", "len trends"),
+    ("short skirts", "shorts and skirts"),
+]
+
+for group in SAME_KEY:
+    keys = {query: normalize_search_query(query) for query in group}
+    print(f"{group[0]!r:<42} -> {sorted(set(keys.values()))}")
+    if len({build_search_cache_key(query) for query in group}) != 1: failures.append(f"not one key: {keys}")
+for first, second in DIFFERENT_KEY:
+    if build_search_cache_key(first) == build_search_cache_key(second):
+        failures.append(f"shared key: {first!r} / {second!r} ({normalize_search_query(first)})")
+if "country_us" in normalize_search_query("what do stylists tell us about jeans"): failures.append("pronoun read as the country")
+
+print("\n----- Cache Key Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("--------------------------------")
+sys.exit(1 if failures else 0)
@@ -58,6 +58,7 @@ else:
 # --- Import Handler AFTER setting environment variables ---
 try:
     # Assuming your file is named fetch_external_context.py in src/
+    import fetch_external_context
     from fetch_external_context import lambda_handler
 except ImportError as e:
     # Handle case where Tavily SDK might be missing
@@ -118,8 +119,8 @@ def configure_mocks_cache_miss(mock_ddb, mock_tavily):
             {"title": "Mock Result 2", "url": "http://example.com/2", "content": "Content 2..."}
         ]
     }
-    # Cache Write Success (Optional Check): put_item returns standard success response
-    mock_ddb.put_item.return_value = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+    # Cache Write Success (Optional Check): update_item returns standard success response
+    mock_ddb.update_item.return_value = {'ResponseMetadata': {'HTTPStatusCode': 200}}
 
 def configure_mocks_cache_hit(mock_ddb, mock_tavily):
     """Simulate cache hit."""
@@ -158,7 +159,7 @@ def configure_mocks_cache_expired(mock_ddb, mock_tavily):
             {"title": "Fresh Result 1", "url": "http://fresh.example.com/1", "content": "Fresh Content 1..."}
         ]
     }
-    mock_ddb.put_item.return_value = {'ResponseMetadata': {'HTTPStatusCode': 200}}
+    mock_ddb.update_item.return_value = {'ResponseMetadata': {'HTTPStatusCode': 200}}
 
 def configure_mocks_api_error(mock_ddb, mock_tavily):
     """Simulate cache miss and Tavily API call failure."""
@@ -176,9 +177,11 @@ def run_test(scenario_config_func):
     # Use patch context managers to replace dependencies during the call
     # Patch the TavilyClient constructor and the cache_table instance
     with patch('fetch_external_context.cache_table', mock_ddb_table), \
-         patch('fetch_external_context.TavilyClient', mock_tavily_client_constructor):
+         patch('fetch_external_context.TavilyClient', mock_tavily_client_constructor), \
+         patch('fetch_external_context._tavily_client', None):
 
-        # Reset mocks before configuring for the specific scenario
+        # Reset mocks (and the in-process L1 search cache) before configuring for the specific scenario
+        fetch_external_context.WEB_SEARCH_L1_CACHE.clear()
         mock_ddb_table.reset_mock()
         mock_tavily_client_constructor.reset_mock()
         mock_tavily_client_instance.reset_mock()
@@ -210,10 +213,12 @@ def run_test(scenario_config_func):
             if mock_tavily_client_instance.search.call_count > 0:
                  print(f"  search query: {mock_tavily_client_instance.search.call_args.kwargs.get('query')}")
 
-            # DynamoDB put_item should be called only on cache miss/expired AND successful API call
-            print(f"DynamoDB put_item called: {mock_ddb_table.put_item.call_count > 0}")
-            if mock_ddb_table.put_item.call_count > 0:
-                 print(f"  put_item contains 'ttl': {'ttl' in mock_ddb_table.put_item.call_args.kwargs.get('Item', {})}")
+            # The cache row update_item (SET payload/ttl) should be called only on cache miss/expired AND successful API call
+            # (single-flight lease rows and hit counters are written separately and are not counted here)
+            cache_writes = [c for c in mock_ddb_table.update_item.call_args_list if 'ExpressionAttributeNames' in c.kwargs]
+            print(f"DynamoDB cache row update_item called: {len(cache_writes) > 0}")
+            if cache_writes:
+                 print(f"  update_item sets 'ttl': {'ttl' in cache_writes[-1].kwargs['ExpressionAttributeNames'].values()}")
 
             print("-----------------------------")
 
@@ -233,6 +238,25 @@ if __name__ == "__main__":
     run_test(configure_mocks_cache_expired)
     run_test(configure_mocks_api_error)
 
+    # Repeat query in a warm container: second call is served from L1 without touching DynamoDB
+    logger.info("\n===== Running Test Scenario: L1 Cache Hit =====")
+    with patch('fetch_external_context.cache_table', mock_ddb_table), \
+         patch('fetch_external_context.TavilyClient', mock_tavily_client_constructor), \
+         patch('fetch_external_context._tavily_client', None):
+        fetch_external_context.WEB_SEARCH_L1_CACHE.clear()
+        mock_ddb_table.reset_mock(); mock_tavily_client_instance.reset_mock()
+        mock_tavily_client_instance.search.side_effect = None # Left over from the API error scenario
+        configure_mocks_cache_miss(mock_ddb_table, mock_tavily_client_instance)
+        first_result = lambda_handler(test_event_data, None)
+        second_result = lambda_handler(test_event_data, None)
+        print("\n----- L1 Cache Hit Verification -----")
+        print(f"First call tier: {first_result.get('cache_metadata', {}).get('tier')}, second call tier: {second_result.get('cache_metadata', {}).get('tier')}")
+        print(f"DynamoDB get_item calls: {mock_ddb_table.get_item.call_count} (expected 1)")
+        print(f"Tavily search calls: {mock_tavily_client_instance.search.call_count} (expected 1)")
+        print(f"Cache metadata: {json.dumps(second_result.get('cache_metadata'))}")
+        print("-------------------------------------")
+    logger.info("===== Finished Test Scenario: L1 Cache Hit =====")
+
     # Add a test case where web_search is NOT required
     logger.info("\n===== Running Test Scenario: Web Search Not Required =====")
     event_no_web_search = test_event_data.copy()
@@ -0,0 +1,188 @@
+# _local_test_llm_client.py
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestLlmClient")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Modules AFTER setting environment variables ---
+try:
+    import llm_client
+    import interpret_query_v2
+    import generate_final_response_v2
+    from botocore.exceptions import ClientError
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+
+# --- Fake Model ---
+class FakeGenerativeModel:
+    """Stands in for genai.GenerativeModel; returns a canned interpretation."""
+
+    def __init__(self, model_name, generation_config):
+        self.model_name = model_name; self.generation_config = generation_config; self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        text = json.dumps({"status": "success", "primary_task": "get_trend", "required_sources": ["internal_trends_category"],
+                           "query_subjects": {"specific_known": [], "unmapped_items": ["Bootcut"]},
+                           "timeframe_reference": None, "attributes": [], "clarification_needed": None})
+        return type("FakeResponse", (), {"text": text})()
+
+    def count_tokens(self, contents):
+        return type("FakeTokenCount", (), {"total_tokens": len(str(contents).split())})()
+
+
+# --- Run Scenarios ---
+failures = []
+llm_client.set_model_factory(FakeGenerativeModel)
+config = {"response_mime_type": "application/json"}
+
+# 1. Warm calls reuse the model and do not reconfigure
+first = llm_client.get_model("key-1", "gemini-test", config)
+second = llm_client.get_model("key-1", "gemini-test", dict(config))
+stats = llm_client.health_check()
+print(f"Reuse: same={first is second}, configure_calls={stats['configure_calls']}, models_created={stats['models_created']}")
+if first is not second or stats["configure_calls"] != 1 or stats["models_created"] != 1: failures.append("reuse")
+
+# 2. A different generation config is a different registry entry
+if llm_client.get_model("key-1", "gemini-test", None) is first: failures.append("config keying")
+
+# 3. Key rotation reconfigures and rebuilds
+rotated = llm_client.get_model("key-2", "gemini-test", config)
+stats = llm_client.health_check()
+print(f"Rotation: new_instance={rotated is not first}, configure_calls={stats['configure_calls']}")
+if rotated is first or stats["configure_calls"] != 2: failures.append("key rotation")
+
+# 4. Concurrent first use creates exactly one model
+llm_client.reset()
+results = []
+threads = [threading.Thread(target=lambda: results.append(llm_client.get_model("key-1", "gemini-test", config))) for _ in range(16)]
+for t in threads: t.start()
+for t in threads: t.join()
+print(f"Concurrency: distinct_models={len({id(m) for m in results})}")
+if len({id(m) for m in results}) != 1: failures.append("thread safety")
+
+# 5. Interpreter: LLM path twice builds the client once; warm-up ping and probe
+llm_client.reset()
+with patch('interpret_query_v2.get_secret_value', lambda *_: "key-1"):
+    for _ in range(2):
+        result = interpret_query_v2.lambda_handler({"query": "are bootcut jeans trending", "category": "Jeans", "country": "United States"}, None)
+        if result["statusCode"] != 200: failures.append(f"interpreter status {result['statusCode']}")
+    stats = llm_client.health_check()
+    print(f"Interpreter: models_created={stats['models_created']}, cache_hits={stats['cache_hits']}")
+    if stats["models_created"] != 1 or stats["cache_hits"] != 1: failures.append("interpreter reuse")
+    warm = json.loads(interpret_query_v2.lambda_handler({"warmup": True}, None)["body"])
+    if warm.get("status") != "warm": failures.append("warm-up")
+    with patch('llm_client.warm_up', side_effect=RuntimeError("SDK misconfigured")): # An SDK error is an error body, not a raise
+        try:
+            failed_warm = interpret_query_v2.lambda_handler({"warmup": True}, None)
+        except Exception as e:
+            failed_warm = {"statusCode": None, "body": json.dumps({"raised": repr(e)})}
+    print(f"Interpreter warm-up failure: {failed_warm['statusCode']} {failed_warm['body']}")
+    if failed_warm["statusCode"] != 500 or json.loads(failed_warm["body"]).get("status") != "error": failures.append("warm-up failure")
+probe = llm_client.health_check(probe=True)
+print(f"Health probe: healthy={probe.get('healthy')}")
+if not probe.get("healthy"): failures.append("health probe")
+
+
+# --- Context caches ---
+class FakeInstructionModel(FakeGenerativeModel):
+    def __init__(self, model_name, generation_config, system_instruction=None, cached_content=None):
+        super().__init__(model_name, generation_config); self.cached_content = cached_content
+
+
+class FakeContextCaches:
+    """CachedContent stand-in: raises the queued errors first, optionally blocking until released."""
+
+    def __init__(self): self.errors = []; self.created = 0; self.release = threading.Event(); self.release.set(); self.started = threading.Event()
+
+    def __call__(self, model_name, system_instruction, ttl_seconds):
+        self.started.set(); self.release.wait(5)
+        if self.errors: raise self.errors.pop(0)
+        self.created += 1; return type("FakeCachedContent", (), {"name": f"cachedContents/{self.created}"})()
+
+
+caches = FakeContextCaches()
+llm_client.set_model_factory(FakeInstructionModel, caches)
+clock = [1000.0]
+with patch('llm_client.time.time', lambda: clock[0]):
+    cached_model = lambda key="key-1", instruction="persona": llm_client.get_cached_context_model(key, "gemini-test", config, instruction, 3600)
+
+    # 6. A transient error (rate limit) falls back now, is not retried during the backoff, and is retried after it
+    caches.errors = [RuntimeError("429 Resource has been exhausted")]
+    during = [cached_model(), cached_model()]; clock[0] += llm_client.CONTEXT_CACHE_RETRY_SECONDS + 1; after = cached_model()
+    print(f"Transient failure: fallback={[m.cached_content is None for m in during]}, after backoff cached={after.cached_content is not None}")
+    if any(m.cached_content is not None for m in during) or after.cached_content is None or caches.created != 1: failures.append("transient retry")
+
+    # 7. Consecutive transient failures back off exponentially
+    caches.errors = [RuntimeError("503 unavailable")] * 2
+    cached_model(instruction="other"); clock[0] += llm_client.CONTEXT_CACHE_RETRY_SECONDS + 1
+    cached_model(instruction="other"); clock[0] += llm_client.CONTEXT_CACHE_RETRY_SECONDS + 1
+    too_early = cached_model(instruction="other"); clock[0] += llm_client.CONTEXT_CACHE_RETRY_SECONDS
+    if too_early.cached_content is not None or cached_model(instruction="other").cached_content is None: failures.append("exponential backoff")
+
+    # 8. Below the minimum cacheable size is remembered for good, until the API key rotates
+    caches.errors = [ValueError("Cached content is too small. total_token_count=500, min_total_token_count=1024")]
+    small = [cached_model(instruction="short") for _ in range(2)]; clock[0] += llm_client.CONTEXT_CACHE_MAX_RETRY_SECONDS * 10
+    still_small = cached_model(instruction="short"); rotated_key = cached_model(key="key-2", instruction="short")
+    print(f"Below minimum: cached={[m.cached_content is not None for m in small + [still_small]]}, after key rotation cached={rotated_key.cached_content is not None}")
+    if any(m.cached_content is not None for m in small + [still_small]) or rotated_key.cached_content is None: failures.append("below minimum")
+
+# 9. Creating a cache (network calls) does not hold the registry lock: get_model is served meanwhile
+llm_client.reset(); caches.release.clear(); caches.started.clear()
+creator = threading.Thread(target=lambda: llm_client.get_cached_context_model("key-1", "gemini-test", config, "slow persona", 3600))
+creator.start(); caches.started.wait(5)
+served = threading.Event()
+threading.Thread(target=lambda: (llm_client.get_model("key-1", "gemini-test", config), served.set()), daemon=True).start()
+unblocked = served.wait(2); caches.release.set(); creator.join(5)
+print(f"Registry during cache creation: get_model served={unblocked}")
+if not unblocked: failures.append("registry lock held during cache creation")
+llm_client.set_model_factory(None)
+
+
+# 10. API keys: failures are not cached, a cached key expires after SECRET_CACHE_TTL_SECONDS (secret rotation)
+class FakeSecretsManager:
+    def __init__(self): self.responses = []; self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1; response = self.responses.pop(0)
+        if isinstance(response, Exception): raise response
+        return {"SecretString": json.dumps({"GOOGLE_API_KEY": response})}
+
+
+for module in (interpret_query_v2, generate_final_response_v2):
+    secrets = FakeSecretsManager(); module.API_KEY_CACHE.clear(); now = [1000.0]
+    secrets.responses = [ClientError({"Error": {"Code": "ThrottlingException"}}, "GetSecretValue"), "key-a", "key-b"]
+    with patch.object(module, 'secrets_manager', secrets), patch.object(module, 'BOTO3_CLIENT_ERROR', None), \
+         patch.object(module.time, 'time', lambda: now[0]), patch.dict(os.environ, {"IS_LOCAL": "false"}):
+        keys = [module.get_secret_value("secret", "GOOGLE_API_KEY") for _ in range(3)]
+        now[0] += module.SECRET_CACHE_TTL_SECONDS + 1; keys.append(module.get_secret_value("secret", "GOOGLE_API_KEY"))
+    print(f"{module.__name__} API keys: {keys}, Secrets Manager calls={secrets.calls}")
+    if keys != [None, "key-a", "key-a", "key-b"] or secrets.calls != 3: failures.append(f"{module.__name__} key cache")
+for module in (interpret_query_v2, generate_final_response_v2): module.API_KEY_CACHE.clear()
+
+print("\n----- LLM Client Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("---------------------------------")
+sys.exit(1 if failures else 0)
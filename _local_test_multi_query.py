@@ -0,0 +1,140 @@
+# _local_test_multi_query.py
+# Offline test of multi-query web search: comparison/brand tasks fan out into one search per
+# subject, run concurrently (wall-clock close to a single search), cache each sub-query on its own,
+# and fuse the result lists with URL dedup + reciprocal-rank fusion. The comparison event comes from the
+# interpreter's COMPARE_CATEGORIES payload, so a comparison that never asks for web_search fails here.
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestMultiQuery")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_external_context as fec
+    import interpret_query_v2 as interpret
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The interpreter sets the root logger to INFO on import
+
+SEARCH_DELAY = 0.3
+tavily_calls = []; tavily_lock = threading.Lock()
+
+
+def fake_tavily(api_key, search_query):
+    """Each query gets its own URLs plus one shared article (with URL variants) so dedup and fusion are observable."""
+    with tavily_lock: tavily_calls.append(search_query)
+    time.sleep(SEARCH_DELAY)
+    slug = "-".join(search_query.lower().split()[:2])
+    results = [{"title": f"{slug} {i}", "url": f"https://news.example.com/{slug}/{i}", "content": f"about {slug}", "score": 0.9 - i / 10}
+               for i in range(1, 4)]
+    results.insert(1, {"title": "Shared market report", "url": "http://www.example.com/report/", "content": "both", "score": 0.8})
+    return {"answer": f"answer for {search_query}", "results": results}
+
+
+def interpret_comparison():
+    """The interpreter's direct payload for a COMPARE_CATEGORIES request (no LLM call on this path)."""
+    with patch('interpret_query_v2.BOTO3_CLIENT_ERROR', None), patch('interpret_query_v2.GEMINI_SDK_AVAILABLE', True):
+        response = interpret.lambda_handler({"query": "compare jeans and dresses", "category": "COMPARE_CATEGORIES", "country": "United States"}, None)
+    return json.loads(response["body"])
+
+
+COMPARISON_INTERPRETATION = interpret_comparison()
+
+
+def compare_event(primary_task="compare_categories_task"):
+    return {**COMPARISON_INTERPRETATION, "primary_task": primary_task}
+
+
+# --- Run Scenarios ---
+failures = []
+table = MagicMock(); table.get_item.return_value = {}
+with patch('fetch_external_context.cache_table', table), \
+     patch('fetch_external_context.call_tavily_search', fake_tavily), \
+     patch('fetch_external_context.get_secret_value', lambda *_: "stub-key"), \
+     patch('fetch_external_context.REFRESH_AHEAD_ENABLED', False), \
+     patch('fetch_external_context.BOTO3_CLIENT_ERROR', None), patch('fetch_external_context.DDB_RESOURCE_AVAILABLE', True):
+
+    # 0. The interpreter asks for web_search on comparisons, unless multi-query is off
+    with patch('interpret_query_v2.MULTI_QUERY_SEARCH_ENABLED', False): without_multi_query = interpret_comparison()
+    print(f"Interpreted comparison: task={COMPARISON_INTERPRETATION.get('primary_task')}, sources={COMPARISON_INTERPRETATION.get('required_sources')}, "
+          f"subjects={[s['subject'] for s in COMPARISON_INTERPRETATION.get('query_subjects', {}).get('comparison_subjects', [])]}")
+    if COMPARISON_INTERPRETATION.get("required_sources") != ["internal_trends_category", "web_search"]: failures.append("comparison sources")
+    if without_multi_query.get("required_sources") != ["internal_trends_category"]: failures.append("comparison sources, multi-query off")
+
+    # 1. Sub-query formulation: blended query + one per subject, placeholder category dropped
+    sub_queries = fec.formulate_sub_queries("compare jeans and dresses", "compare_categories_task",
+                                            compare_event()["query_subjects"], compare_event()["original_context"])
+    brand_queries = fec.formulate_sub_queries("how is levi's doing", "analyze_brand_deep_dive", {"target_brand": "Levi's"},
+                                              {"category": "Jeans", "country": "United States"})
+    print(f"Sub-queries: {sub_queries}\nBrand sub-queries: {brand_queries}")
+    if sub_queries != ["compare jeans and dresses", "Jeans trends United States", "Dresses trends United States"]: failures.append("compare sub-queries")
+    if len(brand_queries) != 3 or "Levi's brand news United States" not in brand_queries: failures.append("brand sub-queries")
+
+    # 2. Handler fans out concurrently: wall-clock close to one search, URL dedup + fusion
+    fec.WEB_SEARCH_L1_CACHE.clear(); tavily_calls.clear()
+    start = time.time(); result = fec.lambda_handler(compare_event(), None); elapsed = time.time() - start
+    urls = [r["url"] for r in result["results"]]
+    shared = [r for r in result["results"] if "report" in r["url"]]
+    print(f"Fan-out: status={result['status']}, tavily calls={len(tavily_calls)}, elapsed={elapsed:.2f}s (one search={SEARCH_DELAY}s), "
+          f"results={len(urls)}, top={result['results'][0]['title']}")
+    if result["status"] != "success_multi" or len(tavily_calls) != 3: failures.append("fan-out")
+    if elapsed > 2 * SEARCH_DELAY: failures.append(f"not concurrent ({elapsed:.2f}s)")
+    if len(shared) != 1 or "report" not in result["results"][0]["url"]: failures.append("dedup/fusion ranking") # Found by all 3 queries
+    if len(urls) != len(set(urls)) or len(urls) > fec.MULTI_QUERY_MAX_RESULTS: failures.append("result list")
+    if result["answer"].count("[") != 3: failures.append("answers not combined")
+    # Top of the fused list interleaves the subjects instead of draining one query's list first
+    top_slugs = [r["title"].split()[0] for r in result["results"][1:4]]
+    if len(set(top_slugs)) != 3: failures.append(f"no interleaving: {top_slugs}")
+
+    # 3. Each sub-query is cached on its own: written separately, and a repeat is served from L1 without Tavily
+    cache_writes = {c.kwargs["Key"]["search_key"] for c in table.update_item.call_args_list if "ExpressionAttributeNames" in c.kwargs}
+    tavily_calls.clear(); repeat = fec.lambda_handler(compare_event(), None)
+    tiers = [s["tier"] for s in repeat["sub_queries"]]
+    print(f"Caching: distinct rows written={len(cache_writes)}, repeat tiers={tiers}, tavily calls={len(tavily_calls)}")
+    if len(cache_writes) != 3 or tavily_calls or set(tiers) != {"l1"}: failures.append("per-sub-query caching")
+
+    # 4. A failing sub-query degrades to the others
+    fec.WEB_SEARCH_L1_CACHE.clear()
+    def flaky_tavily(api_key, search_query):
+        if search_query.startswith("Dresses"): raise RuntimeError("simulated outage")
+        return fake_tavily(api_key, search_query)
+    with patch('fetch_external_context.call_tavily_search', flaky_tavily):
+        partial = fec.lambda_handler(compare_event(), None)
+    statuses = [s["status"] for s in partial["sub_queries"]]
+    print(f"Partial failure: status={partial['status']}, sub-query statuses={statuses}")
+    if partial["status"] != "success_multi" or statuses.count("error") != 1: failures.append("partial failure")
+
+    # 5. Other tasks, or the flag off, keep the single search
+    tavily_calls.clear(); fec.WEB_SEARCH_L1_CACHE.clear()
+    single = fec.lambda_handler({**compare_event("get_trend"), "required_sources": ["web_search"]}, None)
+    with patch('fetch_external_context.MULTI_QUERY_SEARCH_ENABLED', False):
+        fec.WEB_SEARCH_L1_CACHE.clear(); flagged = fec.lambda_handler(compare_event(), None)
+    print(f"Single path: get_trend={single['status']}, flag off={flagged['status']}, tavily calls={len(tavily_calls)}")
+    if single["status"] != "success_api" or flagged["status"] != "success_api" or len(tavily_calls) != 2: failures.append("single path")
+
+print("\n----- Multi-Query Search Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,151 @@
+# _local_test_orchestrator.py
+# Offline test of the single-Lambda orchestrator: same output as the state machine mirror
+# (local_state_machine.run_pipeline_locally) for the same input, internal and external fetches
+# overlapping, failures surfacing like a failed execution, and the proxy's A/B routing.
+import json
+import logging
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestOrchestrator")
+
+# --- Set Environment Variables for the Lambdas ---
+os.environ['USE_LOCAL_STATE_MACHINE'] = 'true'
+os.environ['SPECULATIVE_PREFETCH_ENABLED'] = 'false' # Covered by _local_test_speculation.py
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ.pop('EXECUTION_STORE_TABLE_NAME', None)
+os.environ.pop('ANSWER_CACHE_TABLE_NAME', None)
+
+# --- Import Handlers AFTER setting environment variables ---
+try:
+    import orchestrator
+    import sfn_proxy_lambda
+    from local_state_machine import LocalStateMachine, run_pipeline_locally
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+
+# --- Stand-ins for the four step handlers ---
+FETCH_DELAY = 0.3
+fetch_delay = {"value": FETCH_DELAY}
+
+
+def fake_interpret(event, context):
+    interpretation = {"status": "success", "primary_task": "get_trend", "required_sources": ["internal_trends_category", "web_search"],
+                      "query_subjects": {"specific_known": [], "unmapped_items": []},
+                      "original_context": {"query": event["query"], "category": event["category"], "country": event["country"]}}
+    return {"statusCode": 200, "body": json.dumps(interpretation)}
+
+
+def fake_router(event, context, prefetched=None, pass_by_reference=True):
+    time.sleep(fetch_delay["value"])
+    event["query_subjects"]["router_was_here"] = True # Must not leak into the external fetch's copy
+    return {"trends": {"category": event["original_context"]["category"], "avg_volume": 1200}}
+
+
+def fake_external(event, context, prefetched=None):
+    time.sleep(fetch_delay["value"])
+    return {"status": "success_api", "answer": "web says yes", "results": [], "saw_router_mutation": "router_was_here" in event["query_subjects"]}
+
+
+def fake_generate(event, context):
+    payload = {"status": "success", "result_type_indicator": "CATEGORY_OVERVIEW",
+               "ai_summary_structured": {"overall_summary": f"{event['internal_data']['trends']['category']} grows", "sections": []},
+               "inputs": event}
+    return {"statusCode": 200, "body": json.dumps(payload)}
+
+
+class FakeLambdaClient:
+    """lambda.invoke(RequestResponse) stand-in that runs the orchestrator handler in-process."""
+
+    def __init__(self): self.calls = 0
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.calls += 1
+        try:
+            body, error = json.dumps(orchestrator.lambda_handler(json.loads(Payload), None)), None
+        except Exception as e:
+            body, error = json.dumps({"errorType": type(e).__name__, "errorMessage": str(e)}), "Unhandled"
+        response = {"StatusCode": 200, "Payload": type("Stream", (), {"read": lambda self: body.encode()})()}
+        if error: response["FunctionError"] = error
+        return response
+
+
+# --- Run Scenarios ---
+failures = []
+sfn_input = {"query": "what's trending in jeans", "category": "Jeans", "country": "United States"}
+with patch('interpret_query_v2.lambda_handler', fake_interpret), patch('fetch_internal_router_v2.lambda_handler', fake_router), \
+     patch('fetch_external_context.lambda_handler', fake_external), patch('generate_final_response_v2.lambda_handler', fake_generate):
+
+    # 1. Same output contract as the state machine mirror; fetches overlap
+    start = time.time(); expected = run_pipeline_locally(sfn_input); sequential_s = time.time() - start
+    start = time.time(); actual = orchestrator.lambda_handler(sfn_input, None); orchestrator_s = time.time() - start
+    print(f"Contract: identical={actual == expected}, state machine mirror={sequential_s:.2f}s, orchestrator={orchestrator_s:.2f}s")
+    if actual != expected: failures.append("output contract")
+    if orchestrator_s > FETCH_DELAY * 1.6: failures.append(f"fetches not overlapped ({orchestrator_s:.2f}s)")
+    if actual["inputs"]["external_data"]["saw_router_mutation"]: failures.append("interpretation shared between branches")
+
+    # 2. A failing step fails the whole run, like a failed execution
+    def broken_router(event, context, prefetched=None, pass_by_reference=True): raise RuntimeError("router exploded")
+    with patch('fetch_internal_router_v2.lambda_handler', broken_router):
+        try:
+            orchestrator.lambda_handler(sfn_input, None); failures.append("error swallowed")
+        except RuntimeError as e:
+            print(f"Failure: raised {type(e).__name__}: {e}")
+
+    # 3. Proxy A/B: 100% -> orchestrator, 0% -> state machine; same response body either way
+    fetch_delay["value"] = 0
+    fake_lambda = FakeLambdaClient(); event = {"body": json.dumps(sfn_input)}
+    with patch('sfn_proxy_lambda.sfn_client', LocalStateMachine()), patch('sfn_proxy_lambda.orchestrator_client', fake_lambda), \
+         patch('sfn_proxy_lambda.ORCHESTRATOR_LAMBDA_NAME', 'TrendForecastOrchestrator'):
+        with patch('sfn_proxy_lambda.ORCHESTRATOR_TRAFFIC_PERCENT', 100):
+            via_orchestrator = sfn_proxy_lambda.lambda_handler(event, None)
+        with patch('sfn_proxy_lambda.ORCHESTRATOR_TRAFFIC_PERCENT', 0):
+            via_state_machine = sfn_proxy_lambda.lambda_handler(event, None)
+        print(f"A/B: orchestrator={via_orchestrator['statusCode']} {via_orchestrator['headers']['X-Execution-Path']}, "
+              f"state machine={via_state_machine['statusCode']} {via_state_machine['headers']['X-Execution-Path']}, "
+              f"same body={via_orchestrator['body'] == via_state_machine['body']}")
+        if via_orchestrator["headers"]["X-Execution-Path"] != "orchestrator" or fake_lambda.calls != 1: failures.append("100% routing")
+        if via_state_machine["headers"]["X-Execution-Path"] != "state_machine": failures.append("0% routing")
+        if via_orchestrator["body"] != via_state_machine["body"]: failures.append("proxy body differs between paths")
+
+        # 4. Split roughly follows the percentage
+        random.seed(11)
+        with patch('sfn_proxy_lambda.ORCHESTRATOR_TRAFFIC_PERCENT', 25):
+            paths = [sfn_proxy_lambda.lambda_handler(event, None)["headers"]["X-Execution-Path"] for _ in range(200)]
+        share = paths.count("orchestrator") / len(paths)
+        print(f"Split at 25%: orchestrator share={share:.2f}")
+        if not 0.15 <= share <= 0.35: failures.append("traffic split")
+
+        # 5. Failures map to the same proxy error on both paths
+        with patch('fetch_internal_router_v2.lambda_handler', broken_router):
+            with patch('sfn_proxy_lambda.ORCHESTRATOR_TRAFFIC_PERCENT', 100):
+                orchestrator_error = sfn_proxy_lambda.lambda_handler(event, None)
+            with patch('sfn_proxy_lambda.ORCHESTRATOR_TRAFFIC_PERCENT', 0):
+                state_machine_error = sfn_proxy_lambda.lambda_handler(event, None)
+        errors = (json.loads(orchestrator_error["body"])["error"], json.loads(state_machine_error["body"])["error"])
+        print(f"Errors: orchestrator={orchestrator_error['statusCode']} {errors[0]}, state machine={state_machine_error['statusCode']} {errors[1]}")
+        if orchestrator_error["statusCode"] != 500 or errors[0] != errors[1]: failures.append("error mapping")
+
+print("\n----- Orchestrator Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------")
+sys.exit(1 if failures else 0)
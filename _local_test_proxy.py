@@ -0,0 +1,189 @@
+# _local_test_proxy.py
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestProxy")
+
+# --- Set Environment Variables for the Lambda ---
+# The local stand-in replaces Step Functions; the execution store falls back to its in-process backend.
+os.environ['USE_LOCAL_STATE_MACHINE'] = 'true'
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ.pop('EXECUTION_STORE_TABLE_NAME', None)
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import execution_store
+    import sfn_proxy_lambda
+    from botocore.exceptions import ClientError
+    from sfn_proxy_lambda import lambda_handler
+    from local_state_machine import LocalStateMachine
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+
+# --- Stand-ins ---
+MOCK_FINAL_PAYLOAD = {
+    "ai_summary_structured": {"overall_summary": "Jeans are growing.", "sections": []},
+    "result_type_indicator": "CATEGORY_OVERVIEW", "status": "success", "error_message": None
+}
+runner_calls = []
+
+
+def fake_pipeline_runner(sfn_input):
+    """Replaces interpret -> router/external -> generate; records calls so cache hits can be verified."""
+    runner_calls.append(sfn_input)
+    time.sleep(0.2)
+    return MOCK_FINAL_PAYLOAD
+
+
+class InMemoryAnswerCacheTable:
+    """Minimal DynamoDB Table stand-in for the answer cache (get_item / put_item / update_item)."""
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key):
+        item = self.items.get(Key['answer_key'])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item):
+        self.items[Item['answer_key']] = dict(Item)
+
+    def update_item(self, Key, ExpressionAttributeValues, **kwargs):
+        self.items[Key['answer_key']]['revalidate_lease_until'] = ExpressionAttributeValues[':lease']
+
+
+class InMemoryExecutionTable:
+    """DynamoDB Table stand-in for execution records: get_item / update_item with the record_version condition."""
+
+    def __init__(self):
+        self.items = {}; self.before_update = None # Hook: runs once before the next update (a concurrent writer)
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get((Key['stream_id'], Key['seq']))
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, ExpressionAttributeValues, **kwargs):
+        if self.before_update: hook, self.before_update = self.before_update, None; hook()
+        item = self.items.get((Key['stream_id'], Key['seq']), {})
+        if 'record_version' in item and item['record_version'] != ExpressionAttributeValues[':version']:
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "UpdateItem")
+        self.items[(Key['stream_id'], Key['seq'])] = {**item, "record_json": ExpressionAttributeValues[':record'],
+                                                      "record_version": ExpressionAttributeValues[':next_version']}
+
+
+class FastExpressStateMachine:
+    """Synthesis records the result before StartExecution returns; Express workflows cannot be described."""
+
+    def __init__(self, fail_start=False): self.fail_start = fail_start
+
+    def start_execution(self, stateMachineArn, input, name=None, **kwargs):
+        if self.fail_start: raise ClientError({"Error": {"Code": "ExecutionLimitExceeded"}}, "StartExecution")
+        execution_store.put_execution_result(json.loads(input)["execution_token"], MOCK_FINAL_PAYLOAD)
+        return {"executionArn": f"{stateMachineArn}:{name}"}
+
+    def describe_execution(self, executionArn, **kwargs):
+        raise ClientError({"Error": {"Code": "InvalidArn"}}, "DescribeExecution")
+
+
+def poll_status(token):
+    return json.loads(lambda_handler({"queryStringParameters": {"execution_token": token}}, None)["body"])
+
+
+def make_event(query, category="Jeans", country="United States", **extra):
+    return {"body": json.dumps({"query": query, "category": category, "country": country, **extra})}
+
+
+# --- Run Scenarios ---
+failures = []
+local_sfn = LocalStateMachine(runner=fake_pipeline_runner)
+cache_table = InMemoryAnswerCacheTable()
+
+with patch('sfn_proxy_lambda.sfn_client', local_sfn), patch('sfn_proxy_lambda.answer_cache_table', cache_table):
+    # 1. Sync mode (default) - runs the workflow and caches the answer
+    result = lambda_handler(make_event("What's trending in jeans?"), None)
+    print(f"Sync: status={result['statusCode']} cache={result.get('headers', {}).get('X-Answer-Cache')}")
+    if result["statusCode"] != 200 or json.loads(result["body"]) != MOCK_FINAL_PAYLOAD: failures.append("sync result")
+
+    # 2. Same question, different casing/spacing - served from the answer cache without a new execution
+    calls_before = len(runner_calls)
+    result = lambda_handler(make_event("  what's TRENDING in   jeans? ", category="jeans", country="united states"), None)
+    print(f"Cached: status={result['statusCode']} cache={result.get('headers', {}).get('X-Answer-Cache')}")
+    if len(runner_calls) != calls_before or result.get('headers', {}).get('X-Answer-Cache') != "HIT":
+        failures.append("answer cache hit")
+
+    # 3. Async mode - returns a token immediately, then the status endpoint serves the stored output
+    with patch('sfn_proxy_lambda.PROXY_EXECUTION_MODE', 'async'):
+        start = time.time()
+        result = lambda_handler(make_event("forecast for bootcut jeans"), None)
+        token = json.loads(result["body"]).get("execution_token")
+        print(f"Async start: status={result['statusCode']} token={token} in {time.time() - start:.3f}s")
+        if result["statusCode"] != 202 or not token: failures.append("async start")
+
+        status_body = {}
+        for _ in range(50):
+            status_result = lambda_handler({"queryStringParameters": {"execution_token": token}}, None)
+            status_body = json.loads(status_result["body"])
+            if status_body.get("status") != "RUNNING": break
+            time.sleep(0.05)
+        print(f"Async status: {status_body.get('status')}")
+        if status_body.get("status") != "SUCCEEDED" or status_body.get("result") != MOCK_FINAL_PAYLOAD:
+            failures.append("async result")
+
+    # 4. Unknown token
+    result = lambda_handler({"queryStringParameters": {"execution_token": "does-not-exist"}}, None)
+    if result["statusCode"] != 404: failures.append("unknown token")
+
+# 5. Synthesis finishing before StartExecution returns is not reset to RUNNING (in-process and DynamoDB stores)
+execution_table = InMemoryExecutionTable()
+for label, table in (("in-process", None), ("dynamodb", execution_table)):
+    with patch('sfn_proxy_lambda.sfn_client', FastExpressStateMachine()), patch('sfn_proxy_lambda.answer_cache_table', cache_table), \
+         patch('sfn_proxy_lambda.PROXY_EXECUTION_MODE', 'async'), patch('execution_store.store_table', table):
+        token = json.loads(lambda_handler(make_event(f"fast {label} question"), None)["body"]).get("execution_token")
+        status_body = poll_status(token)
+        print(f"Fast synthesis ({label}): {status_body.get('status')}, arn recorded: {bool(execution_store.get_execution_record(token).get('execution_arn'))}")
+        if status_body.get("status") != "SUCCEEDED" or status_body.get("result") != MOCK_FINAL_PAYLOAD: failures.append(f"fast synthesis {label}")
+        if not execution_store.get_execution_record(token).get("execution_arn"): failures.append(f"arn {label}")
+
+# 6. A RUNNING write that loses a race to SUCCEEDED re-reads and keeps SUCCEEDED; a stale RUNNING write never regresses it
+with patch('execution_store.store_table', execution_table):
+    execution_store.put_execution_record("race", {"status": "RUNNING", "started_at": time.time()})
+    execution_table.before_update = lambda: execution_store.put_execution_result("race", MOCK_FINAL_PAYLOAD)
+    written = execution_store.put_execution_record("race", {"status": "RUNNING", "execution_arn": "arn"})
+    execution_store.put_execution_record("race", {"status": "RUNNING"})
+    record = execution_store.get_execution_record("race")
+    print(f"Conditional write: written={written} status={record.get('status')} arn={record.get('execution_arn')}")
+    if not written or record.get("status") != "SUCCEEDED" or record.get("execution_arn") != "arn" or record.get("result") != MOCK_FINAL_PAYLOAD:
+        failures.append("conditional record write")
+
+# 7. StartExecution failing leaves a FAILED record, not a RUNNING one that polls until TIMED_OUT
+with patch('sfn_proxy_lambda.sfn_client', FastExpressStateMachine(fail_start=True)), patch('sfn_proxy_lambda.PROXY_EXECUTION_MODE', 'async'), \
+     patch('sfn_proxy_lambda.answer_cache_table', cache_table):
+    result = lambda_handler(make_event("start fails"), None)
+    tokens = [t for t, r in execution_store._LOCAL_RECORDS.items() if r.get("error") == "ExecutionLimitExceeded"]
+    print(f"Failed start: {result['statusCode']}, record {poll_status(tokens[0]).get('status') if tokens else None}")
+    if result["statusCode"] != 502 or not tokens or poll_status(tokens[0]).get("status") != "FAILED": failures.append("failed start")
+
+print("\n----- Proxy Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("----------------------------")
+sys.exit(1 if failures else 0)
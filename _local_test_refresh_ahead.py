@@ -0,0 +1,215 @@
+# _local_test_refresh_ahead.py
+# Offline test of refresh-ahead for the web-search cache: hits late in the TTL window (or on hot
+# keys) schedule exactly one async refresh while still serving the cached value, hit counters are
+# batched into the row off the request path, the refresh entry point rewrites the row, and the warm-up
+# job picks the top-N searches per (country, category) from the hit_count index without scanning the
+# table. DynamoDB and the Lambda client are in-memory stand-ins.
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestRefreshAhead")
+
+# --- Set Environment Variables for the Lambda ---
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['AWS_LAMBDA_FUNCTION_NAME'] = 'FetchExternalContext'
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_external_context as fec
+    from botocore.exceptions import ClientError
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+
+# --- Local DynamoDB Stand-in ---
+class FakeCacheTable:
+    """Dict keyed by search_key; understands the update/condition expressions and the warm-up index the cache code uses."""
+
+    def __init__(self):
+        self.items = {}; self.lock = threading.Lock(); self.updates = []; self.queries = []; self.write_delay = 0.0
+
+    def get_item(self, Key):
+        with self.lock:
+            item = self.items.get(Key['search_key'])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        with self.lock:
+            self.items[Item['search_key']] = dict(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression="", ExpressionAttributeNames=None):
+        time.sleep(self.write_delay)
+        with self.lock:
+            self.updates.append((Key['search_key'], UpdateExpression, dict(ExpressionAttributeValues)))
+            if ExpressionAttributeNames: # Cache row writes: "SET #a0 = :a0, ... REMOVE #r0, ..." (creates the row if missing)
+                item = self.items.setdefault(Key['search_key'], dict(Key)); names = ExpressionAttributeNames
+                for placeholder, name in names.items():
+                    if placeholder.startswith("#a"): item[name] = ExpressionAttributeValues[":" + placeholder[1:]]
+                    else: item.pop(name, None)
+                return {}
+            if Key['search_key'] == fec.WARM_UP_GROUPS_KEY:
+                registry = self.items.setdefault(Key['search_key'], dict(Key))
+                registry["warm_up_groups"] = registry.get("warm_up_groups", set()) | ExpressionAttributeValues[':group']; return {}
+            item = self.items.get(Key['search_key']); values = ExpressionAttributeValues
+            if item is None or ("refresh_lease_until <" in ConditionExpression and item.get("refresh_lease_until", 0) >= values[':now']):
+                raise ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": "failed"}}, "UpdateItem")
+            if "ADD hit_count" in UpdateExpression:
+                item["hit_count"] = item.get("hit_count", 0) + values[':hits']; item["last_hit_at"] = values[':now']
+            if "SET refresh_lease_until" in UpdateExpression: item["refresh_lease_until"] = values[':lease']
+        return {}
+
+    def query(self, IndexName, KeyConditionExpression, ScanIndexForward, Limit, **kwargs):
+        group = KeyConditionExpression.get_expression()['values'][1]; self.queries.append(group)
+        with self.lock: # Sparse index: rows with both warm_up_group and hit_count
+            rows = [dict(item) for item in self.items.values() if item.get("warm_up_group") == group and "hit_count" in item]
+        return {"Items": sorted(rows, key=lambda item: item["hit_count"], reverse=not ScanIndexForward)[:Limit]}
+
+    def scan(self, **kwargs):
+        raise AssertionError("cache table scanned")
+
+
+def drain_hit_writes():
+    """Waits for the background counter/registry writes submitted so far."""
+    for _ in range(fec._hit_write_pool._max_workers): fec._hit_write_pool.submit(time.sleep, 0.01)
+    deadline = time.time() + 5
+    while fec._hit_write_pool._work_queue.qsize() and time.time() < deadline: time.sleep(0.01)
+    time.sleep(0.05)
+
+
+def seed_row(table, search_query, remaining_seconds, **attributes):
+    cache_key = fec.build_search_cache_key(search_query)
+    projected = {"answer": f"cached answer for {search_query}", "results": []}
+    table.items[cache_key] = {"search_key": cache_key, "search_query_text": search_query, **fec.encode_cache_record(projected),
+                              "ttl": int(time.time() + remaining_seconds), **attributes}
+    return cache_key
+
+
+tavily_calls = []
+def fake_tavily(api_key, search_query):
+    tavily_calls.append(search_query)
+    return {"answer": f"fresh answer for {search_query}", "results": [{"title": "T", "url": "https://example.com", "content": "c"}]}
+
+
+def reset(table):
+    fec.WEB_SEARCH_L1_CACHE.clear(); fec._pending_hit_counts.clear(); fec._refresh_scheduled_until.clear()
+    fec._registered_warm_up_groups.clear(); drain_hit_writes()
+    tavily_calls.clear(); fake_lambda.reset_mock(); table.items.clear(); table.updates.clear(); table.queries.clear(); table.write_delay = 0.0
+
+
+# --- Run Scenarios ---
+failures = []
+TTL = fec.CACHE_TTL_SECONDS
+table, fake_lambda = FakeCacheTable(), MagicMock()
+with patch('fetch_external_context.cache_table', table), \
+     patch('fetch_external_context.lambda_client', fake_lambda), \
+     patch('fetch_external_context.call_tavily_search', fake_tavily), \
+     patch('fetch_external_context.get_secret_value', lambda *_: "stub-key"), \
+     patch('fetch_external_context.SINGLE_FLIGHT_ENABLED', False), \
+     patch('fetch_external_context.BOTO3_CLIENT_ERROR', None), patch('fetch_external_context.DDB_RESOURCE_AVAILABLE', True):
+
+    # 1. Early in the TTL window: served from cache, no refresh
+    reset(table); seed_row(table, "jeans trends United States", remaining_seconds=TTL * 0.9)
+    result = fec.search_with_cache("jeans trends United States")
+    print(f"Fresh hit: status={result['status']}, refresh invokes={fake_lambda.invoke.call_count}")
+    if result["status"] != "success_cached" or fake_lambda.invoke.call_count != 0: failures.append("fresh hit refreshed")
+
+    # 2. Last 20% of the window: current value served, one async refresh scheduled, repeat hits do not re-schedule
+    reset(table); key = seed_row(table, "jeans trends United States", remaining_seconds=TTL * 0.1, country="United States", category="Jeans")
+    first = fec.search_with_cache("jeans trends United States")
+    for _ in range(3): fec.search_with_cache("Jeans trends in the US") # L1 hits, same key
+    fec._refresh_scheduled_until.clear(); fec.search_with_cache("jeans trends United States") # "Another container": lease blocks it
+    payload = json.loads(fake_lambda.invoke.call_args.kwargs["Payload"]) if fake_lambda.invoke.called else {}
+    print(f"Late hit: status={first['status']}, answer='{first['answer']}', refresh invokes={fake_lambda.invoke.call_count}, payload={payload}")
+    if first["answer"] != "cached answer for jeans trends United States": failures.append("late hit not served from cache")
+    if fake_lambda.invoke.call_count != 1 or fake_lambda.invoke.call_args.kwargs.get("InvocationType") != "Event": failures.append("late hit refresh count")
+    if payload.get("refresh_search", {}).get("category") != "Jeans" or tavily_calls: failures.append("refresh payload / inline fetch")
+
+    # 3. Hot keys refresh earlier (inside the wider hot window)
+    reset(table); seed_row(table, "cargo pants trends US", remaining_seconds=TTL * 0.4, hit_count=fec.REFRESH_AHEAD_HOT_HIT_COUNT)
+    seed_row(table, "linen shirts trends US", remaining_seconds=TTL * 0.4, hit_count=1)
+    fec.search_with_cache("cargo pants trends US"); fec.search_with_cache("linen shirts trends US")
+    refreshed = [json.loads(c.kwargs["Payload"])["refresh_search"]["search_query"] for c in fake_lambda.invoke.call_args_list]
+    print(f"Hot window: refreshed={refreshed}")
+    if refreshed != ["cargo pants trends US"]: failures.append("hot-key refresh")
+
+    # 4. The refresh entry point updates the row in place: new payload and ttl, context kept, and hits counted
+    #    while it was fetching (the request carries a stale hit_count) are not overwritten
+    reset(table); key = seed_row(table, "jeans trends United States", remaining_seconds=60, hit_count=7, country="United States", category="Jeans",
+                                 refresh_lease_until=int(time.time()) + 30, tavily_response_json='{"answer": "legacy"}')
+    def tavily_during_hits(api_key, search_query):
+        fec._write_search_hits(key, 2); fec._write_search_hits(key, 1) # Other containers' counter writes land mid-refresh
+        return fake_tavily(api_key, search_query)
+    with patch('fetch_external_context.call_tavily_search', tavily_during_hits):
+        response = fec.lambda_handler({"refresh_search": {"search_query": "jeans trends United States", "cache_key": key,
+                                                          "hit_count": 7, "country": "United States", "category": "Jeans"}}, None)
+    row = table.items[key]
+    print(f"Refresh: status={response['status']}, ttl remaining={row['ttl'] - int(time.time())}s, hit_count={row.get('hit_count')}, category={row.get('category')}")
+    if response["status"] != "success_api" or row["ttl"] - time.time() < TTL - 5 or row.get("hit_count") != 10 or row.get("category") != "Jeans":
+        failures.append("refresh update")
+    if "refresh_lease_until" in row or "tavily_response_json" in row: failures.append(f"refresh left stale attributes: {sorted(row)}")
+    if fec.decode_cache_record(row)["answer"] != "fresh answer for jeans trends United States": failures.append("refresh content")
+
+    # 5. Hit counters: an L2 hit is written at once, L1 hits in batches of SEARCH_HIT_FLUSH_EVERY, never on the request path
+    reset(table); key = seed_row(table, "wide leg jeans US", remaining_seconds=TTL * 0.9); table.write_delay = 0.2
+    start = time.perf_counter()
+    for _ in range(1 + fec.SEARCH_HIT_FLUSH_EVERY): fec.search_with_cache("wide leg jeans US")
+    elapsed = time.perf_counter() - start; drain_hit_writes()
+    print(f"Counters: {1 + fec.SEARCH_HIT_FLUSH_EVERY} hits in {elapsed * 1000:.0f} ms with {table.write_delay * 1000:.0f} ms counter writes")
+    if elapsed >= table.write_delay: failures.append("hit counter write on the request path")
+    counter_writes = [u for u in table.updates if "hit_count" in u[1]]
+    print(f"Counters: hit_count={table.items[key].get('hit_count')}, counter writes={len(counter_writes)}")
+    if table.items[key].get("hit_count") != 1 + fec.SEARCH_HIT_FLUSH_EVERY or len(counter_writes) != 2: failures.append("hit counters")
+
+    # 6. Rows written with a country and category join their warm-up group, registered once per container
+    reset(table)
+    for query in ("jeans trends US", "bootcut jeans US"): fec.search_with_cache(query, {"country": "United States", "category": "Jeans"})
+    drain_hit_writes()
+    groups = table.items.get(fec.WARM_UP_GROUPS_KEY, {}).get("warm_up_groups")
+    registry_writes = [u for u in table.updates if u[0] == fec.WARM_UP_GROUPS_KEY]
+    print(f"Warm-up groups: {groups}, registry writes={len(registry_writes)}")
+    if groups != {"United States#Jeans"} or len(registry_writes) != 1: failures.append("warm-up group registry")
+    if table.items[fec.build_search_cache_key("jeans trends US")].get("warm_up_group") != "United States#Jeans": failures.append("row group")
+
+    # 7. Warm-up: top-N per (country, category) from the index, only rows expired or inside the hot window
+    reset(table)
+    def seed_grouped(search_query, remaining_seconds, hit_count, country, category):
+        seed_row(table, search_query, remaining_seconds, hit_count=hit_count, country=country, category=category,
+                 warm_up_group=fec.build_warm_up_group(country, category))
+    seed_grouped("jeans trends US", -30, 50, "United States", "Jeans")
+    seed_grouped("bootcut jeans US", TTL * 0.3, 40, "United States", "Jeans")
+    seed_grouped("skinny jeans US", TTL * 0.3, 2, "United States", "Jeans") # Not top-2
+    seed_grouped("jeans trends UK", TTL * 0.9, 30, "United Kingdom", "Jeans") # Still fresh
+    seed_grouped("dresses trends UK", TTL * 0.1, 5, "United Kingdom", "Dresses")
+    table.items[fec.WARM_UP_GROUPS_KEY] = {"search_key": fec.WARM_UP_GROUPS_KEY,
+                                           "warm_up_groups": {"United States#Jeans", "United Kingdom#Jeans", "United Kingdom#Dresses"}}
+    summary = fec.warm_up_top_searches({"top_n": 2})
+    print(f"Warm-up: {summary}, refreshed={sorted(tavily_calls)}, index queries={table.queries}")
+    if sorted(tavily_calls) != ["bootcut jeans US", "dresses trends UK", "jeans trends US"]: failures.append("warm-up selection")
+    tavily_calls.clear(); table.queries.clear(); fec.warm_up_top_searches({"top_n": 2, "country": "United Kingdom"})
+    if sorted(table.queries) != ["United Kingdom#Dresses", "United Kingdom#Jeans"]: failures.append(f"warm-up country filter: {table.queries}")
+
+print("\n----- Refresh-Ahead Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("------------------------------------")
+sys.exit(1 if failures else 0)
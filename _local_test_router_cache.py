@@ -0,0 +1,169 @@
+# _local_test_router_cache.py
+# Offline test of the router's result cache for the trend Lambdas: repeat questions are served from L1, a
+# fresh container is served from the shared DynamoDB tier (in-memory stand-in), a data-version bump moves
+# every key on, errors and the brand Lambda are never cached, and both fan-out engines go through it.
+# Reports per-request latency for a miss, an L1 hit and an L2 hit.
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestRouterCache")
+
+# --- Set Environment Variables for the Lambda ---
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['TREND_MAIN_LAMBDA_NAME'] = 'TrendMain'
+os.environ['MEGA_TRENDS_LAMBDA_NAME'] = 'MegaTrends'
+os.environ['BRAND_INSIGHT_LAMBDA_NAME'] = 'BrandInsight'
+os.environ['ROUTER_CACHE_ENABLED'] = 'true'
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_internal_router_v2 as router
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The router sets the root logger to INFO on import
+
+LAMBDA_DELAY = 0.15
+
+
+# --- Stand-ins: downstream Lambdas and the cache table ---
+class FakeLambdaClient:
+    def __init__(self): self.calls = []; self.lock = threading.Lock()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        with self.lock: self.calls.append(FunctionName)
+        time.sleep(LAMBDA_DELAY)
+        payload = json.loads(Payload); params = payload.get("queryStringParameters", {})
+        if params.get("category") == "Broken": outer = {"statusCode": 500, "body": "upstream failure"}
+        elif FunctionName == "BrandInsight": outer = {"statusCode": 200, "body": json.dumps({"performance_data": [{"month": "2026-09"}]})}
+        else:
+            body = {"country_category": {"category": params.get("category"), "avg_volume_growth": 0.12},
+                    "country_category_style": [{"style": f"Style {i}", "growth": i / 100} for i in range(200)],
+                    "country_color_category": [], "query_category": [{"trend": "Quiet Luxury"}]}
+            outer = {"statusCode": 200, "body": json.dumps(body)}
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps(outer).encode())}
+
+
+class FakeCacheTable:
+    """get_item / put_item / update_item(ADD) on a dict, keyed by cache_key."""
+    def __init__(self): self.items = {}; self.lock = threading.Lock()
+
+    def get_item(self, Key):
+        with self.lock: item = self.items.get(Key['cache_key'])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item):
+        with self.lock: self.items[Item['cache_key']] = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ReturnValues):
+        with self.lock:
+            item = self.items.setdefault(Key['cache_key'], {'cache_key': Key['cache_key']})
+            item['version'] = item.get('version', 0) + ExpressionAttributeValues[':one']
+            item['updated_at'] = ExpressionAttributeValues[':now']
+            return {"Attributes": {"version": item['version'], "updated_at": item['updated_at']}}
+
+    def result_rows(self): return [key for key in self.items if not key.startswith("data_version:")]
+
+
+def trend_event(category, sources=("internal_trends_category",), **context):
+    return {"status": "success", "primary_task": "get_trend", "required_sources": list(sources),
+            "query_subjects": {"specific_known": [], "target_brand": "brand.example"}, "timeframe_reference": None,
+            "original_context": {"query": "q", "category": category, "country": "United States", **context}}
+
+
+def timed(event):
+    start = time.perf_counter(); output = router.lambda_handler(event, None)
+    return output, (time.perf_counter() - start) * 1000
+
+
+def wait_for_writes():
+    deadline = time.time() + 2
+    while router._cache_write_pool._work_queue.qsize() and time.time() < deadline: time.sleep(0.01)
+    time.sleep(0.05)
+
+
+def new_container():
+    """A cold container: empty L1 and no remembered data versions."""
+    router.ROUTER_L1_CACHE.clear(); router._data_versions.clear()
+
+
+# --- Run Scenarios ---
+failures = []
+fake_lambda = FakeLambdaClient(); table = FakeCacheTable()
+with patch('fetch_internal_router_v2.lambda_client', fake_lambda), patch('fetch_internal_router_v2.BOTO3_CLIENT_ERROR', None), \
+     patch('fetch_internal_router_v2.router_cache_table', table):
+    event = trend_event("Jeans", ("internal_trends_category", "internal_mega"))
+
+    # 1. Miss -> invoke and store; repeat -> L1; new container -> L2; all outputs identical
+    miss, miss_ms = timed(event); wait_for_writes()
+    calls_after_miss = len(fake_lambda.calls)
+    l1_hit, l1_ms = timed(event)
+    new_container(); l2_hit, l2_ms = timed(event)
+    print(f"Miss {miss_ms:.1f} ms ({calls_after_miss} invokes), L1 hit {l1_ms:.1f} ms, L2 hit {l2_ms:.1f} ms; "
+          f"{len(table.result_rows())} rows; stats {router.ROUTER_CACHE_STATS}")
+    if calls_after_miss != 2 or len(fake_lambda.calls) != 2: failures.append(f"hits invoked ({fake_lambda.calls})")
+    if not (miss == l1_hit == l2_hit) or miss["status"] != "success": failures.append("cached output differs")
+    if len(table.result_rows()) != 2: failures.append("L2 rows not written")
+    if l1_ms > LAMBDA_DELAY * 1000 / 3: failures.append("L1 hit not fast")
+
+    # 2. A pipeline bump (handler entry point) moves TrendMain's keys on; MegaTrends stays cached
+    bump = router.lambda_handler({"bump_data_version": ["TrendMain"]}, None)
+    fake_lambda.calls.clear(); after_bump, _ = timed(event)
+    print(f"Bump: {bump}; invokes after bump={fake_lambda.calls}")
+    if bump["versions"] != {"TrendMain": 1} or fake_lambda.calls != ["TrendMain"]: failures.append("bump invalidation")
+    if after_bump != miss: failures.append("output after bump differs")
+
+    # 3. Other containers see a bump once their version refresh interval has passed
+    wait_for_writes(); table.update_item(Key={'cache_key': "data_version:MegaTrends"}, UpdateExpression="",
+                                         ExpressionAttributeValues={':one': 1, ':now': 0}, ReturnValues="UPDATED_NEW")
+    fake_lambda.calls.clear(); timed(event)
+    stale_calls = list(fake_lambda.calls)
+    with patch('fetch_internal_router_v2.ROUTER_CACHE_VERSION_REFRESH_SECONDS', 0):
+        timed(event)
+    print(f"Remote bump: before refresh invokes={stale_calls}, after refresh invokes={fake_lambda.calls}")
+    if stale_calls or fake_lambda.calls != ["MegaTrends"]: failures.append("remote bump")
+
+    # 4. Errors and the brand Lambda are never cached
+    fake_lambda.calls.clear()
+    for _ in range(2): timed(trend_event("Broken")); timed(trend_event("Jeans", ("internal_brand_performance",)))
+    print(f"Uncached: invokes={fake_lambda.calls}")
+    if fake_lambda.calls.count("TrendMain") != 2 or fake_lambda.calls.count("BrandInsight") != 2: failures.append("errors/brand cached")
+
+    # 5. The asyncio engine reads and fills the same cache
+    new_container(); fake_lambda.calls.clear()
+    with patch('fetch_internal_router_v2.ROUTER_ENGINE', "asyncio"):
+        async_l2, _ = timed(event); router.ROUTER_L1_CACHE.clear()
+        async_fresh, _ = timed(trend_event("Dresses")); async_l1, _ = timed(trend_event("Dresses"))
+    print(f"asyncio: invokes={fake_lambda.calls}")
+    if fake_lambda.calls != ["TrendMain"] or async_l2 != miss or async_fresh != async_l1: failures.append("asyncio engine")
+
+    # 6. Disabled -> always invoke
+    fake_lambda.calls.clear()
+    with patch('fetch_internal_router_v2.ROUTER_CACHE_ENABLED', False):
+        timed(event); timed(event)
+    if len(fake_lambda.calls) != 4: failures.append("cache not disabled")
+
+print("\n----- Router Result Cache Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("------------------------------------------")
+sys.exit(1 if failures else 0)
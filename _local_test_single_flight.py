@@ -0,0 +1,188 @@
+# _local_test_single_flight.py
+# Offline test of single-flight web searches: an in-memory stand-in for the DynamoDB cache table
+# (including the conditional writes used for leases) is shared by N threads that miss the cache
+# at the same moment; exactly one of them may call Tavily.
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestSingleFlight")
+
+# --- Set Environment Variables for the Lambda ---
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['SEARCH_LEASE_POLL_SECONDS'] = '0.02'
+os.environ['SEARCH_LEASE_WAIT_SECONDS'] = '3'
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_external_context
+    from botocore.exceptions import ClientError
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+
+# --- Local DynamoDB Stand-in ---
+class FakeCacheTable:
+    """Thread-safe dict keyed by search_key; supports the two condition expressions the lease code uses."""
+
+    def __init__(self):
+        self.items = {}; self.lock = threading.Lock(); self.put_calls = 0; self.get_calls = 0
+
+    @staticmethod
+    def _condition_failed(operation):
+        return ClientError({"Error": {"Code": "ConditionalCheckFailedException", "Message": "The conditional request failed"}}, operation)
+
+    def get_item(self, Key):
+        with self.lock:
+            self.get_calls += 1; item = self.items.get(Key['search_key'])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+        with self.lock:
+            self.put_calls += 1
+            existing = self.items.get(Item['search_key'])
+            if ConditionExpression and existing is not None:
+                if not existing.get('lease_expires_at_ms', 0) < ExpressionAttributeValues[':now_ms']:
+                    raise self._condition_failed("PutItem")
+            self.items[Item['search_key']] = dict(Item)
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ExpressionAttributeNames=None, ConditionExpression=None):
+        if not ExpressionAttributeNames: return {} # Hit counters are not modelled here
+        with self.lock: # Cache row writes: SET #aN = :aN, REMOVE #rN
+            self.put_calls += 1; item = self.items.setdefault(Key['search_key'], dict(Key))
+            for placeholder, name in (ExpressionAttributeNames or {}).items():
+                if placeholder.startswith("#a"): item[name] = ExpressionAttributeValues[":" + placeholder[1:]]
+                else: item.pop(name, None)
+        return {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeValues=None):
+        with self.lock:
+            existing = self.items.get(Key['search_key'])
+            if ConditionExpression and (existing is None or existing.get('lease_owner') != ExpressionAttributeValues[':owner']):
+                raise self._condition_failed("DeleteItem")
+            self.items.pop(Key['search_key'], None)
+        return {}
+
+
+class FakeTavily:
+    """Slow upstream that counts calls; optionally fails the first N of them."""
+
+    def __init__(self, delay=0.3, failures=0):
+        self.calls = 0; self.delay = delay; self.failures = failures; self.lock = threading.Lock()
+
+    def __call__(self, api_key, search_query):
+        with self.lock:
+            self.calls += 1; call_number = self.calls
+        time.sleep(self.delay)
+        if call_number <= self.failures: raise RuntimeError("simulated Tavily outage")
+        return {"query": search_query, "answer": "stub answer",
+                "results": [{"title": "Stub", "url": "https://example.com", "content": "c", "score": 0.9}]}
+
+
+def run_concurrent(table, tavily, queries, deadline_at=None):
+    fetch_external_context.WEB_SEARCH_L1_CACHE.clear()
+    results = [None] * len(queries); barrier = threading.Barrier(len(queries))
+    def worker(i):
+        barrier.wait(); results[i] = fetch_external_context.search_with_cache(queries[i], deadline_at=deadline_at)
+    with patch('fetch_external_context.cache_table', table), \
+         patch('fetch_external_context.call_tavily_search', tavily), \
+         patch('fetch_external_context.get_secret_value', lambda *_: "stub-key"):
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(queries))]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    return results
+
+
+# --- Run Scenarios ---
+failures = []
+N = 12
+
+# 1. N concurrent identical misses (mixed phrasing, same normalized key) -> one upstream call
+table, tavily = FakeCacheTable(), FakeTavily()
+queries = ["jeans trends in US", "Jeans trends in the United States", "jeans trends US?"] * (N // 3)
+results = run_concurrent(table, tavily, queries)
+tiers = sorted(r.get("cache_metadata", {}).get("tier", "?") for r in results)
+print(f"Concurrent misses: callers={N}, upstream calls={tavily.calls}, tiers={tiers}")
+if tavily.calls != 1: failures.append(f"expected 1 upstream call, got {tavily.calls}")
+if any(r["status"] not in ("success_api", "success_cached") or r["answer"] != "stub answer" for r in results): failures.append("waiter results")
+if any(key.startswith("lease:") for key in table.items): failures.append("lease not released")
+
+# 2. Holder fails: the lease is released, one waiter takes over, the rest get its result
+table, tavily = FakeCacheTable(), FakeTavily(failures=1)
+results = run_concurrent(table, tavily, ["bootcut jeans trends US"] * N)
+statuses = [r["status"] for r in results]
+print(f"Holder failure: upstream calls={tavily.calls}, errors={statuses.count('error')}, successes={N - statuses.count('error')}")
+if tavily.calls != 2 or statuses.count("error") != 1: failures.append("takeover after holder failure")
+
+# 3. A stale lease from a crashed holder does not block the next caller
+table, tavily = FakeCacheTable(), FakeTavily(delay=0)
+stale_key = fetch_external_context.build_search_cache_key("wide leg jeans US")
+table.items[f"lease:{stale_key}"] = {"search_key": f"lease:{stale_key}", "lease_owner": "crashed", "lease_expires_at_ms": 0}
+start = time.time()
+results = run_concurrent(table, tavily, ["wide leg jeans US"])
+print(f"Stale lease: status={results[0]['status']}, waited={time.time() - start:.2f}s")
+if results[0]["status"] != "success_api" or time.time() - start > 1: failures.append("stale lease takeover")
+
+# 4. Disabled: every caller goes upstream (the pre-change behaviour)
+table, tavily = FakeCacheTable(), FakeTavily(delay=0.1)
+with patch('fetch_external_context.SINGLE_FLIGHT_ENABLED', False):
+    run_concurrent(table, tavily, ["cargo pants trends US"] * 4)
+print(f"Disabled: upstream calls={tavily.calls}")
+if tavily.calls != 4: failures.append("disabled flag")
+
+# 5. The request deadline caps the wait on a holder that is still working: past it, the waiter calls Tavily itself
+def held_lease(search_query):
+    table = FakeCacheTable(); key = fetch_external_context.build_search_cache_key(search_query)
+    table.items[f"lease:{key}"] = {"search_key": f"lease:{key}", "lease_owner": "busy holder", "lease_expires_at_ms": int(time.time() * 1000) + 60000}
+    return table
+
+
+context = {"deadline_ms": int((time.time() + fetch_external_context.SEARCH_SYNTHESIS_RESERVE_SECONDS + 0.3) * 1000)}
+table, tavily = held_lease("linen trousers US"), FakeTavily(delay=0)
+start = time.time(); results = run_concurrent(table, tavily, ["linen trousers US"], fetch_external_context.search_deadline_at(context))
+waited = time.time() - start
+print(f"Deadline-capped wait: status={results[0]['status']}, waited={waited:.2f}s (lease wait {fetch_external_context.SEARCH_LEASE_WAIT_SECONDS}s)")
+if results[0]["status"] != "success_api" or not 0.2 <= waited < 1: failures.append("deadline-capped wait")
+
+# Less than one poll left: no polling, straight to Tavily
+table, tavily = held_lease("linen trousers UK"), FakeTavily(delay=0)
+results = run_concurrent(table, tavily, ["linen trousers UK"], time.time() + fetch_external_context.SEARCH_LEASE_POLL_SECONDS / 2)
+print(f"No budget to wait: status={results[0]['status']}, cache reads={table.get_calls}")
+if results[0]["status"] != "success_api" or table.get_calls != 1: failures.append("waited without budget")
+if fetch_external_context.search_deadline_at({}) is not None: failures.append("deadline without deadline_ms")
+
+# 6. L2 hit/miss counters stay exact when the fan-out reads the cache from several threads at once
+table = FakeCacheTable(); stats_before = dict(fetch_external_context.L2_CACHE_STATS)
+def read_misses():
+    for i in range(500): fetch_external_context.read_cached_search(f"missing-{threading.get_ident()}-{i}")
+with patch('fetch_external_context.cache_table', table):
+    threads = [threading.Thread(target=read_misses) for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+counted = fetch_external_context.L2_CACHE_STATS["misses"] - stats_before["misses"]
+print(f"Concurrent L2 counters: cache reads={table.get_calls}, misses counted={counted}")
+if counted != table.get_calls: failures.append(f"lost L2 counter updates: {counted} of {table.get_calls}")
+
+print("\n----- Single-Flight Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("------------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,172 @@
+# _local_test_speculation.py
+# Offline test of speculative prefetch in the orchestrator: the TREND_MAIN call and the raw-query web
+# search start while the interpreter's LLM call runs, are reused by the router / external steps when the
+# interpretation asks for the same data (no duplicate downstream calls, same output), and are discarded
+# otherwise. Reports the hit rate and latency saved over a mix of request types.
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestSpeculation")
+
+# --- Set Environment Variables for the Lambdas ---
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ['TREND_MAIN_LAMBDA_NAME'] = 'TrendMain'
+os.environ['ROUTER_CACHE_ENABLED'] = 'false' # Counts downstream calls; covered by _local_test_router_cache.py
+
+# --- Import Handlers AFTER setting environment variables ---
+try:
+    import orchestrator
+    import speculation
+    import fetch_external_context as fec
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # Handler modules set the root logger to INFO on import
+
+INTERPRET_DELAY, LAMBDA_DELAY, SEARCH_DELAY = 0.5, 0.3, 0.4
+
+
+# --- Stand-ins: interpreter LLM, downstream Lambdas, Tavily, synthesis ---
+def interpretation_for(request):
+    """What the interpreter decides for each scripted request."""
+    context = {"query": request["query"], "category": request["category"].lower().title(), "country": request["country"]}
+    base = {"status": "success", "primary_task": "get_trend", "required_sources": ["internal_trends_category", "web_search"],
+            "query_subjects": {"specific_known": [], "unmapped_items": []}, "timeframe_reference": None, "original_context": context}
+    kind = request["kind"]
+    if kind == "longer_timeframe": base["timeframe_reference"] = "12 months"
+    if kind == "specific_subject":
+        base["required_sources"] = ["internal_trends_item", "web_search"]
+        base["query_subjects"]["specific_known"] = [{"subject": "Baggy", "type": "style"}]
+    if kind == "internal_only": base["required_sources"] = ["internal_trends_category"]
+    if kind == "web_general": base.update(primary_task="summarize_web_trends", required_sources=["web_search"])
+    if kind == "amazon":
+        base.update(primary_task="summarize_amazon_radar", required_sources=["internal_amazon_radar"])
+        context.update(target_department="Women", target_category="Jeans")
+    return base
+
+
+def fake_interpret(event, context):
+    time.sleep(INTERPRET_DELAY)
+    return {"statusCode": 200, "body": json.dumps(interpretation_for(event))}
+
+
+def fake_generate(event, context):
+    external = {k: v for k, v in event["external_data"].items() if k != "cache_metadata"} # Timing fields differ run to run
+    return {"statusCode": 200, "body": json.dumps({"internal": event["internal_data"], "external": external})}
+
+
+class FakeLambdaClient:
+    def __init__(self): self.calls = []; self.lock = threading.Lock()
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        with self.lock: self.calls.append((FunctionName, json.loads(Payload)))
+        time.sleep(LAMBDA_DELAY)
+        params = json.loads(Payload).get("queryStringParameters", {})
+        body = {"country_category": {"category": params.get("category"), "time_frame": params.get("time_frame")},
+                "country_category_style": [], "country_color_category": []}
+        return {"StatusCode": 200, "Payload": io.BytesIO(json.dumps({"statusCode": 200, "body": json.dumps(body)}).encode())}
+
+
+tavily_calls = []; tavily_lock = threading.Lock()
+def fake_tavily(api_key, search_query):
+    with tavily_lock: tavily_calls.append(search_query)
+    time.sleep(SEARCH_DELAY)
+    return {"answer": f"answer for {search_query}", "results": [{"title": "T", "url": f"https://example.com/{len(search_query)}", "content": "c"}]}
+
+
+REQUESTS = [
+    {"kind": "standard", "query": "what's trending in jeans", "category": "jeans", "country": "United States"},
+    {"kind": "standard", "query": "dress trends this season", "category": "Dresses", "country": "United Kingdom"},
+    {"kind": "standard", "query": "are cargo pants still popular", "category": "Pants", "country": "United States"},
+    {"kind": "longer_timeframe", "query": "jeans over the last 12 months", "category": "Jeans", "country": "United States"},
+    {"kind": "specific_subject", "query": "is baggy still in", "category": "Jeans", "country": "United States"},
+    {"kind": "internal_only", "query": "jeans category numbers", "category": "Jeans", "country": "Germany"},
+    {"kind": "web_general", "query": "global fashion news this week", "category": "WEB_SEARCH_GENERAL_TRENDS", "country": "United States"},
+    {"kind": "amazon", "query": "top amazon jeans", "category": "AMAZON_RADAR", "country": "United States"},
+]
+
+
+def run(request, enabled):
+    fec.WEB_SEARCH_L1_CACHE.clear(); fake_lambda.calls.clear(); tavily_calls.clear()
+    event = {k: v for k, v in request.items() if k != "kind"}; event["kind"] = request["kind"] # interpret stand-in reads "kind"
+    with patch('orchestrator.SPECULATIVE_PREFETCH_ENABLED', enabled):
+        start = time.perf_counter(); final, timings = orchestrator.run_pipeline(event); elapsed = time.perf_counter() - start
+    time.sleep(max(LAMBDA_DELAY, SEARCH_DELAY) + 0.05) # Let discarded fetches finish before counting calls
+    return final, timings, elapsed, len(fake_lambda.calls), len(tavily_calls)
+
+
+# --- Run Scenarios ---
+failures = []
+fake_lambda = FakeLambdaClient(); table = MagicMock(); table.get_item.return_value = {}
+with patch('interpret_query_v2.lambda_handler', fake_interpret), patch('generate_final_response_v2.lambda_handler', fake_generate), \
+     patch('fetch_internal_router_v2.lambda_client', fake_lambda), patch('fetch_internal_router_v2.BOTO3_CLIENT_ERROR', None), \
+     patch('fetch_external_context.cache_table', table), patch('fetch_external_context.call_tavily_search', fake_tavily), \
+     patch('fetch_external_context.get_secret_value', lambda *_: "stub-key"), \
+     patch('fetch_external_context.SINGLE_FLIGHT_ENABLED', False), patch('fetch_external_context.REFRESH_AHEAD_ENABLED', False), \
+     patch('fetch_external_context.BOTO3_CLIENT_ERROR', None), patch('fetch_external_context.DDB_RESOURCE_AVAILABLE', True):
+
+    expected_outcomes = {"standard": {"trend_main": "hit", "web_search": "hit"},
+                         "longer_timeframe": {"trend_main": "discarded", "web_search": "hit"},
+                         "specific_subject": {"trend_main": "hit", "web_search": "discarded"}, # Item trends use TREND_MAIN too
+                         "internal_only": {"trend_main": "hit", "web_search": "discarded"},
+                         "web_general": {"web_search": "hit"},
+                         "amazon": {}}
+    hits = started = 0; saved_ms = []; speedups = []
+    print(f"{'kind':<18}{'off ms':>8}{'on ms':>8}  calls off->on (lambda/tavily)  outcomes")
+    for request in REQUESTS:
+        final_off, _, elapsed_off, lambdas_off, searches_off = run(request, False)
+        final_on, timings, elapsed_on, lambdas_on, searches_on = run(request, True)
+        outcomes = {name: s["outcome"] for name, s in timings.get("speculation", {}).items()}
+        print(f"{request['kind']:<18}{elapsed_off * 1000:>8.0f}{elapsed_on * 1000:>8.0f}  "
+              f"{lambdas_off}/{searches_off} -> {lambdas_on}/{searches_on}{'':>16}{outcomes}")
+        if final_on != final_off: failures.append(f"{request['kind']}: output differs with speculation")
+        if outcomes != expected_outcomes[request["kind"]]: failures.append(f"{request['kind']}: outcomes {outcomes}")
+        # Hits never add a downstream call; each discarded fetch adds exactly one
+        extra = sum(1 for outcome in outcomes.values() if outcome == "discarded")
+        if (lambdas_on + searches_on) - (lambdas_off + searches_off) != extra: failures.append(f"{request['kind']}: duplicate calls")
+        for summary in timings.get("speculation", {}).values():
+            started += 1; hits += summary["outcome"] == "hit"
+            if summary["outcome"] == "hit": saved_ms.append(summary["saved_ms"])
+        if request["kind"] == "standard": speedups.append(elapsed_off - elapsed_on)
+
+    hit_rate = hits / started if started else 0.0
+    print(f"\nSpeculative fetches: {started} started, {hits} hits ({hit_rate:.0%}), mean saved per hit={sum(saved_ms) / len(saved_ms):.0f} ms, "
+          f"standard requests faster by {1000 * sum(speedups) / len(speedups):.0f} ms on average")
+    print(f"Container stats: {speculation.SPECULATION_STATS}")
+    if min(speedups) < 0.8 * SEARCH_DELAY: failures.append("standard requests not faster")
+
+    # A speculative fetch that raises falls back to the normal call
+    broken = speculation.SpeculativeFetch("trend_main", "k", orchestrator._speculation_pool, lambda: 1 / 0)
+    if broken.claim() is not None: failures.append("raising fetch not treated as miss")
+    before = dict(speculation.SPECULATION_STATS["trend_main"])
+    broken_summary = speculation.summarize_speculation({"trend_main": broken})["trend_main"]
+    after = speculation.SPECULATION_STATS["trend_main"]
+    print(f"Raising fetch: {broken_summary}")
+    if broken_summary != {"outcome": "failed", "saved_ms": 0.0}: failures.append(f"raising fetch summary {broken_summary}")
+    if (after["hits"], after["failed"], after["saved_ms"]) != (before["hits"], before["failed"] + 1, before["saved_ms"]):
+        failures.append("raising fetch counted as a hit")
+
+print("\n----- Speculative Prefetch Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-------------------------------------------")
+sys.exit(1 if failures else 0)
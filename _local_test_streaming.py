@@ -0,0 +1,176 @@
+# _local_test_streaming.py
+# Offline test of synthesis streaming: the IncrementalSummaryParser at chunk boundaries (escapes and
+# \u sequences split across chunks, sections spanning chunks, braces inside strings, truncated JSON), and
+# the execution store's stream sequence numbers, which come from storage so a retried synthesis step
+# in another container appends after what clients already read instead of overwriting it.
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestStreaming")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ.pop('EXECUTION_STORE_TABLE_NAME', None)
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import execution_store
+    import generate_final_response_v2 as generate
+    import llm_client
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The generator sets the root logger to INFO on import
+
+failures = []
+SUMMARY = {
+    "overall_summary": "Denim is \"up\" 12% — café {culture} [rising]\\n",
+    "sections": [
+        {"id": "category_context", "heading": "Context {1}", "content": "Brace } and bracket ] in text",
+        "points": [{"text": "a \"quoted\" point"}, {"text": "élégance"}]},
+        {"id": "web_context", "heading": "Web", "content": "", "points": []},
+    ],
+}
+TEXT = json.dumps(SUMMARY) # ASCII, so é etc. appear as escape sequences that can be split
+
+
+def feed(chunks):
+    parser = generate.IncrementalSummaryParser(); pieces = []
+    for chunk in chunks: pieces += parser.feed(chunk)
+    return pieces, parser
+
+
+EXPECTED = [("overall_summary", SUMMARY["overall_summary"])] + [("section", s) for s in SUMMARY["sections"]]
+
+# --- Parser: every way of cutting the text yields the same pieces, in order ---
+whole, _ = feed([TEXT])
+if whole != EXPECTED: failures.append(f"whole text: {whole}")
+by_char, _ = feed(list(TEXT))
+if by_char != EXPECTED: failures.append("one character per chunk")
+for boundary in (TEXT.index('\\"'), TEXT.index('\\"') + 1, TEXT.index("\\u00e9") + 3, TEXT.index('"sections"') + 40):
+    pieces, _ = feed([TEXT[:boundary], TEXT[boundary:]])
+    if pieces != EXPECTED: failures.append(f"split at {boundary} ({TEXT[boundary - 3:boundary + 3]!r})")
+print(f"Parser: whole, per-character and split-escape feeds -> {len(whole)} pieces each")
+
+# A section spanning chunks is reported once, when its closing brace arrives
+section_start = TEXT.index('{"id": "category_context"'); section_end = TEXT.index('{"id": "web_context"')
+parser = generate.IncrementalSummaryParser()
+before = parser.feed(TEXT[:section_start + 30]); middle = parser.feed(TEXT[section_start + 30:section_end - 2]); after = parser.feed(TEXT[section_end - 2:])
+if [k for k, _ in before] != ["overall_summary"] or [k for k, _ in middle] != ["section"] or [k for k, _ in after] != ["section"]:
+    failures.append(f"spanning section: {before} / {middle} / {after}")
+
+# Markdown fences around the object are ignored
+fenced, parser = feed(["```json\n", TEXT[:50], TEXT[50:], "\n```"])
+if fenced != EXPECTED or parser.text != "```json\n" + TEXT + "\n```": failures.append("markdown fences")
+
+# Truncated JSON: only complete pieces are reported, nothing raises, and the full text fails validation
+for cut in (TEXT.index("\\u00e9") + 2, section_end - 5, len(TEXT) - 3):
+    try:
+        pieces, parser = feed([TEXT[:cut]])
+    except Exception as e:
+        failures.append(f"truncated at {cut} raised {e!r}"); continue
+    if pieces != EXPECTED[:len(pieces)] or len(pieces) == len(EXPECTED) and cut < section_end: failures.append(f"truncated at {cut}: {pieces}")
+    try:
+        generate.parse_structured_summary(parser.text); failures.append(f"truncated at {cut} validated")
+    except ValueError:
+        pass
+print("Parser: spanning section, fences and truncation checked")
+
+
+# --- Stream sequence numbers from storage ---
+class InMemoryStreamTable:
+    """DynamoDB Table stand-in: atomic ADD counter, put_item, get_item and the stream query."""
+
+    def __init__(self): self.items = {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ReturnValues=None, **kwargs):
+        item = self.items.setdefault((Key['stream_id'], Key['seq']), dict(Key))
+        if ':record' in ExpressionAttributeValues: # Execution record write
+            item.update(record_json=ExpressionAttributeValues[':record'], record_version=ExpressionAttributeValues[':next_version']); return {}
+        item['next_seq'] = item.get('next_seq', 0) + ExpressionAttributeValues[':one']
+        return {"Attributes": {"next_seq": item['next_seq']}}
+
+    def put_item(self, Item): self.items[(Item['stream_id'], Item['seq'])] = dict(Item)
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get((Key['stream_id'], Key['seq']))
+        return {"Item": dict(item)} if item else {}
+
+    def query(self, KeyConditionExpression, **kwargs):
+        stream_condition, seq_condition = KeyConditionExpression.get_expression()['values']
+        stream_id, after_seq = stream_condition.get_expression()['values'][1], seq_condition.get_expression()['values'][1]
+        return {"Items": [dict(item) for (sid, seq), item in sorted(self.items.items(), key=lambda kv: kv[0][1])
+                          if sid == stream_id and seq > after_seq]}
+
+
+table = InMemoryStreamTable()
+with patch('execution_store.store_table', table):
+    execution_store.put_execution_record("stream-retry", {"status": "RUNNING"}) # Shares the partition (seq 0)
+    first_run = [execution_store.publish_stream_event("stream-retry", {"type": "section", "section": {"id": f"s{i}"}}) for i in range(3)]
+    cursor = first_run[-1] # The client has read everything the first run published
+    # A retry in another container shares only the table; the module keeps no per-stream state in DynamoDB mode
+    retry_run = [execution_store.publish_stream_event("stream-retry", {"type": "section", "section": {"id": f"r{i}"}}) for i in range(2)]
+    unread = execution_store.read_stream_events("stream-retry", after_seq=cursor)
+    everything = execution_store.read_stream_events("stream-retry", after_seq=-5)
+    record = execution_store.get_execution_record("stream-retry")
+print(f"Store: first run seqs {first_run}, retry seqs {retry_run}, unread after cursor {cursor}: {[e['section']['id'] for e in unread]}")
+if first_run != [1, 2, 3] or retry_run != [4, 5]: failures.append("seq not continued across runs")
+if [e["section"]["id"] for e in unread] != ["r0", "r1"]: failures.append("retried events missed")
+if [e["seq"] for e in everything] != [1, 2, 3, 4, 5] or (record or {}).get("status") != "RUNNING": failures.append("stream and record rows mixed")
+class ThrottledTable:
+    def update_item(self, **kwargs): raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "UpdateItem")
+
+
+with patch('execution_store.store_table', ThrottledTable()): # A counter failure drops the event rather than reusing a seq
+    if execution_store.publish_stream_event("stream-retry", {"type": "section"}) is not None: failures.append("counter failure")
+
+
+# --- A retried synthesis step resets what the earlier run streamed ---
+class FakeStreamingModel:
+    def __init__(self, model_name, generation_config, system_instruction=None, cached_content=None): pass
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        return [SimpleNamespace(text=TEXT[i:i + 23]) for i in range(0, len(TEXT), 23)] if stream else SimpleNamespace(text=TEXT)
+
+
+def web_event(stream_id):
+    return {"internal_data": {"status": "success", "interpretation": {
+                "status": "success", "primary_task": "summarize_web_trends", "required_sources": ["web_search"], "query_subjects": {"specific_known": []},
+                "original_context": {"query": "jeans", "country": "United States", "category": "Jeans", "stream_id": stream_id}}},
+            "external_data": {"status": "success", "answer": "Barrel jeans lead.", "results": []}}
+
+
+llm_client.set_model_factory(FakeStreamingModel)
+with patch('generate_final_response_v2.get_secret_value', lambda *_: "test-key"), patch('generate_final_response_v2.BOTO3_CLIENT_ERROR', None):
+    generate.lambda_handler(web_event("stream-step"), None); first_kinds = [e["type"] for e in execution_store.read_stream_events("stream-step")]
+    generate.lambda_handler(web_event("stream-step"), None) # Step Functions retry of the same execution
+    retry_events = execution_store.read_stream_events("stream-step", after_seq=len(first_kinds))
+llm_client.set_model_factory(None)
+print(f"Step retry: first run {first_kinds}, retry {[e['type'] for e in retry_events]}")
+if "reset" in first_kinds or first_kinds[-1] != "final": failures.append("first run")
+if not retry_events or retry_events[0]["type"] != "reset" or retry_events[0].get("reason") != "step_retry" or retry_events[-1]["type"] != "final":
+    failures.append("step retry reset")
+
+print("\n----- Streaming Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("--------------------------------")
+sys.exit(1 if failures else 0)
@@ -0,0 +1,139 @@
+# _local_test_synthesis_fallback.py
+# Offline test of synthesis model-tier fallback under a request deadline: the time left is split so a first
+# attempt that times out still leaves a budget for the other tier, a deadline too close to split goes to one
+# attempt, and a streamed first attempt that fails validation is followed by a "reset" event before the retry
+# streams its own sections. Uses fake models and a fake clock (no sleeping, no API calls).
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestSynthesisFallback")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+os.environ.pop('EXECUTION_STORE_TABLE_NAME', None) # In-process stream store
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import execution_store
+    import generate_final_response_v2 as generate
+    import llm_client
+    from google.api_core import exceptions as google_api_exceptions
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The generator sets the root logger to INFO on import
+
+HEAVY, LIGHT = "gemini-2.0-flash", "gemini-2.0-flash-lite"
+NOW = 1_700_000_000.0
+
+
+# --- Stand-ins: clock and tiered models ---
+clock = SimpleNamespace(now=NOW)
+fake_time = SimpleNamespace(time=lambda: clock.now)
+behaviour = {} # model name -> "ok" | "timeout" | "invalid"
+calls = [] # (model name, timeout, streamed)
+
+
+def summary(model_name):
+    return {"overall_summary": f"From {model_name}.",
+            "sections": [{"id": "s1", "heading": model_name, "content": "c", "points": [{"text": "p"}]}]}
+
+
+class FakeTierModel:
+    def __init__(self, model_name, generation_config, system_instruction=None, cached_content=None):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        timeout = (request_options or {}).get("timeout"); calls.append((self.model_name, timeout, stream))
+        mode = behaviour.get(self.model_name, "ok")
+        if mode == "timeout":
+            clock.now += timeout; raise google_api_exceptions.DeadlineExceeded(f"{self.model_name} timed out")
+        clock.now += 1.0
+        text = json.dumps(summary(self.model_name))
+        if mode == "invalid": text = text[:text.index('"points"')] + '"points": "none"}]}' # Sections stream, schema fails
+        if not stream: return SimpleNamespace(text=text)
+        return [SimpleNamespace(text=text[i:i + 17]) for i in range(0, len(text), 17)]
+
+    def count_tokens(self, contents):
+        return SimpleNamespace(total_tokens=len(str(contents)) // 4)
+
+
+def web_summary_event(deadline_in=None, stream_id=None):
+    context = {"query": "what is trending in jeans", "country": "United States", "category": "Jeans"}
+    if deadline_in is not None: context["deadline_ms"] = int((NOW + deadline_in) * 1000) # run() starts the clock at NOW
+    if stream_id: context["stream_id"] = stream_id
+    return {"internal_data": {"status": "success", "interpretation": {
+                "status": "success", "primary_task": "summarize_web_trends", "required_sources": ["web_search"],
+                "query_subjects": {"specific_known": []}, "original_context": context}},
+            "external_data": {"status": "success", "answer": "Barrel jeans lead.",
+                              "results": [{"title": "Denim report", "content": "Barrel jeans are up."}]}}
+
+
+def run(event, **modes):
+    behaviour.clear(); behaviour.update(modes); calls.clear(); clock.now = NOW
+    response = generate.lambda_handler(event, None)
+    return json.loads(response["body"])
+
+
+# --- Run Scenarios ---
+failures = []
+llm_client.set_model_factory(FakeTierModel)
+with patch('generate_final_response_v2.time', fake_time), patch('generate_final_response_v2.get_secret_value', lambda *_: "test-key"), \
+     patch('generate_final_response_v2.BOTO3_CLIENT_ERROR', None), patch('generate_final_response_v2.SYNTHESIS_LLM_MODEL', HEAVY), \
+     patch('generate_final_response_v2.SYNTHESIS_LIGHT_LLM_MODEL', LIGHT), patch('generate_final_response_v2.SYNTHESIS_LLM_TIMEOUT_SECONDS', 25.0):
+    # 1. 8 s left (the router's synthesis reserve): the light tier times out, the heavy tier still gets its share
+    body = run(web_summary_event(deadline_in=8.0), **{LIGHT: "timeout"})
+    print(f"Deadline 8s, light times out: {[(m, round(t, 2)) for m, t, _ in calls]} -> {body.get('status')}")
+    if [m for m, _, _ in calls] != [LIGHT, HEAVY] or body.get("status") == generate.INDICATOR_ERROR: failures.append("fallback under deadline")
+    elif not (abs(calls[0][1] - 4.8) < 0.01 and calls[1][1] >= generate.SYNTHESIS_FALLBACK_MIN_SECONDS): failures.append("budget split")
+    if body.get("ai_summary_structured", {}).get("overall_summary") != f"From {HEAVY}.": failures.append("fallback answer")
+
+    # 2. Too little time to split: one attempt gets all of it and there is no fallback
+    body = run(web_summary_event(deadline_in=2.0), **{LIGHT: "timeout"})
+    print(f"Deadline 2s, light times out: {[(m, round(t, 2)) for m, t, _ in calls]} -> {body.get('status')}")
+    if len(calls) != 1 or abs(calls[0][1] - 2.0) > 0.01 or body.get("status") != generate.INDICATOR_ERROR: failures.append("short deadline")
+
+    # 3. No deadline: each attempt gets SYNTHESIS_LLM_TIMEOUT_SECONDS
+    body = run(web_summary_event(), **{LIGHT: "timeout"})
+    print(f"No deadline, light times out: {[(m, t) for m, t, _ in calls]} -> {body.get('status')}")
+    if [t for _, t, _ in calls] != [25.0, 25.0] or body.get("status") == generate.INDICATOR_ERROR: failures.append("no deadline")
+
+    # 4. Streamed first attempt fails validation: its sections are followed by a reset, then the retry's sections
+    body = run(web_summary_event(deadline_in=8.0, stream_id="stream-fallback"), **{LIGHT: "invalid"})
+    events = execution_store.read_stream_events("stream-fallback")
+    kinds = [e["type"] for e in events]
+    after_reset = events[kinds.index("reset") + 1:] if "reset" in kinds else []
+    print(f"Streamed fallback: {kinds}")
+    if [streamed for _, _, streamed in calls] != [True, True] or "reset" not in kinds or kinds[-1] != "final": failures.append("stream reset")
+    elif kinds.index("reset") < kinds.index("section"): failures.append("reset before the failed attempt's sections")
+    elif [e.get("overall_summary") for e in after_reset if e["type"] == "overall_summary"] != [f"From {HEAVY}."] or \
+            any(e["section"]["heading"] != HEAVY for e in after_reset if e["type"] == "section"):
+        failures.append("sections after reset")
+    if "reset" in kinds and events[kinds.index("reset")].get("reason") != "invalid_output": failures.append("reset reason")
+
+    # 5. A streamed request that succeeds first time has no reset
+    run(web_summary_event(deadline_in=8.0, stream_id="stream-ok"))
+    if "reset" in [e["type"] for e in execution_store.read_stream_events("stream-ok")]: failures.append("reset without retry")
+llm_client.set_model_factory(None)
+
+print("\n----- Synthesis Fallback Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------------")
+sys.exit(1 if failures else 0)
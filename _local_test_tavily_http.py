@@ -0,0 +1,104 @@
+# _local_test_tavily_http.py
+# Offline test of the pooled Tavily client: a local HTTP stub stands in for the search API so
+# connection reuse and 429/5xx retry behaviour can be checked without network access.
+import json
+import logging
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestTavilyHttp")
+
+
+# --- Stub Search API ---
+class StubSearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so connection reuse is observable
+    requests_seen = [] # (client port, query)
+    failures_to_serve = [] # Status codes returned (in order) before succeeding
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        StubSearchHandler.requests_seen.append((self.client_address[1], body.get("query")))
+        if StubSearchHandler.failures_to_serve:
+            status = StubSearchHandler.failures_to_serve.pop(0)
+            payload = json.dumps({"detail": {"error": "stub failure"}}).encode()
+            self.send_response(status)
+            if status == 429: self.send_header("Retry-After", "0")
+        else:
+            status = 200
+            payload = json.dumps({"query": body.get("query"), "answer": "stub answer",
+                                  "results": [{"title": "Stub", "url": "https://example.com", "content": "c", "score": 0.9}]}).encode()
+            self.send_response(status)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(payload)))
+        self.end_headers(); self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StubSearchHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# --- Set Environment Variables for the Lambda ---
+os.environ['TAVILY_API_BASE_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ['TAVILY_BACKOFF_FACTOR'] = '0.01' # Keep the retry test fast
+os.environ['TAVILY_TIMEOUT_SECONDS'] = '5'
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import fetch_external_context
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+
+# --- Run Scenarios ---
+failures = []
+
+# 1. Connection reuse: several searches share one client and one TCP connection
+for i in range(5):
+    fetch_external_context.call_tavily_search("stub-key", f"jeans trends {i}")
+ports = {port for port, _ in StubSearchHandler.requests_seen}
+print(f"Reuse: requests={len(StubSearchHandler.requests_seen)}, distinct connections={len(ports)}")
+if len(StubSearchHandler.requests_seen) != 5 or len(ports) != 1: failures.append("connection reuse")
+client = fetch_external_context.get_tavily_client("stub-key")
+
+# 2. Retry with backoff on 503 then 429, then success
+StubSearchHandler.requests_seen.clear(); StubSearchHandler.failures_to_serve[:] = [503, 429]
+response = fetch_external_context.call_tavily_search("stub-key", "retry me")
+print(f"Retry: attempts={len(StubSearchHandler.requests_seen)}, answer={response.get('answer')}")
+if len(StubSearchHandler.requests_seen) != 3 or response.get("answer") != "stub answer": failures.append("retry")
+
+# 3. Retries exhausted surface as an error
+StubSearchHandler.requests_seen.clear(); StubSearchHandler.failures_to_serve[:] = [500, 500, 500]
+try:
+    fetch_external_context.call_tavily_search("stub-key", "always failing")
+    failures.append("exhausted retries should raise")
+except Exception as e:
+    print(f"Exhausted: attempts={len(StubSearchHandler.requests_seen)}, error={type(e).__name__}")
+    if len(StubSearchHandler.requests_seen) != 1 + fetch_external_context.TAVILY_MAX_RETRIES: failures.append("retry budget")
+
+# 4. Same key keeps the client; a rotated key rebuilds it
+if fetch_external_context.get_tavily_client("stub-key") is not client: failures.append("client reuse")
+if fetch_external_context.get_tavily_client("rotated-key") is client: failures.append("key rotation")
+
+server.shutdown()
+print("\n----- Tavily HTTP Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("----------------------------------")
+sys.exit(1 if failures else 0)
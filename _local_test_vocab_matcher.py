@@ -0,0 +1,77 @@
+# _local_test_vocab_matcher.py
+# Offline test of the Aho-Corasick vocabulary matcher and the interpreter extractors built on it:
+# leftmost-longest matching on word boundaries, and Amazon Radar department/category extraction, which
+# must still find the Amazon category inside a longer category or style ('evening dresses' -> Dresses).
+import logging
+import os
+import sys
+from pathlib import Path
+
+# --- Setup Project Root and Add src to Path ---
+project_root = Path(__file__).resolve().parent
+src_path = project_root / "src"
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+    print(f"Added {src_path} to sys.path")
+
+# --- Configure Logging ---
+log_level = os.environ.get("LOG_LEVEL", "WARNING").upper()
+logging.basicConfig(
+    level=log_level,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("LocalTestVocabMatcher")
+
+os.environ['AWS_REGION'] = os.environ.get('AWS_REGION', 'us-west-2')
+
+# --- Import Handler AFTER setting environment variables ---
+try:
+    import interpret_query_v2 as interpret
+    from vocab_matcher import VocabularyMatcher
+except Exception as e:
+    logger.error(f"Error during import or initial module load: {e}", exc_info=True)
+    sys.exit(1)
+logging.getLogger().setLevel(log_level) # The interpreter sets the root logger to INFO on import
+
+failures = []
+
+
+def check(label, actual, expected):
+    print(f"{label:<48} {actual}")
+    if actual != expected: failures.append(f"{label}: expected {expected}, got {actual}")
+
+
+# --- Matcher ---
+matcher = VocabularyMatcher()
+matcher.add_all(["dresses", "evening dresses", "ant", "t-shirts", "shirts", "red"], "category"); matcher.add("red", "color")
+check("leftmost-longest", [m.term for m in matcher.find_all("Evening dresses and dresses")], ["evening dresses", "dresses"])
+check("word boundaries", matcher.find_terms("pants, antique, ant", "category"), ["ant"])
+check("hyphenated term wins over its suffix", matcher.find_terms("t-shirts vs shirts", "category"), ["t-shirts", "shirts"])
+check("one term, several kinds", [sorted(m.kinds) for m in matcher.find_all("red")], [["category", "color"]])
+check("duplicates reported once", matcher.find_terms("dresses or dresses", "category"), ["dresses"])
+
+# --- Amazon Radar extraction ---
+if interpret.CONFIG_LOAD_ERROR: failures.append(f"config: {interpret.CONFIG_LOAD_ERROR}")
+AMAZON_CASES = {
+    "evening dresses for women": ("Women", "Dresses"),
+    "cocktail dresses for women": ("Women", "Dresses"),
+    "polo shirts for men": ("Men", "Shirts"),
+    "ankle boots for women": ("Women", "Boots"),
+    "tote bags for women": ("Women", "Bags"),
+    "best selling t-shirts for kids": ("Kids", "T-Shirts"),
+    "top jeans in the men department": ("Men", "Jeans"),
+    "dresses for men": ("Men", None), # Not an Amazon category for the department
+    "what sells on amazon": (None, None),
+}
+for query, (department, category) in AMAZON_CASES.items():
+    params = interpret.extract_amazon_params(query)
+    check(f"amazon: {query}", (params["department"], params["target_category"] and params["target_category"].title()),
+          (department, category))
+# The shared matcher still reports the longest category for the other extractors
+check("comparison keeps the longest category", interpret.extract_comparison_subjects_no_re_simple_split(
+    "evening dresses vs jeans", interpret.KNOWN_CATEGORIES, interpret.KNOWN_CATEGORIES_TITLE_CASE_MAP)[:1], ["Evening Dresses"])
+
+print("\n----- Vocabulary Matcher Local Test -----")
+print("All scenarios passed." if not failures else f"FAILED: {failures}")
+print("-----------------------------------------")
+sys.exit(1 if failures else 0)
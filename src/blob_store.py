@@ -0,0 +1,110 @@
+# src/blob_store.py
+import gzip
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Any
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+# --- Configuration ---
+# Claim-check for state hand-offs: a step output over BLOB_OFFLOAD_THRESHOLD_BYTES is written once to the blob
+# store and the state carries a small handle instead; the consuming step fetches it when it reads the data.
+# BLOB_STORE_BUCKET -> S3 (expire the prefix with a bucket lifecycle rule, e.g. 1 day). BLOB_STORE_LOCAL_DIR ->
+# filesystem stand-in (local runs / tests only - nothing is shared across containers). Neither -> disabled.
+BLOB_STORE_BUCKET = os.environ.get("BLOB_STORE_BUCKET") or None
+BLOB_STORE_PREFIX = os.environ.get("BLOB_STORE_PREFIX", "pipeline-state/")
+BLOB_STORE_LOCAL_DIR = os.environ.get("BLOB_STORE_LOCAL_DIR") or None
+BLOB_OFFLOAD_THRESHOLD_BYTES = int(os.environ.get("BLOB_OFFLOAD_THRESHOLD_BYTES", 64 * 1024)) # Step Functions caps state at 256 KB
+AWS_REGION = os.environ.get("AWS_REGION", "us-west-2")
+BLOB_REF_KEY = "$blob_ref"
+
+# --- Logger Setup ---
+logger = logging.getLogger()
+
+# --- Initialize Boto3 Client ---
+s3_client = None
+if BLOB_STORE_BUCKET:
+    try:
+        session = boto3.session.Session()
+        s3_client = session.client('s3', region_name=AWS_REGION)
+    except Exception as e:
+        logger.exception(f"Failed to initialize S3 client for blob store bucket '{BLOB_STORE_BUCKET}', payloads will be passed inline.")
+        s3_client = None
+
+
+class BlobStoreError(Exception):
+    """A handle could not be resolved (blob missing, expired or unreadable)."""
+
+
+def is_enabled() -> bool:
+    return s3_client is not None or bool(BLOB_STORE_LOCAL_DIR)
+
+
+def is_blob_ref(value: Any) -> bool:
+    return isinstance(value, dict) and isinstance(value.get(BLOB_REF_KEY), dict)
+
+
+def put_blob(name: str, body: bytes) -> str:
+    """Writes a gzip'd JSON blob and returns its URI (s3://bucket/key or file:///path)."""
+    key = f"{BLOB_STORE_PREFIX}{uuid.uuid4().hex}/{name}.json.gz"
+    if s3_client is not None:
+        s3_client.put_object(Bucket=BLOB_STORE_BUCKET, Key=key, Body=body, ContentType="application/json", ContentEncoding="gzip")
+        return f"s3://{BLOB_STORE_BUCKET}/{key}"
+    path = Path(BLOB_STORE_LOCAL_DIR) / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(body)
+    return f"file://{path.resolve()}"
+
+
+def get_blob(uri: str) -> bytes:
+    """
+    Reads a blob written by put_blob. Handles arrive in step input, so only URIs under the configured store
+    (BLOB_STORE_BUCKET + BLOB_STORE_PREFIX, or BLOB_STORE_PREFIX inside BLOB_STORE_LOCAL_DIR) are read; any
+    other bucket, key or path raises BlobStoreError.
+    """
+    if uri.startswith("s3://"):
+        if s3_client is None: raise BlobStoreError(f"S3 blob store not configured, cannot read {uri}.")
+        bucket, _, key = uri[len("s3://"):].partition("/")
+        if bucket != BLOB_STORE_BUCKET or not key.startswith(BLOB_STORE_PREFIX) or ".." in key.split("/"):
+            raise BlobStoreError(f"Blob URI outside the configured store: {uri}")
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+    if uri.startswith("file://"):
+        if not BLOB_STORE_LOCAL_DIR: raise BlobStoreError(f"Local blob store not configured, cannot read {uri}.")
+        path = Path(uri[len("file://"):]).resolve()
+        if (Path(BLOB_STORE_LOCAL_DIR) / BLOB_STORE_PREFIX).resolve() not in path.parents:
+            raise BlobStoreError(f"Blob URI outside the configured store: {uri}")
+        return path.read_bytes()
+    raise BlobStoreError(f"Unsupported blob URI: {uri}")
+
+
+def offload(payload: Any, name: str) -> Any:
+    """
+    Returns `payload` unchanged when it is small or the store is disabled; otherwise writes it and returns
+    {"$blob_ref": {"uri", "bytes"}, "status": <payload status>}. The status stays inline for workflow
+    Choice states and logs. On a write failure the payload is passed inline (and may hit the state limit).
+    """
+    if not is_enabled() or not isinstance(payload, dict): return payload
+    serialized = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    if len(serialized) <= BLOB_OFFLOAD_THRESHOLD_BYTES: return payload
+    try:
+        uri = put_blob(name, gzip.compress(serialized, compresslevel=5))
+    except (ClientError, BotoCoreError, OSError) as e: # BotoCoreError: no credentials, endpoint unreachable, ...
+        logger.error(f"Blob store write failed for '{name}' ({len(serialized)} bytes), passing inline: {e}")
+        return payload
+    logger.info(f"Offloaded '{name}' ({len(serialized)} bytes) to {uri}")
+    return {BLOB_REF_KEY: {"uri": uri, "bytes": len(serialized)}, "status": payload.get("status")}
+
+
+def resolve(value: Any) -> Any:
+    """The payload behind a handle; anything that is not a handle is returned as is. Raises BlobStoreError."""
+    if not is_blob_ref(value): return value
+    uri = value[BLOB_REF_KEY].get("uri")
+    if not uri: raise BlobStoreError("Blob handle has no URI.")
+    try:
+        return json.loads(gzip.decompress(get_blob(uri)).decode("utf-8"))
+    except (ClientError, BotoCoreError, OSError, EOFError, ValueError) as e:
+        raise BlobStoreError(f"Could not read blob {uri}: {e}") from e
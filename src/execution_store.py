@@ -0,0 +1,192 @@
+# src/execution_store.py
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, List, Any
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+# --- Configuration ---
+# Shared by the synthesis Lambda (writer) and the SFN proxy (reader). Leave the table unset
+# to use the in-process store (local runs / tests only - nothing is shared across containers).
+EXECUTION_STORE_TABLE_NAME = os.environ.get("EXECUTION_STORE_TABLE_NAME")
+EXECUTION_STORE_TTL_SECONDS = int(os.environ.get("EXECUTION_STORE_TTL_SECONDS", 60 * 60)) # 1 hour
+AWS_REGION = os.environ.get("AWS_REGION", "us-west-2")
+
+# --- Logger Setup ---
+logger = logging.getLogger()
+
+# --- Initialize Boto3 Table ---
+store_table = None
+if EXECUTION_STORE_TABLE_NAME:
+    try:
+        session = boto3.session.Session()
+        store_table = session.resource('dynamodb', region_name=AWS_REGION).Table(EXECUTION_STORE_TABLE_NAME)
+    except Exception as e:
+        logger.exception(f"Failed to initialize execution store table '{EXECUTION_STORE_TABLE_NAME}', using in-process store.")
+        store_table = None
+
+# --- In-process fallback store ---
+_LOCAL_EVENTS: Dict[str, List[Dict[str, Any]]] = {}
+_LOCAL_LOCK = threading.Lock()
+# Sequence numbers come from the store, not the writer's process: a Step Functions retry of synthesis
+# runs in another container and must append after the events clients have already read. In DynamoDB an
+# atomic counter row per stream (seq -1; the execution record is seq 0, events start at 1) hands them out.
+STREAM_COUNTER_SEQ = -1
+
+
+def next_stream_seq(stream_id: str) -> int:
+    response = store_table.update_item(
+        Key={'stream_id': stream_id, 'seq': STREAM_COUNTER_SEQ},
+        UpdateExpression="ADD next_seq :one SET #ttl = :ttl",
+        ExpressionAttributeNames={'#ttl': 'ttl'},
+        ExpressionAttributeValues={':one': 1, ':ttl': int(time.time()) + EXECUTION_STORE_TTL_SECONDS},
+        ReturnValues="UPDATED_NEW"
+    )
+    return int(response['Attributes']['next_seq'])
+
+
+def last_stream_seq(stream_id: str) -> int:
+    """Sequence number of the stream's latest event (0 when nothing was published or on a read error)."""
+    if not stream_id: return 0
+    if store_table is None:
+        with _LOCAL_LOCK:
+            return len(_LOCAL_EVENTS.get(stream_id, []))
+    try:
+        item = store_table.get_item(Key={'stream_id': stream_id, 'seq': STREAM_COUNTER_SEQ}, ConsistentRead=True).get('Item')
+        return int(item['next_seq']) if item and 'next_seq' in item else 0
+    except ClientError as e:
+        logger.error(f"Execution store counter read error for stream {stream_id}: {e.response['Error']['Code']}")
+    except Exception:
+        logger.exception(f"Unexpected execution store counter read error for stream {stream_id}.")
+    return 0
+
+
+def publish_stream_event(stream_id: str, event: Dict[str, Any]) -> Optional[int]:
+    """Appends an event to the stream and returns its sequence number (None on failure)."""
+    if not stream_id: return None
+    if store_table is None:
+        with _LOCAL_LOCK:
+            events = _LOCAL_EVENTS.setdefault(stream_id, [])
+            events.append({"seq": len(events) + 1, "ts": time.time(), **event})
+            return len(events)
+    try:
+        seq = next_stream_seq(stream_id)
+        record = {"seq": seq, "ts": time.time(), **event}
+        store_table.put_item(
+            Item={
+                'stream_id': stream_id,
+                'seq': seq,
+                'event_json': json.dumps(record),
+                'ttl': int(time.time()) + EXECUTION_STORE_TTL_SECONDS
+            }
+        )
+        return seq
+    except ClientError as e:
+        logger.error(f"Execution store write error for stream {stream_id}: {e.response['Error']['Code']}")
+    except Exception:
+        logger.exception(f"Unexpected execution store write error for stream {stream_id}.")
+    return None
+
+
+def read_stream_events(stream_id: str, after_seq: int = 0) -> List[Dict[str, Any]]:
+    """Returns events with seq > after_seq in publish order."""
+    if not stream_id: return []
+    after_seq = max(after_seq, 0) # Events start at 1; the execution record and the counter sit below
+    if store_table is None:
+        with _LOCAL_LOCK:
+            return [e for e in _LOCAL_EVENTS.get(stream_id, []) if e["seq"] > after_seq]
+    events = []
+    try:
+        query_kwargs = {
+            "KeyConditionExpression": Key('stream_id').eq(stream_id) & Key('seq').gt(after_seq),
+            "ConsistentRead": True
+        }
+        while True:
+            response = store_table.query(**query_kwargs)
+            events.extend(json.loads(item['event_json']) for item in response.get('Items', []) if 'event_json' in item)
+            if 'LastEvaluatedKey' not in response: break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except ClientError as e:
+        logger.error(f"Execution store read error for stream {stream_id}: {e.response['Error']['Code']}")
+    except Exception:
+        logger.exception(f"Unexpected execution store read error for stream {stream_id}.")
+    return events
+
+
+# --- Async Execution Records ---
+# One record per async execution token, stored under seq 0 of the token's partition (stream
+# events start at seq 1). Written as RUNNING by the proxy before the workflow starts and completed
+# by the synthesis step. Writes merge into the stored record under an optimistic version check, and
+# a terminal status is never replaced by a non-terminal one, whichever writer lands last.
+_LOCAL_RECORDS: Dict[str, Dict[str, Any]] = {}
+EXECUTION_RECORD_SEQ = 0
+TERMINAL_EXECUTION_STATUSES = {"SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"}
+EXECUTION_RECORD_WRITE_ATTEMPTS = 5
+
+
+def merge_execution_record(existing: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    merged = {**existing, **update}
+    if existing.get("status") in TERMINAL_EXECUTION_STATUSES and update.get("status") not in TERMINAL_EXECUTION_STATUSES:
+        merged["status"] = existing["status"]
+    return merged
+
+
+def put_execution_record(token: str, record: Dict[str, Any]) -> bool:
+    if not token: return False
+    record = {**record, "updated_at": time.time()}
+    if store_table is None:
+        with _LOCAL_LOCK:
+            _LOCAL_RECORDS[token] = merge_execution_record(_LOCAL_RECORDS.get(token, {}), record)
+        return True
+    try:
+        for _ in range(EXECUTION_RECORD_WRITE_ATTEMPTS):
+            item = store_table.get_item(Key={'stream_id': token, 'seq': EXECUTION_RECORD_SEQ}, ConsistentRead=True).get('Item') or {}
+            existing = json.loads(item['record_json']) if 'record_json' in item else {}
+            version = int(item.get('record_version', 0))
+            merged = merge_execution_record(existing, record)
+            try:
+                store_table.update_item(
+                    Key={'stream_id': token, 'seq': EXECUTION_RECORD_SEQ},
+                    UpdateExpression="SET record_json = :record, record_status = :status, record_version = :next_version, #ttl = :ttl",
+                    ConditionExpression="attribute_not_exists(record_version) OR record_version = :version",
+                    ExpressionAttributeNames={'#ttl': 'ttl'},
+                    ExpressionAttributeValues={':record': json.dumps(merged), ':status': merged.get("status") or "UNKNOWN",
+                                               ':version': version, ':next_version': version + 1,
+                                               ':ttl': int(time.time()) + EXECUTION_STORE_TTL_SECONDS}
+                )
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException': raise
+                logger.debug(f"Execution record {token} changed concurrently, re-reading.")
+        logger.error(f"Execution record write for {token} lost {EXECUTION_RECORD_WRITE_ATTEMPTS} races, giving up.")
+    except ClientError as e:
+        logger.error(f"Execution record write error for {token}: {e.response['Error']['Code']}")
+    except Exception:
+        logger.exception(f"Unexpected execution record write error for {token}.")
+    return False
+
+
+def get_execution_record(token: str) -> Optional[Dict[str, Any]]:
+    if not token: return None
+    if store_table is None:
+        with _LOCAL_LOCK:
+            record = _LOCAL_RECORDS.get(token)
+            return dict(record) if record else None
+    try:
+        item = store_table.get_item(Key={'stream_id': token, 'seq': EXECUTION_RECORD_SEQ},
+                                    ConsistentRead=True).get('Item')
+        return json.loads(item['record_json']) if item and 'record_json' in item else None
+    except ClientError as e:
+        logger.error(f"Execution record read error for {token}: {e.response['Error']['Code']}")
+    except Exception:
+        logger.exception(f"Unexpected execution record read error for {token}.")
+    return None
+
+
+def put_execution_result(token: str, result: Any) -> bool:
+    return put_execution_record(token, {"status": "SUCCEEDED", "result": result, "completed_at": time.time()})
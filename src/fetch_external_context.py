@@ -276,25 +276,79 @@
 #         "error": None
 #     }
 
+import gzip
 import json
 import logging
 import os
+import threading
 import time
-from hashlib import sha256
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from typing import Dict, Optional, List, Any
 import boto3
+from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation # Needed for replace_decimals
 import re
+from lru_ttl_cache import LRUTTLCache
+from search_cache_keys import SemanticQueryIndex, build_search_cache_key, normalize_search_query
 
 # --- Configuration ---
 CACHE_TABLE_NAME = os.environ.get("CACHE_TABLE_NAME", "TrendForecastAskAiCache")
 SECRET_NAME = os.environ.get("SECRET_NAME", "YourSecretsName") # Match case from your file
 AWS_REGION = os.environ.get("AWS_REGION", "us-west-2")
 CACHE_TTL_SECONDS = int(os.environ.get("CACHE_TTL_SECONDS", 3 * 60 * 60))
+TAVILY_API_BASE_URL = os.environ.get("TAVILY_API_BASE_URL") # None -> SDK default (https://api.tavily.com)
+TAVILY_TIMEOUT_SECONDS = float(os.environ.get("TAVILY_TIMEOUT_SECONDS", 60))
+TAVILY_MAX_RETRIES = int(os.environ.get("TAVILY_MAX_RETRIES", 2))
+TAVILY_BACKOFF_FACTOR = float(os.environ.get("TAVILY_BACKOFF_FACTOR", 0.5))
+TAVILY_BACKOFF_JITTER = float(os.environ.get("TAVILY_BACKOFF_JITTER", 0.25))
+TAVILY_POOL_MAXSIZE = int(os.environ.get("TAVILY_POOL_MAXSIZE", 10))
+TAVILY_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+WEB_SEARCH_L1_MAX_ENTRIES = int(os.environ.get("WEB_SEARCH_L1_MAX_ENTRIES", 256))
+WEB_SEARCH_L1_TTL_SECONDS = int(os.environ.get("WEB_SEARCH_L1_TTL_SECONDS", CACHE_TTL_SECONDS)) # Capped by the DynamoDB item TTL
+CACHE_KEY_NORMALIZATION_ENABLED = os.environ.get("CACHE_KEY_NORMALIZATION_ENABLED", "true").lower() == "true" # Phrasing variants share a key
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.9))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 512))
+# Cache record format: "compact" = gzip'd JSON of the projected fields in a Binary attribute; "json" = plain JSON string
+CACHE_WRITE_FORMAT = os.environ.get("CACHE_WRITE_FORMAT", "compact").lower()
+CACHE_MAX_RESULTS = int(os.environ.get("CACHE_MAX_RESULTS", 5))
+CACHE_RESULT_CONTENT_CHARS = int(os.environ.get("CACHE_RESULT_CONTENT_CHARS", 500)) # The prompt uses the first 150
+# Single-flight: the first miss for a key takes a lease row; concurrent misses poll the cache instead of calling Tavily
+SINGLE_FLIGHT_ENABLED = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+SEARCH_LEASE_SECONDS = float(os.environ.get("SEARCH_LEASE_SECONDS", 30)) # A crashed holder blocks others at most this long
+SEARCH_LEASE_WAIT_SECONDS = float(os.environ.get("SEARCH_LEASE_WAIT_SECONDS", 25)) # Then waiters call Tavily themselves
+SEARCH_LEASE_POLL_SECONDS = float(os.environ.get("SEARCH_LEASE_POLL_SECONDS", 0.25))
+# Waiters also stop at the proxy-stamped original_context.deadline_ms minus this (kept for synthesis, as in the router)
+SEARCH_SYNTHESIS_RESERVE_SECONDS = float(os.environ.get("SEARCH_SYNTHESIS_RESERVE_SECONDS", 8))
+# Refresh-ahead: a hit late in the TTL window (wider window for hot keys) re-fetches the row in the background
+REFRESH_AHEAD_ENABLED = os.environ.get("REFRESH_AHEAD_ENABLED", "true").lower() == "true"
+REFRESH_AHEAD_WINDOW_FRACTION = float(os.environ.get("REFRESH_AHEAD_WINDOW_FRACTION", 0.2)) # Last 20% of CACHE_TTL_SECONDS
+REFRESH_AHEAD_HOT_WINDOW_FRACTION = float(os.environ.get("REFRESH_AHEAD_HOT_WINDOW_FRACTION", 0.5))
+REFRESH_AHEAD_HOT_HIT_COUNT = int(os.environ.get("REFRESH_AHEAD_HOT_HIT_COUNT", 20))
+REFRESH_LEASE_SECONDS = int(os.environ.get("REFRESH_LEASE_SECONDS", 120))
+SEARCH_HIT_FLUSH_EVERY = int(os.environ.get("SEARCH_HIT_FLUSH_EVERY", 10)) # L1 hits are counted locally, written in batches
+WARM_UP_TOP_N = int(os.environ.get("WARM_UP_TOP_N", 10)) # Per (country, category)
+WARM_UP_MAX_WORKERS = int(os.environ.get("WARM_UP_MAX_WORKERS", 4))
+# Sparse GSI on the cache table: partition warm_up_group ("<country>#<category>"), sort hit_count, projecting
+# search_query_text, country, category and ttl. The warm-up job queries it per group instead of scanning the table.
+WARM_UP_INDEX_NAME = os.environ.get("WARM_UP_INDEX_NAME", "warm_up_group-hit_count-index")
+WARM_UP_GROUPS_KEY = "warm_up_groups" # Registry row: string set of the groups rows have been written for
+# Multi-query search: comparison/brand tasks run one cached search per subject concurrently and fuse the results
+MULTI_QUERY_SEARCH_ENABLED = os.environ.get("MULTI_QUERY_SEARCH_ENABLED", "true").lower() == "true"
+MULTI_QUERY_TASKS = {"compare_categories_task", "compare_items", "analyze_brand_deep_dive"}
+MULTI_QUERY_MAX_SUBQUERIES = int(os.environ.get("MULTI_QUERY_MAX_SUBQUERIES", 4))
+MULTI_QUERY_MAX_WORKERS = int(os.environ.get("MULTI_QUERY_MAX_WORKERS", 4))
+MULTI_QUERY_MAX_RESULTS = int(os.environ.get("MULTI_QUERY_MAX_RESULTS", 8))
+RRF_K = 60 # Reciprocal-rank fusion constant (rank 1 -> 1/61)
 
 # --- SDK Check (Do this early) ---
 try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     from tavily import TavilyClient
     TAVILY_SDK_AVAILABLE = True
 except ImportError:
@@ -317,6 +371,7 @@ logger.info(f"SECRET_NAME: {SECRET_NAME}")
 # --- Initialize Boto3 Clients ---
 dynamodb_resource = None
 secrets_manager = None
+lambda_client = None
 cache_table = None
 BOTO3_CLIENT_ERROR = None
 DDB_RESOURCE_AVAILABLE = False # Track availability
@@ -324,6 +379,7 @@ try:
     session = boto3.session.Session()
     dynamodb_resource = session.resource('dynamodb', region_name=AWS_REGION)
     secrets_manager = session.client(service_name='secretsmanager', region_name=AWS_REGION)
+    lambda_client = session.client(service_name='lambda', region_name=AWS_REGION) # For async refresh-ahead
     if dynamodb_resource: # Check if resource init succeeded
          cache_table = dynamodb_resource.Table(CACHE_TABLE_NAME)
          cache_table.load() # Check table connection
@@ -390,8 +446,580 @@ def replace_decimals(obj):
     else: return obj
 
 
+# --- Persistent Tavily Client ---
+# Module-scoped so warm invocations reuse pooled keep-alive connections instead of paying TLS setup per search.
+_tavily_client = None
+_tavily_client_api_key: Optional[str] = None
+_tavily_client_lock = threading.Lock()
+
+
+def build_tavily_session() -> "requests.Session":
+    """requests Session with a keep-alive pool and jittered-backoff retries on 429/5xx (Retry-After honoured)."""
+    retry_kwargs = dict(total=TAVILY_MAX_RETRIES, connect=TAVILY_MAX_RETRIES, read=0, status=TAVILY_MAX_RETRIES,
+                        backoff_factor=TAVILY_BACKOFF_FACTOR, status_forcelist=TAVILY_RETRY_STATUS_CODES,
+                        allowed_methods=frozenset({"POST"}), respect_retry_after_header=True, raise_on_status=False)
+    try:
+        retry = Retry(backoff_jitter=TAVILY_BACKOFF_JITTER, **retry_kwargs)
+    except TypeError: # urllib3 < 2 has no backoff_jitter
+        retry = Retry(**retry_kwargs)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TAVILY_POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter); session.mount("http://", adapter)
+    return session
+
+
+def get_tavily_client(api_key: str):
+    """Returns the container's TavilyClient, rebuilding it (and its session) only when the API key changes."""
+    global _tavily_client, _tavily_client_api_key
+    with _tavily_client_lock:
+        if _tavily_client is None or api_key != _tavily_client_api_key:
+            if _tavily_client is not None: logger.info("Tavily API key changed. Rebuilding client.")
+            session = build_tavily_session()
+            try:
+                _tavily_client = TavilyClient(api_key=api_key, session=session, api_base_url=TAVILY_API_BASE_URL)
+            except TypeError: # tavily-python < 0.7.23 (requirements.txt pins a newer one) has no session/api_base_url
+                logger.warning("Installed tavily-python does not accept a session; connection pooling disabled.")
+                _tavily_client = TavilyClient(api_key=api_key)
+            _tavily_client_api_key = api_key
+            logger.info(f"Initialized Tavily client (base URL: {TAVILY_API_BASE_URL or 'default'}, timeout: {TAVILY_TIMEOUT_SECONDS}s, retries: {TAVILY_MAX_RETRIES})")
+        return _tavily_client
+
+
+def call_tavily_search(api_key: str, search_query: str) -> Dict[str, Any]:
+    client = get_tavily_client(api_key)
+    return client.search(
+        query=search_query,
+        search_depth="advanced",
+        include_answer="advanced",
+        max_results=5,
+        timeout=TAVILY_TIMEOUT_SECONDS
+        # Removed time_range="month" for broader results initially
+    )
+
+
+# --- Cache Record Format ---
+# Version 1 (no format_version attribute): raw Tavily response in tavily_response_json.
+# Version 2: projected response, gzip'd compact JSON in the Binary attribute tavily_response_bin.
+CACHE_RECORD_FORMAT_VERSION = 2
+CACHED_RESULT_FIELDS = ("title", "url", "content", "score")
+
+
+def project_search_response(tavily_response_data: Dict) -> Dict[str, Any]:
+    """Keeps what downstream reads: the answer and, per result, title/url/score and a content prefix (no raw_content)."""
+    results = []
+    for result in (tavily_response_data.get("results") or [])[:CACHE_MAX_RESULTS]:
+        if not isinstance(result, dict): continue
+        projected = {field: result[field] for field in CACHED_RESULT_FIELDS if result.get(field) is not None}
+        if isinstance(projected.get("content"), str): projected["content"] = projected["content"][:CACHE_RESULT_CONTENT_CHARS]
+        results.append(projected)
+    return {"answer": tavily_response_data.get("answer"), "results": replace_decimals(results)}
+
+
+CACHE_RECORD_ATTRIBUTES = ("tavily_response_json", "tavily_response_bin", "format_version") # Both formats; a write removes the other's
+
+
+def encode_cache_record(projected: Dict) -> Dict[str, Any]:
+    """Item attributes holding a projected response in the configured write format."""
+    if CACHE_WRITE_FORMAT == "json": return {'tavily_response_json': json.dumps(projected)}
+    payload = gzip.compress(json.dumps(projected, separators=(",", ":")).encode("utf-8"), mtime=0)
+    return {'tavily_response_bin': payload, 'format_version': CACHE_RECORD_FORMAT_VERSION}
+
+
+def build_row_update(attributes: Dict[str, Any], remove: List[str]) -> Dict[str, Any]:
+    """update_item arguments that SET attributes and REMOVE the named ones, leaving every other attribute (hit_count) as is."""
+    names = {f"#a{i}": name for i, name in enumerate(attributes)}; names.update({f"#r{i}": name for i, name in enumerate(remove)})
+    expression = "SET " + ", ".join(f"#a{i} = :a{i}" for i in range(len(attributes)))
+    if remove: expression += " REMOVE " + ", ".join(f"#r{i}" for i in range(len(remove)))
+    return {"UpdateExpression": expression, "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {f":a{i}": value for i, value in enumerate(attributes.values())}}
+
+
+def decode_cache_record(item: Dict) -> Dict[str, Any]:
+    """Projected response from a cache item of either format (legacy rows are projected on read)."""
+    format_version = int(item.get('format_version', 1))
+    if format_version > CACHE_RECORD_FORMAT_VERSION: raise ValueError(f"Unsupported cache record format_version {format_version}")
+    if 'tavily_response_bin' in item:
+        payload = item['tavily_response_bin']
+        payload = getattr(payload, 'value', payload) # boto3 returns Binary attributes wrapped
+        return json.loads(gzip.decompress(bytes(payload)).decode("utf-8"))
+    cached_response_data = json.loads(item.get('tavily_response_json', '{}'), parse_float=Decimal) # Parse numbers as Decimal
+    return project_search_response(cached_response_data) # Converts Decimals back for output
+
+
+# --- Two-Tier Search Cache ---
+# L1: per-container LRU of decoded results; L2: DynamoDB cache_table shared by all containers.
+WEB_SEARCH_L1_CACHE = LRUTTLCache(max_entries=WEB_SEARCH_L1_MAX_ENTRIES, ttl_seconds=WEB_SEARCH_L1_TTL_SECONDS)
+L2_CACHE_STATS = {"hits": 0, "misses": 0}
+_cache_stats_lock = threading.Lock() # Searches (multi-query fan-out) read the cache from worker threads
+# Recently cached normalized queries; lets near-duplicates ("boot-cut" vs "bootcut") reuse an entry
+SEMANTIC_QUERY_INDEX = SemanticQueryIndex(max_entries=SEMANTIC_CACHE_MAX_ENTRIES, threshold=SEMANTIC_CACHE_THRESHOLD)
+# Row attributes kept for refreshes and the warm-up job; L1 entries carry them (and the row ttl) next to answer/results
+REFRESH_ROW_ATTRIBUTES = ("country", "category", "hit_count")
+
+
+def build_cache_metadata(tier: str) -> Dict[str, Any]:
+    """Per-container cache counters returned with every search result."""
+    l1_stats = WEB_SEARCH_L1_CACHE.stats()
+    with _cache_stats_lock: l2_stats = dict(L2_CACHE_STATS)
+    return {"tier": tier, "l1": {"hits": l1_stats["hits"], "misses": l1_stats["misses"], "size": l1_stats["size"]},
+            "l2": l2_stats}
+
+
+def count_cache_event(name: str) -> None:
+    with _cache_stats_lock:
+        L2_CACHE_STATS[name] += 1
+
+
+def read_cached_search(cache_key: str) -> Optional[tuple]:
+    """Looks a key up in L1, then DynamoDB (promoting hits to L1). Returns (entry, tier) or None."""
+    # --- L1 (in-process, already decoded) ---
+    l1_entry = WEB_SEARCH_L1_CACHE.get(cache_key)
+    if l1_entry is not None:
+        logger.info(f"L1 cache hit for key: {cache_key}")
+        record_search_hit(cache_key)
+        return l1_entry, "l1"
+
+    # --- L2 (DynamoDB) ---
+    try:
+        response = cache_table.get_item(Key={'search_key': cache_key})
+        item = response.get('Item')
+        if item and 'ttl' in item and item['ttl'] >= int(time.time()):
+            logger.info(f"Cache hit for key: {cache_key}")
+            count_cache_event("hits")
+            l1_entry = {**decode_cache_record(item), "ttl": int(item['ttl']),
+                        "row_attributes": {name: replace_decimals(item[name]) for name in REFRESH_ROW_ATTRIBUTES if name in item}}
+            record_search_hit(cache_key, flush=True)
+            WEB_SEARCH_L1_CACHE.put(cache_key, l1_entry, expires_at=int(item['ttl'])) # Never outlive the DynamoDB TTL
+            return l1_entry, "l2"
+        count_cache_event("misses")
+        if item: logger.info(f"Cache expired/TTL missing for key: {cache_key}")
+        else: logger.info(f"Cache miss for key: {cache_key}")
+    except ClientError as e: logger.error(f"DynamoDB cache read error: {e.response['Error']['Code']}", exc_info=True)
+    except Exception as e: logger.exception("Unexpected cache read error.")
+    return None
+
+
+def search_deadline_at(original_context: Dict) -> Optional[float]:
+    """Epoch seconds by which a search must be done: the request deadline less SEARCH_SYNTHESIS_RESERVE_SECONDS."""
+    deadline_ms = original_context.get("deadline_ms") if isinstance(original_context, dict) else None
+    return deadline_ms / 1000.0 - SEARCH_SYNTHESIS_RESERVE_SECONDS if isinstance(deadline_ms, (int, float)) else None
+
+
+def search_with_cache(search_query: str, row_attributes: Optional[Dict] = None, deadline_at: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Serves a search from L1, then DynamoDB, then (optionally) a near-identical cached query, then Tavily.
+    `row_attributes` (country, category) are stored on a newly written row for the warm-up job; `deadline_at`
+    (see search_deadline_at) caps how long this call waits on another execution's in-flight search.
+    """
+    normalized_query = normalize_search_query(search_query) if CACHE_KEY_NORMALIZATION_ENABLED else search_query
+    cache_key = build_search_cache_key(search_query, normalize=CACHE_KEY_NORMALIZATION_ENABLED)
+    logger.debug(f"Using cache key: {cache_key} (normalized query: '{normalized_query}')")
+
+    # --- 3a. Exact (normalized) key: L1, then L2 ---
+    cached = read_cached_search(cache_key)
+    if cached:
+        entry, tier = cached
+        if SEMANTIC_CACHE_ENABLED and tier == "l2": SEMANTIC_QUERY_INDEX.add(normalized_query, cache_key)
+        if REFRESH_AHEAD_ENABLED: maybe_schedule_refresh(cache_key, search_query, entry)
+        return {"status": "success_cached", "query_used": search_query, "answer": entry["answer"],
+                "results": entry["results"], "error": None, "cache_metadata": build_cache_metadata(tier)}
+
+    # --- 3b. Near-duplicate of a recently cached query ---
+    if SEMANTIC_CACHE_ENABLED:
+        similar = SEMANTIC_QUERY_INDEX.find_similar(normalized_query)
+        if similar:
+            similar_key, similar_query, similarity = similar
+            cached = read_cached_search(similar_key)
+            if cached:
+                entry, tier = cached
+                logger.info(f"Semantic cache hit: '{normalized_query}' ~ '{similar_query}' (similarity {similarity:.3f})")
+                cache_metadata = build_cache_metadata(f"semantic_{tier}")
+                cache_metadata.update(similarity=round(similarity, 3), matched_query=similar_query)
+                return {"status": "success_cached", "query_used": search_query, "answer": entry["answer"],
+                        "results": entry["results"], "error": None, "cache_metadata": cache_metadata}
+
+    # --- 3c. Single-flight: one caller per key fetches, concurrent callers wait for its cache write ---
+    lease_owner = None
+    if SINGLE_FLIGHT_ENABLED:
+        lease_owner = acquire_search_lease(cache_key)
+        if lease_owner:
+            cached = read_cached_search(cache_key) # Written between our miss and the lease
+        else:
+            logger.info(f"Search for key {cache_key} already in flight; waiting for its result.")
+            cached, lease_owner = wait_for_search_result(cache_key, deadline_at)
+        if cached:
+            if lease_owner: release_search_lease(cache_key, lease_owner)
+            entry, tier = cached
+            return {"status": "success_cached", "query_used": search_query, "answer": entry["answer"],
+                    "results": entry["results"], "error": None, "cache_metadata": build_cache_metadata(f"coalesced_{tier}")}
+        if not lease_owner: logger.warning(f"Timed out waiting for in-flight search {cache_key}; calling Tavily directly.")
+
+    try:
+        return fetch_and_cache_search(search_query, cache_key, normalized_query, row_attributes)
+    finally:
+        if lease_owner: release_search_lease(cache_key, lease_owner)
+
+
+def acquire_search_lease(cache_key: str) -> Optional[str]:
+    """
+    Conditionally writes a 'lease:<cache_key>' row. Returns an owner token if this caller may fetch
+    (lease taken, or DynamoDB unusable), None if another execution holds an unexpired lease.
+    """
+    owner = uuid.uuid4().hex
+    now_ms = int(time.time() * 1000)
+    try:
+        cache_table.put_item(
+            Item={'search_key': f"lease:{cache_key}", 'lease_owner': owner,
+                  'lease_expires_at_ms': now_ms + int(SEARCH_LEASE_SECONDS * 1000),
+                  'ttl': now_ms // 1000 + int(SEARCH_LEASE_SECONDS) + 60}, # DynamoDB TTL cleans up abandoned leases
+            ConditionExpression="attribute_not_exists(search_key) OR lease_expires_at_ms < :now_ms",
+            ExpressionAttributeValues={':now_ms': now_ms}
+        )
+        return owner
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException': return None
+        logger.error(f"DynamoDB lease write error: {e.response['Error']['Code']}. Proceeding without single-flight.")
+    except Exception as e: logger.exception("Unexpected lease write error. Proceeding without single-flight.")
+    return owner
+
+
+def release_search_lease(cache_key: str, owner: str):
+    """Deletes the lease row if this caller still owns it (it may have expired and been taken over)."""
+    try:
+        cache_table.delete_item(Key={'search_key': f"lease:{cache_key}"},
+                                ConditionExpression="lease_owner = :owner",
+                                ExpressionAttributeValues={':owner': owner})
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.warning(f"DynamoDB lease release error: {e.response['Error']['Code']}")
+    except Exception as e: logger.warning(f"Unexpected lease release error: {e}")
+
+
+def wait_for_search_result(cache_key: str, deadline_at: Optional[float] = None) -> tuple:
+    """
+    Polls the cache while another execution holds the lease. Returns (cached, None) once its result lands,
+    (cached or None, owner) once the lease is free again and this caller took it over (None: the holder
+    failed without writing), or (None, None) after SEARCH_LEASE_WAIT_SECONDS, or sooner when less than a
+    poll interval is left before `deadline_at`.
+    """
+    wait_until = time.time() + SEARCH_LEASE_WAIT_SECONDS
+    if deadline_at is not None: wait_until = min(wait_until, deadline_at)
+    while wait_until - time.time() >= SEARCH_LEASE_POLL_SECONDS:
+        time.sleep(SEARCH_LEASE_POLL_SECONDS)
+        cached = read_cached_search(cache_key)
+        if cached: return cached, None
+        owner = acquire_search_lease(cache_key)
+        if owner:
+            logger.info(f"Took over search lease for key {cache_key}.")
+            return read_cached_search(cache_key), owner # The holder may have written and released since the last poll
+    return None, None
+
+
+def fetch_and_cache_search(search_query: str, cache_key: str, normalized_query: str,
+                           row_attributes: Optional[Dict] = None) -> Dict[str, Any]:
+    """Calls Tavily and writes a successful response to both cache tiers."""
+    # --- 4. Call Tavily API ---
+    logger.info("Calling Tavily API...")
+    tavily_api_key = get_secret_value(SECRET_NAME, "TAVILY_API_KEY")
+    if not tavily_api_key:
+         return {"status": "error", "query_used": search_query, "answer": None, "results": [], "error": "API key config error (Tavily)."}
+
+    tavily_response_data = {}
+    error_message = None
+    try:
+        tavily_response_data = call_tavily_search(tavily_api_key, search_query)
+        answer = tavily_response_data.get("answer")
+        results_list = tavily_response_data.get("results", [])
+        logger.info(f"Received {len(results_list)} results from Tavily.")
+        if answer: logger.info("Tavily provided a synthesized answer.")
+        logger.debug(f"Tavily Raw Response Snippet: {str(tavily_response_data)[:500]}...")
+
+    except Exception as e:
+        logger.error(f"Tavily API call failed: {e}", exc_info=True)
+        error_message = f"Tavily API call failed: {str(e)}"
+        # Return error structure consistent with success structure
+        return {"status": "error", "query_used": search_query, "answer": None, "results": [], "error": error_message,
+                "cache_metadata": build_cache_metadata("api")}
+
+    # --- 5. Store Result in Cache ---
+    projected = project_search_response(tavily_response_data) # Same shape as a cache hit
+    row_attributes = {name: value for name, value in (row_attributes or {}).items() if name in REFRESH_ROW_ATTRIBUTES and value}
+    warm_up_group = build_warm_up_group(row_attributes.get("country"), row_attributes.get("category"))
+    ttl_timestamp = int(time.time()) + CACHE_TTL_SECONDS
+    if not error_message and tavily_response_data:
+        try:
+            logger.info(f"Writing Tavily response to cache with TTL: {ttl_timestamp}")
+            cache_record = encode_cache_record(projected) # Projected fields only (format_version 2 unless CACHE_WRITE_FORMAT=json)
+            cache_table.update_item( # Not put_item: a refresh must not overwrite hit_count increments made since the row was read
+                Key={'search_key': cache_key},
+                **build_row_update({
+                    'search_query_text': search_query,
+                    'search_query_normalized': normalized_query,
+                    **cache_record,
+                    **{name: value for name, value in row_attributes.items() if name != "hit_count"},
+                    **({'warm_up_group': warm_up_group} if warm_up_group else {}),
+                    'timestamp': int(time.time()),
+                    'ttl': ttl_timestamp
+                }, remove=[name for name in CACHE_RECORD_ATTRIBUTES if name not in cache_record] + ["refresh_lease_until"])
+            )
+            logger.info(f"Successfully wrote response to cache for key: {cache_key}")
+            if warm_up_group: register_warm_up_group(warm_up_group)
+        except ClientError as e: logger.error(f"DynamoDB cache write error: {e.response['Error']['Code']}", exc_info=True)
+        except Exception as e: logger.exception("Unexpected cache write error.")
+
+    results_output = projected["results"]
+    if not error_message and tavily_response_data:
+        WEB_SEARCH_L1_CACHE.put(cache_key, {**projected, "ttl": ttl_timestamp, "row_attributes": row_attributes})
+        if SEMANTIC_CACHE_ENABLED: SEMANTIC_QUERY_INDEX.add(normalized_query, cache_key)
+
+    # --- 6. Return Tavily Results ---
+    return {
+        "status": "success_api",
+        "query_used": search_query,
+        "answer": tavily_response_data.get("answer"),
+        "results": results_output,
+        "error": None, "cache_metadata": build_cache_metadata("api")
+    }
+
+
+# --- Refresh-Ahead & Warm-Up ---
+# Rows count their hits (hit_count) so refreshes can favour hot keys and a scheduled warm-up can re-fetch
+# the top-N queries per (country, category) before they expire. Refreshes run in a separate async
+# invocation of this function, so the request that triggered one is still served the current value.
+# Counter and registry writes go through a write pool, off the request path.
+_pending_hit_counts: Dict[str, int] = {}
+_refresh_scheduled_until: Dict[str, float] = {} # Avoids re-trying the refresh lease on every L1 hit
+_registered_warm_up_groups = set() # Groups this container already added to the registry row
+_refresh_lock = threading.Lock()
+_hit_write_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="search-hit-write")
+
+
+def build_warm_up_group(country: Optional[str], category: Optional[str]) -> Optional[str]:
+    return f"{country}#{category}" if country and category else None
+
+
+def register_warm_up_group(warm_up_group: str):
+    """Adds a group to the registry row once per container, so the warm-up job knows which index partitions to query."""
+    with _refresh_lock:
+        if warm_up_group in _registered_warm_up_groups: return
+        _registered_warm_up_groups.add(warm_up_group)
+    _hit_write_pool.submit(_write_warm_up_group, warm_up_group)
+
+
+def _write_warm_up_group(warm_up_group: str):
+    try:
+        cache_table.update_item(Key={'search_key': WARM_UP_GROUPS_KEY}, UpdateExpression="ADD warm_up_groups :group",
+                                ExpressionAttributeValues={':group': {warm_up_group}})
+    except ClientError as e:
+        logger.warning(f"DynamoDB warm-up group registry error: {e.response['Error']['Code']}")
+        with _refresh_lock: _registered_warm_up_groups.discard(warm_up_group) # Retried on the next write for the group
+    except Exception as e:
+        logger.warning(f"Unexpected warm-up group registry error: {e}")
+        with _refresh_lock: _registered_warm_up_groups.discard(warm_up_group)
+
+
+def record_search_hit(cache_key: str, flush: bool = False):
+    """
+    Counts a hit; L1 hits are written every SEARCH_HIT_FLUSH_EVERY hits, L2 hits (flush=True) on the next
+    write. Writes run on _hit_write_pool, so a hit never waits for DynamoDB.
+    """
+    with _refresh_lock:
+        pending = _pending_hit_counts.pop(cache_key, 0) + 1
+        if not flush and pending < SEARCH_HIT_FLUSH_EVERY:
+            _pending_hit_counts[cache_key] = pending; return
+    _hit_write_pool.submit(_write_search_hits, cache_key, pending)
+
+
+def _write_search_hits(cache_key: str, hits: int):
+    try:
+        cache_table.update_item(Key={'search_key': cache_key},
+                                UpdateExpression="ADD hit_count :hits SET last_hit_at = :now",
+                                ConditionExpression="attribute_exists(search_key)", # Never resurrect a deleted row
+                                ExpressionAttributeValues={':hits': hits, ':now': int(time.time())})
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.warning(f"DynamoDB hit counter error: {e.response['Error']['Code']}")
+    except Exception as e: logger.warning(f"Unexpected hit counter error: {e}")
+
+
+def should_refresh_ahead(ttl: int, hit_count: int, now: Optional[float] = None) -> bool:
+    """True in the last REFRESH_AHEAD_WINDOW_FRACTION of the TTL (REFRESH_AHEAD_HOT_WINDOW_FRACTION for hot keys)."""
+    remaining = ttl - (now if now is not None else time.time())
+    fraction = REFRESH_AHEAD_HOT_WINDOW_FRACTION if hit_count >= REFRESH_AHEAD_HOT_HIT_COUNT else REFRESH_AHEAD_WINDOW_FRACTION
+    return 0 <= remaining <= CACHE_TTL_SECONDS * fraction
+
+
+def maybe_schedule_refresh(cache_key: str, search_query: str, entry: Dict) -> bool:
+    """Schedules one background refresh per key (row lease) when a hit falls in the refresh-ahead window."""
+    row_attributes = entry.get("row_attributes") or {}
+    if "ttl" not in entry or not should_refresh_ahead(entry["ttl"], int(row_attributes.get("hit_count", 0))): return False
+    now = time.time()
+    with _refresh_lock:
+        if _refresh_scheduled_until.get(cache_key, 0) > now: return False
+        _refresh_scheduled_until[cache_key] = now + REFRESH_LEASE_SECONDS
+    function_name = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+    if not function_name or not lambda_client:
+        logger.warning("Cannot schedule search refresh (no function name or Lambda client)."); return False
+    try: # Only one container wins the lease; the rest keep serving the current value
+        cache_table.update_item(
+            Key={'search_key': cache_key},
+            UpdateExpression="SET refresh_lease_until = :lease",
+            ConditionExpression="attribute_exists(search_key) AND (attribute_not_exists(refresh_lease_until) OR refresh_lease_until < :now)",
+            ExpressionAttributeValues={':lease': int(now) + REFRESH_LEASE_SECONDS, ':now': int(now)}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException': logger.info(f"Refresh already scheduled for key {cache_key}.")
+        else: logger.error(f"Refresh lease error: {e.response['Error']['Code']}", exc_info=True)
+        return False
+    try:
+        lambda_client.invoke(FunctionName=function_name, InvocationType='Event',
+                             Payload=json.dumps({"refresh_search": {"search_query": search_query, "cache_key": cache_key, **row_attributes}}))
+        logger.info(f"Scheduled background refresh for key {cache_key} (ttl {entry['ttl']}).")
+        return True
+    except Exception:
+        logger.exception("Failed to schedule search refresh.")
+        return False
+
+
+def refresh_search(refresh_request: Dict) -> Dict[str, Any]:
+    """Re-fetches one search from Tavily and updates its row in place (hit_count is never written, so no increment is lost)."""
+    search_query = refresh_request.get("search_query")
+    if not search_query: return {"status": "error", "error": "refresh_search requires search_query."}
+    cache_key = refresh_request.get("cache_key") or build_search_cache_key(search_query, normalize=CACHE_KEY_NORMALIZATION_ENABLED)
+    normalized_query = normalize_search_query(search_query) if CACHE_KEY_NORMALIZATION_ENABLED else search_query
+    row_attributes = {name: replace_decimals(refresh_request[name]) for name in REFRESH_ROW_ATTRIBUTES if refresh_request.get(name)}
+    result = fetch_and_cache_search(search_query, cache_key, normalized_query, row_attributes)
+    logger.info(f"Refresh for key {cache_key}: {result['status']}")
+    return {"status": result["status"], "cache_key": cache_key, "error": result.get("error")}
+
+
+def find_top_searches(top_n: int, country: Optional[str] = None, category: Optional[str] = None) -> List[Dict]:
+    """
+    Returns the top_n rows by hit_count per (country, category), optionally filtered: one Query of
+    WARM_UP_INDEX_NAME per group (highest hit_count first, at most top_n items read), never a table Scan.
+    """
+    warm_up_group = build_warm_up_group(country, category)
+    if warm_up_group:
+        groups = [warm_up_group]
+    else:
+        registry = cache_table.get_item(Key={'search_key': WARM_UP_GROUPS_KEY}).get('Item') or {}
+        groups = sorted(group for group in registry.get('warm_up_groups', set())
+                        if (not country or group.split("#", 1)[0] == country) and (not category or group.split("#", 1)[1] == category))
+    top_searches = []
+    for group in groups:
+        page = cache_table.query(IndexName=WARM_UP_INDEX_NAME, KeyConditionExpression=Key('warm_up_group').eq(group),
+                                 ScanIndexForward=False, Limit=top_n,
+                                 ProjectionExpression="search_key, search_query_text, country, category, hit_count, #ttl",
+                                 ExpressionAttributeNames={"#ttl": "ttl"})
+        top_searches.extend(replace_decimals(page.get("Items", [])))
+    return top_searches
+
+
+def warm_up_top_searches(options: Dict) -> Dict[str, Any]:
+    """
+    Scheduled entry point ({"warm_up_searches": {"top_n": 10, "country": ..., "category": ...}}), e.g. from an
+    EventBridge rule: re-fetches the hottest searches whose rows are expired or inside the hot refresh window.
+    """
+    top_n = int(options.get("top_n", WARM_UP_TOP_N)); now = time.time()
+    candidates = find_top_searches(top_n, options.get("country"), options.get("category"))
+    due = [item for item in candidates if item.get("search_query_text") and
+           item.get("ttl", 0) - now <= CACHE_TTL_SECONDS * REFRESH_AHEAD_HOT_WINDOW_FRACTION]
+    def refresh_item(item):
+        return refresh_search({"search_query": item["search_query_text"], "cache_key": item["search_key"],
+                               **{name: item.get(name) for name in REFRESH_ROW_ATTRIBUTES}})
+    with ThreadPoolExecutor(max_workers=max(1, WARM_UP_MAX_WORKERS)) as pool:
+        results = list(pool.map(refresh_item, due))
+    refreshed = sum(1 for result in results if result["status"] == "success_api")
+    logger.info(f"Warm-up: {len(candidates)} top searches, {len(due)} due, {refreshed} refreshed.")
+    return {"status": "success", "candidates": len(candidates), "due": len(due), "refreshed": refreshed,
+            "failed": len(due) - refreshed}
+
+
+# --- Multi-Query Search & Fusion ---
+def formulate_sub_queries(base_query: str, primary_task: str, query_subjects: Dict, original_context: Dict) -> List[str]:
+    """The blended query plus one per comparison subject (or brand-focused queries), deduplicated by cache key."""
+    country = original_context.get("country") or ""
+    category = original_context.get("category") or ""
+    if category.upper() == "COMPARE_CATEGORIES": category = "" # Placeholder, not a real category
+    sub_queries = [base_query]
+    if primary_task == "analyze_brand_deep_dive":
+        brand = query_subjects.get("target_brand")
+        if brand:
+            sub_queries.append(f"{brand} brand news {country}")
+            if category: sub_queries.append(f"{brand} {category} trends {country}")
+    else:
+        subjects = query_subjects.get("comparison_subjects") or query_subjects.get("specific_known") or []
+        for subject in [s.get("subject") for s in subjects if isinstance(s, dict) and s.get("subject")]:
+            scope = category if category and category.lower() not in subject.lower() else ""
+            sub_queries.append(f"{subject} {scope} trends {country}")
+    unique_queries, seen_keys = [], set()
+    for sub_query in (" ".join(q.split())[:1000] for q in sub_queries):
+        cache_key = build_search_cache_key(sub_query, normalize=CACHE_KEY_NORMALIZATION_ENABLED)
+        if sub_query and cache_key not in seen_keys: seen_keys.add(cache_key); unique_queries.append(sub_query)
+    return unique_queries[:MULTI_QUERY_MAX_SUBQUERIES]
+
+
+def canonical_url(url: str) -> str:
+    """Dedup key for a result URL: scheme, 'www.', fragment and trailing slash ignored."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+    return f"{host}{parts.path.rstrip('/')}{'?' + parts.query if parts.query else ''}"
+
+
+def fuse_search_results(responses: List[Dict]) -> List[Dict]:
+    """Reciprocal-rank fusion over the per-query result lists; a URL found by several queries is kept once, ranked higher."""
+    scores: Dict[str, float] = {}; first_seen: Dict[str, Dict] = {}
+    for response in responses:
+        for rank, result in enumerate(response.get("results") or [], start=1):
+            if not isinstance(result, dict): continue
+            key = canonical_url(result["url"]) if result.get("url") else f"title:{result.get('title')}"
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            first_seen.setdefault(key, result)
+    ranked = sorted(scores, key=lambda key: scores[key], reverse=True) # Stable: ties keep first-seen order
+    return [{**first_seen[key], "fusion_score": round(scores[key], 5)} for key in ranked[:MULTI_QUERY_MAX_RESULTS]]
+
+
+def claim_prefetched_search(search_query: str, prefetched: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Result of the orchestrator's speculative search if it was for the same cache key (None otherwise, or if it raised)."""
+    if not prefetched: return None
+    speculative = prefetched.pop(build_search_cache_key(search_query, normalize=CACHE_KEY_NORMALIZATION_ENABLED), None)
+    if speculative is None: return None
+    result = speculative.claim()
+    if result is not None: logger.info(f"Search served by speculative prefetch: {search_query}")
+    return result
+
+
+def multi_query_search(sub_queries: List[str], row_attributes: Optional[Dict] = None,
+                       prefetched: Optional[Dict[str, Any]] = None, deadline_at: Optional[float] = None) -> Dict[str, Any]:
+    """Runs each sub-query through the cache concurrently (bounded) and fuses them into one answer/results payload."""
+    def run_one(sub_query):
+        try: return claim_prefetched_search(sub_query, prefetched) or search_with_cache(sub_query, row_attributes, deadline_at)
+        except Exception as e:
+            logger.exception(f"Sub-query search failed: {sub_query}")
+            return {"status": "error", "query_used": sub_query, "answer": None, "results": [], "error": str(e)}
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, min(MULTI_QUERY_MAX_WORKERS, len(sub_queries)))) as pool:
+        responses = list(pool.map(run_one, sub_queries))
+    succeeded = [r for r in responses if r.get("status") != "error"]
+    sub_query_summary = [{"query": r.get("query_used"), "status": r.get("status"), "results": len(r.get("results") or []),
+                          "tier": (r.get("cache_metadata") or {}).get("tier"), "error": r.get("error")} for r in responses]
+    logger.info(f"Multi-query search: {len(succeeded)}/{len(responses)} sub-queries succeeded in {time.time() - start:.2f}s.")
+    if not succeeded:
+        return {"status": "error", "query_used": sub_queries[0], "answer": None, "results": [], "error": responses[0].get("error"),
+                "sub_queries": sub_query_summary}
+    answers = [(r["query_used"], r["answer"]) for r in succeeded if r.get("answer")]
+    answer = answers[0][1] if len(answers) == 1 else "\n".join(f"[{query}] {text}" for query, text in answers) or None
+    return {"status": "success_multi", "query_used": sub_queries[0], "answer": answer, "results": fuse_search_results(succeeded),
+            "error": None, "sub_queries": sub_query_summary,
+            "cache_metadata": {"tier": "multi", "duration_ms": round((time.time() - start) * 1000, 1)}}
+
+
 # --- Main Lambda Handler ---
-def lambda_handler(event, context):
+def lambda_handler(event, context, prefetched: Optional[Dict[str, Any]] = None):
+    """
+    prefetched: in-process callers only (orchestrator). search cache key -> speculative search exposing claim();
+    the formulated query (or sub-query) with that key reuses it instead of searching. Claimed entries are removed.
+    """
     logger.info(f"Received event: {json.dumps(event)}")
 
     # --- Initial Checks ---
@@ -402,6 +1030,10 @@ def lambda_handler(event, context):
         logger.error(f"Boto3 init failure or DDB unavailable: {BOTO3_CLIENT_ERROR}")
         return {"status": "error", "query_used": None, "answer": None, "results": [], "error": f"Configuration Error: {BOTO3_CLIENT_ERROR}"}
 
+    # --- Background Entry Points (async refresh self-invoke, scheduled warm-up) ---
+    if isinstance(event, dict) and event.get("refresh_search"): return refresh_search(event["refresh_search"])
+    if isinstance(event, dict) and "warm_up_searches" in event: return warm_up_top_searches(event["warm_up_searches"] or {})
+
     # --- 1. Parse Input & Check Requirement ---
     # Define variables with default values BEFORE try block
     interpretation_result = None
@@ -464,81 +1096,11 @@ def lambda_handler(event, context):
         return {"status": "error", "query_used": None, "answer": None, "results": [], "error": "Failed to formulate search query."}
 
 
-    # --- 3. Check Cache ---
-    cache_key = sha256(search_query.encode()).hexdigest()
-    logger.debug(f"Using cache key: {cache_key}")
-    try:
-        response = cache_table.get_item(Key={'search_key': cache_key})
-        item = response.get('Item')
-        if item and 'ttl' in item and item['ttl'] >= int(time.time()):
-            logger.info(f"Cache hit for key: {cache_key}")
-            cached_response_data = json.loads(item.get('tavily_response_json', '{}'), parse_float=Decimal) # Parse numbers as Decimal
-            return {
-                "status": "success_cached", "query_used": search_query,
-                "answer": cached_response_data.get("answer"),
-                "results": replace_decimals(cached_response_data.get("results", [])), # Convert Decimals back for output
-                "error": None
-            }
-        elif item: logger.info(f"Cache expired/TTL missing for key: {cache_key}")
-        else: logger.info(f"Cache miss for key: {cache_key}")
-    except ClientError as e: logger.error(f"DynamoDB cache read error: {e.response['Error']['Code']}", exc_info=True)
-    except Exception as e: logger.exception("Unexpected cache read error.")
-
-
-    # --- 4. Call Tavily API ---
-    logger.info("Calling Tavily API...")
-    tavily_api_key = get_secret_value(SECRET_NAME, "TAVILY_API_KEY")
-    if not tavily_api_key:
-         return {"status": "error", "query_used": search_query, "answer": None, "results": [], "error": "API key config error (Tavily)."}
-
-    tavily_response_data = {}
-    error_message = None
-    try:
-        client = TavilyClient(api_key=tavily_api_key)
-        tavily_response_data = client.search(
-            query=search_query,
-            search_depth="advanced",
-            include_answer="advanced",
-            max_results=5
-            # Removed time_range="month" for broader results initially
-        )
-        answer = tavily_response_data.get("answer")
-        results_list = tavily_response_data.get("results", [])
-        logger.info(f"Received {len(results_list)} results from Tavily.")
-        if answer: logger.info("Tavily provided a synthesized answer.")
-        logger.debug(f"Tavily Raw Response Snippet: {str(tavily_response_data)[:500]}...")
-
-    except Exception as e:
-        logger.error(f"Tavily API call failed: {e}", exc_info=True)
-        error_message = f"Tavily API call failed: {str(e)}"
-        # Return error structure consistent with success structure
-        return {"status": "error", "query_used": search_query, "answer": None, "results": [], "error": error_message}
-
-    # --- 5. Store Result in Cache ---
-    if not error_message and tavily_response_data:
-        try:
-            ttl_timestamp = int(time.time()) + CACHE_TTL_SECONDS
-            logger.info(f"Writing Tavily response to cache with TTL: {ttl_timestamp}")
-            # Store raw Tavily response (which might have floats)
-            cache_table.put_item(
-                Item={
-                    'search_key': cache_key,
-                    'search_query_text': search_query,
-                    'tavily_response_json': json.dumps(tavily_response_data), # Store raw response
-                    'timestamp': int(time.time()),
-                    'ttl': ttl_timestamp
-                }
-            )
-            logger.info(f"Successfully wrote response to cache for key: {cache_key}")
-        except ClientError as e: logger.error(f"DynamoDB cache write error: {e.response['Error']['Code']}", exc_info=True)
-        except Exception as e: logger.exception("Unexpected cache write error.")
-
-    # --- 6. Return Tavily Results ---
-    return {
-        "status": "success_api",
-        "query_used": search_query,
-        "answer": tavily_response_data.get("answer"),
-        # Convert decimals just before returning
-        "results": replace_decimals(tavily_response_data.get("results", [])),
-        "error": None
-    }
\ No newline at end of file
+    row_attributes = {"country": original_context.get("country"), "category": original_context.get("category")}
+    deadline_at = search_deadline_at(original_context)
+    if MULTI_QUERY_SEARCH_ENABLED and primary_task in MULTI_QUERY_TASKS:
+        sub_queries = formulate_sub_queries(search_query, primary_task, query_subjects, original_context)
+        if len(sub_queries) > 1:
+            logger.info(f"Multi-query search with {len(sub_queries)} sub-queries: {sub_queries}")
+            return multi_query_search(sub_queries, row_attributes, prefetched, deadline_at)
+    return claim_prefetched_search(search_query, prefetched) or search_with_cache(search_query, row_attributes, deadline_at)
\ No newline at end of file
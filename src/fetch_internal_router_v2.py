@@ -558,6 +558,21 @@ import re
 from typing import Dict, Optional, List, Any
 import concurrent.futures
 import time
+import asyncio
+import threading
+import gzip
+import hashlib
+from collections import deque
+import blob_store
+from lru_ttl_cache import LRUTTLCache
+
+try:
+    from aiobotocore.session import get_session as get_aiobotocore_session
+    from aiobotocore.config import AioConfig
+    AIOBOTOCORE_AVAILABLE = True
+except ImportError:
+    get_aiobotocore_session = None; AioConfig = None
+    AIOBOTOCORE_AVAILABLE = False
 
 # --- Lambda Names from Environment Variables ---
 TREND_MAIN_LAMBDA_NAME = os.environ.get("TREND_MAIN_LAMBDA_NAME", "trend_analysis_main_page_placeholder")
@@ -565,11 +580,80 @@ MEGA_TRENDS_LAMBDA_NAME = os.environ.get("MEGA_TRENDS_LAMBDA_NAME", "dev_mega_tr
 CHART_DETAILS_LAMBDA_NAME = os.environ.get("CHART_DETAILS_LAMBDA_NAME", "chart_details_lambda_placeholder")
 BRAND_INSIGHT_LAMBDA_NAME = os.environ.get("BRAND_INSIGHT_LAMBDA_NAME", "brand_insight_placeholder")
 AMAZON_RADAR_LAMBDA_NAME = os.environ.get("AMAZON_RADAR_LAMBDA_NAME", "dev_amazon_recommend_placeholder")
+# Optional batch entry point for TREND_MAIN: {"requests": [<TREND_MAIN payload + "id">, ...]} ->
+# {"results": [<TREND_MAIN response>, ...]} in request order. Unset -> one TREND_MAIN invoke per category.
+TREND_MAIN_BATCH_LAMBDA_NAME = os.environ.get("TREND_MAIN_BATCH_LAMBDA_NAME") or None
 AWS_REGION = os.environ.get("AWS_REGION", "us-west-2")
+LAMBDA_ENDPOINT_URL = os.environ.get("LAMBDA_ENDPOINT_URL") or None # Override for a local stub endpoint (benchmarks)
+
+# --- Fan-out Engine ---
+# "thread": a ThreadPoolExecutor per invocation (original path, the fallback).
+# "asyncio": one event loop per container drives every invoke at once with per-task timeouts, merging results
+# as they finish; uses aiobotocore when installed, otherwise the shared boto3 client on a persistent thread pool.
+ROUTER_ENGINE = os.environ.get("ROUTER_ENGINE", "thread").lower()
+if ROUTER_ENGINE not in ("thread", "asyncio"): ROUTER_ENGINE = "thread"
+ROUTER_TASK_TIMEOUT_SECONDS = float(os.environ.get("ROUTER_TASK_TIMEOUT_SECONDS", "25"))
+ROUTER_ASYNC_MAX_CONCURRENCY = int(os.environ.get("ROUTER_ASYNC_MAX_CONCURRENCY", "32")) # Pool size when aiobotocore is absent
+ROUTER_MAX_PARALLEL_INVOKES = int(os.environ.get("ROUTER_MAX_PARALLEL_INVOKES", "10")) # Tasks in flight per request, either engine
+
+# --- Deadlines ---
+# The proxy stamps original_context.deadline_ms (epoch ms). The router keeps ROUTER_SYNTHESIS_RESERVE_SECONDS of it for
+# the synthesis step; each task gets min(its Lambda's cap, what is left). Late tasks are abandoned and recorded in errors.
+ROUTER_SYNTHESIS_RESERVE_SECONDS = float(os.environ.get("ROUTER_SYNTHESIS_RESERVE_SECONDS", "8"))
+ROUTER_TASK_TIMEOUTS: Dict[str, float] = {} # Per-Lambda caps, e.g. {"chart_details_lambda": 6}; default ROUTER_TASK_TIMEOUT_SECONDS
+try:
+    ROUTER_TASK_TIMEOUTS.update({k: float(v) for k, v in json.loads(os.environ.get("ROUTER_TASK_TIMEOUTS", "{}")).items()})
+except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+    logging.warning("Ignoring invalid ROUTER_TASK_TIMEOUTS value.")
+
+# --- Hedged Requests ---
+# A duplicate invoke is sent when the first has not answered after the Lambda's recent p95 latency; the first
+# response wins. Downstream Lambdas are read-only, so duplicates are safe; they add ~5% load.
+HEDGED_REQUESTS_ENABLED = os.environ.get("HEDGED_REQUESTS_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20")) # Below this, HEDGE_DEFAULT_DELAY_SECONDS is used
+HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get("HEDGE_DEFAULT_DELAY_SECONDS", "2.0"))
+HEDGE_MIN_DELAY_SECONDS = 0.05
+LATENCY_WINDOW = 200 # Recent successful latencies kept per Lambda
+
+# --- Result Cache ---
+# The trend Lambdas serve batch-built data (daily/weekly), so their decoded bodies are cached per (Lambda, payload):
+# L1 in-process, L2 in ROUTER_CACHE_TABLE_NAME (unset = L1 only). Keys carry the Lambda's data version, a
+# 'data_version:<lambda name>' row the upstream pipelines bump after publishing ({"bump_data_version": [...]}).
+ROUTER_CACHE_ENABLED = os.environ.get("ROUTER_CACHE_ENABLED", "true").lower() == "true"
+ROUTER_CACHE_TABLE_NAME = os.environ.get("ROUTER_CACHE_TABLE_NAME")
+ROUTER_CACHE_TTL_SECONDS = int(os.environ.get("ROUTER_CACHE_TTL_SECONDS", 6 * 60 * 60)) # Backstop for a missed bump
+ROUTER_L1_CACHE_MAX_ENTRIES = int(os.environ.get("ROUTER_L1_CACHE_MAX_ENTRIES", 256))
+ROUTER_CACHE_VERSION_REFRESH_SECONDS = float(os.environ.get("ROUTER_CACHE_VERSION_REFRESH_SECONDS", 60)) # Bump visible within this
+ROUTER_CACHE_MAX_ITEM_BYTES = 350 * 1024 # DynamoDB items are capped at 400 KB
+ROUTER_CACHEABLE_LAMBDAS = {TREND_MAIN_LAMBDA_NAME, MEGA_TRENDS_LAMBDA_NAME, CHART_DETAILS_LAMBDA_NAME, AMAZON_RADAR_LAMBDA_NAME}
+
+# --- Payload Projection ---
+# Downstream bodies are cut to what generate_final_response_v2 reads (format_data_for_prompt and
+# build_final_payload_for_bubble) before they enter aggregated_results: top-level "keys", and per list the top
+# "limit" rows by "sort_by" (None = keep downstream order) with only "fields". Keeps the Step Functions state
+# (256 KB limit, re-serialized every hop) small. Lambdas in PROJECTION_PUSHDOWN_LAMBDAS also get the spec as
+# "fields"/"limit" query parameters so they can skip the rows themselves; the router projects either way.
+PAYLOAD_PROJECTION_ENABLED = os.environ.get("PAYLOAD_PROJECTION_ENABLED", "true").lower() == "true"
+PROJECTION_PUSHDOWN_LAMBDAS = {name.strip() for name in os.environ.get("PROJECTION_PUSHDOWN_LAMBDAS", "").split(",") if name.strip()}
+PROJECTION_SPECS: Dict[str, Dict[str, Any]] = {
+    TREND_MAIN_LAMBDA_NAME: {"keys": ("country_category", "country_category_style", "country_color_category"), "lists": {
+        "country_category_style": {"fields": ("style_name", "growth_recent", "average_volume"), "limit": 5, "sort_by": "average_volume"},
+        "country_color_category": {"fields": ("color_name", "growth_recent", "average_volume"), "limit": 5, "sort_by": "average_volume"}}},
+    MEGA_TRENDS_LAMBDA_NAME: {"keys": ("query_category",), "lists": {
+        "query_category": {"fields": ("query_name", "category_name", "growth_recent", "average_volume"), "limit": 10, "sort_by": "growth_recent"}}},
+    CHART_DETAILS_LAMBDA_NAME: {"keys": ("category_subject", "average_volume", "growth_recent", "chart_data",
+                                         "f2", "f3", "f6", "avg2", "avg3", "avg6"), "lists": {}},
+    AMAZON_RADAR_LAMBDA_NAME: {"keys": ("country_department_category", "category_dep_market_size"), "lists": {
+        "country_department_category": {"fields": ("asin", "product_url", "product_photo", "product_price", "currency", "estimated_revenue",
+                                                   "estimated_orders", "number_of_reviews", "product_star_rating", "saturation"),
+                                        "limit": 10, "sort_by": None}}}, # Downstream order is by revenue
+}
 
 # --- NEW: Constant for the comparison task name from Interpreter ---
 # Ensure this matches the constant in interpret_query_v2.py
 COMPARE_CATEGORIES_TASK_NAME = "compare_categories_task"
+MAX_COMPARISON_CATEGORIES = int(os.environ.get("MAX_COMPARISON_CATEGORIES", "10")) # Keep in sync with interpret_query_v2.py
 # --- END NEW ---
 
 # --- Logger Setup ---
@@ -582,20 +666,48 @@ logger.info(f"Logger initialized with level: {log_level_str}")
 logger.info(
     f"Target Lambdas - TrendMain: {TREND_MAIN_LAMBDA_NAME}, MegaTrends: {MEGA_TRENDS_LAMBDA_NAME}, "
     f"ChartDetails: {CHART_DETAILS_LAMBDA_NAME}, BrandInsight: {BRAND_INSIGHT_LAMBDA_NAME}, "
-    f"AmazonRadar: {AMAZON_RADAR_LAMBDA_NAME}"
+    f"AmazonRadar: {AMAZON_RADAR_LAMBDA_NAME}, TrendMainBatch: {TREND_MAIN_BATCH_LAMBDA_NAME}"
 )
+logger.info(f"Fan-out engine: {ROUTER_ENGINE} (aiobotocore available: {AIOBOTOCORE_AVAILABLE})")
+logger.info(f"Result cache enabled: {ROUTER_CACHE_ENABLED}, ROUTER_CACHE_TABLE_NAME: {ROUTER_CACHE_TABLE_NAME}")
+logger.info(f"Payload projection enabled: {PAYLOAD_PROJECTION_ENABLED}, pushed down to: {sorted(PROJECTION_PUSHDOWN_LAMBDAS)}")
 
 # --- Boto3 Client ---
 lambda_client = None
+router_cache_table = None
 BOTO3_CLIENT_ERROR = None
 try:
     session = boto3.session.Session()
-    boto_config = boto3.session.Config(max_pool_connections=50)
-    lambda_client = session.client(service_name='lambda', region_name=AWS_REGION, config=boto_config)
+    # Abandoned calls must not hang for botocore's default 60s read timeout x retries
+    boto_config = boto3.session.Config(max_pool_connections=50, connect_timeout=5, read_timeout=ROUTER_TASK_TIMEOUT_SECONDS,
+                                       retries={"mode": "standard", "total_max_attempts": 2})
+    lambda_client = session.client(service_name='lambda', region_name=AWS_REGION, config=boto_config,
+                                   endpoint_url=LAMBDA_ENDPOINT_URL)
+    if ROUTER_CACHE_ENABLED and ROUTER_CACHE_TABLE_NAME:
+        router_cache_table = session.resource('dynamodb', region_name=AWS_REGION).Table(ROUTER_CACHE_TABLE_NAME)
 except Exception as e:
     logger.exception("CRITICAL ERROR initializing Boto3 Lambda client!")
     BOTO3_CLIENT_ERROR = f"Failed to initialize Boto3 client: {e}"
 
+# --- asyncio Engine State (lives for the container) ---
+_async_loop = None
+_async_loop_lock = threading.Lock()
+_aio_lambda_client = None; _aio_lambda_client_context = None
+_async_invoke_pool = concurrent.futures.ThreadPoolExecutor(max_workers=ROUTER_ASYNC_MAX_CONCURRENCY, thread_name_prefix="router-invoke")
+_hedge_pool = concurrent.futures.ThreadPoolExecutor(max_workers=ROUTER_ASYNC_MAX_CONCURRENCY, thread_name_prefix="router-hedge")
+
+# --- Latency Tracking (hedge delays) ---
+_latency_samples: Dict[str, deque] = {}
+_latency_lock = threading.Lock()
+HEDGE_STATS = {"hedged": 0, "hedge_won": 0}
+
+# --- Result Cache State ---
+ROUTER_L1_CACHE = LRUTTLCache(max_entries=ROUTER_L1_CACHE_MAX_ENTRIES, ttl_seconds=ROUTER_CACHE_TTL_SECONDS)
+ROUTER_CACHE_STATS = {"l1_hits": 0, "l2_hits": 0, "misses": 0}
+_data_versions: Dict[str, tuple] = {} # lambda name -> (version, read_at)
+_cache_stats_lock = threading.Lock()
+_cache_write_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="router-cache-write")
+
 
 # --- Helper Functions (map_timeframe_reference, safe_title_case - unchanged) ---
 def map_timeframe_reference(timeframe_ref_str: str | None) -> str:
@@ -621,28 +733,63 @@ def safe_title_case(input_string: str) -> str:
     return input_string.title() if isinstance(input_string, str) else ""
 
 
+def trend_main_payload(country: str, category: str, time_frame: str) -> Dict:
+    return {"queryStringParameters": {"country": country, "category": category, "time_frame": time_frame}}
+
+
+# --- Payload Projection ---
+def downstream_payload(lambda_name: str, payload: Dict) -> Dict:
+    """The payload as sent: for PROJECTION_PUSHDOWN_LAMBDAS, with the projection spec as 'fields'/'limit' query parameters."""
+    spec = PROJECTION_SPECS.get(lambda_name)
+    if not PAYLOAD_PROJECTION_ENABLED or lambda_name not in PROJECTION_PUSHDOWN_LAMBDAS or not spec or "queryStringParameters" not in payload:
+        return payload
+    fields = sorted({field for list_spec in spec["lists"].values() for field in list_spec["fields"]} | set(spec["keys"]))
+    limit = max((list_spec["limit"] for list_spec in spec["lists"].values()), default=None)
+    params = {**payload["queryStringParameters"], "fields": ",".join(fields)}
+    if limit: params["limit"] = str(limit)
+    return {**payload, "queryStringParameters": params}
+
+
+def numeric_sort_key(field: str):
+    return lambda row: row.get(field) if isinstance(row.get(field), (int, float)) else float('-inf')
+
+
+def project_body(lambda_name: str, data: Any) -> Any:
+    """A new, smaller body with only what the generator reads (data itself may be a shared cache entry; it is not modified)."""
+    spec = PROJECTION_SPECS.get(lambda_name)
+    if not PAYLOAD_PROJECTION_ENABLED or not spec or not isinstance(data, dict): return data
+    projected = {key: data[key] for key in spec["keys"] if key in data}
+    for list_key, list_spec in spec["lists"].items():
+        rows = projected.get(list_key)
+        if not isinstance(rows, list): continue
+        rows = [row for row in rows if isinstance(row, dict)]
+        if list_spec["sort_by"]: rows = sorted(rows, key=numeric_sort_key(list_spec["sort_by"]), reverse=True)
+        projected[list_key] = [{field: row[field] for field in list_spec["fields"] if field in row} for row in rows[:list_spec["limit"]]]
+    return projected
+
+
+def lambda_for_task(task_id: str) -> Optional[str]:
+    if task_id.startswith("trends_"): return TREND_MAIN_LAMBDA_NAME
+    return {"mega": MEGA_TRENDS_LAMBDA_NAME, "charts": CHART_DETAILS_LAMBDA_NAME, "brand_perf": BRAND_INSIGHT_LAMBDA_NAME,
+            "amazon": AMAZON_RADAR_LAMBDA_NAME}.get(task_id)
+
+
 # --- Helper for parallel invocation (unchanged, but task_id usage will be important) ---
-def invoke_lambda_task(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None) -> Dict:
-    # subject_name here is more for chart/item specific things,
-    # for category comparison, the task_id itself will be made unique
-    logger.info(
-        f"Starting task '{task_id}' to invoke {lambda_name} for subject: {subject_name if subject_name else 'N/A'}")
-    start_time = time.time()
-    response_body_outer = None
-    response_body_inner = None
-    # --- NEW: Add category_compared to result if applicable ---
+def new_task_result(task_id: str) -> Dict:
     result = {"task_id": task_id, "data": None, "error_info": None}
+    # --- NEW: Add category_compared to result if applicable ---
     if task_id.startswith("trends_compare_"):
         result["category_compared"] = task_id.split("trends_compare_", 1)[1]
     # --- END NEW ---
+    return result
+
 
+def parse_invoke_response(lambda_name: str, task_id: str, response_payload: bytes, function_error: Optional[str],
+                          result: Dict) -> Dict:
+    """Fills result['data'] or result['error_info'] from a RequestResponse invoke's raw payload (shared by both engines)."""
+    response_body_outer = None
     try:
-        response = lambda_client.invoke(FunctionName=lambda_name, InvocationType='RequestResponse',
-                                        Payload=json.dumps(payload))
-        invocation_duration = time.time() - start_time
-        logger.info(f"Raw invoke for {lambda_name} (task '{task_id}') took {invocation_duration:.3f}s")
-        response_payload = response['Payload'].read()
-        if response.get('FunctionError'):
+        if function_error:
             error_payload_str = response_payload.decode('utf-8');
             logger.error(f"FunctionError from {lambda_name} (task '{task_id}'): {error_payload_str[:500]}...")
             try:
@@ -651,17 +798,31 @@ def invoke_lambda_task(lambda_name: str, payload: Dict, task_id: str, subject_na
                 error_details = {"raw_error": error_payload_str}
             error_msg = f"FunctionError in {lambda_name}: {error_details.get('errorMessage', 'Unknown')}"
             result["error_info"] = {"source": lambda_name, "error": error_msg, "details": error_details}
-            if subject_name: result["error_info"]["subject"] = subject_name
         else:
             response_body_outer = response_payload.decode('utf-8')
-            outer_payload = json.loads(response_body_outer)
+            parse_response_object(lambda_name, task_id, json.loads(response_body_outer), result)
+    except json.JSONDecodeError as e:
+        error_msg = f"Failed to parse JSON response from {lambda_name}: {e}";
+        logger.error(error_msg + f" (task '{task_id}')", exc_info=True);
+        result["error_info"] = {"source": lambda_name, "error": error_msg, "raw_payload": response_body_outer or 'N/A'}
+    return result
+
+
+def parse_response_object(lambda_name: str, task_id: str, outer_payload: Any, result: Dict) -> Dict:
+    """Fills result from a decoded {"statusCode", "body"} response: a single invoke's payload or one entry of a batch."""
+    response_body_inner = None
+    try:
+        if not isinstance(outer_payload, dict):
+            error_msg = f"Response from {lambda_name} is not a JSON object.";
+            logger.error(error_msg + f" (task '{task_id}')")
+            result["error_info"] = {"source": lambda_name, "error": error_msg, "details": outer_payload}
+        else:
             status_code = outer_payload.get("statusCode", 200)
             if status_code >= 300:
                 error_msg = f"Downstream lambda {lambda_name} returned error status code: {status_code}";
                 logger.error(error_msg + f" (task '{task_id}')")
                 result["error_info"] = {"source": lambda_name, "error": error_msg,
                                         "details": outer_payload.get("body", outer_payload)}
-                if subject_name: result["error_info"]["subject"] = subject_name
             elif isinstance(outer_payload.get("body"), str):
                 response_body_inner = outer_payload["body"]
                 inner_result_payload = json.loads(response_body_inner)
@@ -678,31 +839,494 @@ def invoke_lambda_task(lambda_name: str, payload: Dict, task_id: str, subject_na
                 error_msg = f"Response from {lambda_name} missing or invalid 'body' field, and outer payload is empty/invalid.";
                 logger.error(error_msg + f" (task '{task_id}')")
                 result["error_info"] = {"source": lambda_name, "error": error_msg, "details": outer_payload}
-                if subject_name: result["error_info"]["subject"] = subject_name
-    except ClientError as e:
-        error_msg = f"Boto3 ClientError invoking {lambda_name}: {e.response['Error']['Code']}";
-        logger.error(error_msg + f" (task '{task_id}')", exc_info=True)
-        result["error_info"] = {"source": lambda_name, "error": error_msg};
-        if subject_name: result["error_info"]["subject"] = subject_name
     except json.JSONDecodeError as e:
         error_msg = f"Failed to parse JSON response from {lambda_name}: {e}";
-        raw_payload_to_log = response_body_inner if response_body_inner else (
-            response_body_outer if response_body_outer else 'N/A')
         logger.error(error_msg + f" (task '{task_id}')", exc_info=True);
-        result["error_info"] = {"source": lambda_name, "error": error_msg, "raw_payload": raw_payload_to_log}
-        if subject_name: result["error_info"]["subject"] = subject_name
-    except Exception as e:
+        result["error_info"] = {"source": lambda_name, "error": error_msg, "raw_payload": response_body_inner or 'N/A'}
+    return result
+
+
+def record_invoke_exception(e: Exception, lambda_name: str, task_id: str, result: Dict) -> None:
+    if isinstance(e, ClientError):
+        error_msg = f"Boto3 ClientError invoking {lambda_name}: {e.response['Error']['Code']}";
+        logger.error(error_msg + f" (task '{task_id}')", exc_info=True)
+    else:
         error_msg = f"Unexpected error during {lambda_name} processing (task '{task_id}'): {str(e)}";
         logger.exception(error_msg)
-        result["error_info"] = {"source": lambda_name, "error": error_msg}
-        if subject_name: result["error_info"]["subject"] = subject_name
-    end_time = time.time()
+    result["error_info"] = {"source": lambda_name, "error": error_msg}
+
+
+# --- Budgets, Timeouts & Hedge Delays ---
+def record_latency(lambda_name: str, seconds: float) -> None:
+    with _latency_lock:
+        _latency_samples.setdefault(lambda_name, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+
+def hedge_delay_seconds(lambda_name: str) -> float:
+    """HEDGE_PERCENTILE of this Lambda's recent successful latencies (HEDGE_DEFAULT_DELAY_SECONDS until enough samples)."""
+    with _latency_lock:
+        samples = sorted(_latency_samples.get(lambda_name, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES: return HEDGE_DEFAULT_DELAY_SECONDS
+    return max(HEDGE_MIN_DELAY_SECONDS, samples[min(len(samples) - 1, int(HEDGE_PERCENTILE * len(samples)))])
+
+
+def task_budget_seconds(lambda_name: str, deadline_at: Optional[float]) -> float:
+    budget = ROUTER_TASK_TIMEOUTS.get(lambda_name, ROUTER_TASK_TIMEOUT_SECONDS)
+    if deadline_at is not None: budget = min(budget, deadline_at - time.time())
+    return max(budget, 0.0)
+
+
+def timeout_task_result(task_id: str, lambda_name: str, subject_name: Optional[str], budget_seconds: float) -> Dict:
+    logger.error(f"Task '{task_id}' for {lambda_name} abandoned: no response within its {budget_seconds:.2f}s budget")
+    result = new_task_result(task_id)
+    result["error_info"] = {"source": lambda_name, "error": f"Deadline exceeded: no response within {budget_seconds:.2f}s",
+                            "timeout": True}
+    if subject_name: result["error_info"]["subject"] = subject_name
+    return result
+
+
+def finish_task(result: Dict, lambda_name: str, task_id: str, subject_name: Optional[str], start_time: float) -> Dict:
+    if result["error_info"] and subject_name: result["error_info"]["subject"] = subject_name
+    if result["error_info"] is None: record_latency(lambda_name, time.time() - start_time)
+    logger.info(
+        f"Finished task '{task_id}' for {lambda_name} in {time.time() - start_time:.3f}s. Success: {result['error_info'] is None}")
+    return result
+
+
+def invoke_lambda_task(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None) -> Dict:
+    # subject_name here is more for chart/item specific things,
+    # for category comparison, the task_id itself will be made unique
+    logger.info(
+        f"Starting task '{task_id}' to invoke {lambda_name} for subject: {subject_name if subject_name else 'N/A'}")
+    start_time = time.time()
+    result = new_task_result(task_id)
+    try:
+        response = lambda_client.invoke(FunctionName=lambda_name, InvocationType='RequestResponse',
+                                        Payload=json.dumps(downstream_payload(lambda_name, payload)))
+        invocation_duration = time.time() - start_time
+        logger.info(f"Raw invoke for {lambda_name} (task '{task_id}') took {invocation_duration:.3f}s")
+        parse_invoke_response(lambda_name, task_id, response['Payload'].read(), response.get('FunctionError'), result)
+    except Exception as e:
+        record_invoke_exception(e, lambda_name, task_id, result)
+    return finish_task(result, lambda_name, task_id, subject_name, start_time)
+
+
+def invoke_lambda_task_hedged(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None,
+                              budget_seconds: Optional[float] = None) -> Dict:
+    """
+    invoke_lambda_task plus, when enabled, a duplicate invoke once the first has been outstanding for the hedge
+    delay; returns whichever response comes first. The caller enforces the budget; the slower call is left to finish.
+    """
+    delay = hedge_delay_seconds(lambda_name)
+    if not HEDGED_REQUESTS_ENABLED or (budget_seconds is not None and delay >= budget_seconds):
+        return invoke_lambda_task(lambda_name, payload, task_id, subject_name)
+    primary = _hedge_pool.submit(invoke_lambda_task, lambda_name, payload, task_id, subject_name)
+    try:
+        return primary.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    logger.info(f"Hedging task '{task_id}' ({lambda_name}): no response after {delay:.3f}s")
+    hedge = _hedge_pool.submit(invoke_lambda_task, lambda_name, payload, task_id, subject_name)
+    done, _ = concurrent.futures.wait([primary, hedge], return_when=concurrent.futures.FIRST_COMPLETED)
+    winner = hedge if hedge in done and primary not in done else primary
+    with _latency_lock:
+        HEDGE_STATS["hedged"] += 1; HEDGE_STATS["hedge_won"] += int(winner is hedge)
+    return winner.result()
+
+
+# --- Result Cache ---
+def is_cacheable(lambda_name: str) -> bool:
+    return ROUTER_CACHE_ENABLED and lambda_name in ROUTER_CACHEABLE_LAMBDAS
+
+
+def data_version(lambda_name: str) -> int:
+    """The Lambda's current data version, re-read from the cache table at most every ROUTER_CACHE_VERSION_REFRESH_SECONDS."""
+    if router_cache_table is None: return 0
+    known = _data_versions.get(lambda_name)
+    if known and time.time() - known[1] < ROUTER_CACHE_VERSION_REFRESH_SECONDS: return known[0]
+    version = known[0] if known else 0 # Kept on a read error; retried after the refresh interval
+    try:
+        item = router_cache_table.get_item(Key={'cache_key': f"data_version:{lambda_name}"}).get('Item')
+        version = int(item['version']) if item and 'version' in item else 0
+    except ClientError as e: logger.error(f"Data version read error for {lambda_name}: {e.response['Error']['Code']}")
+    except Exception: logger.exception(f"Unexpected data version read error for {lambda_name}.")
+    _data_versions[lambda_name] = (version, time.time())
+    return version
+
+
+def result_cache_key(lambda_name: str, payload: Dict) -> str:
+    digest = hashlib.sha256(task_key(lambda_name, downstream_payload(lambda_name, payload)).encode("utf-8")).hexdigest() # Spec changes miss
+    return f"{lambda_name}:v{data_version(lambda_name)}:{digest}"
+
+
+def count_cache_event(name: str) -> None:
+    with _cache_stats_lock:
+        ROUTER_CACHE_STATS[name] += 1
+
+
+def lookup_cached_result(lambda_name: str, payload: Dict) -> tuple:
+    """(cache_key, decoded body or None): L1, then the cache table (promoting hits to L1)."""
+    cache_key = result_cache_key(lambda_name, payload)
+    data = ROUTER_L1_CACHE.get(cache_key)
+    if data is not None:
+        count_cache_event("l1_hits"); return cache_key, data
+    if router_cache_table is not None:
+        try:
+            item = router_cache_table.get_item(Key={'cache_key': cache_key}).get('Item')
+            if item and int(item.get('ttl', 0)) >= int(time.time()):
+                payload_bin = item['data_bin']
+                payload_bin = getattr(payload_bin, 'value', payload_bin) # boto3 returns Binary attributes wrapped
+                data = json.loads(gzip.decompress(bytes(payload_bin)).decode("utf-8"))
+                ROUTER_L1_CACHE.put(cache_key, data, expires_at=int(item['ttl'])) # Never outlive the row
+                count_cache_event("l2_hits"); return cache_key, data
+        except ClientError as e: logger.error(f"Result cache read error: {e.response['Error']['Code']}", exc_info=True)
+        except Exception: logger.exception("Unexpected result cache read error.")
+    count_cache_event("misses")
+    return cache_key, None
+
+
+def write_cached_result_l2(cache_key: str, lambda_name: str, data: Any, ttl: int) -> None:
+    try:
+        payload_bin = gzip.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), mtime=0)
+        if len(payload_bin) > ROUTER_CACHE_MAX_ITEM_BYTES:
+            logger.warning(f"Not caching {lambda_name} result in DynamoDB: {len(payload_bin)} bytes compressed."); return
+        router_cache_table.put_item(Item={'cache_key': cache_key, 'lambda_name': lambda_name, 'data_bin': payload_bin,
+                                          'cached_at': int(time.time()), 'ttl': ttl}) # DynamoDB TTL attribute
+    except ClientError as e: logger.error(f"Result cache write error: {e.response['Error']['Code']}", exc_info=True)
+    except Exception: logger.exception("Unexpected result cache write error.")
+
+
+def write_cached_result(cache_key: str, lambda_name: str, data: Any) -> None:
+    """Stores a decoded body in L1 now and in the cache table in the background (off the task's critical path)."""
+    ttl = int(time.time()) + ROUTER_CACHE_TTL_SECONDS
+    ROUTER_L1_CACHE.put(cache_key, data, expires_at=ttl)
+    if router_cache_table is not None: _cache_write_pool.submit(write_cached_result_l2, cache_key, lambda_name, data, ttl)
+
+
+def cached_task_result(task_id: str, lambda_name: str, data: Any) -> Dict:
+    logger.info(f"Task '{task_id}' served from the result cache ({lambda_name}).")
+    result = new_task_result(task_id)
+    result["data"] = data # Shared with L1: read-only
+    return result
+
+
+def invoke_lambda_task_cached(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None,
+                              budget_seconds: Optional[float] = None) -> Dict:
+    """invoke_lambda_task_hedged behind the result cache for ROUTER_CACHEABLE_LAMBDAS; only successful results are stored."""
+    if lambda_name == TREND_MAIN_BATCH_LAMBDA_NAME: return invoke_trend_main_batch(lambda_name, payload, task_id, subject_name, budget_seconds)
+    if not is_cacheable(lambda_name): return invoke_lambda_task_hedged(lambda_name, payload, task_id, subject_name, budget_seconds)
+    cache_key, data = lookup_cached_result(lambda_name, payload)
+    if data is not None: return cached_task_result(task_id, lambda_name, data)
+    result = invoke_lambda_task_hedged(lambda_name, payload, task_id, subject_name, budget_seconds)
+    if result["error_info"] is None and result["data"] is not None: write_cached_result(cache_key, lambda_name, result["data"])
+    return result
+
+
+# --- TREND_MAIN Batches (N-way comparisons) ---
+def trend_main_batch_task(single_tasks: List) -> tuple:
+    """One task for the batch entry point standing in for several TREND_MAIN tasks; each request carries its task id."""
+    requests = [{"id": task_id, **downstream_payload(TREND_MAIN_LAMBDA_NAME, payload)} for task_id, _, payload, _ in single_tasks]
+    return ("trends_compare_batch", TREND_MAIN_BATCH_LAMBDA_NAME, {"requests": requests}, None)
+
+
+def invoke_trend_main_batch(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None,
+                            budget_seconds: Optional[float] = None) -> Dict:
+    """
+    Runs a trend_main_batch_task: requests found in the result cache are answered from it, the rest go to the batch
+    entry point in one invoke. Returns {"task_id", "batch_results": [one TREND_MAIN task result per request]}.
+    """
+    batch_results, uncached = [], []
+    for request in payload["requests"]:
+        single_payload = {key: value for key, value in request.items() if key != "id"}
+        cache_key, data = lookup_cached_result(TREND_MAIN_LAMBDA_NAME, single_payload) if is_cacheable(TREND_MAIN_LAMBDA_NAME) else (None, None)
+        if data is not None: batch_results.append(cached_task_result(request["id"], TREND_MAIN_LAMBDA_NAME, data))
+        else: uncached.append((request, cache_key))
+    if uncached:
+        logger.info(f"Batch task '{task_id}': {len(uncached)} of {len(payload['requests'])} requests go to {lambda_name}.")
+        batch = invoke_lambda_task_hedged(lambda_name, {"requests": [request for request, _ in uncached]}, task_id, None, budget_seconds)
+        responses = batch["data"].get("results") if isinstance(batch["data"], dict) else None
+        for index, (request, cache_key) in enumerate(uncached):
+            result = new_task_result(request["id"])
+            category = request.get("queryStringParameters", {}).get("category")
+            if batch["error_info"]:
+                result["error_info"] = {**batch["error_info"], "subject": category}
+            elif not isinstance(responses, list) or index >= len(responses):
+                logger.error(f"Batch response from {lambda_name} has no result for request '{request['id']}'.")
+                result["error_info"] = {"source": lambda_name, "error": "Batch response missing this request's result", "subject": category}
+            else:
+                parse_response_object(TREND_MAIN_LAMBDA_NAME, request["id"], responses[index], result)
+                if result["error_info"]: result["error_info"]["subject"] = category
+                elif result["data"] is not None and cache_key: write_cached_result(cache_key, TREND_MAIN_LAMBDA_NAME, result["data"])
+            batch_results.append(result)
+    return {"task_id": task_id, "data": None, "error_info": None, "batch_results": batch_results}
+
+
+def bump_data_version(lambda_names: List[str]) -> Dict[str, Any]:
+    """
+    Entry point for the upstream batch pipelines ({"bump_data_version": ["<lambda name>", ...]}; empty = all cacheable
+    Lambdas), called after they publish: moves each Lambda's cache keys to a new version. Other containers pick the
+    new version up within ROUTER_CACHE_VERSION_REFRESH_SECONDS; superseded rows expire through the DynamoDB TTL.
+    """
+    if router_cache_table is None:
+        return {"status": "error", "versions": {}, "errors": ["ROUTER_CACHE_TABLE_NAME is not configured."]}
+    versions, errors = {}, []
+    for lambda_name in lambda_names or sorted(ROUTER_CACHEABLE_LAMBDAS):
+        try:
+            response = router_cache_table.update_item(
+                Key={'cache_key': f"data_version:{lambda_name}"},
+                UpdateExpression="ADD version :one SET updated_at = :now",
+                ExpressionAttributeValues={':one': 1, ':now': int(time.time())},
+                ReturnValues="UPDATED_NEW")
+            versions[lambda_name] = int(response['Attributes']['version'])
+            _data_versions[lambda_name] = (versions[lambda_name], time.time())
+            logger.info(f"Data version for {lambda_name} bumped to {versions[lambda_name]}.")
+        except ClientError as e:
+            errors.append(f"{lambda_name}: {e.response['Error']['Code']}"); logger.error(f"Data version bump failed for {lambda_name}: {e}")
+    return {"status": "success" if not errors else "partial", "versions": versions, "errors": errors}
+
+
+def run_tasks_threaded(tasks_to_submit: List, aggregated_results: Dict, prefetched: Optional[Dict[str, Any]] = None,
+                       deadline_at: Optional[float] = None) -> None:
+    """
+    Thread engine: a pool per invocation, results merged as tasks complete. A task past its budget is abandoned
+    (its worker finishes in the background, bounded by the client's read timeout) and recorded as a timeout.
+    """
+    # Consider adjusting max_workers if many parallel calls are expected for comparisons
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=ROUTER_MAX_PARALLEL_INVOKES)
+    pending = {} # future -> (task_id, lambda_name, subject_name, due_at, budget)
+    try:
+        for task_id, lambda_name, payload, subject_name_for_task in tasks_to_submit:
+            budget = task_budget_seconds(lambda_name, deadline_at)
+            if budget <= 0:
+                apply_task_result(aggregated_results, timeout_task_result(task_id, lambda_name, subject_name_for_task, 0.0))
+                continue
+            speculative = prefetched.pop(task_key(lambda_name, payload), None) if prefetched else None
+            if speculative:
+                future = executor.submit(claim_prefetched_task, speculative, lambda_name, payload, task_id, subject_name_for_task)
+            else:
+                logger.info(f"Submitting task '{task_id}' for {lambda_name} with payload: {json.dumps(payload)}")
+                future = executor.submit(invoke_lambda_task_cached, lambda_name, payload, task_id, subject_name_for_task, budget)
+            pending[future] = (task_id, lambda_name, subject_name_for_task, time.time() + budget, budget)
+
+        while pending:
+            next_due = min(entry[3] for entry in pending.values())
+            done, _ = concurrent.futures.wait(pending, timeout=max(0.0, next_due - time.time()),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                try:
+                    apply_task_result(aggregated_results, future.result())
+                except Exception as e:
+                    logger.exception(f"Error retrieving result from future: {e}");
+                    aggregated_results["errors"].append(
+                        {"source": "ThreadPoolExecutor", "error": f"Failed to get task result: {str(e)}"})
+            now = time.time()
+            for future, (task_id, lambda_name, subject_name, due_at, budget) in list(pending.items()):
+                if due_at <= now:
+                    pending.pop(future); future.cancel()
+                    apply_task_result(aggregated_results, timeout_task_result(task_id, lambda_name, subject_name, budget))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- asyncio Engine ---
+async def _get_aio_lambda_client():
+    """aiobotocore client opened once on the container's event loop and kept for its connection pool."""
+    global _aio_lambda_client, _aio_lambda_client_context
+    if _aio_lambda_client is None:
+        _aio_lambda_client_context = get_aiobotocore_session().create_client(
+            'lambda', region_name=AWS_REGION, endpoint_url=LAMBDA_ENDPOINT_URL, config=AioConfig(max_pool_connections=50))
+        _aio_lambda_client = await _aio_lambda_client_context.__aenter__()
+    return _aio_lambda_client
+
+
+async def invoke_lambda_task_async(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None) -> Dict:
+    """Same result shape as invoke_lambda_task. Without aiobotocore, runs it on the shared invoke pool."""
+    if not AIOBOTOCORE_AVAILABLE:
+        return await asyncio.get_running_loop().run_in_executor(
+            _async_invoke_pool, invoke_lambda_task, lambda_name, payload, task_id, subject_name)
     logger.info(
-        f"Finished task '{task_id}' for {lambda_name} in {end_time - start_time:.3f}s. Success: {result['error_info'] is None}")
+        f"Starting task '{task_id}' to invoke {lambda_name} for subject: {subject_name if subject_name else 'N/A'}")
+    start_time = time.time()
+    result = new_task_result(task_id)
+    try:
+        client = await _get_aio_lambda_client()
+        response = await client.invoke(FunctionName=lambda_name, InvocationType='RequestResponse',
+                                       Payload=json.dumps(downstream_payload(lambda_name, payload)))
+        async with response['Payload'] as stream:
+            response_payload = await stream.read()
+        logger.info(f"Raw invoke for {lambda_name} (task '{task_id}') took {time.time() - start_time:.3f}s")
+        parse_invoke_response(lambda_name, task_id, response_payload, response.get('FunctionError'), result)
+    except Exception as e:
+        record_invoke_exception(e, lambda_name, task_id, result)
+    return finish_task(result, lambda_name, task_id, subject_name, start_time)
+
+
+async def invoke_lambda_task_hedged_async(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str],
+                                          budget_seconds: float) -> Dict:
+    """asyncio counterpart of invoke_lambda_task_hedged; the losing call is cancelled."""
+    delay = hedge_delay_seconds(lambda_name)
+    if not HEDGED_REQUESTS_ENABLED or delay >= budget_seconds:
+        return await invoke_lambda_task_async(lambda_name, payload, task_id, subject_name)
+    primary = asyncio.ensure_future(invoke_lambda_task_async(lambda_name, payload, task_id, subject_name))
+    hedge = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done: return primary.result()
+        logger.info(f"Hedging task '{task_id}' ({lambda_name}): no response after {delay:.3f}s")
+        hedge = asyncio.ensure_future(invoke_lambda_task_async(lambda_name, payload, task_id, subject_name))
+        done, _ = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+        winner = hedge if hedge in done and primary not in done else primary
+        with _latency_lock:
+            HEDGE_STATS["hedged"] += 1; HEDGE_STATS["hedge_won"] += int(winner is hedge)
+        return winner.result()
+    finally:
+        for call in (primary, hedge):
+            if call is not None and not call.done(): call.cancel()
+
+
+async def invoke_lambda_task_cached_async(lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str],
+                                          budget_seconds: float) -> Dict:
+    """asyncio counterpart of invoke_lambda_task_cached; DynamoDB lookups and batch tasks run on the shared invoke pool."""
+    if lambda_name == TREND_MAIN_BATCH_LAMBDA_NAME:
+        return await asyncio.get_running_loop().run_in_executor(_async_invoke_pool, invoke_trend_main_batch, lambda_name, payload,
+                                                                task_id, subject_name, budget_seconds)
+    if not is_cacheable(lambda_name):
+        return await invoke_lambda_task_hedged_async(lambda_name, payload, task_id, subject_name, budget_seconds)
+    if router_cache_table is None:
+        cache_key, data = lookup_cached_result(lambda_name, payload)
+    else:
+        cache_key, data = await asyncio.get_running_loop().run_in_executor(_async_invoke_pool, lookup_cached_result, lambda_name, payload)
+    if data is not None: return cached_task_result(task_id, lambda_name, data)
+    result = await invoke_lambda_task_hedged_async(lambda_name, payload, task_id, subject_name, budget_seconds)
+    if result["error_info"] is None and result["data"] is not None: write_cached_result(cache_key, lambda_name, result["data"])
     return result
 
 
-def lambda_handler(event, context):
+async def _run_tasks_async(tasks_to_submit: List, aggregated_results: Dict, prefetched: Optional[Dict[str, Any]],
+                           deadline_at: Optional[float] = None) -> None:
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(ROUTER_MAX_PARALLEL_INVOKES)
+
+    async def bounded(pending):
+        async with in_flight:
+            return await pending
+
+    async def run_one(task_id, lambda_name, payload, subject_name):
+        budget = task_budget_seconds(lambda_name, deadline_at)
+        if budget <= 0: return timeout_task_result(task_id, lambda_name, subject_name, 0.0)
+        speculative = prefetched.pop(task_key(lambda_name, payload), None) if prefetched else None
+        if speculative:
+            pending = loop.run_in_executor(_async_invoke_pool, claim_prefetched_task, speculative, lambda_name, payload,
+                                           task_id, subject_name)
+        else:
+            logger.info(f"Submitting task '{task_id}' for {lambda_name} with payload: {json.dumps(payload)}")
+            pending = invoke_lambda_task_cached_async(lambda_name, payload, task_id, subject_name, budget)
+        try:
+            return await asyncio.wait_for(bounded(pending), timeout=budget)
+        except asyncio.TimeoutError:
+            return timeout_task_result(task_id, lambda_name, subject_name, budget)
+
+    # Results are merged as each task finishes, not in submission order
+    for next_done in asyncio.as_completed([run_one(*task) for task in tasks_to_submit]):
+        try:
+            apply_task_result(aggregated_results, await next_done)
+        except Exception as e:
+            logger.exception(f"Error retrieving async task result: {e}")
+            aggregated_results["errors"].append({"source": "AsyncEngine", "error": f"Failed to get task result: {str(e)}"})
+
+
+def run_tasks_asyncio(tasks_to_submit: List, aggregated_results: Dict, prefetched: Optional[Dict[str, Any]] = None,
+                      deadline_at: Optional[float] = None) -> None:
+    """Drives all tasks on the container's persistent event loop (one run at a time)."""
+    global _async_loop
+    with _async_loop_lock:
+        if _async_loop is None or _async_loop.is_closed(): _async_loop = asyncio.new_event_loop()
+        _async_loop.run_until_complete(_run_tasks_async(tasks_to_submit, aggregated_results, prefetched, deadline_at))
+
+
+def task_key(lambda_name: str, payload: Dict) -> str:
+    """Identity of a downstream call: the same Lambda with the same payload (canonical JSON) returns the same data."""
+    return f"{lambda_name}:{json.dumps(payload, sort_keys=True, separators=(',', ':'))}"
+
+
+def claim_prefetched_task(speculative: Any, lambda_name: str, payload: Dict, task_id: str, subject_name: Optional[str] = None) -> Dict:
+    """Result of a call the orchestrator started speculatively; invokes normally if that fetch raised."""
+    result = speculative.claim()
+    if result is None: return invoke_lambda_task_cached(lambda_name, payload, task_id, subject_name)
+    logger.info(f"Task '{task_id}' served by speculative prefetch of {lambda_name}.")
+    return {**result, "task_id": task_id}
+
+
+def apply_task_result(aggregated_results: Dict, task_result: Dict) -> None:
+    """Merges one finished task into aggregated_results (both engines call this as each task completes)."""
+    if "batch_results" in task_result:
+        for single_result in task_result["batch_results"]: apply_task_result(aggregated_results, single_result)
+        return
+    task_id = task_result.get("task_id");
+    error_info = task_result.get("error_info");
+    data = project_body(lambda_for_task(task_id or ""), task_result.get("data"))
+
+    if error_info:
+        logger.warning(f"Task '{task_id}' completed with error: {error_info.get('error')}")
+        aggregated_results["errors"].append(error_info)
+    elif data is not None:
+        logger.info(f"Task '{task_id}' completed successfully.")
+        # --- NEW: Handle comparison trend data ---
+        if task_id.startswith("trends_compare_"):
+            category_name_compared = task_result.get("category_compared")  # From invoke_lambda_task
+            if category_name_compared:
+                formatted_trend_data = {  # Structure consistent with single trend data
+                    "category_summary": data.get("country_category"),
+                    "style_details": data.get("country_category_style", []),
+                    "color_details": data.get("country_color_category", [])
+                }
+                aggregated_results["trends_data_comparison"].append({
+                    "category_name": category_name_compared,
+                    "data": formatted_trend_data
+                })
+                logger.info(f"Stored comparison trend data for category: {category_name_compared}")
+            else:
+                logger.error(
+                    f"Task '{task_id}' (comparison) missing category_compared field in result.")
+                aggregated_results["errors"].append(
+                    {"source": task_id, "error": "Comparison trend data missing category identifier"})
+        # --- END NEW ---
+        elif task_id == "trends_single":  # Standard single trend data
+            aggregated_results["trends_data"] = {"category_summary": data.get("country_category"),
+                                                 "style_details": data.get("country_category_style",
+                                                                           []),
+                                                 "color_details": data.get("country_color_category",
+                                                                           [])}
+        elif task_id == "mega":
+            aggregated_results["mega_trends_data"] = data.get("query_category", [])
+        elif task_id == "charts":
+            aggregated_results["chart_details_data"] = data
+        elif task_id == "brand_perf":
+            if isinstance(data.get("performance_data"), list):
+                aggregated_results["brand_performance_data"] = data["performance_data"]; logger.info(
+                    f"Stored brand performance data for {data.get('brand_domain')}")
+            else:
+                logger.error(f"Task 'brand_perf' returned unexpected data format: {data}");
+                aggregated_results["errors"].append(
+                    {"source": BRAND_INSIGHT_LAMBDA_NAME, "error": "Invalid data format received",
+                     "details": "Expected 'performance_data' list key."})
+        elif task_id == "amazon":
+            aggregated_results["amazon_radar_data"] = data
+            logger.info(
+                f"Stored Amazon Radar data. Keys: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
+    else:
+        logger.error(f"Task '{task_id}' returned no data and no error."); aggregated_results[
+            "errors"].append({"source": task_id, "error": "Task returned unexpected empty result"})
+
+
+def lambda_handler(event, context, prefetched: Optional[Dict[str, Any]] = None, pass_by_reference: bool = True):
+    """
+    prefetched: in-process callers only (orchestrator). task_key -> speculative fetch exposing claim();
+    a task whose key is present reuses it instead of invoking. Claimed entries are removed.
+    pass_by_reference: a large output is written to the blob store and returned as a handle (blob_store.offload)
+    for the synthesis step to resolve; in-process callers pass False to get the results inline.
+    """
     overall_start_time = time.time()
     try:
         logger.info(f"ROUTER RECEIVED EVENT: {json.dumps(event)}")
@@ -714,6 +1338,9 @@ def lambda_handler(event, context):
         logger.error(f"Boto3 init failure: {BOTO3_CLIENT_ERROR}");
         raise Exception(f"Configuration Error: {BOTO3_CLIENT_ERROR}")
 
+    # --- Background Entry Point (upstream pipelines publishing new data) ---
+    if isinstance(event, dict) and "bump_data_version" in event: return bump_data_version(event["bump_data_version"] or [])
+
     # --- Input Parsing ---
     try:
         interpretation_result = event
@@ -783,17 +1410,28 @@ def lambda_handler(event, context):
     if primary_task == COMPARE_CATEGORIES_TASK_NAME and "internal_trends_category" in required_sources:
         if comparison_subjects_list:
             logger.info(f"Preparing to fetch trends for {len(comparison_subjects_list)} categories for comparison.")
+            categories_to_compare = []
             for cat_subject_obj in comparison_subjects_list:
                 if isinstance(cat_subject_obj, dict) and "subject" in cat_subject_obj:
-                    category_to_fetch = cat_subject_obj["subject"]
-                    # Create a unique task_id for each category trend fetch in comparison
-                    task_id_compare = f"trends_compare_{category_to_fetch.replace(' ', '_')}"  # Sanitize name for ID
-                    payload = {"queryStringParameters": {"country": country_name, "category": category_to_fetch,
-                                                         "time_frame": time_frame_trends}}
-                    tasks_to_submit.append(
-                        (task_id_compare, TREND_MAIN_LAMBDA_NAME, payload, None))  # subject_name not critical here
+                    if cat_subject_obj["subject"] not in categories_to_compare: categories_to_compare.append(cat_subject_obj["subject"])
                 else:
                     logger.warning(f"Skipping invalid item in comparison_subjects_list: {cat_subject_obj}")
+            if len(categories_to_compare) > MAX_COMPARISON_CATEGORIES:
+                dropped = categories_to_compare[MAX_COMPARISON_CATEGORIES:]
+                logger.warning(f"Comparison limited to {MAX_COMPARISON_CATEGORIES} categories; dropping {dropped}")
+                aggregated_results["errors"].append({"source": "Router", "error": f"Comparison limited to {MAX_COMPARISON_CATEGORIES} categories",
+                                                     "details": f"Not fetched: {', '.join(dropped)}"})
+                categories_to_compare = categories_to_compare[:MAX_COMPARISON_CATEGORIES]
+            compare_tasks = []
+            for category_to_fetch in categories_to_compare:
+                # Create a unique task_id for each category trend fetch in comparison
+                task_id_compare = f"trends_compare_{category_to_fetch.replace(' ', '_')}"  # Sanitize name for ID
+                payload = trend_main_payload(country_name, category_to_fetch, time_frame_trends)
+                compare_tasks.append((task_id_compare, TREND_MAIN_LAMBDA_NAME, payload, None))  # subject_name not critical here
+            if TREND_MAIN_BATCH_LAMBDA_NAME and len(compare_tasks) > 1:
+                tasks_to_submit.append(trend_main_batch_task(compare_tasks))
+            else:
+                tasks_to_submit.extend(compare_tasks)
         else:
             logger.warning("COMPARE_CATEGORIES_TASK specified, but no comparison_subjects found in query_subjects.")
     # --- END NEW ---
@@ -801,9 +1439,7 @@ def lambda_handler(event, context):
         invoke_trend_main = "internal_trends_item" in required_sources or "internal_trends_category" in required_sources
         if invoke_trend_main:
             # Use category_name_from_interpreter_context for standard trend calls
-            payload = {
-                "queryStringParameters": {"country": country_name, "category": category_name_from_interpreter_context,
-                                          "time_frame": time_frame_trends}}
+            payload = trend_main_payload(country_name, category_name_from_interpreter_context, time_frame_trends)
             tasks_to_submit.append(("trends_single", TREND_MAIN_LAMBDA_NAME, payload, None))  # task_id "trends_single"
 
     # Mega Trends (uses category_name_from_interpreter_context)
@@ -873,77 +1509,13 @@ def lambda_handler(event, context):
                                                  "details": "Target department or category not found"})
 
     # --- Execute tasks in parallel ---
-    if tasks_to_submit:
-        futures = []
-        # Consider adjusting max_workers if many parallel calls are expected for comparisons
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            for task_id, lambda_name, payload, subject_name_for_task in tasks_to_submit:
-                logger.info(f"Submitting task '{task_id}' for {lambda_name} with payload: {json.dumps(payload)}")
-                futures.append(
-                    executor.submit(invoke_lambda_task, lambda_name, payload, task_id, subject_name_for_task))
-
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    task_result = future.result()
-                    task_id = task_result.get("task_id");
-                    error_info = task_result.get("error_info");
-                    data = task_result.get("data")
-
-                    if error_info:
-                        logger.warning(f"Task '{task_id}' completed with error: {error_info.get('error')}")
-                        aggregated_results["errors"].append(error_info)
-                    elif data is not None:
-                        logger.info(f"Task '{task_id}' completed successfully.")
-                        # --- NEW: Handle comparison trend data ---
-                        if task_id.startswith("trends_compare_"):
-                            category_name_compared = task_result.get("category_compared")  # From invoke_lambda_task
-                            if category_name_compared:
-                                formatted_trend_data = {  # Structure consistent with single trend data
-                                    "category_summary": data.get("country_category"),
-                                    "style_details": data.get("country_category_style", []),
-                                    "color_details": data.get("country_color_category", [])
-                                }
-                                aggregated_results["trends_data_comparison"].append({
-                                    "category_name": category_name_compared,
-                                    "data": formatted_trend_data
-                                })
-                                logger.info(f"Stored comparison trend data for category: {category_name_compared}")
-                            else:
-                                logger.error(
-                                    f"Task '{task_id}' (comparison) missing category_compared field in result.")
-                                aggregated_results["errors"].append(
-                                    {"source": task_id, "error": "Comparison trend data missing category identifier"})
-                        # --- END NEW ---
-                        elif task_id == "trends_single":  # Standard single trend data
-                            aggregated_results["trends_data"] = {"category_summary": data.get("country_category"),
-                                                                 "style_details": data.get("country_category_style",
-                                                                                           []),
-                                                                 "color_details": data.get("country_color_category",
-                                                                                           [])}
-                        elif task_id == "mega":
-                            aggregated_results["mega_trends_data"] = data.get("query_category", [])
-                        elif task_id == "charts":
-                            aggregated_results["chart_details_data"] = data
-                        elif task_id == "brand_perf":
-                            if isinstance(data.get("performance_data"), list):
-                                aggregated_results["brand_performance_data"] = data["performance_data"]; logger.info(
-                                    f"Stored brand performance data for {data.get('brand_domain')}")
-                            else:
-                                logger.error(f"Task 'brand_perf' returned unexpected data format: {data}");
-                                aggregated_results["errors"].append(
-                                    {"source": BRAND_INSIGHT_LAMBDA_NAME, "error": "Invalid data format received",
-                                     "details": "Expected 'performance_data' list key."})
-                        elif task_id == "amazon":
-                            aggregated_results["amazon_radar_data"] = data
-                            logger.info(
-                                f"Stored Amazon Radar data. Keys: {list(data.keys()) if isinstance(data, dict) else 'Not a dict'}")
-                    else:
-                        logger.error(f"Task '{task_id}' returned no data and no error."); aggregated_results[
-                            "errors"].append({"source": task_id, "error": "Task returned unexpected empty result"})
-                except Exception as e:
-                    logger.exception(f"Error retrieving result from future: {e}");
-                    aggregated_results["errors"].append(
-                        {"source": "ThreadPoolExecutor", "error": f"Failed to get task result: {str(e)}"})
+    deadline_ms = original_context.get("deadline_ms")
+    deadline_at = deadline_ms / 1000.0 - ROUTER_SYNTHESIS_RESERVE_SECONDS if isinstance(deadline_ms, (int, float)) else None
+    if deadline_at is not None: logger.info(f"Request deadline leaves {deadline_at - time.time():.2f}s for internal fetches.")
+    if tasks_to_submit and ROUTER_ENGINE == "asyncio":
+        run_tasks_asyncio(tasks_to_submit, aggregated_results, prefetched, deadline_at)
+    elif tasks_to_submit:
+        run_tasks_threaded(tasks_to_submit, aggregated_results, prefetched, deadline_at)
     else:
         logger.info("No downstream Lambdas needed based on required_sources.")
 
@@ -963,6 +1535,7 @@ def lambda_handler(event, context):
     overall_end_time = time.time();
     total_duration = overall_end_time - overall_start_time
     logger.info(f"Router Lambda finished in {total_duration:.3f}s. Status: {aggregated_results['status']}.")
+    if ROUTER_CACHE_ENABLED: logger.info(f"Result cache (container): {ROUTER_CACHE_STATS}, L1 size {len(ROUTER_L1_CACHE)}")
 
     data_presence = {
         k: aggregated_results.get(k) is not None
@@ -975,4 +1548,4 @@ def lambda_handler(event, context):
 
     logger.debug(f"Final Data Presence={data_presence}, Errors={len(aggregated_results['errors'])}")
 
-    return aggregated_results
\ No newline at end of file
+    return blob_store.offload(aggregated_results, "internal_data") if pass_by_reference else aggregated_results
\ No newline at end of file
@@ -1959,20 +1959,28 @@ import json
 import logging
 import os
 import re
+import string
+import time
 from typing import Dict, Optional, List, Any, Tuple
 from decimal import Decimal  # Needed for replace_decimals
 
 import boto3
 from botocore.exceptions import ClientError
 
+import blob_store
+import execution_store
+import llm_client
+
 try:
     import google.generativeai as genai
     import google.generativeai.types as genai_types
+    from google.api_core import exceptions as google_api_exceptions
 
     GEMINI_SDK_AVAILABLE = True
 except ImportError:
     genai = None
     genai_types = None
+    google_api_exceptions = None
     GEMINI_SDK_AVAILABLE = False
     logging.basicConfig(level="ERROR")
     logging.error("CRITICAL: google-generativeai SDK not found! Install it.")
@@ -1980,7 +1988,35 @@ except ImportError:
 # --- Configuration and Constants ---
 SECRET_NAME = os.environ.get("SECRET_NAME", "YourSecretsName")
 SYNTHESIS_LLM_MODEL = os.environ.get("SYNTHESIS_LLM_MODEL", "gemini-2.0-flash")
+# Stream sections to the client when the request carries a stream_id (set by the proxy)
+SYNTHESIS_STREAMING_ENABLED = os.environ.get("SYNTHESIS_STREAMING_ENABLED", "true").lower() == "true"
+SYNTHESIS_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+# Persona instructions as a reusable prefix. "off" (default): the persona is formatted with the request values inline.
+# "system_instruction": each indicator's instructions, with request values shown as <placeholder> labels, are the
+# model's system instruction (one model per indicator per container); requests send only the request values and the
+# data block. "cached_content": the instructions also live in a Gemini context cache and are billed at the cached-token
+# rate (falls back to system_instruction when a cache cannot be created). Either way only personas of at least
+# SYNTHESIS_PROMPT_CACHE_MIN_TOKENS use it: shorter ones cannot be cached, so they keep the inline prompt.
+SYNTHESIS_PROMPT_CACHE = os.environ.get("SYNTHESIS_PROMPT_CACHE", "off").lower()
+if SYNTHESIS_PROMPT_CACHE not in ("off", "system_instruction", "cached_content"): SYNTHESIS_PROMPT_CACHE = "off"
+SYNTHESIS_PROMPT_CACHE_MIN_TOKENS = int(os.environ.get("SYNTHESIS_PROMPT_CACHE_MIN_TOKENS", 1024)) # The model's minimum cacheable size
+PROMPT_CHARS_PER_TOKEN = 4 # Rough estimate for English prompt text
+SYNTHESIS_CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get("SYNTHESIS_CONTEXT_CACHE_TTL_SECONDS", 60 * 60))
+# --- Model Tiering ---
+# Summaries over small data blocks go to the light model; reasoning-heavy indicators and large contexts go to
+# SYNTHESIS_LLM_MODEL. An attempt that times out or returns output failing schema validation is retried once on
+# the other tier. Compare tiers offline with _local_eval_model_tiers.py before changing the routing.
+SYNTHESIS_LIGHT_LLM_MODEL = os.environ.get("SYNTHESIS_LIGHT_LLM_MODEL", "gemini-2.0-flash-lite") # "" -> every request on SYNTHESIS_LLM_MODEL
+SYNTHESIS_LIGHT_INDICATORS = {name.strip() for name in os.environ.get("SYNTHESIS_LIGHT_INDICATORS", "WEB_SUMMARY,QA_WEB,AMAZON_RADAR").split(",") if name.strip()}
+SYNTHESIS_LIGHT_MAX_CONTEXT_CHARS = int(os.environ.get("SYNTHESIS_LIGHT_MAX_CONTEXT_CHARS", 6000)) # Larger data blocks stay on the heavy tier
+SYNTHESIS_TIER_FALLBACK_ENABLED = os.environ.get("SYNTHESIS_TIER_FALLBACK_ENABLED", "true").lower() == "true"
+SYNTHESIS_LLM_TIMEOUT_SECONDS = float(os.environ.get("SYNTHESIS_LLM_TIMEOUT_SECONDS", 25)) # Per attempt; capped by the request deadline
+# Under a deadline the first attempt gets this share of the time left, and never so much that less than
+# SYNTHESIS_FALLBACK_MIN_SECONDS remains for the fallback attempt (below that the first attempt gets it all)
+SYNTHESIS_FIRST_ATTEMPT_BUDGET_FRACTION = float(os.environ.get("SYNTHESIS_FIRST_ATTEMPT_BUDGET_FRACTION", 0.6))
+SYNTHESIS_FALLBACK_MIN_SECONDS = float(os.environ.get("SYNTHESIS_FALLBACK_MIN_SECONDS", 3))
 AWS_REGION = os.environ.get("AWS_REGION", "us-west-2")
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get("SECRET_CACHE_TTL_SECONDS", 300)) # A rotated key reaches warm containers within this
 COMPARE_CATEGORIES_TASK_NAME = "compare_categories_task"
 # --- Result Type Indicators ---
 INDICATOR_TREND_DETAIL = "TREND_DETAIL"
@@ -2022,7 +2058,9 @@ try:
 except Exception as e:
     logger.exception("CRITICAL ERROR initializing Boto3 Secrets Manager client!")
     BOTO3_CLIENT_ERROR = f"Failed to initialize Boto3 client: {e}"
-API_KEY_CACHE: Dict[str, Optional[str]] = {}
+# Keys are cached for SECRET_CACHE_TTL_SECONDS so a rotated secret is picked up (llm_client reconfigures on a new key);
+# failures are not cached, so the next request retries Secrets Manager instead of failing until a cold start.
+API_KEY_CACHE: Dict[str, Tuple[str, float]] = {} # cache key -> (value, expires_at)
 
 
 def get_secret_value(secret_name: str, key_name: str) -> Optional[str]:
@@ -2035,8 +2073,8 @@ def get_secret_value(secret_name: str, key_name: str) -> Optional[str]:
             logger.warning(f"Direct env var '{key_name}' not found. Trying Secrets Manager...")
     global API_KEY_CACHE;
     cache_key = f"{secret_name}:{key_name}"
-    if cache_key in API_KEY_CACHE: logger.debug(f"Using cached secret key: {cache_key}"); return API_KEY_CACHE[
-        cache_key]
+    cached = API_KEY_CACHE.get(cache_key)
+    if cached and cached[1] > time.time(): logger.debug(f"Using cached secret key: {cache_key}"); return cached[0]
     if BOTO3_CLIENT_ERROR: logger.error(f"Boto3 client error: {BOTO3_CLIENT_ERROR}"); return None
     if not secrets_manager: logger.error("Secrets Manager client not initialized."); return None
     try:
@@ -2059,19 +2097,16 @@ def get_secret_value(secret_name: str, key_name: str) -> Optional[str]:
         key_value = secret_dict.get(key_name)
         if not key_value or not isinstance(key_value, str):
             logger.error(f"Key '{key_name}' not found or not string in secret '{secret_name}'.");
-            API_KEY_CACHE[cache_key] = None;
             return None
-        API_KEY_CACHE[cache_key] = key_value;
+        API_KEY_CACHE[cache_key] = (key_value, time.time() + SECRET_CACHE_TTL_SECONDS);
         logger.info(f"Key '{key_name}' successfully retrieved and cached.");
         return key_value
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code");
         logger.error(f"AWS ClientError for '{secret_name}': {error_code}");
-        API_KEY_CACHE[cache_key] = None;
         return None
     except Exception as e:
         logger.exception(f"Unexpected error retrieving secret '{secret_name}'.");
-        API_KEY_CACHE[cache_key] = None;
         return None
 
 
@@ -2113,6 +2148,84 @@ def validate_structured_summary(summary_obj: Any) -> bool:
     return True
 
 
+# --- Incremental Parsing of Streamed Summary JSON ---
+class IncrementalSummaryParser:
+    """
+    Consumes the synthesis JSON as it streams in and reports each piece of the
+    ai_summary_structured object as soon as it is complete: the `overall_summary`
+    string and every object inside `sections`. Partial/unterminated values are
+    simply held back until more text arrives; the final payload is still parsed
+    and validated from the full text once the stream ends.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []  # open containers: '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_string: Optional[str] = None
+        self._top_level_key: Optional[str] = None
+        self._expect_key = False
+        self._value_start = -1
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Adds streamed text and returns newly completed (kind, value) pairs."""
+        completed: List[Tuple[str, Any]] = []
+        self.text += chunk or ""
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string_end(self._pos, completed)
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in "{[":
+                if not self._stack and ch != "{":
+                    pass  # Ignore anything before the top-level object (e.g. markdown fences)
+                else:
+                    self._stack.append(ch)
+                    if ch == "{" and len(self._stack) == 1: self._expect_key = True
+                    if ch == "{" and len(self._stack) == 3 and self._top_level_key == "sections":
+                        self._value_start = self._pos
+            elif ch in "}]" and self._stack:
+                self._stack.pop()
+                if ch == "}" and len(self._stack) == 2 and self._top_level_key == "sections" and self._value_start >= 0:
+                    section_text = text[self._value_start:self._pos + 1]
+                    self._value_start = -1
+                    try:
+                        section = json.loads(section_text)
+                        if isinstance(section, dict): completed.append(("section", section))
+                    except json.JSONDecodeError:
+                        logger.debug("Skipping unparsable streamed section fragment.")
+            elif ch == ":" and len(self._stack) == 1 and self._expect_key:
+                self._top_level_key = self._last_string
+                self._expect_key = False
+            elif ch == "," and len(self._stack) == 1:
+                self._expect_key = True
+            self._pos += 1
+        return completed
+
+    def _on_string_end(self, end_pos: int, completed: List[Tuple[str, Any]]) -> None:
+        try:
+            value = json.loads(self.text[self._string_start:end_pos + 1])
+        except json.JSONDecodeError:
+            return
+        if len(self._stack) == 1:
+            if self._expect_key:
+                self._last_string = value
+            elif self._top_level_key == "overall_summary":
+                completed.append(("overall_summary", value))
+
+
 # --- Persona Prompts ---
 PERSONA_PROMPTS = {
     # (Existing prompts for TREND_DETAIL, MEGA_TREND, CATEGORY_OVERVIEW, FORECAST, BRAND_ANALYSIS, AMAZON_RADAR, WEB_SUMMARY unchanged - they already output JSON)
@@ -2391,11 +2504,55 @@ JSON Schema to follow:
 # Aliases/Removals if needed
 PERSONA_PROMPTS[INDICATOR_QA_WEB] = PERSONA_PROMPTS[INDICATOR_WEB_SUMMARY]  # Alias QA_WEB
 
+# --- Compiled Persona Templates ---
+# Every request formats its template with exactly these values (synthesize_final_response builds all of them)
+PROMPT_FIELDS = ("specific_item_name", "category_name", "country_name", "user_query", "brand_domain",
+                 "target_category", "target_department", "category_list_str")
+
+
+class CompiledTemplate:
+    """
+    A persona template parsed once at import: literal text (with {{ }} already unescaped) and the slots its
+    placeholders fill. Only bare names from PROMPT_FIELDS are allowed, so a bad template fails the cold start
+    instead of raising KeyError mid-request. render() substitutes the slots and joins once.
+    """
+    __slots__ = ("indicator", "source", "segments", "slots", "fields", "instruction")
+
+    def __init__(self, indicator: str, source: str):
+        self.indicator = indicator; self.source = source
+        segments: List[str] = []; slots: List[Tuple[int, str]] = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(source):
+            if literal: segments.append(literal)
+            if field_name is None: continue
+            if field_name not in PROMPT_FIELDS or format_spec or conversion:
+                placeholder = field_name + (f"!{conversion}" if conversion else "") + (f":{format_spec}" if format_spec else "")
+                raise ValueError(f"{indicator}: unsupported placeholder '{{{placeholder}}}' (allowed: bare {', '.join(PROMPT_FIELDS)})")
+            slots.append((len(segments), field_name)); segments.append("")
+        self.segments = segments; self.slots = slots
+        self.fields = tuple(dict.fromkeys(name for _, name in slots))
+        # System-instruction form: each placeholder shown as a <name> label, the same for every request
+        self.instruction = self.render({name: f"<{name}>" for name in self.fields})
+
+    def render(self, values: Dict[str, Any]) -> str:
+        if not self.slots: return self.segments[0] if len(self.segments) == 1 else "".join(self.segments)
+        parts = self.segments.copy()
+        for index, name in self.slots: parts[index] = str(values[name])
+        return "".join(parts)
+
+
+PERSONA_TEMPLATES: Dict[str, CompiledTemplate] = {}
+TEMPLATE_LOAD_ERROR = None
+try:
+    PERSONA_TEMPLATES = {indicator: CompiledTemplate(indicator, template) for indicator, template in PERSONA_PROMPTS.items()}
+except ValueError as e:
+    logger.exception("CRITICAL ERROR compiling persona prompt templates!")
+    TEMPLATE_LOAD_ERROR = f"Invalid persona prompt template: {e}"
+
 
 # Could remove QA_WEB key entirely later
 
 # --- Update get_task_details ---
-def get_task_details(primary_task: str | None) -> Tuple[str, str]:
+def get_task_details(primary_task: str | None) -> Tuple[str, Optional[CompiledTemplate]]:
     indicator = INDICATOR_UNKNOWN
     # Existing mappings...
     if primary_task == "get_trend":
@@ -2431,11 +2588,96 @@ def get_task_details(primary_task: str | None) -> Tuple[str, str]:
     elif primary_task == "error":
         indicator = INDICATOR_ERROR
 
-    prompt_template = PERSONA_PROMPTS.get(indicator, PERSONA_PROMPTS[INDICATOR_UNKNOWN])
+    prompt_template = PERSONA_TEMPLATES.get(indicator, PERSONA_TEMPLATES.get(INDICATOR_UNKNOWN))
     logger.info(f"Mapped primary_task '{primary_task}' to indicator '{indicator}'.")
     return indicator, prompt_template
 
 
+# --- Persona Instructions / Request Details ---
+def request_details_block(prompt_template: CompiledTemplate, prompt_format_args: Dict[str, Any]) -> str:
+    """The values for the template's <name> labels in its system-instruction form."""
+    if not prompt_template.fields: return ""
+    lines = [f"<{name}>: {prompt_format_args[name]}" for name in prompt_template.fields]
+    return "REQUEST DETAILS (values for the <placeholders> in your instructions):\n" + "\n".join(lines)
+
+
+def uses_reusable_instruction(prompt_template: CompiledTemplate) -> bool:
+    """True when SYNTHESIS_PROMPT_CACHE is on and the persona is long enough to be cached."""
+    if SYNTHESIS_PROMPT_CACHE == "off": return False
+    return len(prompt_template.instruction) // PROMPT_CHARS_PER_TOKEN >= SYNTHESIS_PROMPT_CACHE_MIN_TOKENS
+
+
+def build_synthesis_request(prompt_template: CompiledTemplate, prompt_format_args: Dict[str, Any], formatted_data_context: str) -> Tuple[Optional[str], str]:
+    """(system instruction, per-request prompt). Without a reusable instruction the whole prompt is per request."""
+    if not uses_reusable_instruction(prompt_template):
+        return None, prompt_template.render(prompt_format_args) + "\n\n" + formatted_data_context
+    details = request_details_block(prompt_template, prompt_format_args)
+    return prompt_template.instruction, (details + "\n\n" + formatted_data_context if details else formatted_data_context)
+
+
+def get_synthesis_model(google_api_key: str, system_instruction: Optional[str], model_name: Optional[str] = None):
+    model_name = model_name or SYNTHESIS_LLM_MODEL
+    if system_instruction is None:
+        return llm_client.get_model(google_api_key, model_name, SYNTHESIS_GENERATION_CONFIG)
+    if SYNTHESIS_PROMPT_CACHE == "cached_content":
+        return llm_client.get_cached_context_model(google_api_key, model_name, SYNTHESIS_GENERATION_CONFIG,
+                                                   system_instruction, SYNTHESIS_CONTEXT_CACHE_TTL_SECONDS)
+    return llm_client.get_model(google_api_key, model_name, SYNTHESIS_GENERATION_CONFIG, system_instruction)
+
+
+# --- Model Tiering ---
+def choose_synthesis_models(result_type_indicator: str, formatted_data_context: str) -> List[str]:
+    """Models to try in order: the tier the request routes to, then the other tier when fallback is enabled."""
+    heavy, light = SYNTHESIS_LLM_MODEL, SYNTHESIS_LIGHT_LLM_MODEL
+    if not light or light == heavy: return [heavy]
+    use_light = result_type_indicator in SYNTHESIS_LIGHT_INDICATORS and len(formatted_data_context) <= SYNTHESIS_LIGHT_MAX_CONTEXT_CHARS
+    models = [light, heavy] if use_light else [heavy, light]
+    return models if SYNTHESIS_TIER_FALLBACK_ENABLED else models[:1]
+
+
+def is_llm_timeout(error: Exception) -> bool:
+    if isinstance(error, TimeoutError): return True
+    return google_api_exceptions is not None and isinstance(error, google_api_exceptions.GatewayTimeout) # Includes DeadlineExceeded
+
+
+def synthesis_attempt_timeout(original_context: Dict, fallback_pending: bool = False) -> Optional[float]:
+    """
+    SYNTHESIS_LLM_TIMEOUT_SECONDS, or less when the proxy-stamped deadline is closer; <= 0 means no time left.
+    With `fallback_pending` the attempt leaves part of the time left for the attempt that follows it.
+    """
+    deadline_ms = original_context.get("deadline_ms") if isinstance(original_context, dict) else None
+    timeout = SYNTHESIS_LLM_TIMEOUT_SECONDS or None
+    if isinstance(deadline_ms, (int, float)):
+        remaining = budget = deadline_ms / 1000.0 - time.time()
+        if fallback_pending:
+            reserve = max(SYNTHESIS_FALLBACK_MIN_SECONDS, remaining * (1 - SYNTHESIS_FIRST_ATTEMPT_BUDGET_FRACTION))
+            if remaining > reserve: budget = remaining - reserve
+        timeout = budget if timeout is None else min(timeout, budget)
+    return timeout
+
+
+def call_synthesis_model(model, synthesis_prompt: str, stream_id: Optional[str], timeout: Optional[float]) -> str:
+    """One attempt; returns the raw response text. A streamed retry re-sends sections under the same ids."""
+    request_kwargs = {"request_options": {"timeout": timeout}} if timeout else {}
+    if stream_id:
+        return stream_synthesis_sections(model, synthesis_prompt, stream_id, **request_kwargs)
+    return model.generate_content(synthesis_prompt, **request_kwargs).text
+
+
+def parse_structured_summary(raw_llm_text: str) -> Dict:
+    """Parses and validates the LLM's JSON summary; raises ValueError (json.JSONDecodeError included)."""
+    cleaned_text = raw_llm_text.strip()
+    if cleaned_text.startswith("```json"): cleaned_text = cleaned_text[7:]
+    if cleaned_text.endswith("```"): cleaned_text = cleaned_text[:-3]
+    cleaned_text = cleaned_text.strip()
+    if not cleaned_text: raise ValueError("LLM returned empty JSON string.")
+    llm_output_json = json.loads(cleaned_text)
+    if not validate_structured_summary(llm_output_json):
+        logger.error(f"LLM JSON output failed validation. Structure received: {json.dumps(llm_output_json)}")
+        raise ValueError("LLM JSON output failed schema validation.")
+    return llm_output_json
+
+
 # --- Update format_data_for_prompt ---
 def format_data_for_prompt(internal_data: Dict, external_data: Dict) -> str:
     prompt_parts = []
@@ -2973,8 +3215,83 @@ def build_final_payload_for_bubble(
     return payload
 
 
-# --- Main Lambda Handler (Mostly unchanged, relies on helpers) ---
+# --- Streaming / Async Helpers ---
+def get_original_context_value(event: Dict, key: str) -> Optional[str]:
+    """Reads a proxy-provided id (stream_id, execution_token) from the interpreter's original_context."""
+    if not isinstance(event, dict): return None
+    internal_data = event.get("internal_data") if isinstance(event.get("internal_data"), dict) else {}
+    interpretation = internal_data.get("interpretation") if isinstance(internal_data.get("interpretation"), dict) else {}
+    original_context = interpretation.get("original_context") if isinstance(interpretation.get("original_context"),
+                                                                            dict) else {}
+    value = original_context.get(key)
+    return value if isinstance(value, str) and value else None
+
+
+def get_stream_id(event: Dict) -> Optional[str]:
+    """Stream id set by the proxy's streaming path."""
+    return get_original_context_value(event, "stream_id") if SYNTHESIS_STREAMING_ENABLED else None
+
+
+def stream_synthesis_sections(model, synthesis_prompt: str, stream_id: str, **request_kwargs) -> str:
+    """
+    Calls the Gemini streaming API and publishes `ai_summary_structured` pieces to the
+    execution store as soon as each one is complete. Returns the full raw response text
+    so the normal parse/validate path can produce the final payload.
+    """
+    logger.info(f"Streaming synthesis output to stream '{stream_id}'.")
+    parser = IncrementalSummaryParser()
+    response = model.generate_content(synthesis_prompt, stream=True, **request_kwargs)
+    first_chunk_logged = False
+    for chunk in response:
+        chunk_text = getattr(chunk, "text", "") or ""
+        if chunk_text and not first_chunk_logged:
+            logger.info("First synthesis chunk received."); first_chunk_logged = True
+        for kind, value in parser.feed(chunk_text):
+            if kind == "overall_summary":
+                execution_store.publish_stream_event(stream_id, {"type": "overall_summary", "overall_summary": value})
+            elif kind == "section":
+                execution_store.publish_stream_event(stream_id, {"type": "section", "section": value})
+    return parser.text
+
+
+def warm_up_llm_client() -> Dict[str, Any]:
+    """Builds the synthesis model client so the next real invocation skips SDK setup."""
+    google_api_key = get_secret_value(SECRET_NAME, "GOOGLE_API_KEY")
+    if not google_api_key: return {"status": "error", "error_message": "API key config error"}
+    try:
+        tier_models = list(dict.fromkeys(model for model in (SYNTHESIS_LLM_MODEL, SYNTHESIS_LIGHT_LLM_MODEL) if model))
+        warm_up_result = llm_client.warm_up(google_api_key, [(model_name, SYNTHESIS_GENERATION_CONFIG) for model_name in tier_models])
+        if SYNTHESIS_PROMPT_CACHE != "off": # One model (and context cache) per cacheable persona and tier
+            for indicator, prompt_template in PERSONA_TEMPLATES.items():
+                if indicator in (INDICATOR_UNKNOWN, INDICATOR_ERROR) or not uses_reusable_instruction(prompt_template): continue
+                for model_name in tier_models: get_synthesis_model(google_api_key, prompt_template.instruction, model_name)
+    except Exception as e:
+        logger.error(f"LLM warm-up failed: {e}", exc_info=True); return {"status": "error", "error_message": str(e)}
+    return {"status": "warm", **warm_up_result, "llm": llm_client.health_check()}
+
+
+# --- Main Lambda Handler ---
 def lambda_handler(event, context):
+    """
+    Runs synthesis. For async executions the final payload is recorded under the execution token;
+    in streaming mode it is also published as the event that closes the stream.
+    """
+    if isinstance(event, dict) and event.get("warmup"): # Scheduled keep-warm ping
+        return {"statusCode": 200, "body": json.dumps(warm_up_llm_client())}
+    result = synthesize_final_response(event, context)
+    stream_id = get_stream_id(event)
+    execution_token = get_original_context_value(event, "execution_token")
+    if stream_id or execution_token:
+        try:
+            final_payload = json.loads(result.get("body", "{}"))
+        except (json.JSONDecodeError, TypeError):
+            final_payload = {"status": INDICATOR_ERROR, "error_message": "Unreadable synthesis result."}
+        if stream_id: execution_store.publish_stream_event(stream_id, {"type": "final", "payload": final_payload})
+        if execution_token: execution_store.put_execution_result(execution_token, final_payload)
+    return result
+
+
+def synthesize_final_response(event, context):
     logger.info(f"Received combined event: {json.dumps(event)}")
 
     # Pre-checks (Unchanged)
@@ -2993,10 +3310,26 @@ def lambda_handler(event, context):
                                                        external_data={}, task_indicator=INDICATOR_ERROR,
                                                        final_status=INDICATOR_ERROR, error_message=BOTO3_CLIENT_ERROR)
         return {"statusCode": 500, "body": json.dumps(error_payload)}
+    if TEMPLATE_LOAD_ERROR:  # Found at cold start
+        error_struct = get_default_summary_structure();
+        error_struct["overall_summary"] = f"Error: {TEMPLATE_LOAD_ERROR}"
+        error_payload = build_final_payload_for_bubble(ai_summary_structured=error_struct, internal_data={},
+                                                       external_data={}, task_indicator=INDICATOR_ERROR,
+                                                       final_status=INDICATOR_ERROR, error_message=TEMPLATE_LOAD_ERROR)
+        return {"statusCode": 500, "body": json.dumps(error_payload)}
 
     # Data extraction (Unchanged, includes getting comparison subjects)
-    internal_data = event.get("internal_data", {});
-    external_data = event.get("external_data", {})
+    try: # Large step outputs arrive as blob store handles
+        internal_data = blob_store.resolve(event.get("internal_data", {}));
+        external_data = blob_store.resolve(event.get("external_data", {}))
+    except blob_store.BlobStoreError as e:
+        logger.error(f"Could not load step output from the blob store: {e}")
+        error_struct = get_default_summary_structure();
+        error_struct["overall_summary"] = "Error: Retrieved data is unavailable."
+        error_payload = build_final_payload_for_bubble(ai_summary_structured=error_struct, internal_data={},
+                                                       external_data={}, task_indicator=INDICATOR_ERROR,
+                                                       final_status=INDICATOR_ERROR, error_message=str(e))
+        return {"statusCode": 500, "body": json.dumps(error_payload)}
     interpretation = internal_data.get("interpretation", {}) if isinstance(internal_data, dict) else {}
     original_context = interpretation.get("original_context", {}) if isinstance(interpretation, dict) else {}
     primary_task = interpretation.get("primary_task");
@@ -3045,8 +3378,7 @@ def lambda_handler(event, context):
             "target_department": amazon_target_department,
             "category_list_str": category_list_str  # For comparison prompt
         }
-        synthesis_prompt = prompt_template.format(**prompt_format_args)
-        synthesis_prompt += "\n\n" + formatted_data_context
+        system_instruction, synthesis_prompt = build_synthesis_request(prompt_template, prompt_format_args, formatted_data_context)
         logger.debug(f"Constructed Synthesis Prompt:\n{synthesis_prompt}")
     except KeyError as key_err:  # ... error handling unchanged ...
         logger.error(f"Missing key in prompt template formatting: {key_err}...", exc_info=True)
@@ -3083,55 +3415,60 @@ def lambda_handler(event, context):
         if not formatted_data_context or formatted_data_context.startswith("No specific data available"):
             logger.warning("Skipping LLM call as no significant data was formatted for prompt.")
             ai_summary_structured = get_default_summary_structure()
-            # Try to make the unknown prompt format args safe
+            # Every PROMPT_FIELDS value is set, so the compiled UNKNOWN template always renders
             unknown_format_args = {
                 "user_query": user_query,
                 "category_name": original_context.get('category', 'N/A'),
                 "country_name": original_context.get('country', 'N/A'),
-                # Add defaults for any other keys the UNKNOWN prompt might use
                 "specific_item_name": "N/A", "brand_domain": "N/A", "target_category": "N/A",
                 "target_department": "N/A", "category_list_str": "N/A"
             }
-            try:
-                # Assume UNKNOWN prompt is simple text for now, place in overall_summary
-                ai_summary_structured["overall_summary"] = PERSONA_PROMPTS[INDICATOR_UNKNOWN].format(
-                    **unknown_format_args)
-            except KeyError as unknown_key_err:
-                logger.error(f"Error formatting UNKNOWN prompt: {unknown_key_err}")
-                ai_summary_structured[
-                    "overall_summary"] = "Could not generate summary because required data was missing and fallback prompt failed."
+            # Assume UNKNOWN prompt is simple text for now, place in overall_summary
+            ai_summary_structured["overall_summary"] = PERSONA_TEMPLATES[INDICATOR_UNKNOWN].render(unknown_format_args)
 
             result_type_indicator = INDICATOR_UNKNOWN
         else:
-            logger.info(f"Calling Synthesis LLM: {SYNTHESIS_LLM_MODEL} for {result_type_indicator}...")
-            genai.configure(api_key=google_api_key)
-            model = genai.GenerativeModel(SYNTHESIS_LLM_MODEL)
-            generation_config = genai_types.GenerationConfig(response_mime_type="application/json")  # Request JSON
-            response = model.generate_content(synthesis_prompt, generation_config=generation_config)
-            logger.info("Synthesis LLM response received.")
-            raw_llm_text = response.text
-            logger.debug(f"LLM Raw Response Text:\n{raw_llm_text}")
-
-            try:  # Parse and validate LLM JSON response
-                cleaned_text = raw_llm_text.strip();  # ... (cleaning as before) ...
-                if cleaned_text.startswith("```json"): cleaned_text = cleaned_text[7:]
-                if cleaned_text.endswith("```"): cleaned_text = cleaned_text[:-3]
-                cleaned_text = cleaned_text.strip()
-                if not cleaned_text: raise ValueError("LLM returned empty JSON string.")
-                llm_output_json = json.loads(cleaned_text)
-                if validate_structured_summary(llm_output_json):
-                    ai_summary_structured = llm_output_json
+            stream_id = get_stream_id(event)
+            synthesis_models = choose_synthesis_models(result_type_indicator, formatted_data_context)
+            attempts = 0; tier_start = time.time(); retry_reason = None
+            if stream_id and execution_store.last_stream_seq(stream_id): retry_reason = "step_retry" # An earlier run of this step streamed here
+            for attempt_index, model_name in enumerate(synthesis_models):
+                timeout = synthesis_attempt_timeout(original_context, fallback_pending=attempt_index < len(synthesis_models) - 1)
+                if timeout is not None and timeout <= 0:
+                    if not llm_error: llm_error = "Synthesis LLM call failed: request deadline passed."
+                    break
+                if stream_id and retry_reason: # Clients drop what the failed attempt (or run) streamed
+                    execution_store.publish_stream_event(stream_id, {"type": "reset", "reason": retry_reason})
+                attempts += 1
+                logger.info(f"Calling Synthesis LLM: {model_name} for {result_type_indicator} (attempt {attempts})...")
+                model = get_synthesis_model(google_api_key, system_instruction, model_name)  # Requests JSON
+                try:
+                    raw_llm_text = call_synthesis_model(model, synthesis_prompt, stream_id, timeout)
+                except Exception as call_err:
+                    if not is_llm_timeout(call_err): raise # Handled below, no fallback
+                    logger.warning(f"Synthesis LLM {model_name} timed out: {call_err}"); retry_reason = "timeout"
+                    llm_error = f"Synthesis LLM call failed: {str(call_err)}"
+                    ai_summary_structured = get_default_summary_structure()  # Fallback
+                    ai_summary_structured["overall_summary"] = "An error occurred during the analysis synthesis."
+                    continue
+                logger.info("Synthesis LLM response received.")
+                logger.debug(f"LLM Raw Response Text:\n{raw_llm_text}")
+
+                try:  # Parse and validate LLM JSON response
+                    ai_summary_structured = parse_structured_summary(raw_llm_text)
+                    llm_error = None
                     logger.info("Successfully parsed and validated structured summary from LLM.")
-                else:
-                    logger.error(
-                        f"LLM JSON output failed validation. Structure received: {json.dumps(llm_output_json)}")
-                    raise ValueError("LLM JSON output failed schema validation.")
-            except (json.JSONDecodeError, ValueError) as parse_err:
-                logger.error(f"Failed to parse or validate LLM JSON response: {parse_err}", exc_info=True)
-                llm_error = f"LLM response parsing/validation error: {parse_err}. Raw text: {raw_llm_text}"
-                ai_summary_structured = get_default_summary_structure()  # Fallback
-                ai_summary_structured[
-                    "overall_summary"] = f"Error: Could not process AI analysis results. Details: {parse_err}"
+                    break
+                except ValueError as parse_err:
+                    logger.error(f"Failed to parse or validate LLM JSON response from {model_name}: {parse_err}", exc_info=True)
+                    retry_reason = "invalid_output"
+                    llm_error = f"LLM response parsing/validation error: {parse_err}. Raw text: {raw_llm_text}"
+                    ai_summary_structured = get_default_summary_structure()  # Fallback
+                    ai_summary_structured[
+                        "overall_summary"] = f"Error: Could not process AI analysis results. Details: {parse_err}"
+            logger.info(json.dumps({"metric": "synthesis_model", "indicator": result_type_indicator, "model": model_name,
+                                    "routed_model": synthesis_models[0], "attempts": attempts, "success": llm_error is None,
+                                    "context_chars": len(formatted_data_context), "duration_ms": round((time.time() - tier_start) * 1000, 1)}))
 
     except Exception as e:  # Catch errors during LLM call itself
         logger.error(f"Synthesis LLM call failed: {e}", exc_info=True)
@@ -6,9 +6,13 @@ import logging
 import os
 import json
 import csv
+import difflib
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Set
+from typing import Dict, List, Any, Optional, Set, Tuple
 import re # Keep existing imports
+import time
+from vocab_matcher import VocabularyMatcher
+import llm_client
 import boto3
 from botocore.exceptions import ClientError
 
@@ -30,7 +34,9 @@ COLORS_CSV = CONFIG_DIR / "colors.csv"
 
 SECRET_NAME = os.environ.get("SECRET_NAME", "YourGeminiSecretName")
 LLM_MODEL_NAME = os.environ.get("INTERPRET_LLM_MODEL", "gemini-2.5-flash-preview-04-17")
+INTERPRET_GENERATION_CONFIG = {"response_mime_type": "application/json"}
 AWS_REGION = os.environ.get("AWS_REGION", "us-west-2")
+SECRET_CACHE_TTL_SECONDS = int(os.environ.get("SECRET_CACHE_TTL_SECONDS", 300)) # A rotated key reaches warm containers within this
 
 # --- Constants for Special Tasks ---
 BRAND_ANALYSIS_CATEGORY = "BRAND_ANALYSIS"
@@ -46,6 +52,10 @@ SUMMARIZE_WEB_TRENDS_TASK = "summarize_web_trends"
 
 COMPARE_CATEGORIES_PLACEHOLDER = "COMPARE_CATEGORIES"
 COMPARE_CATEGORIES_TASK = "compare_categories_task"
+MAX_COMPARISON_CATEGORIES = int(os.environ.get("MAX_COMPARISON_CATEGORIES", "10")) # Keep in sync with fetch_internal_router_v2.py
+# Comparisons also request web_search, which fetch_external_context fans out into one search per category.
+# Same variable as fetch_external_context.py, so turning multi-query off there drops the web search here too.
+MULTI_QUERY_SEARCH_ENABLED = os.environ.get("MULTI_QUERY_SEARCH_ENABLED", "true").lower() == "true"
 
 # --- Logger Setup ---
 logger = logging.getLogger()
@@ -73,13 +83,28 @@ CATEGORIES_BY_DEPARTMENT = { # Assuming these are lowercase already
 
 # Title Case mapping - Build this once during load_config_csvs
 KNOWN_CATEGORIES_TITLE_CASE_MAP: Dict[str, str] = {}
+VOCAB_MATCHER = VocabularyMatcher() # Categories, styles, colors and departments; built in load_config_csvs
+
+def build_amazon_matcher() -> VocabularyMatcher:
+    """
+    Departments and Amazon categories only. Kept apart from VOCAB_MATCHER: there a longer category or style
+    ('evening dresses', 'polo shirts') wins over the Amazon category inside it.
+    """
+    matcher = VocabularyMatcher()
+    matcher.add_all((dept.lower() for dept in VALID_DEPARTMENTS), "department")
+    for department_categories in CATEGORIES_BY_DEPARTMENT.values(): matcher.add_all(department_categories, "amazon_category")
+    matcher.build(); return matcher
+
+
+AMAZON_MATCHER = build_amazon_matcher() # Static vocabulary, independent of the config CSVs
 
 def load_config_csvs():
-    global KNOWN_CATEGORIES, KNOWN_STYLES, KNOWN_COLORS, CONFIG_LOAD_ERROR
+    global KNOWN_CATEGORIES, KNOWN_STYLES, KNOWN_COLORS, CONFIG_LOAD_ERROR, VOCAB_MATCHER
     logger.info(f"Attempting to load config data from: {CONFIG_DIR}")
     KNOWN_CATEGORIES.clear();
     KNOWN_STYLES.clear();
     KNOWN_COLORS.clear();
+    KNOWN_CATEGORIES_TITLE_CASE_MAP.clear();
     CONFIG_LOAD_ERROR = None
     try:
         if not CATEGORIES_CSV.is_file(): raise FileNotFoundError(f"Categories CSV not found at {CATEGORIES_CSV}")
@@ -89,7 +114,9 @@ def load_config_csvs():
             logger.debug(f"Categories CSV header: {header}");
             count = 0
             for row in reader:
-                if row and row[0].strip(): KNOWN_CATEGORIES.add(row[0].strip().lower()); count += 1  # Store lowercase
+                if row and row[0].strip():
+                    KNOWN_CATEGORIES.add(row[0].strip().lower()); count += 1  # Store lowercase
+                    KNOWN_CATEGORIES_TITLE_CASE_MAP[row[0].strip().lower()] = row[0].strip()
             logger.info(f"Loaded {count} standard categories.")
             if count == 0: logger.warning(f"'{CATEGORIES_CSV.name}' contained no data rows.")
         if STYLES_CSV.is_file():
@@ -120,6 +147,11 @@ def load_config_csvs():
                 if count == 0: logger.warning(f"'{COLORS_CSV.name}' contained no data rows.")
         else:
             logger.warning(f"Colors CSV not found at {COLORS_CSV}, color checking unavailable.")
+        matcher = VocabularyMatcher()
+        matcher.add_all(KNOWN_CATEGORIES, "category"); matcher.add_all(KNOWN_STYLES, "style"); matcher.add_all(KNOWN_COLORS, "color")
+        matcher.add_all((dept.lower() for dept in VALID_DEPARTMENTS), "department")
+        matcher.build(); VOCAB_MATCHER = matcher
+        build_candidate_index()
     except FileNotFoundError as e:
         logger.error(f"Config loading failed: {e}"); CONFIG_LOAD_ERROR = str(e)
     except Exception as e:
@@ -127,6 +159,63 @@ def load_config_csvs():
             "CRITICAL ERROR loading config CSVs!"); CONFIG_LOAD_ERROR = f"Unexpected error loading config CSVs: {e}"
 
 
+# --- Vocabulary Candidate Retrieval (keeps the interpretation prompt small) ---
+PROMPT_CANDIDATE_RETRIEVAL_ENABLED = os.environ.get("PROMPT_CANDIDATE_RETRIEVAL_ENABLED", "true").lower() == "true"
+CANDIDATE_FUZZY_CUTOFF = float(os.environ.get("CANDIDATE_FUZZY_CUTOFF", "0.85"))
+CANDIDATE_FUZZY_MIN_TOKEN_LENGTH = 4
+VOCAB_TOKEN_INDEX: Dict[str, Set[tuple]] = {} # token (and singular form) -> {(term, 'style' | 'color')}
+ALL_STYLES_TITLE_CASE: List[str] = []
+ALL_COLORS_TITLE_CASE: List[str] = []
+
+
+def _singularize(token: str) -> str:
+    if token.endswith("ies") and len(token) > 4: return token[:-3] + "y"
+    if token.endswith(("ses", "xes", "ches", "shes")): return token[:-2]
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 3: return token[:-1]
+    return token
+
+
+def _tokenize_query(query_lower: str) -> List[str]:
+    query_lower = re.sub(r"'s\b", "", query_lower).replace("'", "")
+    return re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", query_lower)
+
+
+def build_candidate_index():
+    """Token index over KNOWN_STYLES/KNOWN_COLORS, built once per container after the CSVs load."""
+    global ALL_STYLES_TITLE_CASE, ALL_COLORS_TITLE_CASE
+    VOCAB_TOKEN_INDEX.clear()
+    for vocabulary, term_type in ((KNOWN_STYLES, "style"), (KNOWN_COLORS, "color")):
+        for term in vocabulary:
+            for token in _tokenize_query(term):
+                VOCAB_TOKEN_INDEX.setdefault(token, set()).add((term, term_type))
+                VOCAB_TOKEN_INDEX.setdefault(_singularize(token), set()).add((term, term_type))
+    ALL_STYLES_TITLE_CASE = sorted(s.title() for s in KNOWN_STYLES)
+    ALL_COLORS_TITLE_CASE = sorted(c.title() for c in KNOWN_COLORS)
+    logger.info(f"Built candidate index with {len(VOCAB_TOKEN_INDEX)} tokens.")
+
+
+def retrieve_vocabulary_candidates(user_query: str) -> tuple:
+    """
+    Styles and colors plausibly mentioned in the query: exact matches, then plural token hits, then fuzzy (typo) hits.
+    Any term the query names exactly is always included, so the LLM's exact-match rules still hold.
+    Returns (sorted Title Case styles, sorted Title Case colors).
+    """
+    styles, colors = set(), set()
+    query_lower = user_query.lower()
+    for match in VOCAB_MATCHER.find_all(query_lower): # Exact (incl. multi-word) mentions
+        if "style" in match.kinds: styles.add(match.term.title())
+        if "color" in match.kinds: colors.add(match.term.title())
+        if match.kinds & {"style", "color"}: query_lower = query_lower[:match.start] + " " * (match.end - match.start) + query_lower[match.end:]
+    for token in _tokenize_query(query_lower):
+        hits = VOCAB_TOKEN_INDEX.get(token) or VOCAB_TOKEN_INDEX.get(_singularize(token))
+        if not hits and len(token) >= CANDIDATE_FUZZY_MIN_TOKEN_LENGTH:
+            for close_token in difflib.get_close_matches(token, VOCAB_TOKEN_INDEX.keys(), n=2, cutoff=CANDIDATE_FUZZY_CUTOFF):
+                hits = (hits or set()) | VOCAB_TOKEN_INDEX[close_token]
+        for term, term_type in hits or ():
+            (styles if term_type == "style" else colors).add(term.title())
+    return sorted(styles), sorted(colors)
+
+
 load_config_csvs()
 
 # --- Boto3 Client Setup (Unchanged) ---
@@ -138,8 +227,10 @@ try:
 except Exception as e:
     logger.exception("CRITICAL ERROR initializing Boto3 client!"); BOTO3_CLIENT_ERROR = f"Failed to initialize Boto3 client: {e}"
 
-# --- Get Secret Value (Unchanged) ---
-API_KEY_CACHE: Dict[str, Optional[str]] = {}
+# --- Get Secret Value ---
+# Keys are cached for SECRET_CACHE_TTL_SECONDS so a rotated secret is picked up (llm_client reconfigures on a new key);
+# failures are not cached, so the next request retries Secrets Manager instead of failing until a cold start.
+API_KEY_CACHE: Dict[str, Tuple[str, float]] = {} # cache key -> (value, expires_at)
 def get_secret_value(secret_name: str, key_name: str) -> Optional[str]:
     is_local = os.environ.get("IS_LOCAL", "false").lower() == "true"
     if is_local:
@@ -147,7 +238,8 @@ def get_secret_value(secret_name: str, key_name: str) -> Optional[str]:
         if direct_key: logger.info(f"Using direct env var '{key_name}' (local mode)"); return direct_key
         else: logger.warning(f"Direct env var '{key_name}' not found. Trying Secrets Manager...")
     global API_KEY_CACHE; cache_key = f"{secret_name}:{key_name}"
-    if cache_key in API_KEY_CACHE: logger.debug(f"Using cached secret key: {cache_key}"); return API_KEY_CACHE[cache_key]
+    cached = API_KEY_CACHE.get(cache_key)
+    if cached and cached[1] > time.time(): logger.debug(f"Using cached secret key: {cache_key}"); return cached[0]
     if BOTO3_CLIENT_ERROR: logger.error(f"Boto3 client error: {BOTO3_CLIENT_ERROR}"); return None
     if not secrets_manager: logger.error("Secrets Manager client not initialized."); return None
     try:
@@ -164,12 +256,12 @@ def get_secret_value(secret_name: str, key_name: str) -> Optional[str]:
         if not isinstance(secret_dict, dict): logger.error("Parsed secret not dict."); return None
         key_value = secret_dict.get(key_name)
         if not key_value or not isinstance(key_value, str):
-            logger.error(f"Key '{key_name}' not found or not string in secret '{secret_name}'."); API_KEY_CACHE[cache_key] = None; return None
-        API_KEY_CACHE[cache_key] = key_value; logger.info(f"Key '{key_name}' successfully retrieved and cached."); return key_value
+            logger.error(f"Key '{key_name}' not found or not string in secret '{secret_name}'."); return None
+        API_KEY_CACHE[cache_key] = (key_value, time.time() + SECRET_CACHE_TTL_SECONDS); logger.info(f"Key '{key_name}' successfully retrieved and cached."); return key_value
     except ClientError as e:
-        error_code = e.response.get("Error", {}).get("Code"); logger.error(f"AWS ClientError for '{secret_name}': {error_code}"); API_KEY_CACHE[cache_key] = None; return None
+        error_code = e.response.get("Error", {}).get("Code"); logger.error(f"AWS ClientError for '{secret_name}': {error_code}"); return None
     except Exception as e:
-        logger.exception(f"Unexpected error retrieving secret '{secret_name}'."); API_KEY_CACHE[cache_key] = None; return None
+        logger.exception(f"Unexpected error retrieving secret '{secret_name}'."); return None
 
 # --- Brand/Amazon Extraction Helpers (Unchanged) ---
 def extract_brand_from_query(query: str) -> Optional[str]:
@@ -206,10 +298,9 @@ def clean_domain_for_lookup(input_domain: str) -> str:
     return cleaned.lower()
 
 def extract_amazon_params(query: str) -> Dict[str, Optional[str]]:
-    # (Function unchanged)
     params = {"department": None, "target_category": None}
     if not query or not isinstance(query, str): return params
-    query_lower = query.lower(); original_query = query
+    query_lower = query.lower()
     found_dept_orig_case = None
     dept_keywords = [" department", " for men", " for women", " for kids", " fashion", " beauty"]
     dept_map = {"men": "Men", "women": "Women", "kids": "Kids", "fashion": "Fashion", "beauty": "Beauty"}
@@ -219,9 +310,11 @@ def extract_amazon_params(query: str) -> Dict[str, Optional[str]]:
              if dept_key in dept_map:
                   found_dept_orig_case = dept_map[dept_key]; params["department"] = found_dept_orig_case
                   logger.info(f"Found department '{found_dept_orig_case}' using keyword '{keyword}'"); break
+    vocabulary_matches = AMAZON_MATCHER.find_all(query_lower) # One pass; word boundaries avoid 'ant' in 'pants'
     if not found_dept_orig_case:
+        mentioned_departments = {m.term for m in vocabulary_matches if "department" in m.kinds}
         for dept_val in VALID_DEPARTMENTS:
-             if re.search(r'\b' + re.escape(dept_val.lower()) + r'\b', query_lower):
+             if dept_val.lower() in mentioned_departments:
                   params["department"] = dept_val; found_dept_orig_case = dept_val
                   logger.info(f"Found department '{found_dept_orig_case}' via direct mention."); break
     if not found_dept_orig_case: logger.warning("Could not determine department for Amazon Radar."); return params
@@ -229,11 +322,8 @@ def extract_amazon_params(query: str) -> Dict[str, Optional[str]]:
     dept_key_lower = found_dept_orig_case.lower()
     if dept_key_lower in CATEGORIES_BY_DEPARTMENT:
         possible_categories = CATEGORIES_BY_DEPARTMENT[dept_key_lower]
-        for cat_lower in possible_categories:
-            # Use word boundaries for matching to avoid partial matches like 'ant' in 'pants'
-            pattern = re.compile(r'\b' + re.escape(cat_lower.replace('-', r'\-')) + r'\b', re.IGNORECASE)
-            match = pattern.search(original_query) # Search in original case query to find the word
-            if match:
+        for cat_lower in (m.term for m in vocabulary_matches if "amazon_category" in m.kinds):
+            if cat_lower in possible_categories:
                 # Use the known title case mapping
                 title_cased_cat = KNOWN_CATEGORIES_TITLE_CASE_MAP.get(cat_lower, cat_lower.title()) # Fallback to simple title case
                 params["target_category"] = title_cased_cat
@@ -248,74 +338,16 @@ def extract_amazon_params(query: str) -> Dict[str, Optional[str]]:
 def extract_comparison_subjects_no_re_simple_split(query: str, known_categories_lower: Set[str],
                                                    known_categories_map: Dict[str, str]) -> List[str]:
     """
-    EXTREMELY simple extraction based on splitting by space and known delimiters.
-    Assumes query is very clean or pre-processed.
-    Looks for exactly two known categories.
+    Known categories mentioned in the query, in query order, via the shared vocabulary matcher
+    (longest match wins, so 'cocktail dresses' is not also reported as 'dresses').
+    Returns each distinct name once, in its CSV casing; the caller enforces MAX_COMPARISON_CATEGORIES.
     """
     if not query or not isinstance(query, str):
         return []
-    specials=['Polo Shirts','Evening Dresses',
-              'Cocktail Dresses','High Heels','Ankle Boots','Running Shoes']
-    lst=[]
-    texts = query.replace("'", "").split()
-    for i in texts:
-        if i.lower() in known_categories_lower:
-            lst.append(i.lower().title())
-    if 'high heels' in query.lower() and 'High Heels' not in lst:
-        lst.append('High Heels')
-    if 'polo shirts' in query.lower() and 'Polo Shirts' not in lst:
-        lst.append('Polo Shirts')
-        try:
-            lst.remove('Shirts')
-        except:
-            pass
-    if 'evening dresses' in query.lower() and 'Evening Dresses' not in lst:
-        lst.append('Evening Dresses')
-        try:
-            lst.remove('Dresses')
-        except:
-            pass
-    if 'cocktail dresses' in query.lower() and 'Cocktail Dresses' not in lst:
-        lst.append('Cocktail Dresses')
-        try:
-            lst.remove('Dresses')
-        except:
-            pass
-    if 'ankle boots' in query.lower() and 'Ankle Boots' not in lst:
-        lst.append('Ankle Boots')
-        try:
-            lst.remove('Boots')
-        except:
-            pass
-    if 'running shoes' in query.lower() and 'Running Shoes' not in lst:
-        lst.append('Running Shoes')
-        try:
-            lst.remove('Shoes')
-        except:
-            pass
-    if 'tank tops' in query.lower() and 'Tank Tops' not in lst:
-        lst.append('Tank Tops')
-        try:
-            lst.remove('Tops')
-        except:
-            pass
-    if 'crop tops' in query.lower() and 'Crop Tops' not in lst:
-        lst.append('Crop Tops')
-        try:
-            lst.remove('Tops')
-        except:
-            pass
-    if 'tote bags'in  query.lower() and 'tote bags' not in lst:
-        lst.append('Tote Bags')
-        try:
-            lst.remove('Bags')
-        except:
-            pass
-
-    if 't-shirts' in query.lower() and "T-shirts" not in lst:
-        lst.append('T-shirts')
-    while len(lst)>2:
-        x=lst.pop()
+    lst = []
+    for term in VOCAB_MATCHER.find_terms(query.replace("'", ""), "category"):
+        name = known_categories_map.get(term, term.title())
+        if term in known_categories_lower and name not in lst: lst.append(name)
     logger.info(f"extracted categories are {lst}")
 
 
@@ -324,6 +356,232 @@ def extract_comparison_subjects_no_re_simple_split(query: str, known_categories_
 # --- END NEW ROBUST ---
 
 
+# --- Deterministic Fast Path (skips the LLM for common query shapes) ---
+FAST_PATH_ENABLED = os.environ.get("FAST_PATH_ENABLED", "true").lower() == "true"
+FAST_PATH_CONFIDENCE_THRESHOLD = float(os.environ.get("FAST_PATH_CONFIDENCE_THRESHOLD", "0.8"))
+
+# Intent keywords, checked against query tokens. Mirrors the keyword guidance in the LLM prompt.
+FAST_PATH_INTENT_KEYWORDS: Dict[str, Set[str]] = {
+    "forecast": {"will", "forecast", "forecasts", "forecasting", "predict", "prediction", "predictions", "projection", "outlook"},
+    "mega": {"hot", "hottest", "mega", "rising"},
+    "why": {"why", "reason", "reasons", "driving", "behind"},
+    "recommend": {"recommend", "recommendation", "recommendations", "suggest", "suggestions", "stock", "invest"},
+    "trend": {"trend", "trends", "trending", "popular", "popularity", "demand", "performing", "performance", "doing", "selling", "growing", "growth"},
+}
+# Phrasings the fast path never answers on its own; the LLM decides these.
+FAST_PATH_DEFER_KEYWORDS = {"compare", "comparison", "comparing", "vs", "versus", "between", "or", "difference", "better", "brand", "brands", "amazon"}
+FAST_PATH_WEB_KEYWORDS = {"news", "sentiment", "competitor", "competitors", "web", "global", "week"}
+FAST_PATH_TIMEFRAME_PATTERN = re.compile(
+    r"\b(?:next|last|past|coming|upcoming)\s+(?:\d+|few|couple\s+of|one|two|three|six|twelve)?\s*(?:days?|weeks?|months?|quarters?|years?|seasons?)\b"
+    r"|\b(?:this|next|last)\s+(?:week|month|quarter|year|season|spring|summer|fall|autumn|winter)\b"
+    r"|\b(?:latest|recent|recently|right\s+now|currently|nowadays|today|20\d\d)\b")
+FAST_PATH_NEUTRAL_WORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "been", "being", "by", "can", "could", "currently",
+    "do", "does", "for", "from", "get", "give", "going", "has", "have", "how", "i", "in", "into", "is", "it", "its", "me", "my",
+    "now", "of", "on", "our", "please", "right", "show", "so", "some", "tell", "that", "the", "their", "there", "these", "this",
+    "those", "to", "up", "us", "was", "we", "what", "whats", "when", "where", "which", "with", "would", "you", "your",
+    "latest", "recent", "recently", "next", "last", "past", "coming", "upcoming", "months", "month", "weeks", "years", "year",
+    "season", "seasons", "today", "nowadays", "few", "couple", "quarter", "quarters", "days", "day",
+    "spring", "summer", "fall", "autumn", "winter",
+    "men", "mens", "women", "womens", "kids", "kid", "ladies", "girls", "boys",
+    "market", "markets", "fashion", "style", "color", "colour", "category",
+    "item", "items", "product", "products", "customers", "shoppers", "consumers", "store", "stores", "shop", "online", "retail",
+    "sales", "data", "analysis", "insight", "insights", "overview", "summary", "summarize", "look", "looking", "like", "see",
+    "seeing", "know", "want", "need", "should", "expected", "expect", "most", "more", "much", "well",
+    "down", "over", "time", "general", "overall", "current", "future", "country",
+}
+FAST_PATH_COUNTRY_WORDS = {"usa", "us", "america", "american", "united", "states", "uk", "britain", "british", "kingdom",
+                           "england", "australia", "australian", "canada", "canadian", "germany", "france", "japan", "india"}
+
+
+def classify_query_rule_based(user_query: str, category: str, country: str) -> tuple:
+    """
+    Deterministic interpretation for common query shapes. Returns (output_payload | None, confidence).
+    The payload uses the same schema as the LLM output (before post_process_interpretation).
+    Confidence drops for anything the rules can't account for (unknown words, other categories, mixed intents),
+    so those queries still go to the LLM.
+    """
+    query_lower = user_query.lower()
+    tokens = _tokenize_query(query_lower)
+    if not tokens: return None, 0.0
+    token_set = set(tokens)
+    if token_set & FAST_PATH_DEFER_KEYWORDS: return None, 0.0
+
+    category_lower = category.lower()
+    category_words = set(_tokenize_query(category_lower))
+    category_words |= {_singularize(w) for w in category_words}
+    country_words = set(_tokenize_query(country.lower())) | FAST_PATH_COUNTRY_WORDS
+
+    vocabulary_matches = VOCAB_MATCHER.find_all(query_lower)
+    color_matches = [m for m in vocabulary_matches if "color" in m.kinds]
+    style_matches = [m for m in vocabulary_matches if "style" in m.kinds]
+    other_categories = {m.term for m in vocabulary_matches if "category" in m.kinds} - {category_lower}
+    if other_categories: return None, 0.0 # Possible category mismatch; the LLM decides
+
+    residual_text = query_lower
+    for match in color_matches + style_matches:
+        residual_text = residual_text[:match.start] + " " * (match.end - match.start) + residual_text[match.end:]
+    intent_words = set().union(*FAST_PATH_INTENT_KEYWORDS.values()) | FAST_PATH_WEB_KEYWORDS
+    residual_tokens = [t for t in _tokenize_query(residual_text) if t not in FAST_PATH_NEUTRAL_WORDS
+                       and t not in intent_words and t not in country_words and t not in category_words
+                       and _singularize(t) not in category_words and not t.isdigit()]
+
+    intents = [name for name, keywords in FAST_PATH_INTENT_KEYWORDS.items() if token_set & keywords]
+    if not intents: return None, 0.0
+
+    specific_known = [{"subject": m.term.title(), "type": "color"} for m in color_matches]
+    specific_known += [{"subject": m.term.title(), "type": "style"} for m in style_matches]
+    timeframe_match = FAST_PATH_TIMEFRAME_PATTERN.search(query_lower)
+    needs_web = bool(token_set & FAST_PATH_WEB_KEYWORDS)
+
+    output = {"status": "success", "primary_task": None, "required_sources": [],
+              "query_subjects": {"specific_known": specific_known, "unmapped_items": []},
+              "timeframe_reference": timeframe_match.group(0) if timeframe_match else None,
+              "attributes": [], "clarification_needed": None}
+    # Intent precedence follows the prompt: forecast > why > recommend > mega > trend
+    if "forecast" in intents:
+        confidence = 0.9
+        if specific_known:
+            output["primary_task"] = "get_forecast"; output["required_sources"] = ["internal_trends_item", "internal_forecast"]
+        else:
+            output.update(status="needs_clarification", primary_task="get_forecast", required_sources=["clarify"],
+                          clarification_needed=f"Forecasts require a specific style or color for {category}.")
+    elif "why" in intents:
+        confidence = 0.85
+        output["primary_task"] = "qa_combined"
+        output["required_sources"] = ["internal_trends_item" if specific_known else "internal_trends_category", "web_search"]
+    elif "recommend" in intents:
+        confidence = 0.85 if specific_known else 0.6 # Open-ended "what should I stock" needs the LLM
+        output["primary_task"] = "get_recommendation"
+        output["required_sources"] = ["internal_trends_item" if specific_known else "internal_trends_category"]
+    elif "mega" in intents and not specific_known:
+        confidence = 0.9
+        output["primary_task"] = "summarize_mega_trends"; output["required_sources"] = ["internal_mega", "web_search"]
+    else: # trend (or 'hot' with specific subjects)
+        confidence = 0.9
+        if specific_known:
+            output["primary_task"] = "get_trend"; output["required_sources"] = ["internal_trends_item"]
+        else:
+            output["primary_task"] = "summarize_category"; output["required_sources"] = ["internal_trends_category"]
+
+    if needs_web and "web_search" not in output["required_sources"] and output["status"] == "success":
+        output["required_sources"].append("web_search")
+    if len(set(intents) - {"trend"}) > 1: confidence -= 0.15 # "trend" words accompany every other intent
+    if not specific_known and not token_set & category_words: confidence -= 0.15 # Query never names the context
+    if style_matches: confidence -= 0.05 # Style/category appropriateness is only judged by the LLM
+    confidence -= 0.15 * len(residual_tokens) # Unrecognised words may be unmapped items or attributes
+    logger.debug(f"Fast path: intents={intents}, residual={residual_tokens}, confidence={confidence:.2f}")
+    return output, round(max(confidence, 0.0), 2)
+
+
+def post_process_interpretation(llm_output: Dict) -> Dict:
+    """Source/status consistency rules applied to every standard interpretation (LLM or fast path)."""
+    current_task = llm_output.get("primary_task"); current_status = llm_output.get("status")
+    if (current_task is None or current_task == "unknown") and \
+       (current_status is None or current_status not in ["success", "needs_clarification"]) and \
+       not llm_output.get("query_subjects", {}).get("specific_known") and not llm_output.get("query_subjects", {}).get("unmapped_items"):
+        logger.warning("LLM failed to classify a general category query. Applying fallback.")
+        llm_output["primary_task"] = "summarize_category"; llm_output["required_sources"] = ["internal_trends_category"]
+        llm_output["status"] = "success"; llm_output["clarification_needed"] = None
+        if "query_subjects" not in llm_output: llm_output["query_subjects"] = {"specific_known": [], "unmapped_items": []}
+        if "timeframe_reference" not in llm_output: llm_output["timeframe_reference"] = None
+        if "attributes" not in llm_output: llm_output["attributes"] = []
+
+    primary_task_llm = llm_output.get("primary_task"); required_sources_set = set(llm_output.get("required_sources", []))
+    unmapped_items_llm = llm_output.get("query_subjects", {}).get("unmapped_items", [])
+    specific_known_llm = llm_output.get("query_subjects", {}).get("specific_known", [])
+
+    if primary_task_llm == "summarize_mega_trends":
+        if "internal_mega" not in required_sources_set: required_sources_set.add("internal_mega")
+        required_sources_set.add("web_search")
+        required_sources_set.discard("internal_trends_item"); required_sources_set.discard("internal_forecast"); required_sources_set.discard("internal_trends_category")
+
+    if primary_task_llm in ["get_trend", "qa_combined", "qa_internal_only", "qa_web_only"] and \
+       not specific_known_llm and unmapped_items_llm and \
+       "internal_trends_category" not in required_sources_set:
+       required_sources_set.add("internal_trends_category")
+
+    if specific_known_llm or unmapped_items_llm:
+        if "internal_mega" in required_sources_set and primary_task_llm != "summarize_mega_trends":
+            required_sources_set.discard("internal_mega")
+            if not required_sources_set: required_sources_set.add("internal_trends_category")
+
+    has_mega = "internal_mega" in required_sources_set
+    has_other_internal = any(s in required_sources_set for s in ["internal_trends_category", "internal_trends_item", "internal_forecast"])
+
+    if primary_task_llm != "summarize_mega_trends" and has_mega and has_other_internal :
+         required_sources_set.discard("internal_mega")
+
+    llm_output["required_sources"] = sorted(list(required_sources_set))
+
+    if "clarify" in llm_output.get("required_sources", []) and llm_output.get("status") != "needs_clarification":
+        llm_output["status"] = "needs_clarification"
+    if llm_output.get("status") == "needs_clarification" and not llm_output.get("clarification_needed"):
+        llm_output["clarification_needed"] = "Query requires clarification. Please be more specific."
+    return llm_output
+
+
+def build_interpretation_prompt(user_query: str, category: str, country: str, known_styles_list: List[str],
+                                known_colors_list: List[str], candidates_only: bool = False) -> str:
+    """Standard interpretation prompt. With candidates_only the lists hold only the terms retrieved for this query."""
+    list_scope = "global, pre-filtered to terms that may appear in the query" if candidates_only else "global"
+    return f"""Analyze the user query strictly within the given fashion context.
+        
+        Context:
+            - Category: "{category}"
+            - Country: "{country}"
+            - List of All Known Styles ({list_scope}): {json.dumps(known_styles_list) if known_styles_list else "None Provided"}
+            - List of All Known Colors ({list_scope}): {json.dumps(known_colors_list) if known_colors_list else "None Provided"}
+
+
+        User Query: "{user_query.lower()}"
+
+        Instructions:
+        1.  Identify the primary analysis task based on the User Query's intent. Choose ONE EXCLUSIVELY from this exact list: ['get_trend', 'get_forecast', 'get_recommendation', 'compare_items', 'summarize_category', 'summarize_mega_trends', 'qa_web_only', 'qa_internal_only', 'qa_combined', 'unknown']. 
+            **Prioritize 'summarize_mega_trends' if the query uses keywords like 'mega', 'hot', 'hottest', or 'rising trends' AND does not mention specific items/styles/colors.** Otherwise, determine intent based on keywords like 'forecast', 'recommend', 'compare', 'summarize category', 'trend', 'why', 'news', etc. For general questions about "what's trending" without a specific item, lean towards 'summarize_category' or 'summarize_mega_trends' if applicable. If the query asks 'why' something is trending or for reasoning that requires external knowledge, consider 'qa_web_only' or 'qa_combined'.
+
+        2.  Determine the necessary data sources required for the identified primary_task. Choose one or more EXCLUSIVELY from this exact list: ['internal_trends_category', 'internal_trends_item', 'internal_forecast', 'internal_mega', 'web_search', 'clarify']. Follow these rules STRICTLY:
+            -   Web Search Rule: You MUST include 'web_search' if the query explicitly asks 'why', mentions 'news', 'sentiment', 'competitors', 'web', 'web search', 'hot' trends, 'this week', 'global' trends, or clearly requires external context/reasoning not available in internal data. Also, if the task is 'qa_web_only' or 'qa_combined', 'web_search' is mandatory.
+            -   Item Detail Rule: If step 3 identifies ANY subjects in `specific_known_subjects` (meaning specific styles or colors are identified for the given category) AND the task requires item-level detail (like 'get_forecast', 'get_recommendation' for an item, 'compare_items', 'get_trend' for a specific item/style/color), you MUST include 'internal_trends_item'.
+            -   Forecast Rule: If the primary_task is 'get_forecast' and 'internal_trends_item' is selected (due to specific subjects being present), you MUST ALSO include 'internal_forecast'. Forecasts are only possible for specific items/styles/colors.
+            -   Category Context Rule: If the task is broad (e.g., 'summarize_category', or 'get_trend' for the whole category without specific items/styles/colors mentioned or identified), use 'internal_trends_category'. ALSO, if the task is 'get_trend' or 'qa_combined' or 'qa_internal_only' or 'qa_web_only' and step 3 identifies items in `unmapped_items` but NOT in `specific_known_subjects`, you MUST include 'internal_trends_category' to provide context.
+            -   Mega Trends Rule: Use 'internal_mega' ONLY if the primary_task is 'summarize_mega_trends'. If 'internal_mega' is selected, DO NOT include 'internal_trends_category', 'internal_trends_item', or 'internal_forecast'. However, 'web_search' CAN be combined with 'internal_mega' if the query implies needing external context for mega trends. Also, as checked in step 3, DO NOT use 'internal_mega' if step 3 identifies ANY subjects in `specific_known_subjects` OR `unmapped_items` (as mega trends are broad, not item-specific).
+            -   Clarification Rule: If the query is too ambiguous, invalid, lacks specifics needed for the task (e.g., 'get_forecast' without an item/style/color), or falls outside the Category/Country context, use ONLY 'clarify' as the source.
+
+        3.  Extract key entities mentioned in the User Query. Apply these rules STRICTLY:
+            -   First, identify all potential fashion subjects (styles, colors, items like 'bomber jacket') in the query.
+            -   For EACH potential subject:
+                a. Check for an exact case-insensitive match in the 'All Known Styles' or 'All Known Colors' lists provided in the Context.
+                b. If a match IS found: Determine if it's a 'style' or 'color'. 
+                   **If it's a 'color', add it directly** to the `specific_known_subjects` list as an object: `{{"subject": "Matched Term Title Case", "type": "color"}}`.
+                   **If it's a 'style', THEN check if the matched style is appropriate** for the stated Category context (e.g., 'Dresses' as a style is inappropriate for the 'Shirts' Category). If the style IS appropriate for the category, add it to `specific_known_subjects` as an object: `{{"subject": "Matched Term Title Case", "type": "style"}}`. If the style is NOT appropriate for the category, add the term (Title Case) to `unmapped_items`.
+                c. If NO exact match is found in the known lists: Add the term (Title Case) to the `unmapped_items` list.
+                d. DO NOT guess or find the 'closest' match. Only exact matches are processed for `specific_known_subjects`.
+            -   `specific_known_subjects`: List of objects for matched subjects (colors are always added if matched; styles only if matched AND category-appropriate). Can be empty.
+            -   `unmapped_items`: List of terms (Title Case) that were not exact matches, were category-inappropriate styles, or other potential fashion items. Can be empty.
+            -   `timeframe_reference`: Any mention of time (e.g., "next 6 months", "latest", "last year"). Return null if none found.
+            -   `attributes`: Any other descriptors mentioned (e.g., "material:linen", "price:high"). Return [] if none found.
+
+        4.  Determine the overall 'status'. It MUST be 'needs_clarification' ONLY if 'clarify' is in `required_sources` (from step 2) OR if step 3 added items to `unmapped_items` because they were category-inappropriate styles that prevent analysis. Otherwise (even if 'web_search' is required or there are other `unmapped_items` like unrecognized product names), it MUST be 'success'.
+
+        5.  Provide a concise 'clarification_needed' message (string) ONLY if status is 'needs_clarification' (from step 4), otherwise it MUST be null. Explain *why* clarification is needed (e.g., "Style 'Dresses' is not applicable to the 'Shirts' category. Please specify a relevant style or remove it.", or "Query is too ambiguous, please specify if you want trends or a forecast.", or "Forecasts require a specific style or color for [Category].").
+
+        Output ONLY a valid JSON object following this exact structure:
+        {{
+          "status": "success | needs_clarification",
+          "primary_task": "string | null",
+          "required_sources": ["string", ...],
+          "query_subjects": {{
+            "specific_known": [ {{ "subject": "string (Title Case)", "type": "color | style" }} ],
+            "unmapped_items": ["string (Title Case)", ...]
+          }},
+          "timeframe_reference": "string | null",
+          "attributes": ["string", ...],
+          "clarification_needed": "string | null"
+        }}
+        """
+
+
 # --- Main Lambda Handler ---
 def lambda_handler(event, context):
     # (Initial checks for CONFIG_LOAD_ERROR, BOTO3_CLIENT_ERROR, GEMINI_SDK_AVAILABLE unchanged)
@@ -332,6 +590,15 @@ def lambda_handler(event, context):
     if not GEMINI_SDK_AVAILABLE: return {"statusCode": 500, "body": json.dumps({"status": "error", "error_message": "Gemini SDK unavailable."})}
 
     logger.info(f"Received event: {json.dumps(event)}")
+    if isinstance(event, dict) and event.get("warmup"): # Scheduled keep-warm ping: build the model client ahead of real traffic
+        google_api_key = get_secret_value(SECRET_NAME, "GOOGLE_API_KEY")
+        if not google_api_key: return {"statusCode": 500, "body": json.dumps({"status": "error", "error_message": "API key config error (Google)."})}
+        try:
+            warm_up_result = llm_client.warm_up(google_api_key, [(LLM_MODEL_NAME, INTERPRET_GENERATION_CONFIG)])
+        except Exception as e:
+            logger.error(f"LLM warm-up failed: {e}", exc_info=True)
+            return {"statusCode": 500, "body": json.dumps({"status": "error", "error_message": str(e)})}
+        return {"statusCode": 200, "body": json.dumps({"status": "warm", **warm_up_result, "llm": llm_client.health_check()})}
     try:
         # (Input parsing unchanged)
         if isinstance(event.get('body'), str): body = json.loads(event['body']); logger.debug("Parsed body from API GW event.")
@@ -345,6 +612,11 @@ def lambda_handler(event, context):
 
     category_upper = category.upper() if isinstance(category, str) else ""
     original_context_payload = {'category': category, 'country': country, 'query': user_query}
+    for passthrough_key in ('stream_id', 'execution_token'): # Set by the proxy; read by synthesis
+        if isinstance(body.get(passthrough_key), str) and body.get(passthrough_key):
+            original_context_payload[passthrough_key] = body[passthrough_key]
+    if isinstance(body.get('deadline_ms'), (int, float)): # Set by the proxy; read by the router
+        original_context_payload['deadline_ms'] = int(body['deadline_ms'])
 
     # --- Placeholder Handling Logic ---
 
@@ -414,13 +686,13 @@ def lambda_handler(event, context):
 
         clarification_message = None
 
-        if len(comparison_subjects_names_title_case) == 2:
-            # Success condition: Exactly 2 known categories found
+        if 2 <= len(comparison_subjects_names_title_case) <= MAX_COMPARISON_CATEGORIES:
+            # Success condition: 2 to MAX_COMPARISON_CATEGORIES known categories found
             validated_comparison_subjects = [{"subject": name, "type": "category"} for name in comparison_subjects_names_title_case]
             original_context_payload['comparison_subjects_extracted'] = comparison_subjects_names_title_case
             output_payload = {
                 "status": "success", "primary_task": COMPARE_CATEGORIES_TASK,
-                "required_sources": ["internal_trends_category"],
+                "required_sources": ["internal_trends_category"] + (["web_search"] if MULTI_QUERY_SEARCH_ENABLED else []),
                 "query_subjects": {
                     "comparison_subjects": validated_comparison_subjects,
                     "specific_known": [], "unmapped_items": []
@@ -431,8 +703,8 @@ def lambda_handler(event, context):
             logger.info("Bypassing LLM. Returning direct payload for Category Comparison (Robust Extraction).")
             return {"statusCode": 200, "body": json.dumps(output_payload)}
 
-        elif len(comparison_subjects_names_title_case) > 2:
-             clarification_message = f"Your query mentions multiple potential categories ({', '.join(comparison_subjects_names_title_case)}). Please specify exactly which two you'd like to compare."
+        elif len(comparison_subjects_names_title_case) > MAX_COMPARISON_CATEGORIES:
+             clarification_message = f"Your query mentions {len(comparison_subjects_names_title_case)} categories ({', '.join(comparison_subjects_names_title_case)}). I can compare up to {MAX_COMPARISON_CATEGORIES} at a time; please narrow the list."
         elif len(comparison_subjects_names_title_case) == 1:
              clarification_message = f"I found the category '{comparison_subjects_names_title_case[0]}' in your query. Please specify which other category you'd like to compare it with."
         else: # 0 found
@@ -451,94 +723,38 @@ def lambda_handler(event, context):
 
     # 5. Handle Standard Interpretation (LLM Path - Unchanged)
     else:
+        if FAST_PATH_ENABLED:
+            fast_path_output, fast_path_confidence = classify_query_rule_based(user_query, category.lower().title(), country)
+            if fast_path_output is not None and fast_path_confidence >= FAST_PATH_CONFIDENCE_THRESHOLD:
+                fast_path_output = post_process_interpretation(fast_path_output)
+                logger.info(f"Bypassing LLM. Fast path interpretation (confidence {fast_path_confidence}). Task: {fast_path_output.get('primary_task')}, Status: {fast_path_output.get('status')}, Sources: {fast_path_output.get('required_sources')}")
+                fast_path_output['original_context'] = original_context_payload
+                return {"statusCode": 200, "body": json.dumps(fast_path_output)}
+            logger.info(f"Fast path confidence {fast_path_confidence} below threshold {FAST_PATH_CONFIDENCE_THRESHOLD}.")
+
         logger.info("Category is not a placeholder. Proceeding with standard LLM interpretation.")
         # (Standard LLM interpretation logic is exactly the same as the previous version)
         google_api_key = get_secret_value(SECRET_NAME, "GOOGLE_API_KEY")
         if not google_api_key: return {"statusCode": 500, "body": json.dumps({"status": "error", "error_message": "API key config error (Google)."})}
         try:
-             genai.configure(api_key=google_api_key); model = genai.GenerativeModel(LLM_MODEL_NAME)
+             model = llm_client.get_model(google_api_key, LLM_MODEL_NAME, INTERPRET_GENERATION_CONFIG) # Cached per container
         except Exception as configure_err:
              actual_error = str(configure_err); logger.error(f"Gemini SDK config error: {actual_error}", exc_info=True)
              if "model not found" in actual_error.lower() or "invalid api key" in actual_error.lower(): return {"statusCode": 400, "body": json.dumps({"status": "error", "error_message": f"LLM config error: {actual_error}"})}
              else: return {"statusCode": 500, "body": json.dumps({"status": "error", "error_message": "LLM SDK configuration error."})}
 
-        known_styles_list = sorted([s.title() for s in KNOWN_STYLES])
-        known_colors_list = sorted([c.title() for c in KNOWN_COLORS])
-        # This is the string that will be formatted and assigned to the 'prompt' variable
-        # within the standard LLM interpretation block of interpret_query_v2.py
-
-        # Example of how it would be used in the code:
-        # user_query = "..." ; category = "..." ; country = "..."
-        # known_styles_list = [...] ; known_colors_list = [...]
-        # prompt_template_string = """ ... (the full text below) ... """
-        # prompt = prompt_template_string.format(
-        #     category=category,
-        #     country=country,
-        #     known_styles_list_json=json.dumps(known_styles_list) if known_styles_list else "None Provided",
-        #     known_colors_list_json=json.dumps(known_colors_list) if known_colors_list else "None Provided",
-        #     user_query=user_query
-        # )
-        category=category.lower().title()
-        prompt = f"""Analyze the user query strictly within the given fashion context.
-        
-        Context:
-            - Category: "{category}"
-            - Country: "{country}"
-            - List of All Known Styles (global): {json.dumps(known_styles_list) if known_styles_list else "None Provided"}
-            - List of All Known Colors (global): {json.dumps(known_colors_list) if known_colors_list else "None Provided"}
-
-
-        User Query: "{user_query.lower()}"
-
-        Instructions:
-        1.  Identify the primary analysis task based on the User Query's intent. Choose ONE EXCLUSIVELY from this exact list: ['get_trend', 'get_forecast', 'get_recommendation', 'compare_items', 'summarize_category', 'summarize_mega_trends', 'qa_web_only', 'qa_internal_only', 'qa_combined', 'unknown']. 
-            **Prioritize 'summarize_mega_trends' if the query uses keywords like 'mega', 'hot', 'hottest', or 'rising trends' AND does not mention specific items/styles/colors.** Otherwise, determine intent based on keywords like 'forecast', 'recommend', 'compare', 'summarize category', 'trend', 'why', 'news', etc. For general questions about "what's trending" without a specific item, lean towards 'summarize_category' or 'summarize_mega_trends' if applicable. If the query asks 'why' something is trending or for reasoning that requires external knowledge, consider 'qa_web_only' or 'qa_combined'.
-
-        2.  Determine the necessary data sources required for the identified primary_task. Choose one or more EXCLUSIVELY from this exact list: ['internal_trends_category', 'internal_trends_item', 'internal_forecast', 'internal_mega', 'web_search', 'clarify']. Follow these rules STRICTLY:
-            -   Web Search Rule: You MUST include 'web_search' if the query explicitly asks 'why', mentions 'news', 'sentiment', 'competitors', 'web', 'web search', 'hot' trends, 'this week', 'global' trends, or clearly requires external context/reasoning not available in internal data. Also, if the task is 'qa_web_only' or 'qa_combined', 'web_search' is mandatory.
-            -   Item Detail Rule: If step 3 identifies ANY subjects in `specific_known_subjects` (meaning specific styles or colors are identified for the given category) AND the task requires item-level detail (like 'get_forecast', 'get_recommendation' for an item, 'compare_items', 'get_trend' for a specific item/style/color), you MUST include 'internal_trends_item'.
-            -   Forecast Rule: If the primary_task is 'get_forecast' and 'internal_trends_item' is selected (due to specific subjects being present), you MUST ALSO include 'internal_forecast'. Forecasts are only possible for specific items/styles/colors.
-            -   Category Context Rule: If the task is broad (e.g., 'summarize_category', or 'get_trend' for the whole category without specific items/styles/colors mentioned or identified), use 'internal_trends_category'. ALSO, if the task is 'get_trend' or 'qa_combined' or 'qa_internal_only' or 'qa_web_only' and step 3 identifies items in `unmapped_items` but NOT in `specific_known_subjects`, you MUST include 'internal_trends_category' to provide context.
-            -   Mega Trends Rule: Use 'internal_mega' ONLY if the primary_task is 'summarize_mega_trends'. If 'internal_mega' is selected, DO NOT include 'internal_trends_category', 'internal_trends_item', or 'internal_forecast'. However, 'web_search' CAN be combined with 'internal_mega' if the query implies needing external context for mega trends. Also, as checked in step 3, DO NOT use 'internal_mega' if step 3 identifies ANY subjects in `specific_known_subjects` OR `unmapped_items` (as mega trends are broad, not item-specific).
-            -   Clarification Rule: If the query is too ambiguous, invalid, lacks specifics needed for the task (e.g., 'get_forecast' without an item/style/color), or falls outside the Category/Country context, use ONLY 'clarify' as the source.
-
-        3.  Extract key entities mentioned in the User Query. Apply these rules STRICTLY:
-            -   First, identify all potential fashion subjects (styles, colors, items like 'bomber jacket') in the query.
-            -   For EACH potential subject:
-                a. Check for an exact case-insensitive match in the 'All Known Styles' or 'All Known Colors' lists provided in the Context.
-                b. If a match IS found: Determine if it's a 'style' or 'color'. 
-                   **If it's a 'color', add it directly** to the `specific_known_subjects` list as an object: `{{"subject": "Matched Term Title Case", "type": "color"}}`.
-                   **If it's a 'style', THEN check if the matched style is appropriate** for the stated Category context (e.g., 'Dresses' as a style is inappropriate for the 'Shirts' Category). If the style IS appropriate for the category, add it to `specific_known_subjects` as an object: `{{"subject": "Matched Term Title Case", "type": "style"}}`. If the style is NOT appropriate for the category, add the term (Title Case) to `unmapped_items`.
-                c. If NO exact match is found in the known lists: Add the term (Title Case) to the `unmapped_items` list.
-                d. DO NOT guess or find the 'closest' match. Only exact matches are processed for `specific_known_subjects`.
-            -   `specific_known_subjects`: List of objects for matched subjects (colors are always added if matched; styles only if matched AND category-appropriate). Can be empty.
-            -   `unmapped_items`: List of terms (Title Case) that were not exact matches, were category-inappropriate styles, or other potential fashion items. Can be empty.
-            -   `timeframe_reference`: Any mention of time (e.g., "next 6 months", "latest", "last year"). Return null if none found.
-            -   `attributes`: Any other descriptors mentioned (e.g., "material:linen", "price:high"). Return [] if none found.
-
-        4.  Determine the overall 'status'. It MUST be 'needs_clarification' ONLY if 'clarify' is in `required_sources` (from step 2) OR if step 3 added items to `unmapped_items` because they were category-inappropriate styles that prevent analysis. Otherwise (even if 'web_search' is required or there are other `unmapped_items` like unrecognized product names), it MUST be 'success'.
-
-        5.  Provide a concise 'clarification_needed' message (string) ONLY if status is 'needs_clarification' (from step 4), otherwise it MUST be null. Explain *why* clarification is needed (e.g., "Style 'Dresses' is not applicable to the 'Shirts' category. Please specify a relevant style or remove it.", or "Query is too ambiguous, please specify if you want trends or a forecast.", or "Forecasts require a specific style or color for [Category].").
-
-        Output ONLY a valid JSON object following this exact structure:
-        {{
-          "status": "success | needs_clarification",
-          "primary_task": "string | null",
-          "required_sources": ["string", ...],
-          "query_subjects": {{
-            "specific_known": [ {{ "subject": "string (Title Case)", "type": "color | style" }} ],
-            "unmapped_items": ["string (Title Case)", ...]
-          }},
-          "timeframe_reference": "string | null",
-          "attributes": ["string", ...],
-          "clarification_needed": "string | null"
-        }}
-        """
+        if PROMPT_CANDIDATE_RETRIEVAL_ENABLED:
+            known_styles_list, known_colors_list = retrieve_vocabulary_candidates(user_query)
+            logger.info(f"Prompt candidates - Styles: {known_styles_list}, Colors: {known_colors_list}")
+        else:
+            known_styles_list, known_colors_list = ALL_STYLES_TITLE_CASE, ALL_COLORS_TITLE_CASE
+        category = category.lower().title()
+        prompt = build_interpretation_prompt(user_query, category, country, known_styles_list, known_colors_list,
+                                             candidates_only=PROMPT_CANDIDATE_RETRIEVAL_ENABLED)
         logger.debug("Prompt constructed.")
         logger.info(f"Calling LLM: {LLM_MODEL_NAME} for standard interpretation...")
         try:
-            generation_config = genai.types.GenerationConfig(response_mime_type="application/json")
-            response = model.generate_content(prompt, generation_config=generation_config)
+            response = model.generate_content(prompt)
             logger.info("LLM response received."); logger.debug(f"LLM Raw Response Text:\n{response.text}")
         except Exception as llm_err:
              logger.error(f"LLM API call failed: {llm_err}", exc_info=True)
@@ -569,48 +785,7 @@ def lambda_handler(event, context):
                 if item["type"] not in ["color", "style"]: raise ValueError(f"Invalid type '{item['type']}': {item}")
                 if not isinstance(item.get("subject"), str): raise ValueError(f"Subject not string: {item}")
 
-            current_task = llm_output.get("primary_task"); current_status = llm_output.get("status")
-            if (current_task is None or current_task == "unknown") and \
-               (current_status is None or current_status not in ["success", "needs_clarification"]) and \
-               not query_subjects_llm.get("specific_known") and not query_subjects_llm.get("unmapped_items"):
-                logger.warning("LLM failed to classify a general category query. Applying fallback.")
-                llm_output["primary_task"] = "summarize_category"; llm_output["required_sources"] = ["internal_trends_category"]
-                llm_output["status"] = "success"; llm_output["clarification_needed"] = None
-                if "query_subjects" not in llm_output: llm_output["query_subjects"] = {"specific_known": [], "unmapped_items": []}
-                if "timeframe_reference" not in llm_output: llm_output["timeframe_reference"] = None
-                if "attributes" not in llm_output: llm_output["attributes"] = []
-
-            primary_task_llm = llm_output.get("primary_task"); required_sources_set = set(llm_output.get("required_sources", []))
-            unmapped_items_llm = llm_output.get("query_subjects", {}).get("unmapped_items", [])
-            specific_known_llm = llm_output.get("query_subjects", {}).get("specific_known", [])
-
-            if primary_task_llm == "summarize_mega_trends":
-                if "internal_mega" not in required_sources_set: required_sources_set.add("internal_mega")
-                required_sources_set.add("web_search")
-                required_sources_set.discard("internal_trends_item"); required_sources_set.discard("internal_forecast"); required_sources_set.discard("internal_trends_category")
-
-            if primary_task_llm in ["get_trend", "qa_combined", "qa_internal_only", "qa_web_only"] and \
-               not specific_known_llm and unmapped_items_llm and \
-               "internal_trends_category" not in required_sources_set:
-               required_sources_set.add("internal_trends_category")
-
-            if specific_known_llm or unmapped_items_llm:
-                if "internal_mega" in required_sources_set and primary_task_llm != "summarize_mega_trends":
-                    required_sources_set.discard("internal_mega")
-                    if not required_sources_set: required_sources_set.add("internal_trends_category")
-
-            has_mega = "internal_mega" in required_sources_set
-            has_other_internal = any(s in required_sources_set for s in ["internal_trends_category", "internal_trends_item", "internal_forecast"])
-
-            if primary_task_llm != "summarize_mega_trends" and has_mega and has_other_internal :
-                 required_sources_set.discard("internal_mega")
-
-            llm_output["required_sources"] = sorted(list(required_sources_set))
-
-            if "clarify" in llm_output.get("required_sources", []) and llm_output.get("status") != "needs_clarification":
-                llm_output["status"] = "needs_clarification"
-            if llm_output.get("status") == "needs_clarification" and not llm_output.get("clarification_needed"):
-                llm_output["clarification_needed"] = "Query requires clarification. Please be more specific."
+            llm_output = post_process_interpretation(llm_output)
 
             logger.info(f"LLM interpretation successful (post-processed). Task: {llm_output.get('primary_task')}, Status: {llm_output.get('status')}, Sources: {llm_output.get('required_sources')}")
             llm_output['original_context'] = original_context_payload
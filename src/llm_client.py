@@ -0,0 +1,230 @@
+# src/llm_client.py
+import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import google.generativeai as genai
+    GEMINI_SDK_AVAILABLE = True
+except ImportError:
+    genai = None
+    GEMINI_SDK_AVAILABLE = False
+
+logger = logging.getLogger()
+
+# --- Model Registry ---
+# One GenerativeModel per (model name, generation config, system instruction) per container. genai.configure() is
+# process-wide, so it only runs again when the API key changes (secret rotation), which also drops the cached models.
+_registry_lock = threading.Lock()
+_models: Dict[Tuple[str, str, str], Any] = {}
+_configured_api_key: Optional[str] = None
+_model_factory: Optional[Callable[..., Any]] = None # Test hook; replaces genai.GenerativeModel
+_stats = {"configure_calls": 0, "models_created": 0, "cache_hits": 0, "context_caches_created": 0, "context_cache_failures": 0}
+
+# --- Context Caches ---
+# Explicit Gemini context caches (CachedContent) holding a system instruction, one per (model, instruction) per
+# container; containers find each other's by display name. While a cache cannot be created the instruction is
+# served by a plain system-instruction model: for good when it is below the model's minimum cacheable size,
+# otherwise (rate limits, network errors) until a backoff expires. Cache lookups and creation are network calls,
+# made under a per-instruction lock rather than _registry_lock so get_model callers never wait on them.
+CONTEXT_CACHE_RETRY_SECONDS = 60 # First backoff after a transient failure; doubles per consecutive failure
+CONTEXT_CACHE_MAX_RETRY_SECONDS = 60 * 60
+_context_caches: Dict[Tuple[str, str], Any] = {}
+_uncacheable: Dict[Tuple[str, str], Tuple[float, int, str]] = {} # key -> (retry at, consecutive failures, error)
+_context_cache_locks: Dict[Tuple[str, str], threading.Lock] = {}
+_context_cache_factory: Optional[Callable[[str, str, int], Any]] = None # Test hook; replaces genai.caching.CachedContent
+
+
+def _config_key(generation_config: Optional[Dict]) -> str:
+    return json.dumps(generation_config or {}, sort_keys=True)
+
+
+def _key_fingerprint(api_key: Optional[str]) -> Optional[str]:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8] if api_key else None
+
+
+def _instruction_key(system_instruction: Optional[str]) -> str:
+    return hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()[:16] if system_instruction else ""
+
+
+def _create_model(model_name: str, generation_config: Optional[Dict], system_instruction: Optional[str] = None,
+                  cached_content: Any = None) -> Any:
+    if _model_factory is not None:
+        extra = {"system_instruction": system_instruction} if system_instruction else {}
+        if cached_content is not None: extra = {"cached_content": cached_content}
+        return _model_factory(model_name, generation_config, **extra)
+    if not GEMINI_SDK_AVAILABLE:
+        raise RuntimeError("google-generativeai SDK not available.")
+    config = genai.types.GenerationConfig(**generation_config) if generation_config else None
+    if cached_content is not None: return genai.GenerativeModel.from_cached_content(cached_content, generation_config=config)
+    return genai.GenerativeModel(model_name, generation_config=config, system_instruction=system_instruction)
+
+
+def _configure(api_key: str):
+    """Caller holds _registry_lock."""
+    global _configured_api_key
+    if api_key == _configured_api_key: return
+    if _configured_api_key is not None:
+        logger.info(f"API key changed ({_key_fingerprint(_configured_api_key)} -> {_key_fingerprint(api_key)}). Reconfiguring LLM client.")
+    if _model_factory is None:
+        if not GEMINI_SDK_AVAILABLE: raise RuntimeError("google-generativeai SDK not available.")
+        genai.configure(api_key=api_key)
+    _stats["configure_calls"] += 1
+    _models.clear(); _context_caches.clear(); _uncacheable.clear(); _configured_api_key = api_key
+
+
+def get_model(api_key: str, model_name: str, generation_config: Optional[Dict] = None, system_instruction: Optional[str] = None) -> Any:
+    """
+    Returns the cached model for (model_name, generation_config, system_instruction), creating it on first use.
+    `generation_config` is a plain dict of GenerationConfig fields (e.g. {"response_mime_type": "application/json"}).
+    """
+    if not api_key: raise ValueError("API key is required.")
+    registry_key = (model_name, _config_key(generation_config), _instruction_key(system_instruction))
+    with _registry_lock:
+        _configure(api_key)
+        model = _models.get(registry_key)
+        if model is not None:
+            _stats["cache_hits"] += 1
+            return model
+        model = _create_model(model_name, generation_config, system_instruction)
+        _models[registry_key] = model; _stats["models_created"] += 1
+        logger.info(f"Created LLM model client: {model_name} (config: {registry_key[1]}, instruction: {registry_key[2] or 'none'})")
+        return model
+
+
+def _create_context_cache(model_name: str, system_instruction: str, display_name: str, ttl_seconds: int) -> Any:
+    if _context_cache_factory is not None:
+        return _context_cache_factory(model_name, system_instruction, ttl_seconds)
+    for cached in genai.caching.CachedContent.list(): # Another container may have created it already
+        if cached.display_name == display_name and cached.model.endswith(model_name) and cached.expire_time.timestamp() > time.time() + 60:
+            return cached
+    return genai.caching.CachedContent.create(model=model_name, display_name=display_name, system_instruction=system_instruction,
+                                             ttl=datetime.timedelta(seconds=ttl_seconds))
+
+
+def _is_below_cache_minimum(error: Exception) -> bool:
+    """The API rejects content under the model's minimum cacheable size; that will not change on retry."""
+    message = str(error).lower()
+    return "min_total_token_count" in message or "too small" in message
+
+
+def _cached_context_entry(cache_key: Tuple[str, str]) -> Tuple[Any, bool]:
+    """(live cached-content model or None, whether creating one may be attempted now). Caller holds _registry_lock."""
+    entry = _context_caches.get(cache_key)
+    if entry is not None and entry[0] > time.time(): return entry[1], False
+    failure = _uncacheable.get(cache_key)
+    return None, failure is None or failure[0] <= time.time()
+
+
+def get_cached_context_model(api_key: str, model_name: str, generation_config: Optional[Dict], system_instruction: str,
+                             ttl_seconds: int) -> Any:
+    """
+    Returns a model bound to a context cache holding `system_instruction`, so requests send only their own
+    contents and the instruction is billed at the cached-token rate. The cache is created on first use and
+    recreated once it is close to expiry; if it cannot be created the plain system-instruction model is returned.
+    """
+    if not api_key: raise ValueError("API key is required.")
+    instruction_key = _instruction_key(system_instruction)
+    cache_key = (model_name, instruction_key)
+    with _registry_lock:
+        _configure(api_key)
+        model, may_create = _cached_context_entry(cache_key)
+        if model is not None: _stats["cache_hits"] += 1; return model
+        build_lock = _context_cache_locks.setdefault(cache_key, threading.Lock())
+    if may_create:
+        with build_lock: # One creation per instruction at a time; the registry stays available meanwhile
+            with _registry_lock:
+                model, may_create = _cached_context_entry(cache_key) # Another thread may have just created it
+                if model is not None: _stats["cache_hits"] += 1; return model
+            if may_create:
+                model = _build_cached_context_model(api_key, model_name, generation_config, system_instruction, ttl_seconds, cache_key)
+                if model is not None: return model
+    return get_model(api_key, model_name, generation_config, system_instruction)
+
+
+def _build_cached_context_model(api_key: str, model_name: str, generation_config: Optional[Dict], system_instruction: str,
+                                ttl_seconds: int, cache_key: Tuple[str, str]) -> Any:
+    """Creates (or finds) the context cache outside _registry_lock and records the outcome; None on failure."""
+    instruction_key = cache_key[1]
+    try:
+        cached_content = _create_context_cache(model_name, system_instruction, f"instruction-{instruction_key}", ttl_seconds)
+        model = _create_model(model_name, generation_config, cached_content=cached_content)
+    except Exception as e:
+        with _registry_lock:
+            if api_key != _configured_api_key: return None # Key rotated meanwhile; the failure may not apply to the new key
+            failures = _uncacheable.get(cache_key, (0.0, 0, ""))[1] + 1
+            if _is_below_cache_minimum(e):
+                retry_at = float("inf")
+            else:
+                retry_at = time.time() + min(CONTEXT_CACHE_RETRY_SECONDS * 2 ** (failures - 1), CONTEXT_CACHE_MAX_RETRY_SECONDS)
+            _uncacheable[cache_key] = (retry_at, failures, str(e)); _stats["context_cache_failures"] += 1
+        retry_note = "not retried" if retry_at == float("inf") else f"retry in {retry_at - time.time():.0f}s"
+        logger.warning(f"Context cache unavailable for {model_name} instruction {instruction_key}, using system instruction ({retry_note}): {e}")
+        return None
+    # Refreshed well before the cache's own expiry so no request lands on an expired cache
+    refresh_at = time.time() + ttl_seconds * 0.8
+    expire_time = getattr(cached_content, "expire_time", None)
+    if expire_time is not None: refresh_at = min(refresh_at, expire_time.timestamp() - 60)
+    with _registry_lock:
+        if api_key == _configured_api_key: # Not stored across a key rotation that happened meanwhile
+            _context_caches[cache_key] = (refresh_at, model); _uncacheable.pop(cache_key, None)
+        _stats["context_caches_created"] += 1
+    logger.info(f"Created context cache for {model_name} instruction {instruction_key} (ttl {ttl_seconds}s)")
+    return model
+
+
+def warm_up(api_key: str, model_specs: List[Tuple[str, Optional[Dict]]]) -> Dict[str, Any]:
+    """Creates the listed (model_name, generation_config) clients ahead of the first real request."""
+    start = time.time(); warmed = []
+    for model_name, generation_config in model_specs:
+        get_model(api_key, model_name, generation_config); warmed.append(model_name)
+    return {"warmed": warmed, "duration_ms": round((time.time() - start) * 1000, 1)}
+
+
+def health_check(probe: bool = False) -> Dict[str, Any]:
+    """
+    Registry state for health endpoints and keep-warm pings. With probe=True each cached model
+    makes a cheap count_tokens call so key or quota problems surface before a user request does.
+    """
+    with _registry_lock:
+        models = dict(_models)
+        status = {"sdk_available": GEMINI_SDK_AVAILABLE or _model_factory is not None,
+                  "configured": _configured_api_key is not None,
+                  "key_fingerprint": _key_fingerprint(_configured_api_key),
+                  "models": sorted({name for name, _, _ in models}), **_stats}
+    if probe:
+        probe_results = {}
+        for (model_name, config_key, instruction_key), model in models.items():
+            label = f"{model_name} {config_key} {instruction_key}".rstrip()
+            try:
+                model.count_tokens("ping"); probe_results[label] = "ok"
+            except Exception as e:
+                logger.warning(f"LLM health probe failed for {model_name}: {e}")
+                probe_results[label] = f"error: {e}"
+        status["probe"] = probe_results
+        status["healthy"] = all(result == "ok" for result in probe_results.values())
+    return status
+
+
+def set_model_factory(factory: Optional[Callable[..., Any]], context_cache_factory: Optional[Callable[[str, str, int], Any]] = None):
+    """
+    Installs a factory returning fake models (local tests); None restores the Gemini SDK. Clears the registry.
+    The factory is called as factory(model_name, generation_config) plus system_instruction= or cached_content=
+    when set; context_cache_factory(model_name, system_instruction, ttl_seconds) stands in for CachedContent.create.
+    """
+    global _model_factory, _context_cache_factory
+    with _registry_lock:
+        _model_factory = factory; _context_cache_factory = context_cache_factory
+    reset()
+
+
+def reset():
+    """Drops cached models and the configured key (tests, or forcing a rebuild after an auth failure)."""
+    global _configured_api_key
+    with _registry_lock:
+        _models.clear(); _context_caches.clear(); _uncacheable.clear(); _context_cache_locks.clear(); _configured_api_key = None
+        for stat_name in _stats: _stats[stat_name] = 0
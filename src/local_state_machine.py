@@ -0,0 +1,82 @@
+# src/local_state_machine.py
+import copy
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Callable, Any
+
+logger = logging.getLogger()
+
+LOCAL_STATE_MACHINE_ARN = "arn:aws:states:local:000000000000:stateMachine:local"
+
+
+def parse_handler_body(result: Any) -> Any:
+    """Lambda handlers that return API-GW style {'statusCode', 'body': '<json>'} are unwrapped like the workflow does."""
+    if isinstance(result, dict) and isinstance(result.get("body"), str) and "statusCode" in result:
+        return json.loads(result["body"])
+    return result
+
+
+def run_pipeline_locally(sfn_input: Dict) -> Any:
+    """
+    Mirrors the deployed workflow in-process: interpret -> (internal router | external context) -> generate.
+    Imports are deferred so the stand-in can be used without loading every handler.
+    """
+    import interpret_query_v2
+    import fetch_internal_router_v2
+    import fetch_external_context
+    import generate_final_response_v2
+
+    interpretation = parse_handler_body(interpret_query_v2.lambda_handler(sfn_input, None))
+    # Each branch gets its own copy, as it would from the state machine's JSON hand-off
+    internal_data = fetch_internal_router_v2.lambda_handler(copy.deepcopy(interpretation), None)
+    external_data = fetch_external_context.lambda_handler(copy.deepcopy(interpretation), None)
+    final_result = generate_final_response_v2.lambda_handler(
+        {"internal_data": internal_data, "external_data": external_data}, None)
+    return parse_handler_body(final_result)
+
+
+class LocalStateMachine:
+    """
+    Stand-in for the boto3 Step Functions client used by the proxy in local runs and tests.
+    Supports start_sync_execution, start_execution (runs on a background thread) and
+    describe_execution, returning responses shaped like the real API.
+    """
+
+    def __init__(self, runner: Optional[Callable[[Dict], Any]] = None):
+        self.runner = runner or run_pipeline_locally
+        self.executions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _execute(self, execution_arn: str, input_string: str) -> Dict[str, Any]:
+        record = {"executionArn": execution_arn, "status": "RUNNING", "startDate": time.time(), "input": input_string}
+        with self._lock:
+            self.executions[execution_arn] = record
+        try:
+            output = self.runner(json.loads(input_string))
+            record.update(status="SUCCEEDED", output=json.dumps(output))
+        except Exception as e:
+            logger.exception(f"Local execution {execution_arn} failed.")
+            record.update(status="FAILED", error=type(e).__name__, cause=json.dumps({"errorMessage": str(e)}))
+        record["stopDate"] = time.time()
+        return record
+
+    def start_sync_execution(self, stateMachineArn: str, input: str = "{}", name: Optional[str] = None, **kwargs) -> Dict:
+        execution_arn = f"{stateMachineArn}:{name or uuid.uuid4()}"
+        return dict(self._execute(execution_arn, input))
+
+    def start_execution(self, stateMachineArn: str, input: str = "{}", name: Optional[str] = None, **kwargs) -> Dict:
+        execution_arn = f"{stateMachineArn}:{name or uuid.uuid4()}"
+        with self._lock:
+            self.executions[execution_arn] = {"executionArn": execution_arn, "status": "RUNNING", "startDate": time.time()}
+        threading.Thread(target=self._execute, args=(execution_arn, input), daemon=True).start()
+        return {"executionArn": execution_arn, "startDate": time.time()}
+
+    def describe_execution(self, executionArn: str, **kwargs) -> Dict:
+        with self._lock:
+            record = self.executions.get(executionArn)
+        if record is None:
+            raise KeyError(f"Execution does not exist: {executionArn}")
+        return dict(record)
@@ -0,0 +1,60 @@
+# src/lru_ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class LRUTTLCache:
+    """
+    Size-bounded, thread-safe in-process cache with per-entry expiry. Lives for the life of a warm
+    Lambda container and sits in front of a shared (DynamoDB) tier. Cached values are shared
+    between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.time):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0; self.misses = 0; self.evictions = 0; self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1; return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]; self.expirations += 1; self.misses += 1
+                return default
+            self._entries.move_to_end(key); self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        """Stores `value`; expiry is the earlier of the cache TTL and `expires_at` (e.g. the shared tier's TTL)."""
+        now = self._clock()
+        expiry = now + self.ttl_seconds
+        if expires_at is not None: expiry = min(expiry, expires_at)
+        if expiry <= now: return
+        with self._lock:
+            self._entries[key] = (expiry, value); self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False); self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                    "evictions": self.evictions, "expirations": self.expirations}
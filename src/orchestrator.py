@@ -0,0 +1,120 @@
+# src/orchestrator.py
+import copy
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+
+import interpret_query_v2
+import fetch_internal_router_v2
+import fetch_external_context
+import generate_final_response_v2
+from local_state_machine import parse_handler_body
+from search_cache_keys import build_search_cache_key
+from speculation import SpeculativeFetch, summarize_speculation
+
+# --- Configuration ---
+# Single-Lambda alternative to the Step Functions workflow: same input (the proxy's request body),
+# same output (the synthesis step's payload), no per-hop JSON serialization or state transitions,
+# one cold start instead of four. The proxy routes ORCHESTRATOR_TRAFFIC_PERCENT of sync requests here.
+ORCHESTRATOR_FETCH_TIMEOUT_SECONDS = float(os.environ.get("ORCHESTRATOR_FETCH_TIMEOUT_SECONDS", 120))
+# Start the usual TREND_MAIN call and the raw-query web search while the interpreter's LLM call runs.
+# A fetch the interpretation does not ask for is discarded (its cost is spent; a web search still fills the cache).
+SPECULATIVE_PREFETCH_ENABLED = os.environ.get("SPECULATIVE_PREFETCH_ENABLED", "true").lower() == "true"
+# Placeholder categories whose tasks never make the standard TREND_MAIN call / never search the raw query
+NO_SPECULATIVE_TRENDS_CATEGORIES = {interpret_query_v2.BRAND_ANALYSIS_CATEGORY, interpret_query_v2.AMAZON_RADAR_CATEGORY,
+                                    interpret_query_v2.WEB_SEARCH_GENERAL_TRENDS_CATEGORY,
+                                    interpret_query_v2.COMPARE_CATEGORIES_PLACEHOLDER}
+NO_SPECULATIVE_SEARCH_CATEGORIES = {interpret_query_v2.BRAND_ANALYSIS_CATEGORY, interpret_query_v2.AMAZON_RADAR_CATEGORY}
+
+# --- Logger Setup ---
+logger = logging.getLogger()
+log_level_str = os.environ.get("LOG_LEVEL", "INFO").upper()
+valid_log_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+if log_level_str not in valid_log_levels: log_level_str = "INFO"
+logger.setLevel(log_level_str)
+
+# Internal router and external search run side by side; the pool lives for the container
+_fetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="orchestrator-fetch")
+# Separate pool so a discarded speculative fetch still running never delays the real ones
+_speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="orchestrator-speculate")
+
+
+def _timed(handler: Callable, event: Any, **kwargs) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = handler(event, None, **kwargs)
+    return result, round((time.perf_counter() - start) * 1000, 1)
+
+
+def start_speculative_fetches(request: Dict) -> Dict[str, SpeculativeFetch]:
+    """
+    Fetches most requests end up making, keyed the way the router/external steps look them up: TREND_MAIN
+    for the request's (country, category) at the default timeframe, and a web search for the raw query.
+    Fields are read the way interpret_query_v2 reads them.
+    """
+    if not SPECULATIVE_PREFETCH_ENABLED or not isinstance(request, dict): return {}
+    query, category, country = request.get("query"), request.get("category"), request.get("country")
+    if not all(isinstance(value, str) and value for value in (query, category, country)): return {}
+    category = category.lower().title(); category_upper = category.upper()
+
+    fetches = {}
+    if category_upper not in NO_SPECULATIVE_TRENDS_CATEGORIES and not fetch_internal_router_v2.BOTO3_CLIENT_ERROR:
+        router = fetch_internal_router_v2
+        payload = router.trend_main_payload(country, category, router.map_timeframe_reference(None))
+        fetches["trend_main"] = SpeculativeFetch("trend_main", router.task_key(router.TREND_MAIN_LAMBDA_NAME, payload), _speculation_pool,
+                                                 router.invoke_lambda_task_cached, router.TREND_MAIN_LAMBDA_NAME, payload, "trends_single")
+    external = fetch_external_context
+    if category_upper not in NO_SPECULATIVE_SEARCH_CATEGORIES and external.TAVILY_SDK_AVAILABLE \
+            and not external.BOTO3_CLIENT_ERROR and external.DDB_RESOURCE_AVAILABLE:
+        search_query = query.strip()[:1000]
+        fetches["web_search"] = SpeculativeFetch("web_search", build_search_cache_key(search_query, normalize=external.CACHE_KEY_NORMALIZATION_ENABLED),
+                                                 _speculation_pool, external.search_with_cache, search_query,
+                                                 {"country": country, "category": category})
+    return fetches
+
+
+def run_pipeline(sfn_input: Dict) -> Tuple[Any, Dict[str, Any]]:
+    """
+    interpret -> (internal router || external context) -> generate, in-process, with the speculative fetches
+    running alongside interpret. Each fetch step gets its own copy of the interpretation, as it would from
+    the state machine. Returns (final payload, per-step timings in ms plus speculation outcomes).
+    """
+    pipeline_start = time.perf_counter()
+    speculative = start_speculative_fetches(sfn_input)
+    interpretation_result, interpret_ms = _timed(interpret_query_v2.lambda_handler, sfn_input)
+    interpretation = parse_handler_body(interpretation_result)
+
+    router_prefetched = {fetch.key: fetch for name, fetch in speculative.items() if name == "trend_main"}
+    external_prefetched = {fetch.key: fetch for name, fetch in speculative.items() if name == "web_search"}
+    internal_future = _fetch_pool.submit(_timed, fetch_internal_router_v2.lambda_handler, copy.deepcopy(interpretation),
+                                         prefetched=router_prefetched, pass_by_reference=False) # Handed over in-process
+    external_future = _fetch_pool.submit(_timed, fetch_external_context.lambda_handler, copy.deepcopy(interpretation),
+                                         prefetched=external_prefetched)
+    internal_data, internal_ms = internal_future.result(timeout=ORCHESTRATOR_FETCH_TIMEOUT_SECONDS)
+    external_data, external_ms = external_future.result(timeout=ORCHESTRATOR_FETCH_TIMEOUT_SECONDS)
+
+    final_result, generate_ms = _timed(generate_final_response_v2.lambda_handler,
+                                       {"internal_data": internal_data, "external_data": external_data})
+    timings = {"interpret_ms": interpret_ms, "internal_ms": internal_ms, "external_ms": external_ms,
+               "generate_ms": generate_ms, "total_ms": round((time.perf_counter() - pipeline_start) * 1000, 1)}
+    if speculative: timings["speculation"] = summarize_speculation(speculative)
+    return parse_handler_body(final_result), timings
+
+
+def warm_up() -> Dict[str, Any]:
+    """Keep-warm ping: builds both LLM clients (imports, boto3 clients and config CSVs already loaded at init)."""
+    interpret_warm = parse_handler_body(interpret_query_v2.lambda_handler({"warmup": True}, None))
+    generate_warm = parse_handler_body(generate_final_response_v2.lambda_handler({"warmup": True}, None))
+    return {"status": "warm", "interpret": interpret_warm, "generate": generate_warm}
+
+
+# --- Main Lambda Handler ---
+def lambda_handler(event, context):
+    """Takes the state machine's input and returns its output; errors raise, as a failed execution would."""
+    if isinstance(event, dict) and event.get("warmup"): return warm_up()
+    if isinstance(event, dict) and isinstance(event.get("body"), str): event = json.loads(event["body"]) # Direct API GW invoke
+    final_payload, timings = run_pipeline(event)
+    logger.info(json.dumps({"metric": "orchestrator_timings", **timings}))
+    return final_payload
@@ -0,0 +1,141 @@
+# src/search_cache_keys.py
+import math
+import re
+import threading
+import unicodedata
+from difflib import SequenceMatcher
+import zlib
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Dict, List, Optional, Tuple
+
+# --- Normalization Vocabulary ---
+# Country aliases -> canonical token; multi-word aliases are replaced before tokenization.
+# Bare "us" is not here: it is usually the pronoun ("what do stylists tell us"), see normalize_search_query.
+COUNTRY_ALIASES: Dict[str, str] = {
+    "united states of america": "country_us", "united states": "country_us", "u.s.a.": "country_us", "u.s.a": "country_us",
+    "u.s.": "country_us", "usa": "country_us", "america": "country_us", "american": "country_us",
+    "united kingdom": "country_uk", "great britain": "country_uk", "u.k.": "country_uk", "uk": "country_uk",
+    "britain": "country_uk", "british": "country_uk", "england": "country_uk",
+    "australia": "country_au", "australian": "country_au", "canada": "country_ca", "canadian": "country_ca",
+    "germany": "country_de", "german": "country_de", "france": "country_fr", "french": "country_fr",
+    "italy": "country_it", "italian": "country_it", "spain": "country_es", "spanish": "country_es",
+    "sweden": "country_se", "swedish": "country_se", "japan": "country_jp", "japanese": "country_jp",
+    "india": "country_in", "indian": "country_in",
+}
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "by", "can", "could", "do", "does", "for", "from",
+    "give", "how", "i", "in", "into", "is", "it", "its", "me", "my", "of", "on", "or", "our", "please", "show", "tell",
+    "that", "the", "their", "there", "these", "this", "those", "to", "us", "was", "we", "what", "whats", "which", "with",
+    "would", "you", "your", "some", "get", "currently", "right", "now", "market", "country",
+}
+_COUNTRY_ALIAS_PATTERN = re.compile(
+    r"(?<![\w.])(" + "|".join(re.escape(alias) for alias in sorted(COUNTRY_ALIASES, key=len, reverse=True)) + r")(?![\w])")
+# "us" is the country only when it cannot be the pronoun: "the us" in any case, or "US" in a query that is not all capitals.
+_THE_US_PATTERN = re.compile(r"(?<![\w.])the\s+us(?!\w)", re.IGNORECASE)
+_CAPITALIZED_US_PATTERN = re.compile(r"(?<![\w.])US(?!\w)")
+# Words whose trailing "s" is not a plural (or whose singular means something else): "news" is not "new", "shorts" not "short".
+SINGULAR_EXCEPTIONS = {"news", "lens", "series", "species", "canvas", "bias", "atlas", "always", "shorts", "glasses", "pants"}
+
+
+def _singularize(token: str) -> str:
+    if token in SINGULAR_EXCEPTIONS: return token
+    if token.endswith("ies") and len(token) > 4: return token[:-3] + "y"
+    if token.endswith(("ses", "xes", "ches", "shes")): return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us")) and len(token) > 3: return token[:-1]
+    return token
+
+
+def normalize_search_query(search_query: str) -> str:
+    """
+    Canonical form of a search query for cache keys: case folding, country alias canonicalization,
+    punctuation and stopword removal, singular category/item words, then sorted unique tokens.
+    "Jeans trends in US" and "jeans trends in the United States " both become "country_us jean trend";
+    "what do stylists tell us about jeans" keeps no country.
+    """
+    text = _THE_US_PATTERN.sub(" country_us ", unicodedata.normalize("NFKC", search_query or ""))
+    if not text.isupper(): text = _CAPITALIZED_US_PATTERN.sub(" country_us ", text) # "TELL US ABOUT JEANS" is the pronoun
+    text = text.casefold()
+    text = text.replace("’", "'")
+    text = _COUNTRY_ALIAS_PATTERN.sub(lambda match: f" {COUNTRY_ALIASES[match.group(1)]} ", text)
+    text = re.sub(r"'s\b", "", text).replace("'", "")
+    tokens = re.findall(r"[a-z0-9_]+(?:-[a-z0-9]+)*", text)
+    tokens = {_singularize(token) for token in tokens if token not in STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def build_search_cache_key(search_query: str, normalize: bool = True) -> str:
+    if not normalize: return sha256(search_query.encode()).hexdigest()
+    return sha256(f"norm:{normalize_search_query(search_query)}".encode()).hexdigest()
+
+
+# --- Local Similarity Index ---
+SIMILARITY_VECTOR_DIMENSIONS = 1024
+
+
+def embed_normalized_query(normalized_query: str) -> Dict[int, float]:
+    """
+    Hashed bag of tokens and character trigrams, L2-normalized (sparse). Cheap and dependency-free;
+    trigrams make typos and inflections land near each other.
+    """
+    vector: Dict[int, float] = {}
+    for token in normalized_query.split():
+        padded = f"#{token}#"
+        features = [f"t:{token}"] + [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+        for feature in features:
+            weight = 2.0 if feature.startswith("t:") else 1.0
+            index = zlib.crc32(feature.encode()) % SIMILARITY_VECTOR_DIMENSIONS
+            vector[index] = vector.get(index, 0.0) + weight
+    norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+    return {index: value / norm for index, value in vector.items()}
+
+
+def _guard_tokens(normalized_query: str) -> frozenset:
+    """Tokens that must match exactly for two queries to share results (countries, years/numbers)."""
+    return frozenset(token for token in normalized_query.split() if token.startswith("country_") or token.isdigit())
+
+
+def _tokens_align(query_tokens: frozenset, candidate_tokens: frozenset, min_ratio: float = 0.75) -> bool:
+    """Every token only one side has must closely match a token only the other side has (spelling variants, not new subjects)."""
+    only_query, only_candidate = query_tokens - candidate_tokens, candidate_tokens - query_tokens
+    if not only_query and not only_candidate: return True
+    if not only_query or not only_candidate: return False
+    def has_partner(token, others): return any(SequenceMatcher(None, token, other).ratio() >= min_ratio for other in others)
+    return all(has_partner(t, only_candidate) for t in only_query) and all(has_partner(t, only_query) for t in only_candidate)
+
+
+class SemanticQueryIndex:
+    """
+    Bounded, per-container index of recently cached normalized queries -> cache key.
+    find_similar() returns the closest earlier query above the cosine threshold whose
+    country/number tokens match exactly and whose remaining differences are spelling variants,
+    so "jeans trends US" never answers "jeans trends UK" and "pet accessories" never answers "women accessories".
+    """
+
+    def __init__(self, max_entries: int = 512, threshold: float = 0.9):
+        self.max_entries = max_entries; self.threshold = threshold
+        self._entries: "OrderedDict[str, Tuple[str, Dict[int, float], frozenset]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, normalized_query: str, cache_key: str):
+        entry = (cache_key, embed_normalized_query(normalized_query), _guard_tokens(normalized_query))
+        with self._lock:
+            self._entries[normalized_query] = entry; self._entries.move_to_end(normalized_query)
+            while len(self._entries) > self.max_entries: self._entries.popitem(last=False)
+
+    def find_similar(self, normalized_query: str) -> Optional[Tuple[str, str, float]]:
+        """Returns (cache_key, matched normalized query, similarity) or None."""
+        query_vector = embed_normalized_query(normalized_query); guard = _guard_tokens(normalized_query)
+        best: Optional[Tuple[str, str, float]] = None
+        with self._lock:
+            entries = list(self._entries.items())
+        for candidate_query, (cache_key, vector, candidate_guard) in entries:
+            if candidate_query == normalized_query or candidate_guard != guard: continue
+            similarity = sum(value * vector.get(index, 0.0) for index, value in query_vector.items())
+            if similarity < self.threshold or (best is not None and similarity <= best[2]): continue
+            if _tokens_align(frozenset(normalized_query.split()), frozenset(candidate_query.split())):
+                best = (cache_key, candidate_query, similarity)
+        return best
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -2,13 +2,64 @@
 import json
 import logging
 import os
+import random
+import time
+import uuid
+from hashlib import sha256
+from typing import Dict, Optional, Any, Tuple
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+import execution_store
+from local_state_machine import LocalStateMachine, LOCAL_STATE_MACHINE_ARN
+
 # --- Configuration ---
 # Read State Machine ARN from environment variable
 STATE_MACHINE_ARN = os.environ.get("STATE_MACHINE_ARN")
 AWS_REGION = os.environ.get("AWS_REGION", "us-west-2") # Get region
+# "sync" (default) keeps the proxy waiting on StartSyncExecution; "async" returns an execution token immediately
+PROXY_EXECUTION_MODE = os.environ.get("PROXY_EXECUTION_MODE", "sync").lower()
+ASYNC_EXECUTION_TIMEOUT_SECONDS = int(os.environ.get("ASYNC_EXECUTION_TIMEOUT_SECONDS", 5 * 60))
+# Run the workflow in-process with the local stand-in instead of Step Functions (local runs / tests)
+USE_LOCAL_STATE_MACHINE = os.environ.get("USE_LOCAL_STATE_MACHINE", "false").lower() == "true"
+if USE_LOCAL_STATE_MACHINE and not STATE_MACHINE_ARN: STATE_MACHINE_ARN = LOCAL_STATE_MACHINE_ARN
+
+# --- Orchestrator A/B ---
+# Share of sync requests (0-100) sent to the single-Lambda orchestrator (src/orchestrator.py) instead of the state machine
+ORCHESTRATOR_LAMBDA_NAME = os.environ.get("ORCHESTRATOR_LAMBDA_NAME")
+ORCHESTRATOR_TRAFFIC_PERCENT = float(os.environ.get("ORCHESTRATOR_TRAFFIC_PERCENT", 0))
+ORCHESTRATOR_TIMEOUT_SECONDS = int(os.environ.get("ORCHESTRATOR_TIMEOUT_SECONDS", 300)) # Must cover the whole pipeline
+
+# --- Request Deadlines ---
+# Stamped into the workflow input as deadline_ms (epoch ms); the router splits what is left into per-task budgets.
+# Sync requests must answer inside API Gateway's 29s integration timeout; async ones inside the polling window.
+REQUEST_DEADLINE_SECONDS = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 28))
+
+# --- Answer Cache Configuration ---
+# Final answers are cached per canonical (query, category, country). Leave the table unset to disable.
+ANSWER_CACHE_TABLE_NAME = os.environ.get("ANSWER_CACHE_TABLE_NAME")
+ANSWER_CACHE_DEFAULT_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_DEFAULT_TTL_SECONDS", 60 * 60)) # 1 hour
+# How long an expired answer may still be served while a refresh runs in the background (0 disables SWR)
+ANSWER_CACHE_STALE_SECONDS = int(os.environ.get("ANSWER_CACHE_STALE_SECONDS", 6 * 60 * 60))
+ANSWER_CACHE_REVALIDATE_LEASE_SECONDS = int(os.environ.get("ANSWER_CACHE_REVALIDATE_LEASE_SECONDS", 120))
+# Freshness per result_type_indicator: mega trends / internal data move slowly, web news quickly
+ANSWER_CACHE_TTLS_BY_INDICATOR: Dict[str, int] = {
+    "MEGA_TREND": 24 * 60 * 60,
+    "FORECAST": 24 * 60 * 60,
+    "CATEGORY_OVERVIEW": 12 * 60 * 60,
+    "TREND_DETAIL": 12 * 60 * 60,
+    "CATEGORY_COMPARISON": 12 * 60 * 60,
+    "AMAZON_RADAR": 12 * 60 * 60,
+    "BRAND_ANALYSIS": 6 * 60 * 60,
+    "WEB_SUMMARY": 60 * 60,
+    "QA_WEB": 60 * 60,
+}
+try: # Optional JSON override, e.g. {"WEB_SUMMARY": 1800}
+    ANSWER_CACHE_TTLS_BY_INDICATOR.update({k: int(v) for k, v in json.loads(os.environ.get("ANSWER_CACHE_TTLS", "{}")).items()})
+except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+    logging.warning("Ignoring invalid ANSWER_CACHE_TTLS value.")
+CACHEABLE_FINAL_STATUSES = {"success"} # Never cache errors or partial answers
 
 # --- Initialize Logger ---
 logger = logging.getLogger()
@@ -18,39 +69,197 @@ if log_level_str not in valid_log_levels: log_level_str = "INFO"
 logger.setLevel(log_level_str)
 logger.info(f"Logger initialized with level: {log_level_str}")
 logger.info(f"Target State Machine ARN: {STATE_MACHINE_ARN}")
+logger.info(f"PROXY_EXECUTION_MODE: {PROXY_EXECUTION_MODE}, USE_LOCAL_STATE_MACHINE: {USE_LOCAL_STATE_MACHINE}")
+logger.info(f"ANSWER_CACHE_TABLE_NAME: {ANSWER_CACHE_TABLE_NAME}")
+logger.info(f"ORCHESTRATOR_LAMBDA_NAME: {ORCHESTRATOR_LAMBDA_NAME}, ORCHESTRATOR_TRAFFIC_PERCENT: {ORCHESTRATOR_TRAFFIC_PERCENT}")
 
 # --- Initialize Boto3 SFN Client ---
 sfn_client = None
+lambda_client = None
+orchestrator_client = None
+answer_cache_table = None
 BOTO3_CLIENT_ERROR = None
 try:
     session = boto3.session.Session()
-    sfn_client = session.client(service_name='stepfunctions', region_name=AWS_REGION)
+    sfn_client = LocalStateMachine() if USE_LOCAL_STATE_MACHINE else session.client(service_name='stepfunctions', region_name=AWS_REGION)
+    lambda_client = session.client(service_name='lambda', region_name=AWS_REGION) # For async revalidation
+    if ORCHESTRATOR_LAMBDA_NAME: # Long read timeout and no retries: a retry would re-run the whole pipeline
+        orchestrator_client = session.client(service_name='lambda', region_name=AWS_REGION, config=Config(
+            read_timeout=ORCHESTRATOR_TIMEOUT_SECONDS, retries={"max_attempts": 0}))
+    if ANSWER_CACHE_TABLE_NAME:
+        answer_cache_table = session.resource('dynamodb', region_name=AWS_REGION).Table(ANSWER_CACHE_TABLE_NAME)
 except Exception as e:
     logger.exception("CRITICAL ERROR initializing Boto3 Step Functions client!")
     BOTO3_CLIENT_ERROR = f"Failed to initialize Boto3 SFN client: {e}"
 
 
-# --- Main Lambda Handler ---
-def lambda_handler(event, context):
+# --- Answer Cache Helpers ---
+def canonicalize_request_body(sfn_input_string: str) -> Optional[Dict[str, str]]:
+    """Returns the cache-relevant request fields in canonical form, or None if the body is not cacheable."""
+    try:
+        body = json.loads(sfn_input_string)
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if not isinstance(body, dict): return None
+    query, category, country = body.get("query"), body.get("category"), body.get("country")
+    if not all(isinstance(v, str) and v.strip() for v in (query, category, country)): return None
+    return {
+        "query": " ".join(query.lower().split()),
+        "category": " ".join(category.split()).title(),
+        "country": " ".join(country.split()).title(),
+    }
+
+
+def build_answer_cache_key(canonical_body: Dict[str, str]) -> str:
+    return sha256(json.dumps(canonical_body, sort_keys=True).encode()).hexdigest()
+
+
+def get_answer_ttl_seconds(result_type_indicator: Optional[str]) -> int:
+    return ANSWER_CACHE_TTLS_BY_INDICATOR.get(result_type_indicator or "", ANSWER_CACHE_DEFAULT_TTL_SECONDS)
+
+
+def read_cached_answer(cache_key: str) -> Tuple[Optional[Dict], str]:
+    """Returns (payload, state) where state is 'fresh', 'stale' or 'miss'."""
+    if not answer_cache_table: return None, "miss"
+    try:
+        item = answer_cache_table.get_item(Key={'answer_key': cache_key}).get('Item')
+        if not item or 'payload_json' not in item: return None, "miss"
+        now = int(time.time())
+        if int(item.get('fresh_until', 0)) >= now:
+            return json.loads(item['payload_json']), "fresh"
+        if ANSWER_CACHE_STALE_SECONDS > 0 and int(item.get('ttl', 0)) >= now:
+            return json.loads(item['payload_json']), "stale"
+        return None, "miss"
+    except ClientError as e:
+        logger.error(f"Answer cache read error: {e.response['Error']['Code']}", exc_info=True)
+    except Exception:
+        logger.exception("Unexpected answer cache read error.")
+    return None, "miss"
+
+
+def write_cached_answer(cache_key: str, canonical_body: Dict[str, str], final_output_object: Any) -> None:
+    if not answer_cache_table or not isinstance(final_output_object, dict): return
+    if final_output_object.get("status") not in CACHEABLE_FINAL_STATUSES:
+        logger.info(f"Not caching answer with status '{final_output_object.get('status')}'.")
+        return
+    indicator = final_output_object.get("result_type_indicator")
+    now = int(time.time())
+    fresh_until = now + get_answer_ttl_seconds(indicator)
+    try:
+        answer_cache_table.put_item(
+            Item={
+                'answer_key': cache_key,
+                'request_canonical': json.dumps(canonical_body, sort_keys=True),
+                'payload_json': json.dumps(final_output_object),
+                'result_type_indicator': indicator or "UNKNOWN",
+                'timestamp': now,
+                'fresh_until': fresh_until,
+                'ttl': fresh_until + max(ANSWER_CACHE_STALE_SECONDS, 0) # DynamoDB TTL attribute (hard expiry)
+            }
+        )
+        logger.info(f"Cached final answer for key {cache_key} ({indicator}) until {fresh_until}.")
+    except ClientError as e:
+        logger.error(f"Answer cache write error: {e.response['Error']['Code']}", exc_info=True)
+    except Exception:
+        logger.exception("Unexpected answer cache write error.")
+
+
+def schedule_answer_revalidation(cache_key: str, sfn_input_string: str, context) -> bool:
+    """Takes a short lease on the row and re-runs the workflow via an async self-invoke."""
+    function_name = getattr(context, "invoked_function_arn", None) or os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
+    if not function_name or not lambda_client or not answer_cache_table:
+        logger.warning("Cannot schedule answer revalidation (no function name or clients).")
+        return False
+    now = int(time.time())
+    try: # Only one concurrent request wins the lease; the rest keep serving stale
+        answer_cache_table.update_item(
+            Key={'answer_key': cache_key},
+            UpdateExpression="SET revalidate_lease_until = :lease",
+            ConditionExpression="attribute_exists(answer_key) AND (attribute_not_exists(revalidate_lease_until) OR revalidate_lease_until < :now)",
+            ExpressionAttributeValues={':lease': now + ANSWER_CACHE_REVALIDATE_LEASE_SECONDS, ':now': now}
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            logger.info(f"Revalidation already in progress for key {cache_key}.")
+        else:
+            logger.error(f"Answer cache lease error: {e.response['Error']['Code']}", exc_info=True)
+        return False
+    try:
+        lambda_client.invoke(
+            FunctionName=function_name, InvocationType='Event',
+            Payload=json.dumps({"answer_cache_revalidate": True, "body": sfn_input_string})
+        )
+        logger.info(f"Scheduled background revalidation for key {cache_key}.")
+        return True
+    except Exception:
+        logger.exception("Failed to schedule answer revalidation.")
+        return False
+
+
+def build_http_response(status_code: int, body_object: Any, cache_state: Optional[str] = None) -> Dict:
+    response = {"statusCode": status_code, "body": json.dumps(body_object)}
+    if cache_state: response["headers"] = {"X-Answer-Cache": cache_state.upper()}
+    return response
+
+
+# --- Step Function Execution ---
+def choose_execution_path() -> str:
+    if ORCHESTRATOR_LAMBDA_NAME and orchestrator_client and random.random() * 100 < ORCHESTRATOR_TRAFFIC_PERCENT:
+        return "orchestrator"
+    return "state_machine"
+
+
+def with_deadline(sfn_input_string: str, seconds: float) -> str:
+    """Adds deadline_ms (now + seconds) to a JSON object input; anything else passes through untouched."""
+    try:
+        sfn_input = json.loads(sfn_input_string)
+    except (json.JSONDecodeError, TypeError):
+        return sfn_input_string
+    if not isinstance(sfn_input, dict): return sfn_input_string
+    sfn_input["deadline_ms"] = int((time.time() + seconds) * 1000) # Client-supplied values are overwritten
+    return json.dumps(sfn_input)
+
+
+def run_sync_execution(sfn_input_string: str) -> Tuple[Dict, Optional[Any]]:
     """
-    Receives request from API Gateway, triggers Step Function synchronously,
-    parses the output string, and returns the result object.
+    Runs the workflow synchronously on the state machine or, for the A/B share, the orchestrator Lambda.
+    Returns (http_response, final_output_object); final_output_object is None unless the execution
+    succeeded and its output parsed. Latency is logged per path for the comparison.
     """
-    logger.debug(f"Proxy received event: {json.dumps(event)}")
+    path = choose_execution_path(); start = time.time()
+    sfn_input_string = with_deadline(sfn_input_string, REQUEST_DEADLINE_SECONDS)
+    if path == "orchestrator": http_response, final_output_object = run_orchestrator_execution(sfn_input_string)
+    else: http_response, final_output_object = run_state_machine_execution(sfn_input_string)
+    logger.info(json.dumps({"metric": "workflow_latency", "path": path, "status_code": http_response.get("statusCode"),
+                            "duration_ms": round((time.time() - start) * 1000, 1)}))
+    http_response.setdefault("headers", {})["X-Execution-Path"] = path
+    return http_response, final_output_object
 
-    # --- Initial Checks ---
-    if BOTO3_CLIENT_ERROR:
-        logger.error(f"Boto3 init failure: {BOTO3_CLIENT_ERROR}")
-        return {"statusCode": 500, "body": json.dumps({"error": "Configuration Error", "message": BOTO3_CLIENT_ERROR})}
-    if not STATE_MACHINE_ARN:
-        logger.error("STATE_MACHINE_ARN environment variable not set.")
-        return {"statusCode": 500, "body": json.dumps({"error": "Configuration Error", "message": "State Machine ARN not configured."})}
 
-    # --- Extract Input for Step Function ---
-    # API Gateway HTTP API (Lambda Proxy Integration assumed) passes body under 'body' key
-    sfn_input_string = event.get("body", "{}") # Default to empty object string if body is missing
+def run_orchestrator_execution(sfn_input_string: str) -> Tuple[Dict, Optional[Any]]:
+    """Invokes the orchestrator Lambda with the state machine input; errors map to the same responses as a failed execution."""
+    try:
+        logger.info(f"Invoking orchestrator {ORCHESTRATOR_LAMBDA_NAME}")
+        response = orchestrator_client.invoke(FunctionName=ORCHESTRATOR_LAMBDA_NAME, InvocationType="RequestResponse",
+                                              Payload=sfn_input_string)
+        payload = json.loads(response["Payload"].read() or b"null")
+        if response.get("FunctionError"):
+            error = payload.get("errorType", "UnknownError") if isinstance(payload, dict) else "UnknownError"
+            logger.error(f"Orchestrator execution failed. Error: {error}, Cause: {payload}")
+            return {"statusCode": 500, "body": json.dumps({"error": f"WorkflowExecutionError: {error}", "cause": payload})}, None
+        logger.info("Successfully executed orchestrator.")
+        return {"statusCode": 200, "body": json.dumps(payload)}, payload
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        logger.error(f"Boto3 ClientError invoking orchestrator: {error_code}", exc_info=True)
+        return {"statusCode": 502, "body": json.dumps({"error": "AWS API Error", "message": f"Failed to start workflow: {error_code}"})}, None
+    except Exception as e:
+        logger.exception("Unexpected error during orchestrator invocation.")
+        return {"statusCode": 500, "body": json.dumps({"error": "Internal Server Error", "message": str(e)})}, None
 
-    # --- Call Step Function StartSyncExecution ---
+
+def run_state_machine_execution(sfn_input_string: str) -> Tuple[Dict, Optional[Any]]:
+    """StartSyncExecution on the state machine. Returns (http_response, final_output_object)."""
     try:
         logger.info(f"Starting sync execution for {STATE_MACHINE_ARN}")
         logger.debug(f"Step Function Input String: {sfn_input_string}")
@@ -79,7 +288,7 @@ def lambda_handler(event, context):
                     "error": f"WorkflowExecutionError: {error}",
                     "cause": cause_details
                 })
-            }
+            }, None
         elif response.get('status') != 'SUCCEEDED':
              # Handle other statuses like TIMED_OUT, ABORTED if necessary
              logger.error(f"Step Function execution ended with unexpected status: {response.get('status')}")
@@ -89,7 +298,7 @@ def lambda_handler(event, context):
                     "error": "WorkflowError",
                     "message": f"Workflow ended with status: {response.get('status')}"
                 })
-             }
+             }, None
 
         # --- Parse the Stringified Output from Step Function ---
         sfn_output_string = response.get('output', '{}')
@@ -106,7 +315,7 @@ def lambda_handler(event, context):
                      "error": "OutputParsingError",
                      "message": "Failed to parse final workflow output."
                  })
-             }
+             }, None
 
         # --- Return Parsed Object ---
         # API Gateway Lambda Proxy integration will automatically stringify this dictionary
@@ -114,12 +323,165 @@ def lambda_handler(event, context):
         return {
             "statusCode": 200,
             "body": json.dumps(final_output_object) # Return the already-parsed JSON for Bubble
-        }
+        }, final_output_object
 
     except ClientError as e:
         error_code = e.response.get("Error", {}).get("Code")
         logger.error(f"Boto3 ClientError calling StartSyncExecution: {error_code}", exc_info=True)
-        return {"statusCode": 502, "body": json.dumps({"error": "AWS API Error", "message": f"Failed to start workflow: {error_code}"})}
+        return {"statusCode": 502, "body": json.dumps({"error": "AWS API Error", "message": f"Failed to start workflow: {error_code}"})}, None
     except Exception as e:
         logger.exception("Unexpected error during Step Function invocation.")
-        return {"statusCode": 500, "body": json.dumps({"error": "Internal Server Error", "message": str(e)})}
\ No newline at end of file
+        return {"statusCode": 500, "body": json.dumps({"error": "Internal Server Error", "message": str(e)})}, None
+
+
+# --- Async / Streaming Paths ---
+# Both start the workflow with StartExecution and return an execution token right away, so the
+# proxy does not sit idle for the workflow duration. The synthesis step records the final payload
+# under the token (GET ?execution_token=...). Python Lambdas cannot stream an HTTP response body,
+# so streaming is served incrementally on top of this: synthesis also publishes each completed
+# summary section, and the client polls ?stream_id=...&cursor=N until the "final" event arrives.
+# A "reset" event means synthesis is starting over (the other model tier, or a retry of the step): drop
+# the sections received so far. Sequence numbers keep increasing across retries, so the cursor stays valid.
+def start_async_execution(request_body: Dict, stream: bool = False,
+                          cache_key: Optional[str] = None, canonical_body: Optional[Dict[str, str]] = None) -> Dict:
+    execution_token = str(uuid.uuid4())
+    sfn_input = dict(request_body)
+    sfn_input.pop("stream", None)
+    sfn_input["execution_token"] = execution_token
+    if stream: sfn_input["stream_id"] = execution_token
+    sfn_input["deadline_ms"] = int((time.time() + ASYNC_EXECUTION_TIMEOUT_SECONDS) * 1000)
+    # Recorded before the workflow starts: a fast synthesis step may complete the record before StartExecution returns
+    execution_store.put_execution_record(execution_token, {
+        "status": "RUNNING", "started_at": time.time(), "answer_cache_key": cache_key, "canonical_body": canonical_body
+    })
+    try:
+        response = sfn_client.start_execution(stateMachineArn=STATE_MACHINE_ARN, name=execution_token,
+                                              input=json.dumps(sfn_input))
+        execution_arn = response.get("executionArn")
+        logger.info(f"Started async execution {execution_arn} (token {execution_token}, stream={stream}).")
+        execution_store.put_execution_record(execution_token, {"execution_arn": execution_arn}) # Leaves the status alone
+        body = {"execution_token": execution_token, "status": "RUNNING"}
+        if stream: body.update(stream_id=execution_token, next_cursor=0)
+        return build_http_response(202, body)
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        logger.error(f"Boto3 ClientError calling StartExecution: {error_code}", exc_info=True)
+        execution_store.put_execution_record(execution_token, {"status": "FAILED", "error": error_code})
+        return {"statusCode": 502, "body": json.dumps({"error": "AWS API Error", "message": f"Failed to start workflow: {error_code}"})}
+    except Exception as e:
+        logger.exception("Unexpected error starting async execution.")
+        execution_store.put_execution_record(execution_token, {"status": "FAILED", "error": type(e).__name__})
+        return {"statusCode": 500, "body": json.dumps({"error": "Internal Server Error", "message": str(e)})}
+
+
+def get_execution_status(execution_token: str) -> Dict:
+    record = execution_store.get_execution_record(execution_token)
+    if record is None:
+        return {"statusCode": 404, "body": json.dumps({"error": "NotFound", "message": "Unknown execution token."})}
+
+    if record.get("status") != "SUCCEEDED" and record.get("execution_arn"):
+        # Synthesis has not recorded a result yet - ask Step Functions directly where it can answer
+        # (Standard workflows and the local stand-in; Express workflows do not support DescribeExecution).
+        try:
+            description = sfn_client.describe_execution(executionArn=record["execution_arn"])
+            sfn_status = description.get("status")
+            if sfn_status == "SUCCEEDED" and description.get("output"):
+                record.update(status="SUCCEEDED", result=json.loads(description["output"]))
+                execution_store.put_execution_result(execution_token, record["result"])
+            elif sfn_status in ("FAILED", "TIMED_OUT", "ABORTED"):
+                return build_http_response(200, {"execution_token": execution_token, "status": sfn_status,
+                                                  "error": description.get("error"), "cause": description.get("cause")})
+        except Exception as e:
+            logger.debug(f"DescribeExecution unavailable for {execution_token}: {e}")
+
+    if record.get("status") in ("FAILED", "TIMED_OUT", "ABORTED"): # e.g. StartExecution failed
+        return build_http_response(200, {"execution_token": execution_token, "status": record["status"], "error": record.get("error")})
+    if record.get("status") == "SUCCEEDED":
+        if record.get("answer_cache_key") and not record.get("answer_cached"):
+            write_cached_answer(record["answer_cache_key"], record.get("canonical_body") or {}, record.get("result"))
+            execution_store.put_execution_record(execution_token, {"answer_cached": True})
+        return build_http_response(200, {"execution_token": execution_token, "status": "SUCCEEDED",
+                                          "result": record.get("result")})
+    if time.time() - float(record.get("started_at", 0)) > ASYNC_EXECUTION_TIMEOUT_SECONDS:
+        return build_http_response(200, {"execution_token": execution_token, "status": "TIMED_OUT"})
+    return build_http_response(202, {"execution_token": execution_token, "status": "RUNNING"})
+
+
+def read_stream(stream_id: str, cursor: int) -> Dict:
+    events = execution_store.read_stream_events(stream_id, after_seq=cursor)
+    next_cursor = events[-1]["seq"] if events else cursor
+    done = any(e.get("type") == "final" for e in events)
+    return build_http_response(200, {"stream_id": stream_id, "events": events, "next_cursor": next_cursor, "done": done})
+
+
+# --- Main Lambda Handler ---
+def lambda_handler(event, context):
+    """
+    Receives request from API Gateway, serves the final answer from the answer cache when possible,
+    otherwise triggers Step Function synchronously, parses the output string, and returns the result object.
+    In async mode (PROXY_EXECUTION_MODE=async) or for streaming requests it starts the workflow and returns
+    an execution token; GET ?execution_token=... then serves the status / stored result.
+    """
+    logger.debug(f"Proxy received event: {json.dumps(event)}")
+
+    # --- Initial Checks ---
+    if BOTO3_CLIENT_ERROR:
+        logger.error(f"Boto3 init failure: {BOTO3_CLIENT_ERROR}")
+        return {"statusCode": 500, "body": json.dumps({"error": "Configuration Error", "message": BOTO3_CLIENT_ERROR})}
+    if not STATE_MACHINE_ARN:
+        logger.error("STATE_MACHINE_ARN environment variable not set.")
+        return {"statusCode": 500, "body": json.dumps({"error": "Configuration Error", "message": "State Machine ARN not configured."})}
+
+    # --- Async Status / Stream Polling (GET ?execution_token=... or ?stream_id=...&cursor=N) ---
+    query_params = event.get("queryStringParameters") or {}
+    if query_params.get("execution_token"):
+        return get_execution_status(query_params["execution_token"])
+    if query_params.get("stream_id"):
+        try:
+            cursor = int(query_params.get("cursor", 0))
+        except (TypeError, ValueError):
+            return {"statusCode": 400, "body": json.dumps({"error": "Invalid Request", "message": "cursor must be an integer."})}
+        return read_stream(query_params["stream_id"], cursor)
+
+    # --- Extract Input for Step Function ---
+    # API Gateway HTTP API (Lambda Proxy Integration assumed) passes body under 'body' key
+    sfn_input_string = event.get("body", "{}") # Default to empty object string if body is missing
+    try:
+        request_body = json.loads(sfn_input_string)
+    except (json.JSONDecodeError, TypeError):
+        request_body = None
+    stream_requested = isinstance(request_body, dict) and request_body.get("stream") is True
+
+    canonical_body = canonicalize_request_body(sfn_input_string) if answer_cache_table else None
+    cache_key = build_answer_cache_key(canonical_body) if canonical_body else None
+
+    # --- Background Revalidation (async self-invoke from a stale hit) ---
+    if event.get("answer_cache_revalidate"):
+        logger.info(f"Revalidating cached answer for key {cache_key}.")
+        http_response, final_output_object = run_sync_execution(sfn_input_string)
+        if cache_key and final_output_object is not None:
+            write_cached_answer(cache_key, canonical_body, final_output_object)
+        return http_response
+
+    # --- Check Answer Cache ---
+    if cache_key:
+        cached_payload, cache_state = read_cached_answer(cache_key)
+        if cache_state == "fresh":
+            logger.info(f"Answer cache hit for key {cache_key}. Skipping workflow execution.")
+            return build_http_response(200, cached_payload, "hit")
+        if cache_state == "stale":
+            logger.info(f"Serving stale answer for key {cache_key} while revalidating.")
+            schedule_answer_revalidation(cache_key, sfn_input_string, context)
+            return build_http_response(200, cached_payload, "stale")
+        logger.info(f"Answer cache miss for key {cache_key}.")
+
+    if stream_requested or (PROXY_EXECUTION_MODE == "async" and isinstance(request_body, dict)):
+        return start_async_execution(request_body, stream=stream_requested, cache_key=cache_key,
+                                     canonical_body=canonical_body)
+
+    # --- Call Step Function StartSyncExecution ---
+    http_response, final_output_object = run_sync_execution(sfn_input_string)
+    if cache_key and final_output_object is not None:
+        write_cached_answer(cache_key, canonical_body, final_output_object)
+        http_response.setdefault("headers", {})["X-Answer-Cache"] = "MISS"
+    return http_response
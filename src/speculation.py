@@ -0,0 +1,68 @@
+# src/speculation.py
+import logging
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger()
+
+
+class SpeculativeFetch:
+    """
+    A fetch started before the interpretation is known. A step that turns out to need the same data
+    claim()s it instead of fetching again; a fetch nobody claims is discarded (left to finish in the
+    background, its result unused).
+    """
+
+    def __init__(self, name: str, key: str, executor: Executor, fn: Callable, *args, **kwargs):
+        self.name = name; self.key = key
+        self.started_at = time.perf_counter(); self.finished_at: Optional[float] = None; self.claimed_at: Optional[float] = None
+        self.served = False # Set by claim() when the result was actually used
+        self.future = executor.submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn: Callable, *args, **kwargs) -> Any:
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.finished_at = time.perf_counter() # Before the result is published, so claimers always see it
+
+    def claim(self, timeout: Optional[float] = None) -> Any:
+        """Waits for the result. Returns None if the fetch raised, so the caller falls back to a normal fetch."""
+        self.claimed_at = time.perf_counter()
+        try:
+            result = self.future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Speculative fetch '{self.name}' failed, fetching normally: {e}")
+            return None
+        self.served = True
+        return result
+
+    def saved_ms(self) -> float:
+        """
+        Latency taken off the critical path: a normal fetch would have started at claim time and taken
+        as long as this one did, so the saving is that duration, capped by how early it was started.
+        """
+        if not self.served or self.finished_at is None: return 0.0
+        return round(min(self.finished_at - self.started_at, self.claimed_at - self.started_at) * 1000, 1)
+
+
+# --- Container-level Counters ---
+SPECULATION_STATS: Dict[str, Dict[str, float]] = {} # name -> {"started", "hits", "failed", "saved_ms"}
+_stats_lock = threading.Lock()
+
+
+def summarize_speculation(fetches: Dict[str, SpeculativeFetch]) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-request outcome of each speculative fetch, also added to SPECULATION_STATS: 'hit' (claimed and used),
+    'failed' (claimed but raised, so the step fetched normally) or 'discarded' (never claimed).
+    """
+    summary = {}
+    with _stats_lock:
+        for fetch in fetches.values():
+            outcome = "hit" if fetch.served else "failed" if fetch.claimed_at is not None else "discarded"
+            summary[fetch.name] = {"outcome": outcome, "saved_ms": fetch.saved_ms()}
+            stats = SPECULATION_STATS.setdefault(fetch.name, {"started": 0, "hits": 0, "failed": 0, "saved_ms": 0.0})
+            stats["started"] += 1; stats["hits"] += int(outcome == "hit"); stats["failed"] += int(outcome == "failed")
+            stats["saved_ms"] += summary[fetch.name]["saved_ms"]
+    return summary
@@ -0,0 +1,96 @@
+# src/vocab_matcher.py
+import logging
+from collections import deque
+from typing import Dict, List, NamedTuple, Set
+
+logger = logging.getLogger()
+
+
+class VocabularyMatch(NamedTuple):
+    start: int # Character offsets into the searched text (end is exclusive)
+    end: int
+    term: str # Lowercase vocabulary term
+    kinds: frozenset # e.g. {'category'}, {'color'}
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum()
+
+
+class VocabularyMatcher:
+    """
+    Aho-Corasick automaton over a lowercase vocabulary (single and multi-word terms).
+    Build once per container; find_all() scans a query in a single pass and returns
+    leftmost-longest, non-overlapping matches that sit on word boundaries.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[str]] = [[]] # Terms ending at each state (via failure links after build)
+        self._kinds: Dict[str, Set[str]] = {}
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._kinds)
+
+    def add(self, term: str, kind: str):
+        term = term.strip().lower()
+        if not term: return
+        self._kinds.setdefault(term, set()).add(kind)
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({}); self._fail.append(0); self._outputs.append([])
+            state = next_state
+        if term not in self._outputs[state]: self._outputs[state].append(term)
+        self._built = False
+
+    def add_all(self, terms, kind: str):
+        for term in terms: self.add(term, kind)
+
+    def build(self):
+        """Computes failure links breadth-first and merges outputs along them."""
+        queue = deque()
+        for state in self._goto[0].values():
+            self._fail[state] = 0; queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]: fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._outputs[next_state] += [t for t in self._outputs[self._fail[next_state]] if t not in self._outputs[next_state]]
+        self._built = True
+        logger.info(f"Vocabulary matcher built: {len(self._kinds)} terms, {len(self._goto)} states.")
+
+    def find_all(self, text: str) -> List[VocabularyMatch]:
+        """Matches in `text` (lowercased here). Overlaps resolve to the leftmost, then longest, term."""
+        if not self._built: self.build()
+        text_lower = text.lower()
+        candidates = []; state = 0
+        for index, char in enumerate(text_lower):
+            while state and char not in self._goto[state]: state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for term in self._outputs[state]:
+                start = index - len(term) + 1
+                if start > 0 and _is_word_char(text_lower[start - 1]): continue
+                if index + 1 < len(text_lower) and _is_word_char(text_lower[index + 1]): continue
+                candidates.append((start, index + 1, term))
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        matches: List[VocabularyMatch] = []; covered_until = 0
+        for start, end, term in candidates:
+            if start < covered_until: continue
+            matches.append(VocabularyMatch(start, end, term, frozenset(self._kinds[term]))); covered_until = end
+        return matches
+
+    def find_terms(self, text: str, kind: str) -> List[str]:
+        """Matched terms of one kind, in query order, without duplicates."""
+        terms = []
+        for match in self.find_all(text):
+            if kind in match.kinds and match.term not in terms: terms.append(match.term)
+        return terms